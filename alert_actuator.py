@@ -0,0 +1,166 @@
+"""
+Alert Actuator
+Sends the firmware's BUZZER_ON command (a bare UDP datagram to port 8889,
+see hardware/ESP32_I2S_Camera.ino) the moment a camera goes into an alert,
+off the frame loop. The frame thread only enqueues; one sender thread owns
+the socket, repeats each command a few times since UDP gives no delivery
+guarantee, and times every command from the frame it was detected on.
+"""
+
+import heapq
+import queue
+import socket
+import threading
+import time
+
+from perf_stats import LatencyHistogram
+
+BUZZER_PORT = 8889
+BUZZER_COMMAND = b'BUZZER_ON'
+
+
+class BuzzerActuator:
+    """
+    Non-blocking BUZZER_ON sender shared by all cameras.
+
+    trigger(host, frame_ts) never blocks: it enqueues a command for the
+    sender thread, or returns False when the command is redundant. The
+    firmware holds the buzzer for 3 s per command, so triggers for a host
+    that was sent a command less than `refresh` seconds ago are dropped as
+    duplicates (hosts quiet for longer are forgotten); calling trigger() on every alert frame therefore sends at
+    once on the transition and re-arms the buzzer at most once per refresh
+    while the alert lasts. Each command is repeated `retries` times at
+    `retry_interval`, doubling, as cover for lost datagrams. If the queue
+    is full the trigger is dropped rather than stalling the caller.
+
+    Latency is measured from frame_ts (time.time() when the frame arrived)
+    to the first send; with a profiler it is also recorded as 'actuate'.
+    """
+
+    def __init__(self, port=BUZZER_PORT, command=BUZZER_COMMAND, refresh=2.5, retries=2, retry_interval=0.03,
+                 queue_size=16, profiler=None):
+        self.port = port
+        self.command = command
+        self.refresh = refresh
+        self.retries = retries
+        self.retry_interval = retry_interval
+        self.profiler = profiler
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._last_sent = {}  # host -> monotonic time of the last accepted trigger
+        self._retries = []  # heap of (due, seq, host, attempt)
+        self._seq = 0
+        self._sock = None
+        self._thread = None
+
+        self.triggers = 0
+        self.sent = 0
+        self.retries_sent = 0
+        self.deduplicated = 0
+        self.dropped = 0
+        self.send_errors = 0
+        self.latency = LatencyHistogram()  # frame arrival -> first send
+        self.queue_wait = LatencyHistogram()  # trigger() -> first send
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._thread = threading.Thread(target=self._run, name='buzzer-actuator', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=2)
+        self._thread = None
+        self._sock.close()
+        self._sock = None
+
+    def trigger(self, host, frame_ts=None):
+        """Queue BUZZER_ON for `host`; True if a command will be sent"""
+        now = time.monotonic()
+        with self._lock:
+            self.triggers += 1
+            last = self._last_sent.get(host)
+            if last is not None and now - last < self.refresh:
+                self.deduplicated += 1
+                return False
+            self._prune(now)
+            self._last_sent[host] = now
+        try:
+            self._queue.put_nowait((host, frame_ts, now))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                if self._last_sent.get(host) == now:
+                    del self._last_sent[host]
+            return False
+        return True
+
+    def _prune(self, now):
+        """Forget hosts whose last trigger is older than refresh (caller holds the lock)"""
+        for host in [h for h, t in self._last_sent.items() if now - t >= self.refresh]:
+            del self._last_sent[host]
+
+    def _send(self, host):
+        try:
+            self._sock.sendto(self.command, (host, self.port))
+            return True
+        except OSError as e:
+            self.send_errors += 1
+            print(f"✗ Buzzer command to {host}:{self.port} failed: {e}")
+            return False
+
+    def _run(self):
+        while True:
+            timeout = max(0.0, self._retries[0][0] - time.monotonic()) if self._retries else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = False
+            if item is None:
+                return
+
+            if item:
+                host, frame_ts, queued_at = item
+                if self._send(host):
+                    self.sent += 1
+                    self.queue_wait.record(time.monotonic() - queued_at)
+                    if frame_ts is not None:
+                        latency = max(0.0, time.time() - frame_ts)
+                        self.latency.record(latency)
+                        if self.profiler is not None:
+                            self.profiler.record('actuate', latency)
+                if self.retries:
+                    self._seq += 1
+                    heapq.heappush(self._retries, (time.monotonic() + self.retry_interval, self._seq, host, 1))
+
+            now = time.monotonic()
+            while self._retries and self._retries[0][0] <= now:
+                _, _, host, attempt = heapq.heappop(self._retries)
+                if self._send(host):
+                    self.retries_sent += 1
+                if attempt < self.retries:
+                    self._seq += 1
+                    heapq.heappush(self._retries, (now + self.retry_interval * 2 ** attempt, self._seq, host, attempt + 1))
+
+    def stats(self):
+        with self._lock:
+            self._prune(time.monotonic())
+            targets = sorted(self._last_sent)
+        return {
+            'running': self._thread is not None,
+            'port': self.port,
+            'targets': targets,
+            'triggers': self.triggers,
+            'sent': self.sent,
+            'retries_sent': self.retries_sent,
+            'deduplicated': self.deduplicated,
+            'dropped': self.dropped,
+            'send_errors': self.send_errors,
+            'queued': self._queue.qsize(),
+            'latency': self.latency.snapshot(),
+            'queue_wait': self.queue_wait.snapshot()
+        }
@@ -0,0 +1,376 @@
+"""
+Offline Batch Drowsiness Analysis
+Headless counterpart of dashcam.py for recorded trip videos: no window, no
+overlays, no real-time pacing. Each file is decoded by a reader thread
+while the main thread runs landmarks + features, the classifier runs once
+per file on all feature rows, and per-frame features plus alert events are
+written to <out>/<video name>.npz. Files are spread over a process pool.
+
+Usage: python batch_analyze.py trips/ [more.mp4 ...] [--out analysis] [--jobs 4]
+"""
+
+import argparse
+import os
+import pickle
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+
+import cv2
+import mediapipe as mp
+import numpy as np
+
+from detection_processes import create_interpreter, create_landmarker
+import feature_store
+from face_tracker import create_tracker
+from frame_buffers import FrameBufferPool
+from inference_service import InferenceService, check_feature_model
+from landmark_features import N_FEATURES, AffineScaler, compute_features, feature_points
+from window_metrics import WindowMetrics
+
+# ============================================
+# Configuration
+# ============================================
+
+MODEL_PATH = 'face_landmarker.task'
+TFLITE_MODEL_PATH = 'drowsiness_model.tflite'
+SCALER_PATH = 'scaler.pkl'
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.mjpeg', '.mjpg')
+READ_AHEAD = 8  # decoded frames queued ahead of detection
+
+# Same thresholds as the live detector (detection_core.apply_detection)
+BLINK_EAR = 0.22
+ALERT_EAR = 0.25
+YAWN_MAR = 0.6
+YAWN_GAP_S = 2.0
+DROWSY_PREDICTION = 0.65
+CRITICAL_CONSECUTIVE = 15
+BLINK_WINDOW_S = 30.0
+PERCLOS_WINDOW_S = 60.0
+BLINK_ALERT_COUNT = 20
+
+# Same alert codes as the feature store ('' = no alert)
+ALERT_TYPES = np.array([name or '' for name in feature_store.ALERT_TYPES])
+
+# ============================================
+# Decoding
+# ============================================
+
+class VideoReader:
+    """
+    Decodes a video on a background thread into pooled RGB buffers.
+
+    Iterating yields (frame_index, timestamp_ms, rgb); the consumer hands each
+    buffer back with release() once detection is done with it.
+    """
+
+    _END = object()
+
+    def __init__(self, path, stride=1, mirror=False, read_ahead=READ_AHEAD):
+        self.path = path
+        self.stride = max(1, stride)
+        self.mirror = mirror
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise IOError(f"cannot open {path}")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.buffers = FrameBufferPool(max_free_per_shape=read_ahead + 2)
+        self._queue = queue.Queue(maxsize=read_ahead)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"reader-{os.path.basename(path)}", daemon=True)
+        self.error = None
+
+    def _run(self):
+        bgr = None
+        index = 0
+        try:
+            while not self._stop.is_set():
+                # grab() skips the colour conversion of frames we do not analyze
+                if index % self.stride and self.cap.grab():
+                    index += 1
+                    continue
+                ok, bgr = self.cap.read(bgr)
+                if not ok:
+                    break
+                timestamp_ms = index * 1000.0 / self.fps
+                if self.mirror:
+                    cv2.flip(bgr, 1, dst=bgr)
+                rgb = self.buffers.acquire(bgr.shape)
+                cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB, dst=rgb)
+                self._queue.put((index, timestamp_ms, rgb))
+                index += 1
+        except Exception as e:
+            self.error = e
+        finally:
+            self._queue.put(self._END)
+
+    def __iter__(self):
+        self._thread.start()
+        while True:
+            item = self._queue.get()
+            if item is self._END:
+                break
+            yield item
+        if self.error is not None:
+            raise self.error
+
+    def release(self, rgb):
+        self.buffers.release(rgb)
+
+    def close(self):
+        self._stop.set()
+        # Unblock a reader waiting on a full queue
+        while self._thread.is_alive():
+            try:
+                self._queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        self.cap.release()
+
+# ============================================
+# Alert Events
+# ============================================
+
+def classify_alerts(time_s, face, ear, mar, prediction):
+    """Replay the live detector's blink/yawn/alert rules over a whole file
+
+    Returns (per-frame alert codes into ALERT_TYPES, per-frame PERCLOS,
+    blink frame indices, yawn frame indices). Frames without a face keep
+    the previous state, as in the server.
+    """
+    alerts = np.zeros(len(face), dtype=np.int8)
+    perclos = np.full(len(face), np.nan, dtype=np.float32)
+    blinks, yawns = [], []
+    windows = WindowMetrics(blink_window=BLINK_WINDOW_S, perclos_window=PERCLOS_WINDOW_S,
+                            closed_ear=BLINK_EAR, yawn_mar=YAWN_MAR, yawn_gap=YAWN_GAP_S)
+    stats = {}
+    consecutive = 0
+
+    for i in np.flatnonzero(face):
+        t = time_s[i]
+        blinked, yawned = windows.update(t, float(ear[i]), float(mar[i]))
+        windows.write(stats, t)
+        perclos[i] = stats['perclos']
+        if blinked:
+            blinks.append(i)
+        if yawned:
+            yawns.append(i)
+
+        is_drowsy = prediction[i] > DROWSY_PREDICTION
+        consecutive = consecutive + 1 if is_drowsy else 0
+
+        if consecutive >= CRITICAL_CONSECUTIVE:
+            alerts[i] = 1
+        elif ear[i] <= ALERT_EAR:
+            alerts[i] = 2
+        elif mar[i] > YAWN_MAR:
+            alerts[i] = 3
+        elif stats[windows.blink_key] > BLINK_ALERT_COUNT:
+            alerts[i] = 4
+        elif is_drowsy:
+            alerts[i] = 5
+
+    return alerts, perclos, np.array(blinks, dtype=np.int64), np.array(yawns, dtype=np.int64)
+
+
+def alert_changes(alerts, face):
+    """(change indices, alert before, alert after) with no-face frames carrying the last alert"""
+    last_face = np.maximum.accumulate(np.where(face, np.arange(len(face)), -1))
+    carried = np.where(last_face >= 0, alerts[np.maximum(last_face, 0)], 0).astype(np.int8)
+    previous = np.concatenate(([0], carried[:-1])).astype(np.int8)
+    return np.flatnonzero(carried != previous), previous, carried
+
+# ============================================
+# Per-file Analysis (runs in pool workers)
+# ============================================
+
+_models = None
+
+
+def init_worker(model_path, tflite_path, scaler_path, landmark_mode):
+    """Load the models once per pool process (tflite_path None: no classifier)"""
+    global _models
+    scaler = None
+    if scaler_path and os.path.exists(scaler_path):
+        with open(scaler_path, 'rb') as f:
+            scaler = AffineScaler.from_sklearn(pickle.load(f))
+    classifier = None
+    if tflite_path is not None:
+        classifier = InferenceService(partial(create_interpreter, tflite_path),
+                                      preprocess=scaler.transform if scaler else None, workers=0,
+                                      n_features=N_FEATURES)
+    _models = {
+        'model_path': model_path,
+        'landmarker': create_landmarker(model_path),
+        'classifier': classifier,
+        'landmark_mode': landmark_mode
+    }
+
+
+def analyze_video(path, out_path, stride=1, mirror=False):
+    """Analyze one video and write its .npz; returns a summary dict"""
+    start = time.perf_counter()
+    landmarker = _models['landmarker']
+    # Frames of a file arrive in order, so VIDEO-mode tracking applies
+    tracker = create_tracker(_models['model_path']) if _models['landmark_mode'] == 'video' else None
+
+    reader = VideoReader(path, stride=stride, mirror=mirror)
+    frame_index, time_s, face, features = [], [], [], []
+    try:
+        for index, timestamp_ms, rgb in reader:
+            h, w = rgb.shape[:2]
+            mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb)
+            result = tracker.detect(mp_image, timestamp_ms) if tracker is not None else None
+            if result is None:
+                result = landmarker.detect(mp_image)
+            reader.release(rgb)
+
+            frame_index.append(index)
+            time_s.append(timestamp_ms / 1000.0)
+            if result.face_landmarks:
+                face.append(True)
+                features.append(compute_features(feature_points(result.face_landmarks[0], w, h)))
+            else:
+                face.append(False)
+                features.append(np.full(N_FEATURES, np.nan))
+    finally:
+        reader.close()
+        if tracker is not None:
+            tracker.close()
+
+    face = np.array(face, dtype=bool)
+    features = np.array(features, dtype=np.float32).reshape(-1, N_FEATURES)
+    time_s = np.array(time_s, dtype=np.float64)
+
+    # One batched classifier pass over every frame with a face (NaN: never drowsy)
+    prediction = np.full(len(face), np.nan, dtype=np.float32)
+    if face.any() and _models['classifier'] is not None:
+        prediction[face] = np.asarray(_models['classifier'].predict_now(features[face])).reshape(-1)
+
+    ear, left_ear, right_ear, mar = features[:, 0], features[:, 1], features[:, 2], features[:, 4]
+    alerts, perclos, blinks, yawns = classify_alerts(time_s, face, ear, mar, prediction)
+    changes, previous, carried = alert_changes(alerts, face)
+
+    np.savez_compressed(
+        out_path,
+        frame=np.array(frame_index, dtype=np.int64),
+        time_s=time_s,
+        face=face,
+        ear=ear, left_ear=left_ear, right_ear=right_ear, mar=mar,
+        prediction=prediction,
+        perclos=perclos,
+        alert=carried,
+        alert_types=ALERT_TYPES,
+        event_frame=np.array(frame_index, dtype=np.int64)[changes],
+        event_time_s=time_s[changes],
+        event_from=ALERT_TYPES[previous[changes]],
+        event_to=ALERT_TYPES[carried[changes]],
+        blink_frame=np.array(frame_index, dtype=np.int64)[blinks],
+        yawn_frame=np.array(frame_index, dtype=np.int64)[yawns],
+        source=np.array(os.path.abspath(path)),
+        fps=np.array(reader.fps)
+    )
+
+    elapsed = time.perf_counter() - start
+    return {
+        'path': path,
+        'frames': len(face),
+        'faces': int(face.sum()),
+        'events': len(changes),
+        'video_s': float(time_s[-1]) if len(time_s) else 0.0,
+        'elapsed_s': elapsed
+    }
+
+# ============================================
+# Main
+# ============================================
+
+def find_videos(inputs):
+    videos = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                videos.extend(os.path.join(root, f) for f in sorted(files)
+                              if f.lower().endswith(VIDEO_EXTENSIONS))
+        else:
+            videos.append(item)
+    return videos
+
+
+def output_path(video, out_dir):
+    return os.path.join(out_dir, os.path.splitext(os.path.basename(video))[0] + '.npz')
+
+
+def check_classifier(tflite_path):
+    """Error message if the classifier cannot run on feature rows, else None"""
+    try:
+        check_feature_model(create_interpreter(tflite_path), N_FEATURES)
+    except Exception as e:
+        return f"{tflite_path}: {e}"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless drowsiness analysis of recorded videos")
+    parser.add_argument('inputs', nargs='+', help='video files or directories')
+    parser.add_argument('--out', default='analysis', help='directory for the .npz results')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='worker processes')
+    parser.add_argument('--stride', type=int, default=1, help='analyze every Nth frame')
+    parser.add_argument('--mirror', action='store_true', help='flip frames like the live dashcam view')
+    parser.add_argument('--landmark-mode', choices=('video', 'image'), default='video')
+    parser.add_argument('--overwrite', action='store_true', help='re-analyze files that already have results')
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--tflite', default=TFLITE_MODEL_PATH)
+    parser.add_argument('--no-classifier', action='store_true',
+                        help='skip the feature classifier (threshold alerts only)')
+    parser.add_argument('--scaler', default=SCALER_PATH)
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    jobs = [(v, output_path(v, args.out)) for v in find_videos(args.inputs)]
+    if not args.overwrite:
+        jobs = [(v, o) for v, o in jobs if not os.path.exists(o)]
+    if not jobs:
+        print("Nothing to analyze")
+        return
+
+    # Check the models once here rather than failing every file in every worker
+    if not os.path.exists(args.model):
+        sys.exit(f"✗ Face landmarker model not found: {args.model}")
+    tflite_path = None if args.no_classifier else args.tflite
+    if tflite_path is not None:
+        error = check_classifier(tflite_path)
+        if error is not None:
+            sys.exit(f"✗ Classifier unusable: {error}\n  Use a 5-feature model with --tflite, "
+                     f"or --no-classifier for threshold alerts only")
+
+    print(f"Analyzing {len(jobs)} videos with {args.jobs} processes -> {args.out}/")
+    start = time.perf_counter()
+    total_video_s = 0.0
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.jobs, initializer=init_worker,
+                             initargs=(args.model, tflite_path, args.scaler, args.landmark_mode)) as pool:
+        futures = {pool.submit(analyze_video, v, o, args.stride, args.mirror): v for v, o in jobs}
+        for future in as_completed(futures):
+            try:
+                summary = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"✗ {futures[future]}: {e}")
+                continue
+            total_video_s += summary['video_s']
+            print(f"✓ {summary['path']}: {summary['frames']} frames, {summary['faces']} with a face, "
+                  f"{summary['events']} alert changes ({summary['video_s'] / max(summary['elapsed_s'], 1e-9):.1f}x real time)")
+
+    elapsed = time.perf_counter() - start
+    print(f"\nDone: {len(jobs) - failed}/{len(jobs)} videos, {total_video_s / 3600:.2f} h of footage "
+          f"in {elapsed:.0f} s ({total_video_s / max(elapsed, 1e-9):.1f}x real time)")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark: drowsiness classifier backends, TFLite interpreter vs NumPy.
+
+Exports --tflite to a temporary .npz (scaler folded in), checks that both
+backends agree on random feature rows, then times single-row predict_now
+calls (the per-frame path of dashcam.py and the detection workers), batch
+throughput at each --batch size, and one camera's predict() latency in the
+server (through the micro-batching service with the server's settings for
+TFLite, inline for NumPy). Both backends take raw features, so the TFLite
+timings include the scaler. The model must be a dense 5-feature classifier;
+the exporter rejects anything else.
+
+Usage: python benchmarks/bench_classifier_backends.py [--tflite drowsiness_model.tflite] \
+           [--scaler scaler.pkl] [--rows 20000] [--batch 1 16 256 4096]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from functools import partial
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from inference_service import InferenceService  # noqa: E402
+from model_loader import create_interpreter, interpreter_runtime, load_scaler  # noqa: E402
+from numpy_classifier import NumpyClassifier, export_dense_model, parity  # noqa: E402
+
+
+def time_single(predict, features, repeat):
+    """Per-call latency in microseconds (median, p99) over one row at a time"""
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        predict(features[i % len(features)])
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return statistics.median(samples), samples[int(0.99 * (len(samples) - 1))]
+
+
+def time_batches(model, features, batch):
+    """Rows per second classifying `features` in chunks of `batch`"""
+    start = time.perf_counter()
+    for i in range(0, len(features), batch):
+        model.predict_now(features[i:i + batch])
+    return len(features) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tflite', default='drowsiness_model.tflite')
+    parser.add_argument('--scaler', default='scaler.pkl')
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5000, help='single-row calls per backend')
+    parser.add_argument('--batch', type=int, nargs='+', default=[1, 16, 256, 4096])
+    args = parser.parse_args()
+
+    scaler = load_scaler(args.scaler)
+    try:
+        layers = export_dense_model(args.tflite, scaler)
+    except ValueError as e:
+        sys.exit(f"✗ {e}")
+    with tempfile.TemporaryDirectory() as tmp:
+        npz_path = os.path.join(tmp, 'model.npz')
+        np.savez(npz_path, **layers)
+        backends = {
+            f"tflite ({interpreter_runtime()[0]})": InferenceService(
+                partial(create_interpreter, args.tflite), preprocess=scaler.transform, workers=0),
+            'numpy': NumpyClassifier.load(npz_path)
+        }
+        print(f".npz size: {os.path.getsize(npz_path)} bytes, tflite: {os.path.getsize(args.tflite)} bytes")
+
+    print(f"parity: max |numpy - TFLite| = {parity(args.tflite, backends['numpy'], scaler):.2e}")
+
+    rng = np.random.default_rng(0)
+    features = (scaler.mean + scaler.scale * rng.normal(size=(args.rows, len(scaler.mean)))).astype(np.float32)
+    for model in backends.values():  # warm up
+        model.predict_now(features[:64])
+        model.predict_now(features[0])
+
+    print(f"\n{'backend':<28}{'1-row p50 us':>14}{'1-row p99 us':>14}" +
+          ''.join(f"{f'rows/s @{b}':>16}" for b in args.batch))
+    for name, model in backends.items():
+        p50, p99 = time_single(model.predict_now, features, args.repeat)
+        rates = [time_batches(model, features, b) for b in args.batch]
+        print(f"{name:<28}{p50:>14.1f}{p99:>14.1f}" + ''.join(f"{r:>16,.0f}" for r in rates))
+
+    service = InferenceService(partial(create_interpreter, args.tflite), preprocess=scaler.transform,
+                               workers=1, max_batch=16, max_wait_ms=2.0)
+    print("\nserver predict(), one camera:")
+    for name, predict in (('tflite service', service.predict), ('numpy', backends['numpy'].predict)):
+        p50, p99 = time_single(predict, features, min(args.repeat, 1000))
+        print(f"  {name:<26}p50 {p50:8.1f} us   p99 {p99:8.1f} us")
+    service.close()
+
+
+if __name__ == '__main__':
+    main()
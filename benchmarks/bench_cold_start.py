@@ -0,0 +1,84 @@
+"""
+Benchmark: cold start of the server (or dashcam) module.
+
+Each run is a fresh interpreter that imports the module from --tree and
+reports the time and peak RSS when the import returns (the API can serve
+from that point), then waits for every startup stage to settle (ready or
+failed) and reports both again. It also lists which heavy packages the
+import pulled in. To compare before/after, check out an older revision
+(`git worktree add /tmp/before <rev>`) and run once with --tree /tmp/before;
+--python picks an interpreter with a different runtime installed (e.g. full
+TensorFlow).
+
+Usage: python benchmarks/bench_cold_start.py [--module esp32_stream_server] \
+           [--tree .] [--python python3] [--repeat 3]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ('tensorflow', 'tflite_runtime', 'ai_edge_litert', 'mediapipe', 'sklearn')
+
+PROBE = r'''
+import json, os, resource, sys, time
+start = time.perf_counter()
+sys.path.insert(0, os.getcwd())
+module = __import__(sys.argv[1])
+imported = time.perf_counter() - start
+import_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+startup = getattr(module, 'startup', None)
+deadline = time.perf_counter() + float(sys.argv[2])
+while startup is not None and time.perf_counter() < deadline and \
+        any(s['state'] in ('pending', 'loading') for s in startup.snapshot()['stages'].values()):
+    time.sleep(0.005)
+print('@@' + json.dumps({
+    'import_s': imported,
+    'import_rss_mb': import_rss,
+    'settled_s': time.perf_counter() - start,
+    'settled_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+    'stages': startup.snapshot()['stages'] if startup is not None else None,
+    'heavy': [m for m in sys.argv[3].split(',') if m in sys.modules]
+}))
+sys.stdout.flush()
+os._exit(0)
+'''
+
+
+def probe(python, tree, module, timeout):
+    result = subprocess.run([python, '-c', PROBE, module, str(timeout), ','.join(HEAVY_MODULES)],
+                            cwd=tree, capture_output=True, text=True, timeout=timeout + 120)
+    for line in result.stdout.splitlines():
+        if line.startswith('@@'):
+            return json.loads(line[2:])
+    print(result.stdout[-2000:], result.stderr[-2000:])
+    raise RuntimeError(f"probe of {module} in {tree} failed")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--module', default='esp32_stream_server')
+    parser.add_argument('--tree', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    parser.add_argument('--python', default=sys.executable)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=120.0, help='seconds to wait for startup stages')
+    args = parser.parse_args()
+
+    runs = [probe(args.python, args.tree, args.module, args.timeout) for _ in range(args.repeat)]
+    med = {key: statistics.median(run[key] for run in runs)
+           for key in ('import_s', 'import_rss_mb', 'settled_s', 'settled_rss_mb')}
+    print(f"{args.module} in {os.path.abspath(args.tree)} ({args.python}), median of {args.repeat}")
+    print(f"  import returns:   {med['import_s']:6.2f} s   peak RSS {med['import_rss_mb']:6.0f} MB")
+    print(f"  stages settled:   {med['settled_s']:6.2f} s   peak RSS {med['settled_rss_mb']:6.0f} MB")
+    print(f"  heavy imports:    {', '.join(runs[-1]['heavy']) or 'none'}")
+    if runs[-1]['stages'] is not None:
+        for name, stage in runs[-1]['stages'].items():
+            detail = f"  ({stage['error']})" if stage['error'] else ''
+            print(f"    {name:12s} {stage['state']:8s} {stage['ms'] or 0:8.1f} ms{detail}")
+
+
+if __name__ == '__main__':
+    main()
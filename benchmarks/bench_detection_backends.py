@@ -0,0 +1,110 @@
+"""
+Benchmark: multi-camera detection throughput, thread backend vs process backend.
+
+Each simulated camera is a thread that runs detection on frames back to
+back for --duration seconds. 'threads' gives every camera thread its own
+in-process FaceLandmarker + interpreter (best case for the threaded server);
+'processes' sends frames through ProcessDetectionBackend with --processes
+workers. Run it with the server's model files in the working directory.
+
+Usage: python benchmarks/bench_detection_backends.py [--image face.jpg] \
+           [--cameras 4] [--processes 1 2 4] [--duration 10]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+import cv2
+import mediapipe as mp
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from detection_processes import create_interpreter, create_landmarker, default_backend  # noqa: E402
+from inference_service import InferenceService  # noqa: E402
+from landmark_features import compute_features, feature_points  # noqa: E402
+from model_loader import load_scaler  # noqa: E402
+
+
+def load_frame(path):
+    if path:
+        frame = cv2.imread(path)
+        if frame is None:
+            sys.exit(f"cannot read {path}")
+        return frame
+    rng = np.random.default_rng(0)
+    return cv2.GaussianBlur(rng.integers(0, 256, (480, 640, 3), dtype=np.uint8), (15, 15), 0)
+
+
+def run_cameras(cameras, duration, analyze_for_camera):
+    counts = [0] * cameras
+    stop_at = time.perf_counter() + duration
+
+    def camera(i):
+        analyze = analyze_for_camera(i)
+        while time.perf_counter() < stop_at:
+            analyze()
+            counts[i] += 1
+
+    threads = [threading.Thread(target=camera, args=(i,)) for i in range(cameras)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(counts) / duration
+
+
+def thread_backend(args, frame, scaler):
+    def analyze_for_camera(_):
+        landmarker = create_landmarker(args.model)
+        model = InferenceService(lambda: create_interpreter(args.tflite),
+                                 preprocess=scaler.transform if scaler else None, workers=0)
+        h, w = frame.shape[:2]
+
+        def analyze():
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            result = landmarker.detect(mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb))
+            if result.face_landmarks:
+                model.predict_now(compute_features(feature_points(result.face_landmarks[0], w, h)))
+        return analyze
+
+    return run_cameras(args.cameras, args.duration, analyze_for_camera)
+
+
+def process_backend(args, frame, scaler, processes):
+    backend = default_backend(args.model, args.tflite, scaler, processes)
+    backend.start()
+    try:
+        backend.analyze(frame)  # warm-up
+        return run_cameras(args.cameras, args.duration, lambda _: lambda: backend.analyze(frame))
+    finally:
+        backend.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--image', default=None, help='frame to run detection on (a face photo)')
+    parser.add_argument('--model', default='face_landmarker.task')
+    parser.add_argument('--tflite', default='drowsiness_model.tflite')
+    parser.add_argument('--scaler', default='scaler.pkl')
+    parser.add_argument('--cameras', type=int, default=4)
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--duration', type=float, default=10.0)
+    args = parser.parse_args()
+
+    frame = load_frame(args.image)
+    scaler = load_scaler(args.scaler)
+
+    print(f"{args.cameras} cameras, {frame.shape[1]}x{frame.shape[0]}, {os.cpu_count()} CPUs")
+    base = thread_backend(args, frame, scaler)
+    print(f"  threads:      {base:7.1f} frames/s")
+    for processes in args.processes:
+        fps = process_backend(args, frame, scaler, processes)
+        print(f"  processes={processes}: {fps:7.1f} frames/s  ({fps / base:.2f}x threads)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Micro-benchmark: per-frame feature extraction, legacy vs vectorized.
+
+Legacy = per-landmark Python loops + 7 np.linalg.norm calls + scaler.transform
+(the original dashcam.py / esp32_stream_server.py code). Vectorized = one
+gather + one distance computation + AffineScaler.
+
+Usage: python benchmarks/bench_features.py [--frames 5000]
+"""
+
+import argparse
+import os
+import pickle
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from landmark_features import (LEFT_EYE, RIGHT_EYE, MOUTH, AffineScaler,  # noqa: E402
+                               compute_features, feature_points, gather_feature_points)
+
+Landmark = namedtuple('Landmark', 'x y z')
+
+
+def legacy_ear(eye):
+    A = np.linalg.norm(eye[1] - eye[5])
+    B = np.linalg.norm(eye[2] - eye[4])
+    C = np.linalg.norm(eye[0] - eye[3])
+    return (A + B) / (2.0 * C + 1e-6)
+
+
+def legacy_mar(mouth):
+    A = np.linalg.norm(mouth[1] - mouth[7])
+    B = np.linalg.norm(mouth[2] - mouth[6])
+    C = np.linalg.norm(mouth[3] - mouth[5])
+    D = np.linalg.norm(mouth[0] - mouth[4])
+    return (A + B + C) / (3.0 * D + 1e-6)
+
+
+def legacy_features(face_landmarks, w, h, scaler):
+    left_eye = np.array([[face_landmarks[i].x * w, face_landmarks[i].y * h] for i in LEFT_EYE])
+    right_eye = np.array([[face_landmarks[i].x * w, face_landmarks[i].y * h] for i in RIGHT_EYE])
+    mouth = np.array([[face_landmarks[i].x * w, face_landmarks[i].y * h] for i in MOUTH])
+    left_ear = legacy_ear(left_eye)
+    right_ear = legacy_ear(right_eye)
+    avg_ear = (left_ear + right_ear) / 2.0
+    mar = legacy_mar(mouth)
+    features = np.array([[avg_ear, left_ear, right_ear, abs(left_ear - right_ear), mar]], dtype=np.float32)
+    return scaler.transform(features).astype(np.float32)
+
+
+def vectorized_features(face_landmarks, w, h, affine):
+    return affine.transform(compute_features(feature_points(face_landmarks, w, h)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--frames', type=int, default=5000)
+    parser.add_argument('--scaler', default='scaler.pkl')
+    args = parser.parse_args()
+
+    with open(args.scaler, 'rb') as f:
+        scaler = pickle.load(f)
+    affine = AffineScaler.from_sklearn(scaler)
+
+    rng = np.random.default_rng(0)
+    w, h = 640, 480
+    faces = [[Landmark(*p) for p in rng.uniform(0.2, 0.8, (478, 3))] for _ in range(64)]
+
+    # Parity first
+    worst = max(np.abs(legacy_features(f, w, h, scaler) - vectorized_features(f, w, h, affine)).max()
+                for f in faces)
+    print(f"max |legacy - vectorized| over {len(faces)} faces: {worst:.2e}")
+
+    for name, fn, arg in (('legacy', legacy_features, scaler), ('vectorized', vectorized_features, affine)):
+        start = time.perf_counter()
+        for i in range(args.frames):
+            fn(faces[i % len(faces)], w, h, arg)
+        per_frame = (time.perf_counter() - start) / args.frames * 1e6
+        print(f"{name:>10}: {per_frame:8.1f} us/frame")
+
+    # Offline batch: stacked (frames, landmarks, 2) arrays
+    stacked = rng.uniform(0.2, 0.8, (args.frames, 478, 2))
+    start = time.perf_counter()
+    features = affine.transform(compute_features(gather_feature_points(stacked, w, h)))
+    per_frame = (time.perf_counter() - start) / args.frames * 1e6
+    print(f"{'batch':>10}: {per_frame:8.2f} us/frame ({features.shape[0]} frames in one call)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Micro-benchmark: per-frame capture/convert/overlay/encode path, legacy vs preallocated.
+
+Legacy = cv2.flip + cv2.cvtColor returning new arrays, frame.copy() +
+full-frame addWeighted for the metrics panel, imencode().tobytes() and a
+per-subscriber multipart concatenation. Preallocated = frame_buffers helpers
+(dst= buffers, in-place ROI blend, memoryview JPEG framed once).
+
+Reports time per frame and bytes allocated per frame (tracemalloc tracks
+NumPy buffers) for the convert/overlay path and for encode+framing.
+
+Usage: python benchmarks/bench_frame_buffers.py [--frames 300] [--subscribers 3]
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from frame_buffers import (FrameBufferPool, bgr_to_rgb, blend_panel,  # noqa: E402
+                           encode_jpeg, flip_into, mjpeg_part)
+
+RESOLUTIONS = [(480, 640), (720, 1280)]
+
+
+def make_frames(h, w, count=8):
+    rng = np.random.default_rng(0)
+    base = cv2.GaussianBlur(rng.integers(0, 256, (h, w, 3), dtype=np.uint8), (15, 15), 0)
+    return [np.roll(base, i * 7, axis=1) for i in range(count)]
+
+
+def legacy_convert(raw):
+    frame = cv2.flip(raw, 1)
+    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    h = frame.shape[0]
+    panel = frame.copy()
+    cv2.rectangle(panel, (10, h - 120), (300, h - 10), (0, 0, 0), -1)
+    cv2.addWeighted(panel, 0.7, frame, 0.3, 0, frame)
+    return frame, rgb
+
+
+def make_pooled_convert():
+    pool = FrameBufferPool()
+    buffers = {'frame': None}
+
+    def convert(raw):
+        frame = buffers['frame'] = flip_into(raw, buffers['frame'])
+        h = frame.shape[0]
+        with pool.borrow(frame.shape) as rgb:
+            bgr_to_rgb(frame, rgb)
+        blend_panel(frame, (10, h - 120), (300, h - 10))
+        return frame, rgb
+    return convert
+
+
+def legacy_encode(frame, subscribers):
+    ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+    data = buffer.tobytes()
+    return [b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + data + b'\r\n'
+            for _ in range(subscribers)]
+
+
+def pooled_encode(frame, subscribers):
+    part = mjpeg_part(encode_jpeg(frame, 85))
+    return [part for _ in range(subscribers)]
+
+
+def measure(fn, frames, n):
+    """Return (us per frame, bytes allocated per frame)"""
+    for raw in frames:
+        fn(raw)  # warm-up: let buffers reach steady state
+
+    start = time.perf_counter()
+    for i in range(n):
+        fn(frames[i % len(frames)])
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    total = 0
+    for i in range(min(n, 50)):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        fn(frames[i % len(frames)])
+        total += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return elapsed / n * 1e6, total / min(n, 50)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--subscribers', type=int, default=3)
+    args = parser.parse_args()
+
+    # Parity: the in-place ROI blend must match copy + full-frame blend
+    raw = make_frames(480, 640, 1)[0]
+    legacy_frame, legacy_rgb = legacy_convert(raw)
+    pooled_frame, _ = make_pooled_convert()(raw)
+    diff = int(np.abs(legacy_frame.astype(np.int16) - pooled_frame).max())
+    print(f"parity: max pixel diff {diff}")
+
+    for h, w in RESOLUTIONS:
+        frames = make_frames(h, w)
+        print(f"\n{w}x{h}")
+        rows = [
+            ('convert+overlay legacy', legacy_convert),
+            ('convert+overlay pooled', make_pooled_convert()),
+            ('encode+frame    legacy', lambda f: legacy_encode(f, args.subscribers)),
+            ('encode+frame    pooled', lambda f: pooled_encode(f, args.subscribers)),
+        ]
+        for label, fn in rows:
+            us, allocated = measure(fn, frames, args.frames)
+            print(f"  {label}: {us:8.1f} us/frame  {allocated / 1024:8.1f} KiB allocated/frame")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""
+Benchmark: motion-gated detection vs detecting every frame, on recorded clips.
+
+Every frame of each clip is run through an IMAGE-mode FaceLandmarker (the
+ungated baseline). The clip is then replayed through a MotionGate: frames
+it passes reuse that frame's baseline landmarks, frames it skips reuse the
+last passed frame's, exactly as the server would. Reports detection calls
+saved, gate cost against landmark cost, how many eye closures (EAR below
+the blink threshold) the gated run still sees, and the delay of each
+EAR / YAWN / BLINK alert onset relative to the baseline.
+
+Classifier-driven alerts (DROWSY / CRITICAL) are left out: they follow the
+same per-frame features, so the feature-alert delays bound theirs.
+
+Usage: python benchmarks/bench_motion_gate.py clip1.mp4 [clip2.avi ...] \
+           [--model face_landmarker.task] [--max-frames 0] \
+           [--threshold 2.5] [--roi-threshold 4.0] [--max-skips 2]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import mediapipe as mp
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from batch_analyze import BLINK_EAR, alert_changes, classify_alerts  # noqa: E402
+from landmark_features import compute_features, feature_points, split_regions  # noqa: E402
+from motion_gate import MotionGate  # noqa: E402
+from mediapipe.tasks import python  # noqa: E402
+from mediapipe.tasks.python import vision  # noqa: E402
+
+MATCH_WINDOW_S = 1.0  # a gated alert onset later than this counts as missed
+
+
+def image_landmarker(model_path):
+    return vision.FaceLandmarker.create_from_options(vision.FaceLandmarkerOptions(
+        base_options=python.BaseOptions(model_asset_path=model_path),
+        running_mode=vision.RunningMode.IMAGE,
+        num_faces=1,
+        min_face_detection_confidence=0.5,
+        min_face_presence_confidence=0.5,
+        min_tracking_confidence=0.5
+    ))
+
+
+def run_clip(path, model_path, max_frames, gate):
+    """Baseline and gated per-frame (face, ear, mar) plus timings, or None"""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        print(f"✗ Cannot open {path}")
+        return None
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+
+    base = {'face': [], 'ear': [], 'mar': []}
+    gated = {'face': [], 'ear': [], 'mar': []}
+    detect_ms, gate_ms = [], []
+    last = (False, np.nan, np.nan, None)
+    frame = rgb = None
+    try:
+        with image_landmarker(model_path) as landmarker:
+            index = 0
+            while not max_frames or index < max_frames:
+                ok, frame = cap.read(frame)
+                if not ok:
+                    break
+                h, w = frame.shape[:2]
+                rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb)
+                mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb)
+
+                start = time.perf_counter()
+                result = landmarker.detect(mp_image)
+                detect_ms.append((time.perf_counter() - start) * 1000.0)
+                if result.face_landmarks:
+                    points = feature_points(result.face_landmarks[0], w, h)
+                    features = compute_features(points)
+                    current = (True, features[0], features[4], split_regions(points))
+                else:
+                    current = (False, np.nan, np.nan, None)
+                for key, value in zip(('face', 'ear', 'mar'), current):
+                    base[key].append(value)
+
+                start = time.perf_counter()
+                detect = gate.check(frame)
+                gate_ms.append((time.perf_counter() - start) * 1000.0)
+                if detect:
+                    last = current
+                    gate.observe({'landmarks': current[3]} if current[0] else None)
+                for key, value in zip(('face', 'ear', 'mar'), last):
+                    gated[key].append(value)
+                index += 1
+    finally:
+        cap.release()
+
+    time_s = np.arange(len(detect_ms)) / fps
+    return time_s, as_arrays(base), as_arrays(gated), np.array(detect_ms), np.array(gate_ms)
+
+
+def as_arrays(run):
+    return {key: np.array(values, dtype=bool if key == 'face' else np.float64) for key, values in run.items()}
+
+
+def alert_onsets(time_s, run):
+    """(frame index, alert code) where a feature alert starts"""
+    alerts, _, _, _ = classify_alerts(time_s, run['face'], run['ear'], run['mar'], np.zeros(len(time_s)))
+    changes, _, carried = alert_changes(alerts, run['face'])
+    return [(i, carried[i]) for i in changes if carried[i]], carried
+
+
+def closure_episodes(run):
+    """(start, end) frame ranges where EAR is below the blink threshold"""
+    closed = run['face'] & (np.nan_to_num(run['ear'], nan=1.0) < BLINK_EAR)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], closed.astype(np.int8), [0]))))
+    return list(zip(edges[::2], edges[1::2]))
+
+
+def compare(time_s, base, gated):
+    """Alert onset delays (s), missed onsets, and eye closures the gated run saw"""
+    onsets, _ = alert_onsets(time_s, base)
+    _, gated_alerts = alert_onsets(time_s, gated)
+    delays, missed = [], 0
+    for i, code in onsets:
+        later = np.flatnonzero(gated_alerts[i:] == code)
+        if len(later) and time_s[i + later[0]] - time_s[i] <= MATCH_WINDOW_S:
+            delays.append(time_s[i + later[0]] - time_s[i])
+        else:
+            missed += 1
+
+    episodes = closure_episodes(base)
+    gated_closed = gated['face'] & (np.nan_to_num(gated['ear'], nan=1.0) < BLINK_EAR)
+    # A closure still counts as seen if the gated run catches it one frame late
+    seen = sum(bool(gated_closed[a:b + 1].any()) for a, b in episodes)
+    return np.array(delays), len(onsets), missed, len(episodes), seen
+
+
+def report(name, time_s, base, gated, detect_ms, gate_ms, detections):
+    frames = len(time_s)
+    print(f"{name}: {frames} frames")
+    if not frames:
+        return
+    saved = frames - detections
+    p95 = np.percentile(gate_ms, 95)
+    net = (saved * detect_ms.mean() - gate_ms.sum()) / frames
+    print(f"  detections {detections}/{frames}, saved {saved} ({saved / frames * 100:.1f}%)")
+    print(f"  landmarks mean {detect_ms.mean():.2f} ms, gate mean {gate_ms.mean():.3f} ms (p95 {p95:.3f}), "
+          f"net saving {net:.2f} ms/frame")
+
+    delays, onsets, missed, episodes, seen = compare(time_s, base, gated)
+    print(f"  eye closures seen: {seen}/{episodes}")
+    if onsets:
+        line = f"  EAR/YAWN/BLINK alert onsets: {onsets}, missed {missed}"
+        if len(delays):
+            line += (f", delay mean {delays.mean() * 1000:.0f} ms  p95 {np.percentile(delays, 95) * 1000:.0f} ms  "
+                     f"max {delays.max() * 1000:.0f} ms")
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('clips', nargs='+', help='recorded video files')
+    parser.add_argument('--model', default='face_landmarker.task')
+    parser.add_argument('--max-frames', type=int, default=0, help='frames per clip (0 = all)')
+    parser.add_argument('--threshold', type=float, default=2.5, help='whole-frame mean change to detect')
+    parser.add_argument('--roi-threshold', type=float, default=4.0, help='eye/mouth region mean change to detect')
+    parser.add_argument('--max-skips', type=int, default=2, help='consecutive reused frames before forcing detection')
+    args = parser.parse_args()
+
+    for path in args.clips:
+        gate = MotionGate(threshold=args.threshold, roi_threshold=args.roi_threshold, max_skips=args.max_skips)
+        result = run_clip(path, args.model, args.max_frames, gate)
+        if result is None:
+            continue
+        report(os.path.basename(path), *result, gate.detected)
+        print(f"  forced by skip cap: {gate.forced}")
+
+
+if __name__ == '__main__':
+    main()
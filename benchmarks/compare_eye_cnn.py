@@ -0,0 +1,187 @@
+"""
+Comparison: EAR-only eye state vs the eye-crop CNN stage on recorded clips.
+
+Every frame of each clip goes through an IMAGE-mode FaceLandmarker; for
+each face the EAR features are computed (the feature-only path) and both
+eye crops run through EyeCropClassifier (one batched invoke), also timed
+against two single-crop invokes. Reports per-frame latency of each part,
+the share of frames the 'ambiguous' EyeCheckSchedule would send to the CNN
+and what that adds per frame, and how the eyes-closed decisions of the
+EAR threshold, the CNN and the server's fused rule (CNN decides inside the
+EAR band) compare. With --labels (CSV rows: clip,frame,eyes with eyes one
+of closed/droopy/open) it also reports accuracy against those labels.
+
+Usage: python benchmarks/compare_eye_cnn.py clip1.mp4 [clip2.avi ...] \
+           [--model face_landmarker.task] [--eye-model hardware/drowsiness_model.h] \
+           [--labels labels.csv] [--max-frames 0]
+"""
+
+import argparse
+import csv
+import os
+import sys
+import time
+
+import cv2
+import mediapipe as mp
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from eye_crop_classifier import EyeCheckSchedule, EyeCropClassifier, eye_summary, load_header_model  # noqa: E402
+from landmark_features import compute_features, feature_points, split_regions  # noqa: E402
+from model_loader import interpreter_runtime  # noqa: E402
+from mediapipe.tasks import python  # noqa: E402
+from mediapipe.tasks.python import vision  # noqa: E402
+
+EYES_CLOSED_EAR = 0.25  # EAR alert threshold used by apply_detection
+
+
+def image_landmarker(model_path):
+    return vision.FaceLandmarker.create_from_options(vision.FaceLandmarkerOptions(
+        base_options=python.BaseOptions(model_asset_path=model_path),
+        running_mode=vision.RunningMode.IMAGE,
+        num_faces=1,
+        min_face_detection_confidence=0.5,
+        min_face_presence_confidence=0.5,
+        min_tracking_confidence=0.5
+    ))
+
+
+def single_interpreter(model_content):
+    _, interpreter_class = interpreter_runtime()
+    interpreter = interpreter_class(model_content=model_content)
+    interpreter.allocate_tensors()
+    return interpreter
+
+
+def load_labels(path):
+    """{(clip basename, frame index): eyes closed?}"""
+    labels = {}
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            labels[(os.path.basename(row['clip']), int(row['frame']))] = row['eyes'].strip() != 'open'
+    return labels
+
+
+def run_clip(path, args, eye_classifier, single):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        print(f"✗ Cannot open {path}")
+        return None
+
+    input_index = single.get_input_details()[0]['index']
+    frame = rgb = None
+    rows = []  # (frame index, avg EAR, CNN closed prob, CNN label)
+    ms = {'landmarks': [], 'features': [], 'eye_crop': [], 'eye_cnn': [], 'eye_cnn_single': []}
+    try:
+        with image_landmarker(args.model) as landmarker:
+            index = 0
+            while not args.max_frames or index < args.max_frames:
+                ok, frame = cap.read(frame)
+                if not ok:
+                    break
+                h, w = frame.shape[:2]
+                rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb)
+
+                start = time.perf_counter()
+                result = landmarker.detect(mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb))
+                ms['landmarks'].append((time.perf_counter() - start) * 1000.0)
+                if result.face_landmarks:
+                    start = time.perf_counter()
+                    points = feature_points(result.face_landmarks[0], w, h)
+                    avg_ear = compute_features(points)[0]
+                    ms['features'].append((time.perf_counter() - start) * 1000.0)
+
+                    left_eye, right_eye, _ = split_regions(points)
+                    start = time.perf_counter()
+                    crops = eye_classifier.crop(frame, left_eye, right_eye)
+                    cropped = time.perf_counter()
+                    probs = eye_classifier.invoke(crops)
+                    ms['eye_crop'].append((cropped - start) * 1000.0)
+                    ms['eye_cnn'].append((time.perf_counter() - cropped) * 1000.0)
+
+                    start = time.perf_counter()
+                    for i in range(2):
+                        single.set_tensor(input_index, crops[i:i + 1])
+                        single.invoke()
+                    ms['eye_cnn_single'].append((time.perf_counter() - start) * 1000.0)
+
+                    label, closed_prob = eye_summary(probs)
+                    rows.append((index, avg_ear, closed_prob, label))
+                index += 1
+    finally:
+        cap.release()
+    return {k: np.array(v) for k, v in ms.items()}, rows
+
+
+def latency_line(label, ms):
+    if not len(ms):
+        return f"  {label:<16} -"
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return f"  {label:<16} mean {ms.mean():6.2f} ms  p50 {p50:6.2f}  p95 {p95:6.2f}  p99 {p99:6.2f}"
+
+
+def report(name, ms, rows, args, labels):
+    print(f"{name}: {len(ms['landmarks'])} frames, {len(rows)} with a face")
+    for stage in ('landmarks', 'features', 'eye_crop', 'eye_cnn', 'eye_cnn_single'):
+        print(latency_line(stage, ms[stage]))
+    if not rows:
+        return
+
+    # Which frames the server's 'ambiguous' schedule would have checked
+    schedule = EyeCheckSchedule('ambiguous', ear_band=args.ear_band, interval=args.interval)
+    checked = np.array([schedule.due(ear) for _, ear, _, _ in rows])
+    cnn_ms = ms['eye_crop'].mean() + ms['eye_cnn'].mean()
+    print(f"  batched invoke vs 2 single: {ms['eye_cnn'].mean():.2f} vs {ms['eye_cnn_single'].mean():.2f} ms")
+    print(f"  'ambiguous' schedule checks {checked.mean() * 100:.1f}% of face frames: "
+          f"+{checked.mean() * cnn_ms:.3f} ms/frame (always: +{cnn_ms:.3f}, "
+          f"features alone: {ms['features'].mean():.3f})")
+
+    ears = np.array([ear for _, ear, _, _ in rows])
+    cnn_closed = np.array([label != 'open' for _, _, _, label in rows])
+    ear_closed = ears <= EYES_CLOSED_EAR
+    band = (ears >= args.ear_band[0]) & (ears <= args.ear_band[1])
+    fused = np.where(band & checked, cnn_closed, ear_closed)
+    classes = {c: np.mean([label == c for _, _, _, label in rows]) * 100 for c in ('closed', 'droopy', 'open')}
+    print("  CNN classes: " + ', '.join(f"{c} {p:.1f}%" for c, p in classes.items()))
+    print(f"  CNN vs EAR eyes-closed agreement: {np.mean(cnn_closed == ear_closed) * 100:.1f}% overall, "
+          f"{np.mean(cnn_closed[band] == ear_closed[band]) * 100 if band.any() else 0.0:.1f}% "
+          f"in the EAR band ({band.mean() * 100:.1f}% of frames)")
+
+    if labels:
+        truth = [labels.get((name, index)) for index, _, _, _ in rows]
+        known = np.array([t is not None for t in truth])
+        if not known.any():
+            print("  no labeled frames")
+            return
+        truth = np.array([bool(t) for t in truth])
+        for label, decided in (('EAR only', ear_closed), ('CNN only', cnn_closed), ('fused', fused)):
+            accuracy = np.mean(decided[known] == truth[known]) * 100
+            print(f"  accuracy {label:<9} {accuracy:5.1f}% ({known.sum()} labeled frames)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('clips', nargs='+', help='recorded video files')
+    parser.add_argument('--model', default='face_landmarker.task')
+    parser.add_argument('--eye-model', default='hardware/drowsiness_model.h')
+    parser.add_argument('--labels', help='CSV with clip,frame,eyes columns')
+    parser.add_argument('--ear-band', type=float, nargs=2, default=(0.20, 0.30))
+    parser.add_argument('--interval', type=int, default=15)
+    parser.add_argument('--max-frames', type=int, default=0, help='frames per clip (0 = all)')
+    args = parser.parse_args()
+
+    model_content = load_header_model(args.eye_model)
+    eye_classifier = EyeCropClassifier(model_content)
+    single = single_interpreter(model_content)
+    labels = load_labels(args.labels) if args.labels else {}
+
+    for path in args.clips:
+        result = run_clip(path, args, eye_classifier, single)
+        if result is not None:
+            report(os.path.basename(path), result[0], result[1], args, labels)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+Comparison: IMAGE-mode detection vs VIDEO-mode tracking on recorded clips.
+
+Every frame of each clip is run through an IMAGE-mode FaceLandmarker (full
+detection per frame, the server default) and a FaceTracker (VIDEO mode,
+timestamps taken from the clip). Reports per-frame landmark latency for
+both modes, and how closely tracking agrees with IMAGE mode on face
+presence, EAR, MAR and the eyes-closed / yawn decisions the detector uses.
+
+Usage: python benchmarks/compare_tracking_modes.py clip1.mp4 [clip2.avi ...] \
+           [--model face_landmarker.task] [--max-frames 0]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import mediapipe as mp
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from face_tracker import create_tracker  # noqa: E402
+from landmark_features import compute_features, feature_points  # noqa: E402
+from mediapipe.tasks import python  # noqa: E402
+from mediapipe.tasks.python import vision  # noqa: E402
+
+EYES_CLOSED_EAR = 0.22  # blink threshold used by apply_detection
+YAWN_MAR = 0.6
+
+
+def image_landmarker(model_path):
+    return vision.FaceLandmarker.create_from_options(vision.FaceLandmarkerOptions(
+        base_options=python.BaseOptions(model_asset_path=model_path),
+        running_mode=vision.RunningMode.IMAGE,
+        num_faces=1,
+        min_face_detection_confidence=0.5,
+        min_face_presence_confidence=0.5,
+        min_tracking_confidence=0.5
+    ))
+
+
+def ear_mar(result, w, h):
+    """(avg EAR, MAR) of the first face, or None"""
+    if not result.face_landmarks:
+        return None
+    features = compute_features(feature_points(result.face_landmarks[0], w, h))
+    return features[0], features[4]
+
+
+def run_clip(path, model_path, max_frames):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        print(f"✗ Cannot open {path}")
+        return None
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+
+    tracker = create_tracker(model_path)
+    frame = rgb = None
+    image_ms, video_ms, rows = [], [], []
+    try:
+        with image_landmarker(model_path) as landmarker:
+            index = 0
+            while not max_frames or index < max_frames:
+                ok, frame = cap.read(frame)
+                if not ok:
+                    break
+                h, w = frame.shape[:2]
+                rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb)
+                mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb)
+
+                start = time.perf_counter()
+                image_result = landmarker.detect(mp_image)
+                image_ms.append((time.perf_counter() - start) * 1000.0)
+
+                start = time.perf_counter()
+                video_result = tracker.detect(mp_image, timestamp_ms=index * 1000.0 / fps)
+                video_ms.append((time.perf_counter() - start) * 1000.0)
+                if video_result is None:
+                    print(f"✗ Tracking failed on {path} frame {index}")
+                    break
+
+                rows.append((ear_mar(image_result, w, h), ear_mar(video_result, w, h)))
+                index += 1
+    finally:
+        cap.release()
+        tracker.close()
+    return np.array(image_ms), np.array(video_ms), rows, tracker.stats()
+
+
+def latency_line(label, ms):
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return f"  {label:<6} mean {ms.mean():6.2f} ms  p50 {p50:6.2f}  p95 {p95:6.2f}  p99 {p99:6.2f}"
+
+
+def report(name, image_ms, video_ms, rows, tracker_stats):
+    print(f"{name}: {len(rows)} frames")
+    if not rows:
+        return
+    print(latency_line('image', image_ms))
+    print(latency_line('video', video_ms))
+    print(f"  speedup {image_ms.mean() / max(video_ms.mean(), 1e-9):.2f}x, "
+          f"tracking lost {tracker_stats['lost_frames']}x")
+
+    presence = np.mean([(a is None) == (b is None) for a, b in rows])
+    both = np.array([(a[0], a[1], b[0], b[1]) for a, b in rows if a is not None and b is not None])
+    print(f"  face presence agreement: {presence * 100:.1f}%")
+    if not len(both):
+        return
+    ear_diff = np.abs(both[:, 0] - both[:, 2])
+    mar_diff = np.abs(both[:, 1] - both[:, 3])
+    closed = np.mean((both[:, 0] < EYES_CLOSED_EAR) == (both[:, 2] < EYES_CLOSED_EAR))
+    yawn = np.mean((both[:, 1] > YAWN_MAR) == (both[:, 3] > YAWN_MAR))
+    print(f"  EAR |diff|: mean {ear_diff.mean():.4f}  p95 {np.percentile(ear_diff, 95):.4f}  "
+          f"max {ear_diff.max():.4f}")
+    print(f"  MAR |diff|: mean {mar_diff.mean():.4f}  p95 {np.percentile(mar_diff, 95):.4f}  "
+          f"max {mar_diff.max():.4f}")
+    print(f"  eyes-closed agreement {closed * 100:.1f}%, yawn agreement {yawn * 100:.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('clips', nargs='+', help='recorded video files')
+    parser.add_argument('--model', default='face_landmarker.task')
+    parser.add_argument('--max-frames', type=int, default=0, help='frames per clip (0 = all)')
+    args = parser.parse_args()
+
+    totals = [[], [], [], None]
+    for path in args.clips:
+        result = run_clip(path, args.model, args.max_frames)
+        if result is None:
+            continue
+        image_ms, video_ms, rows, tracker_stats = result
+        report(os.path.basename(path), image_ms, video_ms, rows, tracker_stats)
+        totals[0].append(image_ms)
+        totals[1].append(video_ms)
+        totals[2].extend(rows)
+        lost = tracker_stats['lost_frames'] + (totals[3]['lost_frames'] if totals[3] else 0)
+        totals[3] = dict(tracker_stats, lost_frames=lost)
+
+    if len(totals[0]) > 1:
+        report('all clips', np.concatenate(totals[0]), np.concatenate(totals[1]), totals[2], totals[3])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+Load test: many concurrent MJPEG viewers and status subscribers.
+
+Opens --feeds connections to /api/feed and --events connections to
+/api/events against a running server (threaded esp32_stream_server.py or
+asyncio esp32_async_server.py), holds them for --duration seconds, and
+reports how many stayed connected, delivered frame/event rates, and, with
+--pid, the server's thread count and resident memory while loaded.
+
+Uses raw asyncio sockets so the client side itself stays cheap.
+
+Usage: python benchmarks/load_test_server.py --url http://localhost:5001 \
+           [--feeds 200] [--events 200] [--duration 20] [--pid <server pid>]
+"""
+
+import argparse
+import asyncio
+import time
+from urllib.parse import urlparse
+
+FRAME_MARKER = b'--frame'
+EVENT_MARKER = b'\nevent: '
+
+
+def proc_status(pid):
+    """(threads, rss_kib) of a local process, from /proc"""
+    threads = rss = None
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('Threads:'):
+                    threads = int(line.split()[1])
+                elif line.startswith('VmRSS:'):
+                    rss = int(line.split()[1])
+    except OSError:
+        pass
+    return threads, rss
+
+
+class Client:
+    def __init__(self, kind):
+        self.kind = kind
+        self.connected = False
+        self.failed = None
+        self.items = 0
+        self.bytes = 0
+
+
+async def run_client(client, host, port, path, stop_at, marker):
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), 10)
+    except Exception as e:
+        client.failed = f"connect: {e!r}"
+        return
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: */*\r\n\r\n".encode())
+    try:
+        await writer.drain()
+        status = await asyncio.wait_for(reader.readline(), 10)
+        if b' 200 ' not in status:
+            client.failed = status.decode(errors='replace').strip()
+            return
+        client.connected = True
+        tail = b''
+        while True:
+            remaining = stop_at - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                chunk = await asyncio.wait_for(reader.read(65536), remaining)
+            except asyncio.TimeoutError:
+                break
+            if not chunk:
+                client.failed = 'closed by server'
+                break
+            client.bytes += len(chunk)
+            data = tail + chunk
+            client.items += data.count(marker)
+            tail = data[-len(marker):]
+    except Exception as e:
+        client.failed = repr(e)
+    finally:
+        client.connected = client.connected and client.failed is None
+        writer.close()
+
+
+def summarize(label, clients, duration):
+    if not clients:
+        return
+    ok = [c for c in clients if c.connected]
+    rates = sorted(c.items / duration for c in ok)
+    failures = {}
+    for c in clients:
+        if c.failed:
+            failures[c.failed] = failures.get(c.failed, 0) + 1
+    print(f"{label}: {len(ok)}/{len(clients)} held for the whole run")
+    if rates:
+        print(f"  per-client rate: min {rates[0]:.1f}/s  median {rates[len(rates) // 2]:.1f}/s  "
+              f"max {rates[-1]:.1f}/s  ({sum(c.bytes for c in ok) / duration / 1e6:.1f} MB/s total)")
+    for reason, count in sorted(failures.items(), key=lambda kv: -kv[1])[:3]:
+        print(f"  {count} x {reason}")
+
+
+async def main(args):
+    url = urlparse(args.url)
+    host, port = url.hostname, url.port or 80
+    base = url.path.rstrip('/') + '/api'
+    device = f'/{args.device}' if args.device else ''
+
+    stop_at = time.monotonic() + args.duration
+    feeds = [Client('feed') for _ in range(args.feeds)]
+    subs = [Client('events') for _ in range(args.events)]
+    tasks = [run_client(c, host, port, f'{base}{device}/feed', stop_at, FRAME_MARKER) for c in feeds]
+    tasks += [run_client(c, host, port, f'{base}{device}/events', stop_at, EVENT_MARKER) for c in subs]
+
+    samples = []
+
+    async def sample_server():
+        while time.monotonic() < stop_at:
+            await asyncio.sleep(1.0)
+            samples.append(proc_status(args.pid))
+
+    if args.pid:
+        tasks.append(sample_server())
+    await asyncio.gather(*tasks)
+
+    print(f"{args.feeds} feed + {args.events} event clients for {args.duration:.0f}s against {args.url}")
+    summarize('feeds', feeds, args.duration)
+    summarize('events', subs, args.duration)
+    if samples:
+        threads = [t for t, _ in samples if t is not None]
+        rss = [r for _, r in samples if r is not None]
+        if threads:
+            print(f"server threads: max {max(threads)}")
+        if rss:
+            print(f"server RSS: max {max(rss) / 1024:.0f} MiB")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://localhost:5001')
+    parser.add_argument('--device', default=None, help='device id (default camera if omitted)')
+    parser.add_argument('--feeds', type=int, default=200)
+    parser.add_argument('--events', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--pid', type=int, default=None, help='server pid, for thread/RSS sampling')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,248 @@
+"""
+Alert Clip Recorder
+Keeps the last few seconds of a camera's already-encoded JPEG frames in a
+bounded in-memory ring. When an alert fires, the ring is snapshotted as the
+lead-up, frames keep being collected for the post-event window, and the
+finished clip is written to disk by a background thread as a .mjpeg file
+(concatenated JPEGs, playable with `ffplay -f mjpeg`) plus a JSON sidecar.
+"""
+
+import json
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+
+from perf_stats import LatencyCounter
+
+
+class JpegRing:
+    """Recent (timestamp, jpeg) frames bounded by both age and total bytes"""
+
+    def __init__(self, max_seconds=10.0, max_bytes=32 * 1024 * 1024):
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+        self._frames = deque()
+        self.bytes = 0
+        self.evicted = 0
+
+    def append(self, ts, jpeg):
+        self._frames.append((ts, jpeg))
+        self.bytes += len(jpeg)
+        frames = self._frames
+        while frames and (self.bytes > self.max_bytes or ts - frames[0][0] > self.max_seconds):
+            _, old = frames.popleft()
+            self.bytes -= len(old)
+            self.evicted += 1
+
+    def snapshot(self):
+        return list(self._frames)
+
+    def __len__(self):
+        return len(self._frames)
+
+    def span(self):
+        return self._frames[-1][0] - self._frames[0][0] if len(self._frames) > 1 else 0.0
+
+
+class _Clip:
+    __slots__ = ('reasons', 'alerts', 'alert_time', 'end_time', 'frames', 'bytes', 'part', 'meta')
+
+    def __init__(self, reasons, alert_time, end_time, frames, meta, part=0, alerts=1):
+        self.reasons = reasons  # distinct alert types, in order of first trigger
+        self.alerts = alerts  # triggers during this part
+        self.alert_time = alert_time
+        self.end_time = end_time
+        self.frames = frames
+        self.bytes = sum(len(jpeg) for _, jpeg in frames)
+        self.part = part
+        self.meta = meta
+
+    def add_reason(self, reason):
+        self.alerts += 1
+        if reason not in self.reasons:
+            self.reasons.append(reason)
+
+    def full(self, ts, nbytes, max_seconds, max_bytes):
+        """True if a frame at ts would take the clip past either limit"""
+        return bool(self.frames) and (ts - self.frames[0][0] > max_seconds or self.bytes + nbytes > max_bytes)
+
+
+class ClipRecorder:
+    """
+    Pre/post-alert clip capture for one camera.
+
+    add() is called for every encoded frame and only appends a reference to
+    the ring (the JPEG bytes are shared with the feed, not copied).
+    trigger() starts a clip, or extends the one still collecting its
+    post-event frames. A clip kept open by a sustained alert is finished
+    once it spans max_clip_seconds or holds max_clip_bytes, and recording
+    continues in a new part. Completed clips are handed to a writer
+    thread; if it falls more than max_pending clips behind, new clips are
+    dropped rather than growing memory.
+    """
+
+    def __init__(self, name, directory, pre_seconds=10.0, post_seconds=5.0,
+                 max_bytes=32 * 1024 * 1024, max_pending=4, max_clip_seconds=60.0,
+                 max_clip_bytes=64 * 1024 * 1024):
+        self.name = name
+        self.directory = directory
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.max_clip_seconds = max_clip_seconds
+        self.max_clip_bytes = max_clip_bytes
+        self.ring = JpegRing(pre_seconds, max_bytes)
+        self._lock = threading.Lock()
+        self._active = None
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._thread = None
+
+        self.triggers = 0
+        self.clips_split = 0
+        self.clips_written = 0
+        self.clips_dropped = 0
+        self.frames_written = 0
+        self.bytes_written = 0
+        self.write_errors = 0
+        self.write_seconds = 0.0
+        self.write_latency = LatencyCounter()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"clip-writer-{self.name}", daemon=True)
+            self._thread.start()
+
+    def add(self, jpeg, ts=None):
+        """Record one encoded frame (bytes or memoryview)"""
+        ts = time.time() if ts is None else ts
+        finished = None
+        with self._lock:
+            self.ring.append(ts, jpeg)
+            clip = self._active
+            if clip is not None:
+                if ts > clip.end_time:
+                    finished, self._active = clip, None
+                else:
+                    if clip.full(ts, len(jpeg), self.max_clip_seconds, self.max_clip_bytes):
+                        # Sustained alert: finish this part, keep recording in the next
+                        finished = clip
+                        clip = self._active = _Clip(clip.reasons[:], ts, clip.end_time, [], clip.meta,
+                                                    part=clip.part + 1, alerts=0)
+                        self.clips_split += 1
+                    clip.frames.append((ts, jpeg))
+                    clip.bytes += len(jpeg)
+        if finished is not None:
+            self._enqueue(finished)
+
+    def trigger(self, reason, ts=None, **meta):
+        """Capture the lead-up to an alert and the next post_seconds of frames"""
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            self.triggers += 1
+            clip = self._active
+            if clip is not None:
+                # Overlapping alerts share one clip (split into parts by add() if it runs long)
+                clip.end_time = max(clip.end_time, ts + self.post_seconds)
+                clip.add_reason(reason)
+                return
+            self._active = _Clip([reason], ts, ts + self.post_seconds, self.ring.snapshot(), meta)
+
+    def flush(self):
+        """Hand over a clip still collecting post-event frames (e.g. on shutdown)"""
+        with self._lock:
+            clip, self._active = self._active, None
+        if clip is not None:
+            self._enqueue(clip)
+
+    def _enqueue(self, clip):
+        try:
+            self._pending.put_nowait(clip)
+        except queue.Full:
+            self.clips_dropped += 1
+            print(f"✗ Clip writer for '{self.name}' is behind; dropped a {clip.reasons[0]} clip")
+
+    def _run(self):
+        while True:
+            clip = self._pending.get()
+            if clip is None:
+                break
+            start = time.perf_counter()
+            try:
+                self._write(clip)
+            except OSError as e:
+                self.write_errors += 1
+                print(f"✗ Failed to write clip for '{self.name}': {e}")
+            elapsed = time.perf_counter() - start
+            self.write_seconds += elapsed
+            self.write_latency.record(elapsed)
+
+    def _write(self, clip):
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(clip.alert_time))
+        device = re.sub(r'[^A-Za-z0-9_.-]', '_', self.name)
+        part = f"-part{clip.part + 1}" if clip.part else ''
+        base = os.path.join(self.directory, f"{device}-{stamp}-{clip.reasons[0].lower()}{part}")
+
+        size = 0
+        with open(base + '.mjpeg', 'wb') as f:
+            for _, jpeg in clip.frames:
+                f.write(jpeg)
+                size += len(jpeg)
+
+        times = [round(ts - clip.alert_time, 3) for ts, _ in clip.frames]
+        span = times[-1] - times[0] if len(times) > 1 else 0.0
+        sidecar = {
+            'device': self.name,
+            'reasons': clip.reasons,
+            'alerts': clip.alerts,
+            'part': clip.part + 1,
+            'alert_time': clip.alert_time,
+            'frames': len(clip.frames),
+            'bytes': size,
+            'pre_seconds': -times[0] if times else 0.0,
+            'post_seconds': times[-1] if times else 0.0,
+            'fps': round((len(times) - 1) / span, 2) if span else None,
+            'frame_times': times,
+            'meta': clip.meta
+        }
+        with open(base + '.json', 'w') as f:
+            json.dump(sidecar, f, indent=2, default=str)
+
+        self.clips_written += 1
+        self.frames_written += len(clip.frames)
+        self.bytes_written += size
+
+    def close(self, timeout=5):
+        """Write any collecting clip, then stop the writer once its queue drains"""
+        self.flush()
+        if self._thread is not None:
+            self._pending.put(None)
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def stats(self):
+        with self._lock:
+            ring = {
+                'frames': len(self.ring),
+                'bytes': self.ring.bytes,
+                'seconds': round(self.ring.span(), 3),
+                'max_bytes': self.ring.max_bytes,
+                'evicted': self.ring.evicted
+            }
+            recording = self._active is not None
+        return {
+            'ring': ring,
+            'recording': recording,
+            'triggers': self.triggers,
+            'clips_split': self.clips_split,
+            'pending': self._pending.qsize(),
+            'clips_written': self.clips_written,
+            'clips_dropped': self.clips_dropped,
+            'frames_written': self.frames_written,
+            'bytes_written': self.bytes_written,
+            'write_errors': self.write_errors,
+            'write': self.write_latency.snapshot(),
+            'write_mb_per_s': round(self.bytes_written / self.write_seconds / 1e6, 1) if self.write_seconds else 0.0
+        }
@@ -1,57 +1,92 @@
 """
 Real-time Drowsiness Detection using MediaPipe v0.10.32+ (NEW API)
-Requirements: opencv-python, tensorflow, mediapipe, numpy, scikit-learn
+Requirements: opencv-python, mediapipe, numpy, and a TFLite runtime
+(tflite-runtime, ai-edge-litert or tensorflow); scikit-learn only to read
+scaler.pkl the first time. Run: python dashcam.py
 """
 
+import os
+import sys
+import time
+import urllib.request
+
 import cv2
 import numpy as np
-import tensorflow as tf
-import pickle
-import time
-import mediapipe as mp
-from mediapipe.tasks import python
-from mediapipe.tasks.python import vision
 
-print("="*60)
-print("DROWSINESS DETECTION - MEDIAPIPE v0.10.32")
-print("="*60 + "\n")
+from landmarker_pool import image_options, srgb_image
+from inference_service import InferenceService
+from landmark_features import N_FEATURES, compute_features, feature_points, split_regions
+from model_loader import create_interpreter, interpreter_runtime, load_scaler
+from numpy_classifier import NumpyClassifier
+from frame_buffers import bgr_to_rgb, blend_panel, flip_into
+from face_tracker import create_tracker
+from feature_store import FeatureStore
+from window_metrics import WindowMetrics
+from perf_stats import StageProfiler
 
 # ============================================
-# Load Model and Scaler
+# Configuration
 # ============================================
 
-print("Loading drowsiness detection model...")
-
-try:
-    interpreter = tf.lite.Interpreter(model_path='drowsiness_model.tflite')
-    interpreter.allocate_tensors()
-    input_details = interpreter.get_input_details()
-    output_details = interpreter.get_output_details()
-    print("✓ TFLite model loaded")
-except Exception as e:
-    print(f"✗ Error loading model: {e}")
-    print("Make sure 'drowsiness_model.tflite' is in the same folder!")
-    exit()
-
-try:
-    with open('scaler.pkl', 'rb') as f:
-        scaler = pickle.load(f)
-    print("✓ Scaler loaded")
-except Exception as e:
-    print(f"✗ Error loading scaler: {e}")
-    print("Make sure 'scaler.pkl' is in the same folder!")
-    exit()
+MODEL_PATH = 'face_landmarker.task'
+TFLITE_MODEL_PATH = 'drowsiness_model.tflite'
+SCALER_PATH = 'scaler.pkl'
+# 'tflite' (interpreter), 'numpy' (weights exported to .npz) or 'off' (EAR/yawn/blink only).
+# Off by default: the shipped drowsiness_model.tflite is the firmware's 48x48 eye-crop CNN,
+# not a 5-feature classifier; set this once a feature model (and its scaler) is in place.
+CLASSIFIER_BACKEND = 'off'
+CLASSIFIER_NPZ_PATH = 'drowsiness_model.npz'  # written by `python numpy_classifier.py`
+HISTORY_DIR = 'history'  # per-frame features and alerts, same layout as the server's /api/history
+HISTORY_DEVICE = 'dashcam'
+# 'video' (track across frames, IMAGE fallback) or 'image' (full detection every frame).
+# Tracking is the default here, unlike the server: this loop detects every frame on one
+# thread in capture order, so the tracker sees each frame once and in order.
+LANDMARK_MODE = 'video'
+METRICS_FILE = None  # e.g. 'dashcam_metrics.prom': stage latencies in Prometheus text format, written at exit
 
 # ============================================
-# Download Face Landmarker Model
+# Startup
 # ============================================
 
-import os
-import urllib.request
-
-MODEL_PATH = 'face_landmarker.task'
-
-if not os.path.exists(MODEL_PATH):
+def load_classifier(profiler):
+    """Drowsiness model taking raw features (scaling included), or None if off or a file is missing"""
+    if CLASSIFIER_BACKEND == 'off':
+        print("Classifier off: threshold alerts only (EAR, yawn, blink)")
+        return None
+    print("Loading drowsiness detection model...")
+    try:
+        # Precomputed mean/scale affine transform instead of a scikit-learn call per frame
+        scaler = load_scaler(SCALER_PATH)
+        print("✓ Scaler loaded")
+    except Exception as e:
+        print(f"✗ Error loading scaler: {e}")
+        print(f"Make sure '{SCALER_PATH}' is in the same folder!")
+        return None
+    
+    model_path = CLASSIFIER_NPZ_PATH if CLASSIFIER_BACKEND == 'numpy' else TFLITE_MODEL_PATH
+    try:
+        if CLASSIFIER_BACKEND == 'numpy':
+            # Scaler is folded into the exported weights (applied here only if it was not)
+            drowsiness_model = NumpyClassifier.load(model_path, preprocess=scaler.transform, profiler=profiler)
+            if drowsiness_model.n_features != N_FEATURES:
+                raise ValueError(f"{model_path} takes {drowsiness_model.n_features} features, not {N_FEATURES}")
+            print(f"✓ NumPy classifier loaded ({model_path})")
+        else:
+            # Single stream: no batching workers, inference runs on this thread
+            drowsiness_model = InferenceService(
+                lambda: create_interpreter(model_path), preprocess=scaler.transform, workers=0, profiler=profiler,
+                n_features=N_FEATURES)
+            print(f"✓ TFLite model loaded ({interpreter_runtime()[0]})")
+    except Exception as e:
+        print(f"✗ Error loading model: {e}")
+        print(f"Make sure '{model_path}' is in the same folder!")
+        return None
+    return drowsiness_model
+
+def download_landmarker_model():
+    """Download the Face Landmarker model if needed; False if it is unavailable"""
+    if os.path.exists(MODEL_PATH):
+        return True
     print(f"\nDownloading MediaPipe Face Landmarker model (~30 MB)...")
     model_url = 'https://storage.googleapis.com/mediapipe-models/face_landmarker/face_landmarker/float16/1/face_landmarker.task'
     
@@ -59,343 +94,350 @@ if not os.path.exists(MODEL_PATH):
         print("Downloading from Google Cloud Storage...")
         urllib.request.urlretrieve(model_url, MODEL_PATH)
         print(f"✓ Model downloaded: {MODEL_PATH}")
+        return True
     except Exception as e:
         print(f"✗ Download failed: {e}")
         print("\nManual download:")
         print(f"Download: {model_url}")
         print(f"Save as: {MODEL_PATH}")
-        exit()
-
-print("✓ Face Landmarker model ready\n")
+        return False
 
-# ============================================
-# MediaPipe Face Mesh Landmark Indices
-# ============================================
-
-LEFT_EYE = [33, 160, 158, 133, 153, 144]
-RIGHT_EYE = [362, 385, 387, 263, 373, 380]
-MOUTH = [61, 291, 0, 17, 84, 314, 405, 321, 375, 291]
-
-# ============================================
-# Feature Calculation Functions
-# ============================================
-
-def calculate_ear(eye_landmarks):
-    """Calculate Eye Aspect Ratio"""
-    A = np.linalg.norm(eye_landmarks[1] - eye_landmarks[5])
-    B = np.linalg.norm(eye_landmarks[2] - eye_landmarks[4])
-    C = np.linalg.norm(eye_landmarks[0] - eye_landmarks[3])
-    ear = (A + B) / (2.0 * C + 1e-6)
-    return ear
-
-def calculate_mar(mouth_landmarks):
-    """Calculate Mouth Aspect Ratio"""
-    A = np.linalg.norm(mouth_landmarks[1] - mouth_landmarks[7])
-    B = np.linalg.norm(mouth_landmarks[2] - mouth_landmarks[6])
-    C = np.linalg.norm(mouth_landmarks[3] - mouth_landmarks[5])
-    D = np.linalg.norm(mouth_landmarks[0] - mouth_landmarks[4])
-    mar = (A + B + C) / (3.0 * D + 1e-6)
-    return mar
-
-# ============================================
-# Create Face Landmarker Task (NEW API)
-# ============================================
-
-print("Initializing MediaPipe Face Landmarker (v0.10.32 API)...")
-
-BaseOptions = python.BaseOptions
-FaceLandmarker = vision.FaceLandmarker
-FaceLandmarkerOptions = vision.FaceLandmarkerOptions
-VisionRunningMode = vision.RunningMode
-
-# IMAGE mode for synchronous detection
-options_image = FaceLandmarkerOptions(
-    base_options=BaseOptions(model_asset_path=MODEL_PATH),
-    running_mode=VisionRunningMode.IMAGE,
-    num_faces=1,
-    min_face_detection_confidence=0.5,
-    min_face_presence_confidence=0.5,
-    min_tracking_confidence=0.5
-)
-
-print("✓ MediaPipe Face Landmarker initialized\n")
-
-# ============================================
-# Open Webcam
-# ============================================
-
-print("Opening webcam...")
-cap = cv2.VideoCapture(0)
-
-if not cap.isOpened():
-    print("✗ Cannot open webcam!")
-    print("Trying different camera indices...")
-    for i in range(1, 5):
-        cap = cv2.VideoCapture(i)
-        if cap.isOpened():
-            print(f"✓ Found camera at index {i}")
-            break
+def open_webcam():
+    """First webcam that opens (index 0, then 1-4), or None"""
+    print("Opening webcam...")
+    cap = cv2.VideoCapture(0)
     
     if not cap.isOpened():
-        print("✗ No webcam found!")
-        exit()
-
-cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-cap.set(cv2.CAP_PROP_FPS, 30)
-
-print("✓ Webcam opened")
-
-# Create window BEFORE the loop
-WINDOW_NAME = 'Drowsiness Detection - MediaPipe'
-cv2.namedWindow(WINDOW_NAME, cv2.WINDOW_NORMAL)
-cv2.resizeWindow(WINDOW_NAME, 640, 480)
-
-print("\n" + "="*60)
-print("SYSTEM READY - LOOK FOR THE WINDOW!")
-print("="*60)
-print("Instructions:")
-print("  • Look at the camera")
-print("  • Close eyes for 1-2 seconds to test drowsy detection")
-print("  • Yawn to test drowsy detection")
-print("  • Press 'q' to quit")
-print("  • Press 's' to save screenshot")
-print("="*60 + "\n")
-
-print("🎥 WEBCAM WINDOW SHOULD BE VISIBLE NOW!")
-print("If you don't see it, check your taskbar or minimize other windows\n")
+        print("✗ Cannot open webcam!")
+        print("Trying different camera indices...")
+        for i in range(1, 5):
+            cap = cv2.VideoCapture(i)
+            if cap.isOpened():
+                print(f"✓ Found camera at index {i}")
+                break
+        
+        if not cap.isOpened():
+            print("✗ No webcam found!")
+            return None
+    
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+    cap.set(cv2.CAP_PROP_FPS, 30)
+    
+    print("✓ Webcam opened")
+    return cap
 
 # ============================================
-# Main Detection Loop
+# Main
 # ============================================
 
-drowsy_frames = 0
-DROWSY_THRESHOLD = 15
-
-fps_start_time = time.time()
-fps_frame_count = 0
-fps = 0
-
-total_frames = 0
-drowsy_detections = 0
-alert_detections = 0
-
-with FaceLandmarker.create_from_options(options_image) as landmarker:
+def main():
+    print("="*60)
+    print("DROWSINESS DETECTION - MEDIAPIPE v0.10.32")
+    print("="*60 + "\n")
     
-    frame_counter = 0
+    # Per-stage latency histograms (fetch ... display), reported at exit
+    profiler = StageProfiler()
     
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("Failed to grab frame - retrying...")
-            time.sleep(0.1)
-            continue
-        
-        total_frames += 1
-        frame_counter += 1
-        
-        # Flip for mirror effect
-        frame = cv2.flip(frame, 1)
-        h, w = frame.shape[:2]
-        
-        # Convert to RGB for MediaPipe
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_frame)
-        
-        # Detect face landmarks
-        try:
-            detection_result = landmarker.detect(mp_image)
-        except Exception as e:
-            print(f"Detection error: {e}")
-            continue
-        
-        # Calculate FPS
-        fps_frame_count += 1
-        if fps_frame_count >= 30:
-            fps_end_time = time.time()
-            fps = fps_frame_count / (fps_end_time - fps_start_time)
-            fps_start_time = time.time()
-            fps_frame_count = 0
-        
-        # Default status
-        status_text = "👤 No face detected"
-        status_color = (0, 0, 255)
-        bg_color = (50, 50, 50)
-        
-        # Check if faces detected
-        if detection_result.face_landmarks:
-            face_landmarks = detection_result.face_landmarks[0]
-            
-            # Extract eye coordinates
-            left_eye_coords = []
-            for idx in LEFT_EYE:
-                landmark = face_landmarks[idx]
-                left_eye_coords.append([landmark.x * w, landmark.y * h])
-            left_eye = np.array(left_eye_coords)
-            
-            right_eye_coords = []
-            for idx in RIGHT_EYE:
-                landmark = face_landmarks[idx]
-                right_eye_coords.append([landmark.x * w, landmark.y * h])
-            right_eye = np.array(right_eye_coords)
-            
-            mouth_coords = []
-            for idx in MOUTH:
-                landmark = face_landmarks[idx]
-                mouth_coords.append([landmark.x * w, landmark.y * h])
-            mouth = np.array(mouth_coords)
-            
-            # Calculate features
-            left_ear = calculate_ear(left_eye)
-            right_ear = calculate_ear(right_eye)
-            avg_ear = (left_ear + right_ear) / 2.0
-            mar = calculate_mar(mouth)
-            ear_diff = abs(left_ear - right_ear)
-            
-            # Prepare features for model
-            features = np.array([[avg_ear, left_ear, right_ear, ear_diff, mar]], dtype=np.float32)
-            features_scaled = scaler.transform(features).astype(np.float32)
-            
-            # Run inference
-            interpreter.set_tensor(input_details[0]['index'], features_scaled)
-            interpreter.invoke()
-            prediction = interpreter.get_tensor(output_details[0]['index'])[0][0]
-            
-            is_drowsy = prediction > 0.65
-            
-            # Update statistics
-            if is_drowsy:
-                drowsy_detections += 1
-                drowsy_frames += 1
-            else:
-                alert_detections += 1
-                drowsy_frames = 0
-            
-            # Determine status
-            if drowsy_frames >= DROWSY_THRESHOLD:
-                status_text = "⚠️ DROWSINESS ALERT!"
-                status_color = (0, 0, 255)
-                bg_color = (0, 0, 150)
-            elif is_drowsy:
-                status_text = "😴 Drowsy Detected"
-                status_color = (0, 165, 255)
-                bg_color = (0, 50, 100)
+    drowsiness_model = load_classifier(profiler)
+    if drowsiness_model is None and CLASSIFIER_BACKEND != 'off':
+        sys.exit(1)
+    
+    if not download_landmarker_model():
+        sys.exit(1)
+    print("✓ Face Landmarker model ready\n")
+    
+    print("Initializing MediaPipe Face Landmarker (v0.10.32 API)...")
+    from mediapipe.tasks.python import vision
+    
+    # VIDEO mode tracks the face from frame to frame and only re-runs face
+    # detection when tracking is lost; IMAGE mode stays as the fallback
+    tracker = create_tracker(MODEL_PATH) if LANDMARK_MODE == 'video' else None
+    
+    print("✓ MediaPipe Face Landmarker initialized\n")
+    
+    cap = open_webcam()
+    if cap is None:
+        sys.exit(1)
+    
+    # Create window BEFORE the loop
+    WINDOW_NAME = 'Drowsiness Detection - MediaPipe'
+    cv2.namedWindow(WINDOW_NAME, cv2.WINDOW_NORMAL)
+    cv2.resizeWindow(WINDOW_NAME, 640, 480)
+
+    print("\n" + "="*60)
+    print("SYSTEM READY - LOOK FOR THE WINDOW!")
+    print("="*60)
+    print("Instructions:")
+    print("  • Look at the camera")
+    print("  • Close eyes for 1-2 seconds to test drowsy detection")
+    print("  • Yawn to test drowsy detection")
+    print("  • Press 'q' to quit")
+    print("  • Press 's' to save screenshot")
+    print("="*60 + "\n")
+
+    print("🎥 WEBCAM WINDOW SHOULD BE VISIBLE NOW!")
+    print("If you don't see it, check your taskbar or minimize other windows\n")
+
+    # Main detection loop
+
+    drowsy_frames = 0
+    DROWSY_THRESHOLD = 15
+
+    fps_start_time = time.time()
+    fps_frame_count = 0
+    fps = 0
+
+    total_frames = 0
+    drowsy_detections = 0
+    alert_detections = 0
+    alert_type = None
+
+    # Blink/yawn detection and sliding-window metrics (written into window_stats in place)
+    windows = WindowMetrics()
+    window_stats = windows.write({}, time.monotonic())
+
+    # Session history on disk (flushed once a second in the background)
+    history = FeatureStore(HISTORY_DIR)
+    history.start()
+
+    with vision.FaceLandmarker.create_from_options(image_options(MODEL_PATH)) as landmarker:
+
+        frame_counter = 0
+
+        # Per-frame buffers, allocated on the first frame and reused afterwards
+        # (OpenCV reallocates them only if the camera resolution changes)
+        raw_frame = None
+        frame = None
+        rgb_frame = None
+
+        while True:
+            with profiler.time('fetch'):
+                ret, raw_frame = cap.read(raw_frame)
+            if not ret:
+                print("Failed to grab frame - retrying...")
+                time.sleep(0.1)
+                continue
+
+            total_frames += 1
+            frame_counter += 1
+
+            # Flip for mirror effect and convert to RGB for MediaPipe
+            with profiler.time('color_convert'):
+                frame = flip_into(raw_frame, frame)
+                rgb_frame = bgr_to_rgb(frame, rgb_frame)
+            h, w = frame.shape[:2]
+            mp_image = srgb_image(rgb_frame)
+
+            # Detect face landmarks
+            try:
+                with profiler.time('landmarks'):
+                    detection_result = tracker.detect(mp_image) if tracker is not None else None
+                    if detection_result is None:
+                        detection_result = landmarker.detect(mp_image)
+            except Exception as e:
+                print(f"Detection error: {e}")
+                continue
+
+            # Calculate FPS
+            fps_frame_count += 1
+            if fps_frame_count >= 30:
+                fps_end_time = time.time()
+                fps = fps_frame_count / (fps_end_time - fps_start_time)
+                fps_start_time = time.time()
+                fps_frame_count = 0
+
+            # Default status
+            status_text = "👤 No face detected"
+            status_color = (0, 0, 255)
+            bg_color = (50, 50, 50)
+
+            # Check if faces detected
+            if not detection_result.face_landmarks:
+                history.append(HISTORY_DEVICE, time.time(), alert_type=alert_type)
+                draw_start = time.perf_counter()
             else:
-                status_text = "✓ Alert & Awake"
-                status_color = (0, 255, 0)
-                bg_color = (0, 80, 0)
-            
-            # Draw landmarks - EYES (green)
-            for point in left_eye:
-                cv2.circle(frame, (int(point[0]), int(point[1])), 3, (0, 255, 0), -1)
-            cv2.polylines(frame, [left_eye.astype(int)], True, (0, 255, 0), 2)
-            
-            for point in right_eye:
-                cv2.circle(frame, (int(point[0]), int(point[1])), 3, (0, 255, 0), -1)
-            cv2.polylines(frame, [right_eye.astype(int)], True, (0, 255, 0), 2)
-            
-            # Draw landmarks - MOUTH (blue)
-            for point in mouth[::2]:
-                cv2.circle(frame, (int(point[0]), int(point[1])), 3, (255, 0, 0), -1)
-            cv2.polylines(frame, [mouth.astype(int)], True, (255, 0, 0), 2)
-            
-            # Draw metrics panel (bottom left)
-            panel_x = 10
-            panel_y = h - 180
-            panel_width = 400
-            panel_height = 170
-            
-            # Semi-transparent background
-            overlay = frame.copy()
-            cv2.rectangle(overlay, (panel_x, panel_y), (panel_x + panel_width, panel_y + panel_height), 
-                         (0, 0, 0), -1)
-            cv2.addWeighted(overlay, 0.7, frame, 0.3, 0, frame)
-            
-            cv2.rectangle(frame, (panel_x, panel_y), (panel_x + panel_width, panel_y + panel_height), 
-                         (255, 255, 255), 2)
-            
-            y_offset = panel_y + 25
-            cv2.putText(frame, "📊 METRICS", (panel_x + 10, y_offset), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
-            
-            y_offset += 30
-            cv2.putText(frame, f"EAR: {avg_ear:.3f} (L:{left_ear:.2f} R:{right_ear:.2f})", 
-                       (panel_x + 10, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-            
-            y_offset += 30
-            cv2.putText(frame, f"MAR: {mar:.3f}", 
-                       (panel_x + 10, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-            
-            y_offset += 30
-            cv2.putText(frame, f"Confidence: {prediction:.3f} ({prediction*100:.1f}%)", 
-                       (panel_x + 10, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-            
-            y_offset += 30
-            cv2.putText(frame, f"Drowsy frames: {drowsy_frames}/{DROWSY_THRESHOLD}", 
-                       (panel_x + 10, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 165, 0), 1)
-            
-            y_offset += 30
-            eye_status = "CLOSED" if avg_ear < 0.22 else "OPEN"
-            eye_color = (0, 0, 255) if avg_ear < 0.22 else (0, 255, 0)
-            cv2.putText(frame, f"Eyes: {eye_status}", (panel_x + 10, y_offset), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, eye_color, 2)
-            
-            # Console feedback
-            if frame_counter % 10 == 0:  # Print every 10 frames
-                print(f"✓ Frame {total_frames:05d} | EAR: {avg_ear:.3f} | MAR: {mar:.3f} | {status_text}      ", end='\r')
-        
-        # Draw status bar at top
-        cv2.rectangle(frame, (0, 0), (w, 100), bg_color, -1)
-        cv2.putText(frame, status_text, (20, 60), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 1.3, status_color, 3)
-        
-        # Draw FPS (top right)
-        cv2.putText(frame, f"FPS: {fps:.1f}", (w - 150, 35), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
-        cv2.putText(frame, f"MediaPipe", (w - 150, 65), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1)
-        
-        # Draw instructions (bottom)
-        cv2.putText(frame, "Press 'q' to quit | 's' to screenshot", (w - 350, h - 10), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1)
-        
-        # Show frame counter for debugging
-        cv2.putText(frame, f"#{frame_counter}", (10, 30), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (150, 150, 150), 1)
-        
-        # DISPLAY THE FRAME - THIS IS THE KEY LINE!
-        cv2.imshow(WINDOW_NAME, frame)
-        
-        # Bring window to front every 100 frames
-        if frame_counter % 100 == 1:
-            cv2.setWindowProperty(WINDOW_NAME, cv2.WND_PROP_TOPMOST, 1)
-            cv2.setWindowProperty(WINDOW_NAME, cv2.WND_PROP_TOPMOST, 0)
-        
-        # Handle key presses
-        key = cv2.waitKey(1) & 0xFF
-        
-        if key == ord('q'):
-            print("\n\nQuitting...")
-            break
-        elif key == ord('s'):
-            filename = f"drowsy_screenshot_{int(time.time())}.jpg"
-            cv2.imwrite(filename, frame)
-            print(f"\n✓ Screenshot saved: {filename}                              ")
-
-# ============================================
-# Cleanup
-# ============================================
-
-cap.release()
-cv2.destroyAllWindows()
-
-print("\n\n" + "="*60)
-print("SESSION STATISTICS")
-print("="*60)
-print(f"Total frames processed: {total_frames}")
-print(f"Alert detections:       {alert_detections} ({alert_detections/max(1,total_frames)*100:.1f}%)")
-print(f"Drowsy detections:      {drowsy_detections} ({drowsy_detections/max(1,total_frames)*100:.1f}%)")
-print(f"Average FPS:            {fps:.1f}")
-print("="*60)
-print("✓ Session complete!")
-print("="*60)
+                # Eye/mouth points in pixels and all five features in one vectorized pass
+                with profiler.time('features'):
+                    points = feature_points(detection_result.face_landmarks[0], w, h)
+                    features = compute_features(points)
+                avg_ear, left_ear, right_ear, _, mar = features
+                left_eye, right_eye, mouth = split_regions(points)
+
+                # Run inference (NaN without a classifier: never drowsy, stored as no score)
+                prediction = drowsiness_model.predict_now(features) if drowsiness_model is not None else np.nan
+
+                is_drowsy = drowsiness_model is not None and prediction > 0.65
+
+                now = time.monotonic()
+                blinked, yawned = windows.update(now, avg_ear, mar)
+                windows.write(window_stats, now)
+
+                # Update statistics
+                if is_drowsy:
+                    drowsy_detections += 1
+                    drowsy_frames += 1
+                else:
+                    alert_detections += 1
+                    drowsy_frames = 0
+
+                # Determine status
+                if drowsy_frames >= DROWSY_THRESHOLD:
+                    status_text = "⚠️ DROWSINESS ALERT!"
+                    status_color = (0, 0, 255)
+                    bg_color = (0, 0, 150)
+                    alert_type = "CRITICAL"
+                elif is_drowsy:
+                    status_text = "😴 Drowsy Detected"
+                    status_color = (0, 165, 255)
+                    bg_color = (0, 50, 100)
+                    alert_type = "DROWSY"
+                else:
+                    status_text = "✓ Alert & Awake"
+                    status_color = (0, 255, 0)
+                    bg_color = (0, 80, 0)
+                    alert_type = None
+
+                history.append(HISTORY_DEVICE, time.time(), ear=avg_ear, left_ear=left_ear, right_ear=right_ear,
+                               mar=mar, prediction=prediction, face=True, drowsy=is_drowsy,
+                               blink=blinked, yawn=yawned, alert_type=alert_type)
+
+                # Draw landmarks - EYES (green)
+                draw_start = time.perf_counter()
+                for point in left_eye:
+                    cv2.circle(frame, (int(point[0]), int(point[1])), 3, (0, 255, 0), -1)
+                cv2.polylines(frame, [left_eye.astype(int)], True, (0, 255, 0), 2)
+
+                for point in right_eye:
+                    cv2.circle(frame, (int(point[0]), int(point[1])), 3, (0, 255, 0), -1)
+                cv2.polylines(frame, [right_eye.astype(int)], True, (0, 255, 0), 2)
+
+                # Draw landmarks - MOUTH (blue)
+                for point in mouth[::2]:
+                    cv2.circle(frame, (int(point[0]), int(point[1])), 3, (255, 0, 0), -1)
+                cv2.polylines(frame, [mouth.astype(int)], True, (255, 0, 0), 2)
+
+                # Draw metrics panel (bottom left)
+                panel_x = 10
+                panel_y = h - 210
+                panel_width = 400
+                panel_height = 200
+
+                # Semi-transparent background (blended in place)
+                blend_panel(frame, (panel_x, panel_y), (panel_x + panel_width, panel_y + panel_height))
+
+                cv2.rectangle(frame, (panel_x, panel_y), (panel_x + panel_width, panel_y + panel_height), 
+                             (255, 255, 255), 2)
+
+                y_offset = panel_y + 25
+                cv2.putText(frame, "📊 METRICS", (panel_x + 10, y_offset), 
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
+
+                y_offset += 30
+                cv2.putText(frame, f"EAR: {avg_ear:.3f} (L:{left_ear:.2f} R:{right_ear:.2f})", 
+                           (panel_x + 10, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+                y_offset += 30
+                cv2.putText(frame, f"MAR: {mar:.3f}", 
+                           (panel_x + 10, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+                y_offset += 30
+                confidence = f"{prediction:.3f} ({prediction*100:.1f}%)" if drowsiness_model is not None else "off"
+                cv2.putText(frame, f"Confidence: {confidence}", 
+                           (panel_x + 10, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+                y_offset += 30
+                cv2.putText(frame, f"Drowsy frames: {drowsy_frames}/{DROWSY_THRESHOLD}", 
+                           (panel_x + 10, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 165, 0), 1)
+
+                y_offset += 30
+                cv2.putText(frame, f"Blinks/{windows.blink_window:g}s: {window_stats[windows.blink_key]} | PERCLOS: {window_stats['perclos']*100:.0f}%",
+                           (panel_x + 10, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+                y_offset += 30
+                eye_status = "CLOSED" if windows.eyes_closed else "OPEN"
+                eye_color = (0, 0, 255) if windows.eyes_closed else (0, 255, 0)
+                cv2.putText(frame, f"Eyes: {eye_status}", (panel_x + 10, y_offset), 
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, eye_color, 2)
+
+                # Console feedback
+                if frame_counter % 10 == 0:  # Print every 10 frames
+                    print(f"✓ Frame {total_frames:05d} | EAR: {avg_ear:.3f} | MAR: {mar:.3f} | {status_text}      ", end='\r')
+
+            # Draw status bar at top
+            cv2.rectangle(frame, (0, 0), (w, 100), bg_color, -1)
+            cv2.putText(frame, status_text, (20, 60), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 1.3, status_color, 3)
+
+            # Draw FPS (top right)
+            cv2.putText(frame, f"FPS: {fps:.1f}", (w - 150, 35), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+            cv2.putText(frame, f"MediaPipe", (w - 150, 65), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1)
+
+            # Draw instructions (bottom)
+            cv2.putText(frame, "Press 'q' to quit | 's' to screenshot", (w - 350, h - 10), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1)
+
+            # Show frame counter for debugging
+            cv2.putText(frame, f"#{frame_counter}", (10, 30), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (150, 150, 150), 1)
+
+            profiler.record('overlay', time.perf_counter() - draw_start)
+
+            # DISPLAY THE FRAME - THIS IS THE KEY LINE!
+            with profiler.time('display'):
+                cv2.imshow(WINDOW_NAME, frame)
+
+                # Bring window to front every 100 frames
+                if frame_counter % 100 == 1:
+                    cv2.setWindowProperty(WINDOW_NAME, cv2.WND_PROP_TOPMOST, 1)
+                    cv2.setWindowProperty(WINDOW_NAME, cv2.WND_PROP_TOPMOST, 0)
+
+                # Handle key presses
+                key = cv2.waitKey(1) & 0xFF
+
+            if key == ord('q'):
+                print("\n\nQuitting...")
+                break
+            elif key == ord('s'):
+                filename = f"drowsy_screenshot_{int(time.time())}.jpg"
+                cv2.imwrite(filename, frame)
+                print(f"\n✓ Screenshot saved: {filename}                              ")
+
+    # Cleanup
+
+    cap.release()
+    cv2.destroyAllWindows()
+    if tracker is not None:
+        tracker.close()
+    history.close()
+
+    print("\n\n" + "="*60)
+    print("SESSION STATISTICS")
+    print("="*60)
+    print(f"Total frames processed: {total_frames}")
+    print(f"Alert detections:       {alert_detections} ({alert_detections/max(1,total_frames)*100:.1f}%)")
+    print(f"Drowsy detections:      {drowsy_detections} ({drowsy_detections/max(1,total_frames)*100:.1f}%)")
+    print(f"Average FPS:            {fps:.1f}")
+    windows.write(window_stats, time.monotonic())
+    print(f"PERCLOS (last {windows.perclos_window:.0f}s):   {window_stats['perclos']*100:.1f}% "
+          f"(blink {window_stats['blink_duration_ms']:.0f} ms avg, EAR {window_stats['ear_mean']:.3f})")
+    if tracker is not None:
+        tracking = tracker.stats()
+        print(f"Landmark mode:          {'video' if tracking['available'] else 'image (tracking failed)'}, "
+              f"{tracking['mean_ms']:.1f} ms/frame, tracking lost {tracking['lost_frames']}x")
+    print(f"History saved to:       {HISTORY_DIR}/{HISTORY_DEVICE}/")
+    print("\nStage latency:")
+    print(profiler.report())
+    if METRICS_FILE:
+        with open(METRICS_FILE, 'w') as f:
+            f.write(profiler.prometheus('dashcam_stage_latency_seconds', 'Per-stage frame processing latency'))
+        print(f"Metrics written to:     {METRICS_FILE}")
+    print("="*60)
+    print("✓ Session complete!")
+    print("="*60)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,768 @@
+"""
+Shared Detection Core
+Configuration, per-camera detection state, models and the detection,
+overlay and metrics functions shared by esp32_stream_server.py (Flask) and
+esp32_async_server.py (aiohttp). Importing this module has no side
+effects: models are loaded and the detection, history and buzzer threads
+started by start(), which each server calls once at startup.
+"""
+
+import os
+import time
+import urllib.request
+from functools import partial
+from threading import Lock, Thread
+
+import cv2
+import numpy as np
+
+from alert_actuator import BUZZER_PORT, BuzzerActuator
+from detection_processes import default_backend as process_detection_backend
+from event_broadcaster import EventBroadcaster
+from eye_crop_classifier import EyeCheckSchedule, EyeCropClassifier, eye_summary, load_header_model
+from face_tracker import create_tracker
+from fair_executor import FairExecutor
+from feature_store import FeatureStore
+from frame_buffers import FrameBufferPool, bgr_to_rgb, blend_panel, encode_jpeg
+from inference_service import InferenceService
+from landmark_features import N_FEATURES, compute_features, feature_points, split_regions
+from landmarker_pool import LandmarkerPool, image_options, srgb_image
+from model_loader import StartupStages, create_interpreter, interpreter_runtime, load_scaler
+from motion_gate import MotionGate
+from numpy_classifier import NumpyClassifier
+from perf_stats import StageProfiler, prometheus_metric
+from window_metrics import WindowMetrics
+
+# ============================================
+# Configuration
+# ============================================
+
+ESP32_CAM_URL = "http://192.168.4.1/capture"
+ESP32_STREAM_URL = "http://192.168.4.1:81/stream"
+INGEST_MODE = 'stream'  # 'stream' (persistent MJPEG) or 'capture' (per-frame polling)
+MODEL_PATH = 'face_landmarker.task'
+TFLITE_MODEL_PATH = 'drowsiness_model.tflite'
+SCALER_PATH = 'scaler.pkl'
+# 'tflite' (batched interpreter service), 'numpy' (weights exported to .npz) or 'off'.
+# The classifier takes the 5 EAR/MAR features; without one (or if it fails to load)
+# only the EAR, yawn and blink threshold alerts run. Off by default: the shipped
+# drowsiness_model.tflite is the firmware's 48x48 eye-crop CNN, not a feature model.
+CLASSIFIER_BACKEND = 'off'
+CLASSIFIER_NPZ_PATH = 'drowsiness_model.npz'  # written by `python numpy_classifier.py`
+STARTUP_MODE = 'background'  # 'background' (serve at once, warm the landmarker on a thread) or 'eager'
+DETECTION_WORKERS = 2  # detection threads shared by all camera sessions
+DETECTION_BACKEND = 'threads'  # 'threads' (in-process landmarker pool) or 'processes' (worker processes)
+DETECTION_PROCESSES = 2  # worker processes for the 'processes' backend, each with its own models
+LANDMARKER_POOL_SIZE = DETECTION_WORKERS
+# 'image' (full detection every frame) or 'video' (per-camera tracking, IMAGE fallback).
+# A camera's tracker serializes its detections and only tracks frames in capture order,
+# so frames the pipeline's detect workers finish out of order fall back to IMAGE mode.
+LANDMARK_MODE = 'image'
+TARGET_FPS = 30
+MAX_DETECT_INTERVAL = 6  # detect at least every Nth frame when falling behind
+MOTION_GATE = True  # reuse the last detection on frames that have not changed since it
+MOTION_THRESHOLD = 2.5  # mean gray-level change over the whole (downscaled) frame
+MOTION_ROI_THRESHOLD = 4.0  # mean gray-level change inside the last eye/mouth regions
+MOTION_MAX_SKIPS = 2  # consecutive reused frames before detection is forced
+INFERENCE_WORKERS = 1  # each owns its own TFLite interpreter
+INFERENCE_MAX_BATCH = 16
+INFERENCE_MAX_WAIT_MS = 2.0  # latency bound for filling a micro-batch
+JPEG_QUALITY = 85
+STREAM_PROFILES = {  # /api/feed?profile=<name>; width/quality/fps/kbps params override
+    'high': {},
+    'medium': {'width': 640, 'quality': 70, 'max_fps': 15},
+    'low': {'width': 320, 'quality': 50, 'max_fps': 10}
+}
+EVENT_MIN_INTERVAL = 0.1  # coalesce status pushes to at most 10/s per device (alerts are immediate)
+EVENT_KEEPALIVE = 15.0
+# Sliding windows for /api/status blink/yawn/PERCLOS/EAR metrics. The counts are
+# reported as blinks_<BLINK_WINDOW_S>s and yawns_<YAWN_WINDOW_S>s (the dashboard reads blinks_30s, yawns_60s)
+BLINK_WINDOW_S = 30
+YAWN_WINDOW_S = 60
+PERCLOS_WINDOW_S = 60
+EAR_WINDOW_S = 30
+HISTORY_DIR = 'history'  # per-device feature/event time series for /api/history
+CLIP_DIR = 'clips'  # pre/post-alert .mjpeg clips + JSON sidecars
+CLIP_ALERT_TYPES = ('CRITICAL',)  # alerts that save a clip
+CLIP_PRE_SECONDS = 10.0
+CLIP_POST_SECONDS = 5.0
+CLIP_MAX_BYTES = 32 * 1024 * 1024  # per-camera ring of recent encoded frames
+CLIP_MAX_SECONDS = 60.0  # a sustained alert's clip is split into parts of at most this long...
+CLIP_MAX_CLIP_BYTES = 64 * 1024 * 1024  # ...and this size
+BUZZER_ALERT_TYPES = ('CRITICAL',)  # alerts that sound the device buzzer (UDP BUZZER_ON); () = off
+BUZZER_REFRESH_S = 2.5  # the firmware holds the buzzer 3 s per command; re-arm while the alert lasts
+BUZZER_RETRIES = 2  # extra copies of each command (UDP is lossy)
+EYE_CNN_MODE = 'off'  # 'off', 'ambiguous' (EAR inside EYE_CNN_EAR_BAND + every EYE_CNN_INTERVAL-th) or 'always'
+EYE_CNN_MODEL_PATH = 'hardware/drowsiness_model.h'  # 48x48 eye-crop CNN, read from the firmware header
+EYE_CNN_EAR_BAND = (0.20, 0.30)  # EAR range where the CNN's eye state replaces the EAR threshold
+EYE_CNN_INTERVAL = 15  # in 'ambiguous' mode, also check every Nth detection (0 = only ambiguous ones)
+
+# Camera sessions created at startup; more can be added with POST /api/<device>/connect.
+# A stream_url of 'udp://0.0.0.0:5000' receives the raw UDP frames broadcast by
+# hardware/ESP32_I2S_Camera.ino instead of polling an ESP32-CAM over HTTP
+# (esp32_stream_server.py only).
+DEFAULT_DEVICE_ID = 'esp32cam'
+DEVICES = {
+    DEFAULT_DEVICE_ID: {'stream_url': ESP32_STREAM_URL, 'capture_url': ESP32_CAM_URL}
+}
+
+# ============================================
+# Session State
+# ============================================
+
+class DetectionState:
+    def __init__(self, device_id=DEFAULT_DEVICE_ID):
+        self.device_id = device_id
+        self.is_connected = False
+        self.source = None
+        self.detection_active = False
+        self.lock = Lock()
+        
+        # Blink/yawn detection and sliding-window metrics
+        self.windows = WindowMetrics(blink_window=BLINK_WINDOW_S, yawn_window=YAWN_WINDOW_S,
+                                     perclos_window=PERCLOS_WINDOW_S, ear_window=EAR_WINDOW_S)
+        
+        # Detection statistics
+        self.stats = {
+            'total_frames': 0,
+            'drowsy_frames': 0,
+            'alert_frames': 0,
+            self.windows.blink_key: 0,
+            self.windows.yawn_key: 0,
+            'perclos': 0.0,
+            'blink_duration_ms': 0.0,
+            'ear_mean': 0.0,
+            'ear_var': 0.0,
+            'consecutive_drowsy': 0
+        }
+        
+        # Latest detection data
+        self.latest = {
+            'ear': 0.0,
+            'mar': 0.0,
+            'left_ear': 0.0,
+            'right_ear': 0.0,
+            'prediction': 0.0,
+            'eye_state': None,
+            'eye_closed_prob': None,
+            'status': 'No face detected',
+            'alert_type': None,
+            'timestamp': None
+        }
+        
+        # Overlay data from the last detected frame (reused on decimated frames)
+        self.last_overlay = None
+        
+        # Per-camera VIDEO-mode tracker (LANDMARK_MODE = 'video')
+        self.tracker = None
+        
+        # Per-camera alert clip recorder (set by the session)
+        self.recorder = None
+        
+        # Per-camera motion gate (MOTION_GATE) and the result it lets frames reuse
+        self.gate = None
+        self.last_result = None
+        
+        # Per-camera buzzer trigger, actuate(frame_ts) (set by the session)
+        self.actuate = None
+        
+        # Per-camera eye-crop CNN schedule (EYE_CNN_MODE)
+        self.eye_schedule = None
+
+# ============================================
+# Shared Services
+# ============================================
+
+# Staged startup readiness, reported by /api/health and /api/ready
+# (the classifier and eye-crop CNN are optional: a failure leaves the server degraded, still ready)
+startup = StartupStages(('scaler', 'landmarker') + (('classifier',) if CLASSIFIER_BACKEND != 'off' else ()) +
+                        (('eye_cnn',) if EYE_CNN_MODE != 'off' else ()), optional=('classifier', 'eye_cnn'))
+
+# Per-stage latency histograms (fetch ... encode), served at /metrics
+profiler = StageProfiler()
+
+# Reusable RGB conversion buffers for the detection threads
+frame_buffer_pool = FrameBufferPool()
+
+# Status/alert push channel for /api/events, shared by all sessions
+events = EventBroadcaster(min_interval=EVENT_MIN_INTERVAL, keepalive=EVENT_KEEPALIVE)
+
+# Persistent per-frame features and alert events (flushed to disk once a second after start())
+history = FeatureStore(HISTORY_DIR)
+
+# BUZZER_ON commands back to the devices, sent off the frame loop (after start())
+actuator = BuzzerActuator(port=BUZZER_PORT, refresh=BUZZER_REFRESH_S, retries=BUZZER_RETRIES, profiler=profiler)
+
+# Long-lived landmarker instances, shared by all request threads
+# (MediaPipe is imported when the pool starts, not here)
+landmarker_pool = LandmarkerPool(partial(image_options, MODEL_PATH), size=LANDMARKER_POOL_SIZE)
+
+# Set by start(); read them as detection_core.<name>, not through `from detection_core import`
+scaler = None
+drowsiness_model = None
+eye_classifier = None
+detection_processes = None
+detection_workers = None
+
+# ============================================
+# Load Models
+# ============================================
+
+def load_classifier_models():
+    """Scaler, classifier and eye-crop CNN startup stages; a failed stage leaves its model None"""
+    global scaler, drowsiness_model, eye_classifier
+    
+    # Scaler (from its cached parameters: scikit-learn is only imported to refresh the cache)
+    with startup.stage('scaler'):
+        scaler = load_scaler(SCALER_PATH)
+        print("✓ Scaler loaded")
+    
+    # The classifier: the TFLite model behind the batching inference service
+    # (each inference worker thread owns its own interpreter, from the lightest runtime installed),
+    # or its exported weights evaluated with NumPy on the calling thread.
+    # A model that does not take the feature rows fails this stage (degraded in /api/health).
+    if CLASSIFIER_BACKEND != 'off':
+        with startup.stage('classifier'):
+            if scaler is None:
+                raise RuntimeError("classifier needs the scaler")
+            if CLASSIFIER_BACKEND == 'numpy':
+                model = NumpyClassifier.load(CLASSIFIER_NPZ_PATH, preprocess=scaler.transform, profiler=profiler)
+                if model.n_features != N_FEATURES:
+                    raise ValueError(f"{CLASSIFIER_NPZ_PATH} takes {model.n_features} features, not {N_FEATURES}")
+                drowsiness_model = model
+                print(f"✓ NumPy classifier loaded ({CLASSIFIER_NPZ_PATH})")
+            else:
+                drowsiness_model = InferenceService(
+                    partial(create_interpreter, TFLITE_MODEL_PATH),
+                    preprocess=scaler.transform,
+                    workers=INFERENCE_WORKERS,
+                    max_batch=INFERENCE_MAX_BATCH,
+                    max_wait_ms=INFERENCE_MAX_WAIT_MS,
+                    profiler=profiler,
+                    n_features=N_FEATURES
+                )
+                print(f"✓ TFLite model loaded ({interpreter_runtime()[0]})")
+    if drowsiness_model is None:
+        print("  Classifier off: threshold alerts only (EAR, yawn, blink)")
+    
+    # Optional second-stage eye-crop CNN (EYE_CNN_MODE), run on the detection threads
+    if EYE_CNN_MODE != 'off':
+        with startup.stage('eye_cnn'):
+            eye_classifier = EyeCropClassifier(load_header_model(EYE_CNN_MODEL_PATH), profiler=profiler)
+            print(f"✓ Eye-crop CNN loaded ({EYE_CNN_MODEL_PATH}, mode '{EYE_CNN_MODE}')")
+
+def download_landmarker_model():
+    """Download the MediaPipe Face Landmarker model if needed"""
+    if os.path.exists(MODEL_PATH):
+        return
+    print("\nDownloading MediaPipe Face Landmarker model...")
+    model_url = 'https://storage.googleapis.com/mediapipe-models/face_landmarker/face_landmarker/float16/1/face_landmarker.task'
+    try:
+        urllib.request.urlretrieve(model_url, MODEL_PATH)
+        print(f"✓ Model downloaded: {MODEL_PATH}")
+    except Exception as e:
+        print(f"✗ Download failed: {e}")
+
+def warm_up_landmarker():
+    """Start the detection backend: the slowest startup stage (MediaPipe import, graph load, warmup)"""
+    with startup.stage('landmarker'):
+        download_landmarker_model()
+        if detection_processes is not None:
+            detection_processes.start()
+            print(f"✓ Detection worker processes ready ({DETECTION_PROCESSES} processes, "
+                  f"startup {detection_processes.startup_ms:.0f} ms)")
+        else:
+            landmarker_pool.start()
+            print(f"✓ MediaPipe Face Landmarker pool ready ({LANDMARKER_POOL_SIZE} instances, "
+                  f"warmup {landmarker_pool.warmup_ms:.0f} ms)")
+
+_started = False
+_start_lock = Lock()
+
+def start():
+    """Load the models and start the shared threads; later calls do nothing"""
+    global _started, detection_processes, detection_workers
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+        
+        print("=" * 60)
+        print("ESP32-CAM DROWSINESS DETECTION SERVER")
+        print("=" * 60)
+        
+        load_classifier_models()
+        
+        if DETECTION_BACKEND == 'processes':
+            # Each worker process loads its own landmarker and classifier (none if it did not load here)
+            detection_processes = process_detection_backend(
+                MODEL_PATH, TFLITE_MODEL_PATH if drowsiness_model is not None else None, scaler, DETECTION_PROCESSES,
+                classifier_npz_path=(CLASSIFIER_NPZ_PATH if drowsiness_model is not None
+                                     and CLASSIFIER_BACKEND == 'numpy' else None))
+        
+        # Detection threads shared by every camera session, scheduled round-robin.
+        # With worker processes these threads only hand frames over and wait, so
+        # there is one per frame slot to keep every process busy.
+        if detection_processes is not None:
+            detection_workers = FairExecutor(workers=detection_processes.slots, name='detect')
+        else:
+            detection_workers = FairExecutor(workers=DETECTION_WORKERS, name='detect')
+        
+        history.start()
+        actuator.start()
+        
+        # In background mode the API is up (and /api/health answers) while the landmarker warms;
+        # frames analyzed before it is ready count as no face
+        if STARTUP_MODE == 'background':
+            Thread(target=warm_up_landmarker, name='landmarker-warmup', daemon=True).start()
+        else:
+            warm_up_landmarker()
+
+def close():
+    """Stop the buzzer actuator and flush the history at shutdown"""
+    actuator.close()
+    history.close()
+
+# ============================================
+# Detection Functions
+# ============================================
+
+def detection_health():
+    """Health of whichever detection backend is in use"""
+    if detection_processes is not None:
+        return detection_processes.health()
+    return landmarker_pool.health()
+
+def detection_ready():
+    return detection_processes.ready if detection_processes is not None else landmarker_pool.ready
+
+def detector_ready():
+    """Landmark detection loaded (the classifier is optional)"""
+    return detection_ready()
+
+def health():
+    """/api/health body shared by both servers: liveness plus staged startup readiness"""
+    return {
+        'status': 'degraded' if startup.degraded else 'ok',
+        'ready': startup.ready,
+        'startup': startup.snapshot(),
+        'classifier_backend': CLASSIFIER_BACKEND,
+        'classifier_ready': drowsiness_model is not None,
+        'tflite_runtime': (interpreter_runtime()[0] if drowsiness_model is not None and CLASSIFIER_BACKEND == 'tflite'
+                           else None),
+        'detector_ready': detector_ready(),
+        'landmarker': detection_health(),
+        'timestamp': time.time()
+    }
+
+def forget_session(device_id):
+    """Drop a removed camera's queue from the detection threads"""
+    if detection_workers is not None:
+        detection_workers.forget(device_id)
+
+def shared_status():
+    """Model, detection and service stats for /api/status, the same for every camera"""
+    return {
+        'landmarker_pool': landmarker_pool.stats(),
+        'detection_processes': detection_processes.stats() if detection_processes is not None else None,
+        'detection_workers': detection_workers.stats() if detection_workers is not None else None,
+        'inference': drowsiness_model.stats() if drowsiness_model is not None else None,
+        'eye_cnn': eye_classifier.stats() if eye_classifier is not None else None,
+        'frame_buffers': frame_buffer_pool.stats(),
+        'events': events.stats(),
+        'history': history.stats(),
+        'stages': profiler.snapshot(),
+        'actuator': actuator.stats()
+    }
+
+# ============================================
+# Frame Processing with Detection
+# ============================================
+
+NO_FACE_OVERLAY = {
+    'status_text': "👤 No face detected",
+    'status_color': (0, 0, 255),
+    'bg_color': (50, 50, 50),
+    'landmarks': None
+}
+
+def create_session_tracker():
+    """VIDEO-mode tracker for a new camera session, or None in IMAGE mode"""
+    return create_tracker(MODEL_PATH) if LANDMARK_MODE == 'video' else None
+
+def create_buzzer_trigger(ingest):
+    """state.actuate callback for a session: BUZZER_ON to the camera, or None when actuation is off"""
+    if not BUZZER_ALERT_TYPES:
+        return None
+    
+    def actuate(frame_ts):
+        host = ingest.device_host
+        if host is not None:
+            actuator.trigger(host, frame_ts)
+    return actuate
+
+def create_motion_gate():
+    """Motion gate for a new camera session, or None when gating is off"""
+    if not MOTION_GATE:
+        return None
+    return MotionGate(threshold=MOTION_THRESHOLD, roi_threshold=MOTION_ROI_THRESHOLD, max_skips=MOTION_MAX_SKIPS)
+
+def create_eye_schedule():
+    """Eye-crop CNN schedule for a new camera session, or None when the CNN is off"""
+    if EYE_CNN_MODE == 'off':
+        return None
+    return EyeCheckSchedule(EYE_CNN_MODE, ear_band=EYE_CNN_EAR_BAND, interval=EYE_CNN_INTERVAL)
+
+def analyze_frame(frame, tracker=None, eye_schedule=None, captured_at=None):
+    """Landmarks and classifier (analyze_landmarks), then the eye-crop CNN when the schedule asks for it
+    
+    The CNN's [closed, droopy, open] probabilities for (left, right) are
+    added to the result as 'eye_probs'.
+    """
+    result = analyze_landmarks(frame, tracker, captured_at)
+    if (result is not None and eye_schedule is not None and eye_classifier is not None
+            and eye_schedule.due(result['avg_ear'])):
+        left_eye, right_eye, _ = result['landmarks']
+        result['eye_probs'] = eye_classifier.classify(frame, left_eye, right_eye)
+    return result
+
+def analyze_landmarks(frame, tracker=None, captured_at=None):
+    """Run landmark detection and the classifier on a frame (no shared state)
+    
+    Returns a measurement dict, or None when no face is found. Safe to call
+    from several worker threads at once. With a tracker, landmarks come from
+    the camera's VIDEO-mode landmarker and fall back to the shared IMAGE-mode
+    backend if tracking is unavailable or the frame (captured at
+    captured_at, time.time()) is older than the last tracked one.
+    """
+    tracking = tracker is not None and tracker.available
+    if not tracking and not detection_ready():
+        return None  # landmarker still warming up (or failed to load)
+    if detection_processes is not None and not tracking:
+        # Stages run inside the worker process; only the round trip is seen here
+        with profiler.time('process_detect'):
+            return detection_processes.analyze(frame)
+    
+    h, w = frame.shape[:2]
+    
+    # Convert to RGB for MediaPipe (into a pooled buffer) and detect face landmarks
+    with frame_buffer_pool.borrow(frame.shape) as rgb_frame:
+        with profiler.time('color_convert'):
+            bgr_to_rgb(frame, rgb_frame)
+        mp_image = srgb_image(rgb_frame)
+        detection_result = None
+        if tracking:
+            with profiler.time('landmarks'):
+                detection_result = tracker.detect(mp_image,
+                                                  captured_at * 1000.0 if captured_at is not None else None)
+        if detection_result is None:
+            if detection_processes is not None:
+                with profiler.time('process_detect'):
+                    return detection_processes.analyze(frame)
+            with landmarker_pool.checkout() as landmarker, profiler.time('landmarks'):
+                detection_result = landmarker.detect(mp_image)
+    
+    if not detection_result.face_landmarks:
+        return None
+    
+    # Eye/mouth points in pixels and all five features in one vectorized pass
+    with profiler.time('features'):
+        points = feature_points(detection_result.face_landmarks[0], w, h)
+        features = compute_features(points)
+    avg_ear, left_ear, right_ear, _, mar = features
+    
+    # Run inference (scaled and batched with other frames by the service)
+    prediction = drowsiness_model.predict(features) if drowsiness_model is not None else None
+    
+    return {
+        'landmarks': split_regions(points),
+        'avg_ear': avg_ear,
+        'left_ear': left_ear,
+        'right_ear': right_ear,
+        'mar': mar,
+        'prediction': prediction
+    }
+
+def apply_detection(state, result, frame_ts=None):
+    """Update blink/yawn/drowsiness state from one analyzed frame; returns overlay data
+    
+    Must be called in frame order, since blink and consecutive-drowsy
+    tracking depend on the previous frame. frame_ts (time.time() when the
+    frame arrived) is what buzzer latency is measured from.
+    """
+    state.last_result = result
+    if state.gate is not None:
+        state.gate.observe(result)
+    now = time.monotonic()
+    with state.lock:
+        state.stats['total_frames'] += 1
+        if result is None:
+            state.windows.write(state.stats, now)
+        stats = state.stats.copy() if result is None else None
+        last_alert = state.latest['alert_type']
+    
+    if result is None:
+        history.append(state.device_id, time.time(), alert_type=last_alert)
+        events.update(state.device_id, stats=stats)
+        state.last_overlay = NO_FACE_OVERLAY
+        return NO_FACE_OVERLAY
+    
+    avg_ear = result['avg_ear']
+    left_ear = result['left_ear']
+    right_ear = result['right_ear']
+    mar = result['mar']
+    prediction = result['prediction']
+    
+    is_drowsy = prediction is not None and prediction > 0.65
+    
+    # Eyes closed by the EAR threshold; inside the ambiguous band the eye-crop CNN decides when it ran
+    eyes_closed = avg_ear <= 0.25
+    eye_state = eye_closed_prob = None
+    if result.get('eye_probs') is not None:
+        eye_state, eye_closed_prob = eye_summary(result['eye_probs'])
+        if EYE_CNN_EAR_BAND[0] <= avg_ear <= EYE_CNN_EAR_BAND[1]:
+            eyes_closed = eye_state != 'open'
+    
+    # Update statistics
+    with state.lock:
+        # Blinks (EAR drops below threshold then rises), yawns (MAR above threshold) and windows
+        blinked, yawned = state.windows.update(now, avg_ear, mar)
+        state.windows.write(state.stats, now)
+        
+        if is_drowsy:
+            state.stats['drowsy_frames'] += 1
+            state.stats['consecutive_drowsy'] += 1
+        else:
+            state.stats['alert_frames'] += 1
+            state.stats['consecutive_drowsy'] = 0
+        
+        # Determine alert type
+        alert_type = None
+        if state.stats['consecutive_drowsy'] >= 15:
+            status_text = "⚠️ DROWSINESS ALERT!"
+            status_color = (0, 0, 255)
+            bg_color = (0, 0, 150)
+            alert_type = "CRITICAL"
+        elif eyes_closed:
+            status_text = "🚨 ALERT: EAR"
+            status_color = (0, 165, 255)
+            bg_color = (0, 50, 100)
+            alert_type = "EAR"
+        elif mar > 0.6:
+            status_text = "🚨 ALERT: YAWN"
+            status_color = (0, 165, 255)
+            bg_color = (0, 50, 100)
+            alert_type = "YAWN"
+        elif state.stats[state.windows.blink_key] > 20:
+            status_text = "🚨 ALERT: BLINK"
+            status_color = (0, 165, 255)
+            bg_color = (0, 50, 100)
+            alert_type = "BLINK"
+        elif is_drowsy:
+            status_text = "😴 Drowsy Detected"
+            status_color = (0, 165, 255)
+            bg_color = (0, 50, 100)
+            alert_type = "DROWSY"
+        else:
+            status_text = "✓ ACTIVE"
+            status_color = (0, 255, 0)
+            bg_color = (0, 80, 0)
+        
+        # Update latest detection data
+        state.latest = {
+            'ear': float(avg_ear),
+            'mar': float(mar),
+            'left_ear': float(left_ear),
+            'right_ear': float(right_ear),
+            'prediction': float(prediction) if prediction is not None else None,
+            'eye_state': eye_state,
+            'eye_closed_prob': eye_closed_prob,
+            'status': status_text,
+            'alert_type': alert_type,
+            'timestamp': time.time()
+        }
+        latest = state.latest
+        start_clip = (state.recorder is not None and alert_type != last_alert
+                      and alert_type in CLIP_ALERT_TYPES)
+        stats = state.stats.copy()
+        blinks = stats[state.windows.blink_key]
+        yawns = stats[state.windows.yawn_key]
+    
+    # Buzzer first: it is the latency-critical output (the call only enqueues)
+    if state.actuate is not None and alert_type in BUZZER_ALERT_TYPES:
+        state.actuate(frame_ts)
+    history.append(state.device_id, latest['timestamp'], ear=avg_ear, left_ear=left_ear, right_ear=right_ear,
+                   mar=mar, prediction=np.nan if prediction is None else prediction, face=True, drowsy=is_drowsy,
+                   blink=blinked, yawn=yawned, alert_type=alert_type)
+    events.update(state.device_id, latest=latest, stats=stats)
+    if start_clip:
+        state.recorder.trigger(alert_type, ts=latest['timestamp'], ear=latest['ear'], mar=latest['mar'],
+                               prediction=latest['prediction'], consecutive_drowsy=stats['consecutive_drowsy'])
+    
+    overlay = {
+        'status_text': status_text,
+        'status_color': status_color,
+        'bg_color': bg_color,
+        'landmarks': result['landmarks'],
+        'avg_ear': avg_ear,
+        'mar': mar,
+        'blinks': blinks,
+        'yawns': yawns
+    }
+    state.last_overlay = overlay
+    return overlay
+
+def reuse_detection(state, frame_ts=None):
+    """Apply the last detection result again to a frame the motion gate found unchanged"""
+    return apply_detection(state, state.last_result, frame_ts)
+
+def analyze_on_workers(state, frame, frame_ts=None):
+    """analyze_frame for one camera on the shared detection threads; None on errors"""
+    try:
+        return detection_workers.run(state.device_id, analyze_frame, frame, state.tracker, state.eye_schedule,
+                                     frame_ts)
+    except Exception as e:
+        print(f"Detection error: {e}")
+        return None
+
+def detect_frame(state, frame, frame_ts=None):
+    """Run drowsiness detection on a frame and update state; returns overlay data"""
+    if state.gate is not None and not state.gate.check(frame):
+        return reuse_detection(state, frame_ts)
+    return apply_detection(state, analyze_on_workers(state, frame, frame_ts), frame_ts)
+
+def draw_overlays(frame, overlay, label="ESP32-CAM"):
+    """Draw landmarks, metrics panel and status bar from detection overlay data"""
+    h, w = frame.shape[:2]
+    
+    if overlay['landmarks'] is not None:
+        left_eye, right_eye, mouth = overlay['landmarks']
+        avg_ear = overlay['avg_ear']
+        mar = overlay['mar']
+        
+        # Draw landmarks - EYES (green)
+        for point in left_eye:
+            cv2.circle(frame, (int(point[0]), int(point[1])), 2, (0, 255, 0), -1)
+        cv2.polylines(frame, [left_eye.astype(int)], True, (0, 255, 0), 1)
+        
+        for point in right_eye:
+            cv2.circle(frame, (int(point[0]), int(point[1])), 2, (0, 255, 0), -1)
+        cv2.polylines(frame, [right_eye.astype(int)], True, (0, 255, 0), 1)
+        
+        # Draw landmarks - MOUTH (blue)
+        for point in mouth[::2]:
+            cv2.circle(frame, (int(point[0]), int(point[1])), 2, (255, 0, 0), -1)
+        cv2.polylines(frame, [mouth.astype(int)], True, (255, 0, 0), 1)
+        
+        # Draw metrics overlay (semi-transparent, blended in place)
+        blend_panel(frame, (10, h - 120), (300, h - 10))
+        
+        y_offset = h - 100
+        ear_color = (0, 255, 0) if avg_ear > 0.25 else (0, 0, 255)
+        cv2.putText(frame, f"EAR: {avg_ear:.3f}", (20, y_offset), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, ear_color, 1)
+        
+        y_offset += 25
+        mar_color = (0, 255, 0) if mar < 0.6 else (0, 0, 255)
+        cv2.putText(frame, f"MAR: {mar:.3f}", (20, y_offset), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, mar_color, 1)
+        
+        y_offset += 25
+        cv2.putText(frame, f"Blinks: {overlay['blinks']} | Yawns: {overlay['yawns']}", 
+                   (20, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+    
+    # Draw status bar at top
+    cv2.rectangle(frame, (0, 0), (w, 60), overlay['bg_color'], -1)
+    cv2.putText(frame, overlay['status_text'], (20, 40), 
+               cv2.FONT_HERSHEY_SIMPLEX, 0.8, overlay['status_color'], 2)
+    
+    # Draw source label (bottom left)
+    cv2.putText(frame, label, (10, h - 10), 
+               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1)
+    
+    # Draw XIAO status (bottom right) - placeholder for now
+    cv2.putText(frame, "XIAO: OFF", (w - 100, h - 10), 
+               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1)
+    
+    return frame
+
+def process_frame(state, frame, run_detection=True, frame_ts=None):
+    """Process frame with drowsiness detection and add overlays
+    
+    When run_detection is False (scheduler is decimating), the overlays from
+    the last detected frame are reused.
+    """
+    if frame is None:
+        return None
+    
+    if run_detection or state.last_overlay is None:
+        overlay = detect_frame(state, frame, frame_ts)
+    else:
+        overlay = state.last_overlay
+    
+    with profiler.time('overlay'):
+        return draw_overlays(frame, overlay, state.device_id)
+
+# ============================================
+# Placeholder Frames and Metrics
+# ============================================
+
+_error_frame = None
+_error_jpeg = None
+
+def error_frame():
+    """Placeholder frame shown while the ESP32-CAM is not responding (drawn once)"""
+    global _error_frame
+    if _error_frame is None:
+        frame = np.zeros((480, 640, 3), dtype=np.uint8)
+        cv2.putText(frame, "ESP32-CAM Not Responding", (100, 240),
+                   cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+        _error_frame = frame
+    return _error_frame
+
+def encode_error_frame():
+    """JPEG of the placeholder frame (encoded once and reused)"""
+    global _error_jpeg
+    if _error_jpeg is None:
+        _error_jpeg = encode_jpeg(error_frame(), JPEG_QUALITY)
+    return _error_jpeg
+
+def prometheus_text(camera_sessions):
+    """Prometheus text exposition: per-stage latency histograms and per-camera counters"""
+    cameras = list(camera_sessions)
+    
+    def per_camera(value):
+        return [({'device': session.device_id}, value(session)) for session in cameras]
+    
+    parts = [
+        profiler.prometheus('drowsiness_stage_latency_seconds', 'Per-stage frame processing latency'),
+        prometheus_metric('drowsiness_frames_total', 'counter', 'Frames analyzed',
+                          per_camera(lambda s: s.state.stats['total_frames'])),
+        prometheus_metric('drowsiness_drowsy_frames_total', 'counter', 'Frames classified as drowsy',
+                          per_camera(lambda s: s.state.stats['drowsy_frames'])),
+        prometheus_metric('drowsiness_detections_reused_total', 'counter',
+                          'Frames that reused the previous detection (motion gate)',
+                          per_camera(lambda s: s.state.gate.skipped if s.state.gate is not None else 0)),
+        prometheus_metric('drowsiness_camera_connected', 'gauge', 'Camera connected (1) or not (0)',
+                          per_camera(lambda s: s.state.is_connected)),
+        prometheus_metric('drowsiness_feed_fps', 'gauge', 'Achieved capture and detection frame rate',
+                          per_camera(lambda s: s.scheduler.stats()['achieved_fps'])),
+        prometheus_metric('drowsiness_feed_subscribers', 'gauge', 'Open /api/feed viewers',
+                          per_camera(lambda s: s.hub.subscribers)),
+        prometheus_metric('drowsiness_feed_frames_published_total', 'counter', 'Annotated frames published',
+                          per_camera(lambda s: s.hub.published)),
+        prometheus_metric('drowsiness_feed_frames_dropped_total', 'counter', 'Frames skipped by slow viewers',
+                          per_camera(lambda s: s.hub.dropped)),
+        prometheus_metric('drowsiness_buzzer_commands_total', 'counter', 'BUZZER_ON commands sent (first copies)',
+                          [({}, actuator.sent)]),
+        prometheus_metric('drowsiness_buzzer_retries_total', 'counter', 'Repeated BUZZER_ON copies sent',
+                          [({}, actuator.retries_sent)]),
+        prometheus_metric('drowsiness_buzzer_dropped_total', 'counter', 'Buzzer triggers dropped (queue full)',
+                          [({}, actuator.dropped)])
+    ]
+    if drowsiness_model is not None:
+        parts.append(prometheus_metric('drowsiness_inference_batches_total', 'counter',
+                                       'Classifier micro-batches run', [({}, drowsiness_model.batches)]))
+        parts.append(prometheus_metric('drowsiness_inference_rows_total', 'counter',
+                                       'Feature rows classified', [({}, drowsiness_model.rows)]))
+    return ''.join(parts)
@@ -0,0 +1,429 @@
+"""
+Process-Pool Detection Backend
+Runs landmark detection and the drowsiness classifier in worker processes so
+they do not contend on the GIL with capture, drawing and encoding. Each
+worker owns its own FaceLandmarker and TFLite interpreter (or NumPy
+classifier).
+
+Frames travel through a shared-memory ring of fixed-size slots instead of
+being pickled: the server copies a frame into a free slot and sends only the
+slot number; the worker writes a compact result record (feature points,
+features, prediction) into a shared record array at the same index.
+
+Workers are started as fresh interpreters running this file (not via
+multiprocessing's spawn, which would re-run the server's module-level model
+loading in every child) and connect back over an authenticated
+multiprocessing.connection socket.
+"""
+
+import os
+import queue
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from functools import partial
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Client, Listener, wait
+
+import cv2
+import numpy as np
+
+from inference_service import InferenceService
+from landmarker_pool import PooledLandmarker, image_options, srgb_image
+from landmark_features import FEATURE_INDICES, N_FEATURES, compute_features, feature_points, split_regions
+from model_loader import create_interpreter
+from numpy_classifier import NumpyClassifier
+from perf_stats import LatencyCounter
+
+AUTHKEY_ENV = 'DETECTION_WORKER_AUTHKEY'
+
+# One result record per ring slot
+RESULT_DTYPE = np.dtype([
+    ('found', np.bool_),
+    ('points', np.float32, (len(FEATURE_INDICES), 2)),
+    ('features', np.float32, (5,)),
+    ('prediction', np.float32)
+])
+
+
+# ============================================
+# Worker side
+# ============================================
+
+def create_landmarker(model_path):
+    """Picklable landmarker factory: a warmed IMAGE-mode FaceLandmarker"""
+    landmarker = PooledLandmarker(0, image_options(model_path))
+    landmarker.warmup()
+    return landmarker
+
+
+def attach_shared_memory(name):
+    """Open an existing block without letting this process's tracker unlink it on exit"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+def worker_main(address, authkey):
+    """Entry point of one detection worker process"""
+    conn = Client(address, authkey=authkey)
+    (worker_id, landmarker_factory, interpreter_factory, classifier_npz_path, scaler,
+     ring_name, records_name, slots, slot_bytes) = conn.recv()
+    try:
+        start = time.perf_counter()
+        landmarker = landmarker_factory()
+        preprocess = scaler.transform if scaler is not None else None
+        model = None
+        if classifier_npz_path is not None:
+            model = NumpyClassifier.load(classifier_npz_path, preprocess=preprocess)
+        elif interpreter_factory is not None:
+            model = InferenceService(interpreter_factory, preprocess=preprocess, workers=0, n_features=N_FEATURES)
+        ring = attach_shared_memory(ring_name)
+        records_shm = attach_shared_memory(records_name)
+        conn.send(('ready', (time.perf_counter() - start) * 1000.0))
+    except Exception as e:
+        conn.send(('failed', repr(e)))
+        return
+
+    frames = np.ndarray((slots, slot_bytes), dtype=np.uint8, buffer=ring.buf)
+    records = np.ndarray((slots,), dtype=RESULT_DTYPE, buffer=records_shm.buf)
+    frame = record = rgb = None
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        slot, generation, h, w = task
+        try:
+            frame = frames[slot, :h * w * 3].reshape(h, w, 3)
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb)
+            detection = landmarker.detect(srgb_image(rgb))
+            record = records[slot]
+            if detection.face_landmarks:
+                points = feature_points(detection.face_landmarks[0], w, h)
+                features = compute_features(points)
+                record['points'] = points
+                record['features'] = features
+                record['prediction'] = model.predict_now(features) if model is not None else np.nan
+                record['found'] = True
+            else:
+                record['found'] = False
+            conn.send(('done', slot, generation))
+        except Exception as e:
+            conn.send(('error', slot, generation, repr(e)))
+
+    # Views into shared memory must be released before it can be closed
+    del frames, records, frame, record
+    landmarker.close()
+    ring.close()
+    records_shm.close()
+
+# ============================================
+# Server side
+# ============================================
+
+class _Worker:
+    def __init__(self, worker_id, process, conn):
+        self.worker_id = worker_id
+        self.process = process
+        self.conn = conn
+        self.in_flight = set()  # slots sent to this worker and not yet answered
+        self.jobs = 0
+
+
+class ProcessDetectionBackend:
+    """
+    Pool of detection worker processes fed through a shared-memory frame ring.
+
+    analyze(frame) has the same contract as detection_core.analyze_frame
+    (result dict or None) and blocks the calling thread only, so it can run on
+    the FairExecutor threads. Jobs go to the worker with the fewest frames in
+    flight; with all slots in flight, callers wait for one to free up.
+    """
+
+    def __init__(self, landmarker_factory, interpreter_factory, scaler=None, processes=2,
+                 slots=None, max_frame_shape=(1200, 1600, 3), job_timeout=10.0, start_timeout=120.0,
+                 classifier_npz_path=None):
+        self.landmarker_factory = landmarker_factory
+        self.interpreter_factory = interpreter_factory
+        self.classifier_npz_path = classifier_npz_path  # NumpyClassifier weights instead of the interpreter
+        self.scaler = scaler  # landmark_features.AffineScaler
+        self.processes = processes
+        self.slots = slots or 2 * processes
+        self.slot_bytes = int(np.prod(max_frame_shape))
+        self.job_timeout = job_timeout
+        self.start_timeout = start_timeout
+
+        self._authkey = secrets.token_bytes(32)
+        self._listener = None
+        self._ring = None
+        self._records_shm = None
+        self._frames = None
+        self._records = None
+        self._workers = {}
+        self._free = queue.Queue()
+        self._pending = {}  # slot -> (generation, future, worker)
+        self._generation = [0] * self.slots
+        self._lock = threading.Lock()
+        self._collector = None
+        self._stop = threading.Event()
+
+        self.ready = False
+        self.startup_ms = 0.0
+        self.jobs = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.restarts = 0
+        self.round_trip = LatencyCounter()
+
+    def start(self):
+        self._ring = shared_memory.SharedMemory(create=True, size=self.slots * self.slot_bytes)
+        self._records_shm = shared_memory.SharedMemory(create=True, size=self.slots * RESULT_DTYPE.itemsize)
+        self._frames = np.ndarray((self.slots, self.slot_bytes), dtype=np.uint8, buffer=self._ring.buf)
+        self._records = np.ndarray((self.slots,), dtype=RESULT_DTYPE, buffer=self._records_shm.buf)
+        self._listener = Listener(authkey=self._authkey)
+        for slot in range(self.slots):
+            self._free.put(slot)
+
+        start = time.perf_counter()
+        try:
+            for worker_id in range(self.processes):
+                self._workers[worker_id] = self._spawn(worker_id)
+        except Exception:
+            self.close()
+            raise
+        self.startup_ms = (time.perf_counter() - start) * 1000.0
+
+        self._collector = threading.Thread(target=self._collect, name='detect-proc-results', daemon=True)
+        self._collector.start()
+        self.ready = True
+
+    def _spawn(self, worker_id):
+        """Start one worker process and wait until its models are loaded"""
+        env = dict(os.environ)
+        env[AUTHKEY_ENV] = self._authkey.hex()
+        env['PYTHONPATH'] = os.pathsep.join(p for p in sys.path if p)
+        process = subprocess.Popen([sys.executable, os.path.abspath(__file__), repr(self._listener.address)],
+                                   env=env)
+
+        accepted = queue.Queue()
+        threading.Thread(target=lambda: accepted.put(self._listener.accept()), daemon=True).start()
+        deadline = time.monotonic() + self.start_timeout
+        conn = None
+        while conn is None:
+            if process.poll() is not None:
+                raise RuntimeError(f"detection worker {worker_id} exited ({process.returncode}) before connecting")
+            if time.monotonic() > deadline:
+                process.kill()
+                raise TimeoutError(f"detection worker {worker_id} did not connect")
+            try:
+                conn = accepted.get(timeout=0.2)
+            except queue.Empty:
+                pass
+
+        conn.send((worker_id, self.landmarker_factory, self.interpreter_factory, self.classifier_npz_path,
+                   self.scaler, self._ring.name, self._records_shm.name, self.slots, self.slot_bytes))
+        if not conn.poll(max(0.0, deadline - time.monotonic())):
+            process.kill()
+            raise TimeoutError(f"detection worker {worker_id} did not load its models")
+        status, detail = conn.recv()
+        if status != 'ready':
+            process.kill()
+            raise RuntimeError(f"detection worker {worker_id} failed to start: {detail}")
+        return _Worker(worker_id, process, conn)
+
+    def analyze(self, frame):
+        """Detect on a BGR frame in a worker process; returns the result dict or None"""
+        if not self.ready:
+            raise RuntimeError("Process detection backend not started")
+        h, w = frame.shape[:2]
+        if frame.ndim != 3 or frame.shape[2] != 3 or frame.nbytes > self.slot_bytes:
+            raise ValueError(f"frame {frame.shape} does not fit a {self.slot_bytes}-byte slot")
+
+        start = time.perf_counter()
+        slot = self._free.get()
+        self._frames[slot, :frame.nbytes].reshape(frame.shape)[...] = frame
+        future = Future()
+        with self._lock:
+            workers = [wk for wk in self._workers.values() if wk.conn is not None]
+            if not workers:
+                self._free.put(slot)
+                raise RuntimeError("no detection workers running")
+            worker = min(workers, key=lambda wk: len(wk.in_flight))
+            self._generation[slot] += 1
+            generation = self._generation[slot]
+            self._pending[slot] = (generation, future, worker)
+            worker.in_flight.add(slot)
+            try:
+                worker.conn.send((slot, generation, h, w))
+            except OSError as e:
+                # The collector notices the dead worker and reclaims this slot
+                future.set_exception(RuntimeError(f"detection worker unavailable: {e}"))
+
+        try:
+            result = future.result(timeout=self.job_timeout)
+        except FutureTimeout:
+            # The slot stays reserved until the worker answers or dies
+            self.timeouts += 1
+            raise
+        self.round_trip.record(time.perf_counter() - start)
+        return result
+
+    def _read_record(self, slot):
+        record = self._records[slot]
+        if not record['found']:
+            return None
+        points = record['points'].astype(np.float64)
+        avg_ear, left_ear, right_ear, _, mar = (float(v) for v in record['features'])
+        return {
+            'landmarks': split_regions(points),
+            'avg_ear': avg_ear,
+            'left_ear': left_ear,
+            'right_ear': right_ear,
+            'mar': mar,
+            'prediction': float(record['prediction']) if np.isfinite(record['prediction']) else None
+        }
+
+    def _complete(self, worker, message):
+        kind, slot, generation = message[:3]
+        with self._lock:
+            entry = self._pending.get(slot)
+            if entry is None or entry[0] != generation:
+                return
+            del self._pending[slot]
+            worker.in_flight.discard(slot)
+        future = entry[1]
+        try:
+            if kind == 'done':
+                result = self._read_record(slot)
+                worker.jobs += 1
+                self.jobs += 1
+                if not future.done():
+                    future.set_result(result)
+            else:
+                self.errors += 1
+                if not future.done():
+                    future.set_exception(RuntimeError(message[3]))
+        finally:
+            self._free.put(slot)
+
+    def _worker_lost(self, worker):
+        """Fail the frames a dead worker held, free their slots, and replace it"""
+        with self._lock:
+            worker.conn = None
+            lost = [self._pending.pop(slot) for slot in worker.in_flight]
+            slots = list(worker.in_flight)
+            worker.in_flight.clear()
+        for _, future, _ in lost:
+            if not future.done():
+                future.set_exception(RuntimeError("detection worker exited"))
+        for slot in slots:
+            self._free.put(slot)
+        if self._stop.is_set():
+            return
+        print(f"✗ Detection worker {worker.worker_id} exited, restarting")
+        self.restarts += 1
+        threading.Thread(target=self._respawn, args=(worker.worker_id,), daemon=True).start()
+
+    def _respawn(self, worker_id):
+        try:
+            replacement = self._spawn(worker_id)
+        except Exception as e:
+            print(f"✗ Detection worker {worker_id} failed to restart: {e}")
+            return
+        with self._lock:
+            self._workers[worker_id] = replacement
+
+    def _collect(self):
+        while not self._stop.is_set():
+            with self._lock:
+                by_conn = {wk.conn: wk for wk in self._workers.values() if wk.conn is not None}
+            if not by_conn:
+                time.sleep(0.2)
+                continue
+            for conn in wait(list(by_conn), timeout=0.5):
+                worker = by_conn[conn]
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    self._worker_lost(worker)
+                    continue
+                self._complete(worker, message)
+
+    def close(self):
+        self._stop.set()
+        self.ready = False
+        for worker in self._workers.values():
+            try:
+                if worker.conn is not None:
+                    worker.conn.send(None)
+            except OSError:
+                pass
+        for worker in self._workers.values():
+            try:
+                worker.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                worker.process.kill()
+        if self._collector is not None:
+            self._collector.join(timeout=2)
+        for worker in self._workers.values():
+            if worker.conn is not None:
+                worker.conn.close()
+        self._workers.clear()
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        self._frames = self._records = None
+        for shm in (self._ring, self._records_shm):
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+        self._ring = self._records_shm = None
+
+    def health(self):
+        with self._lock:
+            alive = sum(1 for wk in self._workers.values() if wk.conn is not None)
+        return {
+            'ready': self.ready and alive == self.processes,
+            'size': self.processes,
+            'alive': alive,
+            'restarts': self.restarts
+        }
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._pending)
+            per_worker = {wk.worker_id: wk.jobs for wk in self._workers.values()}
+        return {
+            'processes': self.processes,
+            'slots': self.slots,
+            'slot_mb': round(self.slot_bytes / 1e6, 2),
+            'in_flight': in_flight,
+            'jobs': self.jobs,
+            'jobs_per_worker': per_worker,
+            'errors': self.errors,
+            'timeouts': self.timeouts,
+            'restarts': self.restarts,
+            'startup_ms': round(self.startup_ms, 1),
+            'round_trip': self.round_trip.snapshot()
+        }
+
+
+def default_backend(model_path, tflite_model_path, scaler, processes, **kwargs):
+    """Backend wired to the server's model files (tflite_model_path None: no classifier)"""
+    return ProcessDetectionBackend(partial(create_landmarker, model_path),
+                                   partial(create_interpreter, tflite_model_path) if tflite_model_path else None,
+                                   scaler=scaler, processes=processes, **kwargs)
+
+
+if __name__ == '__main__':
+    import ast
+    worker_main(ast.literal_eval(sys.argv[1]), bytes.fromhex(os.environ[AUTHKEY_ENV]))
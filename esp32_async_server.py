@@ -0,0 +1,613 @@
+"""
+ESP32-CAM Streaming Server (asyncio mode)
+Serves the same API as esp32_stream_server.py on aiohttp instead of Flask's
+thread-per-connection dev server. Camera ingest, MJPEG feeds and status
+events are coroutines on one event loop, so an open viewer costs a socket
+and a small write buffer rather than an OS thread; decode, detection,
+annotation and encoding still run on worker threads.
+
+Configuration, models, detection and overlay code come from detection_core.py,
+shared with esp32_stream_server.py; models load when the app starts.
+Cameras must be HTTP ESP32-CAMs: udp:// devices (the raw UDP frame protocol)
+are rejected here and need esp32_stream_server.py.
+
+Run: python esp32_async_server.py
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+import cv2
+import numpy as np
+from aiohttp import web
+
+import detection_core
+from detection_core import (
+    CLIP_DIR, CLIP_MAX_BYTES, CLIP_MAX_CLIP_BYTES, CLIP_MAX_SECONDS, CLIP_POST_SECONDS, CLIP_PRE_SECONDS,
+    DEFAULT_DEVICE_ID, DEVICES, EVENT_KEEPALIVE, EVENT_MIN_INTERVAL, INGEST_MODE, JPEG_QUALITY, MAX_DETECT_INTERVAL, STREAM_PROFILES, TARGET_FPS,
+    DetectionState, create_buzzer_trigger, create_eye_schedule, create_motion_gate, create_session_tracker,
+    detector_ready, encode_error_frame, error_frame, events, forget_session, health, history, process_frame,
+    profiler, prometheus_text, shared_status, startup
+)
+from clip_recorder import ClipRecorder
+from esp32_ingest import check_camera_url
+from esp32_ingest_async import AsyncCameraIngest
+from feature_store import parse_history_args
+from frame_buffers import encode_jpeg, mjpeg_part
+from frame_scheduler import FrameScheduler
+from stream_profiles import AdaptiveQuality, ProfileEncoder, StreamProfile, encoding_key
+
+# ============================================
+# Configuration
+# ============================================
+
+HOST = '0.0.0.0'
+PORT = 5001
+CPU_WORKERS = 4  # threads for decode + annotate + encode (detection uses detection_workers)
+ALLOWED_ORIGINS = {"http://localhost:3000"}
+
+# ============================================
+# Event-loop primitives
+# ============================================
+
+class LoopSignal:
+    """Wakes every coroutine waiting on it; fire_threadsafe() may be called from any thread"""
+
+    def __init__(self, loop):
+        self._loop = loop
+        self._event = asyncio.Event()
+
+    def fire(self):
+        self._event.set()
+        self._event = asyncio.Event()
+
+    def fire_threadsafe(self):
+        self._loop.call_soon_threadsafe(self.fire)
+
+    async def wait(self, timeout):
+        """True if fired within timeout"""
+        event = self._event
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class AsyncFrameHub:
+    """Latest encoded MJPEG part of one camera, fanned out to feed coroutines
+
+    Only the newest part is kept; a slow viewer blocks on its own socket and
+    skips to the newest frame when it catches up. Viewers whose StreamProfile
+    differs from the feed's own encoding get shared re-encodes of the
+    annotated frame, made on `executor`.
+    """
+
+    def __init__(self, name, executor=None, quality=JPEG_QUALITY):
+        self.name = name
+        self.executor = executor
+        self.quality = quality
+        self.encoder = ProfileEncoder()
+        self._part = None
+        self._frame = None
+        self._seq = 0
+        self._signal = LoopSignal(asyncio.get_running_loop())
+        self.running = False
+        self.subscribers = 0
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.quality_changes = 0
+
+    def publish(self, part, frame=None):
+        self._part = part
+        self._frame = frame
+        self._seq += 1
+        self.published += 1
+        self._signal.fire()
+
+    def stop(self):
+        self.running = False
+        self._signal.fire()
+
+    async def subscribe(self, timeout=1.0, profile=None, source_fps=TARGET_FPS):
+        """Yield parts as they are published; with a profile, paced, re-encoded and quality-adapted
+
+        The time the caller takes to write each part (until it asks for the
+        next) drives the profile's adaptive quality.
+        """
+        loop = asyncio.get_running_loop()
+        adapter = None
+        min_interval = 0.0
+        if profile is not None:
+            interval = profile.frame_interval(source_fps)
+            adapter = AdaptiveQuality(profile, interval)
+            if profile.max_fps:
+                min_interval = interval
+
+        last_seq = 0
+        last_sent = 0.0
+        self.subscribers += 1
+        try:
+            while self.running:
+                if min_interval:
+                    wait = last_sent + min_interval - time.monotonic()
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                if self._seq == last_seq:
+                    await self._signal.wait(timeout)
+                    continue
+                if last_seq and self._seq - last_seq > 1:
+                    self.dropped += self._seq - last_seq - 1
+                last_seq = seq = self._seq
+                self.delivered += 1
+                part = self._part
+                if profile is None:
+                    yield part
+                    continue
+
+                quality = adapter.quality
+                key = encoding_key(profile, adapter, self._frame, self.quality)
+                if key is not None:
+                    encoded = await loop.run_in_executor(self.executor, self.encoder.part,
+                                                         seq, self._frame, *key)
+                    part = encoded or part
+                last_sent = time.monotonic()
+                yield part
+                sent = time.monotonic() - last_sent
+                adapter.observe(sent, len(part))
+                profiler.record('send', sent)
+                if adapter.quality != quality:
+                    self.quality_changes += 1
+        finally:
+            self.subscribers -= 1
+
+    def stats(self):
+        return {
+            'running': self.running,
+            'subscribers': self.subscribers,
+            'published': self.published,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'quality_changes': self.quality_changes,
+            'encodings': self.encoder.stats()
+        }
+
+# ============================================
+# Camera Sessions
+# ============================================
+
+_error_part = None
+
+def error_part():
+    """Cached (multipart part, frame) of the 'not responding' placeholder"""
+    global _error_part
+    if _error_part is None:
+        _error_part = mjpeg_part(encode_error_frame())
+    return _error_part, error_frame()
+
+
+def check_async_camera_url(url):
+    """check_camera_url for this server: HTTP cameras only"""
+    if isinstance(url, str) and url.startswith('udp://'):
+        raise ValueError(f"UDP camera '{url}' is not supported by the async server; "
+                         f"run esp32_stream_server.py for udp:// devices")
+    return check_camera_url(url, schemes=('http',))
+
+
+class AsyncCameraSession:
+    """One camera: detection state, async ingest, capture task and feed hub (HTTP cameras only)"""
+
+    def __init__(self, device_id, stream_url, capture_url, http, cpu_executor):
+        for url in (stream_url, capture_url):
+            if url is not None:
+                check_async_camera_url(url)
+        self.device_id = device_id
+        self.state = DetectionState(device_id)
+        self.state.tracker = create_session_tracker()
+        self.state.gate = create_motion_gate()
+        self.state.eye_schedule = create_eye_schedule()
+        self.recorder = ClipRecorder(device_id, CLIP_DIR, pre_seconds=CLIP_PRE_SECONDS,
+                                     post_seconds=CLIP_POST_SECONDS, max_bytes=CLIP_MAX_BYTES,
+                                     max_clip_seconds=CLIP_MAX_SECONDS, max_clip_bytes=CLIP_MAX_CLIP_BYTES)
+        self.state.recorder = self.recorder
+        self.ingest = AsyncCameraIngest(stream_url, capture_url, http, mode=INGEST_MODE, timeout=3)
+        self.state.actuate = create_buzzer_trigger(self.ingest)
+        self.scheduler = FrameScheduler(target_fps=TARGET_FPS, max_detect_interval=MAX_DETECT_INTERVAL)
+        self.hub = AsyncFrameHub(device_id, executor=cpu_executor)
+        self.cpu_executor = cpu_executor
+        self._task = None
+        self.render_errors = 0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self.recorder.start()
+            self.hub.running = True
+            self._task = asyncio.create_task(self._run(), name=f"capture-{self.device_id}")
+
+    async def stop(self):
+        self.hub.stop()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.ingest.close()
+        await asyncio.get_running_loop().run_in_executor(self.cpu_executor, self.recorder.close)
+        if self.state.tracker is not None:
+            self.state.tracker.close()
+
+    async def fetch_jpeg(self):
+        """Next JPEG and the time.time() it arrived"""
+        start = time.perf_counter()
+        jpeg = await self.ingest.read_jpeg()
+        profiler.record('fetch', time.perf_counter() - start)
+        return jpeg, time.time()
+
+    def render(self, jpeg, run_detection, captured_at=None):
+        """Decode, detect, annotate and encode one frame (runs on a worker thread)
+
+        Returns (mjpeg part, annotated frame) or None.
+        """
+        if jpeg is None:
+            return error_part()
+        with profiler.time('decode'):
+            frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            return None
+        processed = process_frame(self.state, frame, run_detection, captured_at)
+        with profiler.time('encode'):
+            encoded = encode_jpeg(processed, JPEG_QUALITY)
+        if encoded is None:
+            return None
+        self.recorder.add(encoded)
+        return mjpeg_part(encoded), processed
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        # Fetch one frame ahead so network wait overlaps with processing
+        next_jpeg = asyncio.ensure_future(self.fetch_jpeg())
+        try:
+            while True:
+                run_detection = self.scheduler.begin_frame()
+                jpeg, captured_at = await next_jpeg
+                next_jpeg = asyncio.ensure_future(self.fetch_jpeg())
+
+                start = time.perf_counter()
+                try:
+                    rendered = await loop.run_in_executor(self.cpu_executor, self.render, jpeg, run_detection,
+                                                          captured_at)
+                except Exception as e:
+                    print(f"[{self.device_id}] frame error: {e}")
+                    self.render_errors += 1
+                    rendered = None
+                if rendered is not None:
+                    self.hub.publish(*rendered)
+
+                await asyncio.sleep(self.scheduler.end_frame(cost=time.perf_counter() - start))
+        finally:
+            next_jpeg.cancel()
+
+    def status(self):
+        state = self.state
+        with state.lock:
+            return {
+                'device': self.device_id,
+                'source': state.source,
+                'connected': state.is_connected,
+                'detection_active': state.detection_active,
+                'detector_ready': state.is_connected and detector_ready(),
+                'stats': state.stats.copy(),
+                'windows': state.windows.windows(),
+                'latest': state.latest.copy(),
+                'feed': dict(self.hub.stats(), scheduler=self.scheduler.stats(),
+                             render_errors=self.render_errors),
+                'pipeline': None,
+                'ingest': self.ingest.stats(),
+                'tracker': state.tracker.stats() if state.tracker is not None else None,
+                'gate': state.gate.stats() if state.gate is not None else None,
+                'eye_schedule': state.eye_schedule.stats() if state.eye_schedule is not None else None,
+                'recorder': self.recorder.stats()
+            }
+
+# ============================================
+# API Endpoints
+# ============================================
+
+routes = web.RouteTableDef()
+
+
+def device_not_found(device_id):
+    return web.json_response({'success': False, 'error': f"Unknown device '{device_id}'"}, status=404)
+
+
+def get_session(request, device_id=None):
+    device_id = device_id or request.match_info.get('device_id', DEFAULT_DEVICE_ID)
+    return device_id, request.app['sessions'].get(device_id)
+
+
+@routes.get('/api/health')
+async def health_check(request):
+    """Health check endpoint"""
+    default = request.app['sessions'].get(DEFAULT_DEVICE_ID)
+    return web.json_response(dict(health(), server_mode='async',
+                                  esp32_connected=default is not None and default.state.is_connected,
+                                  sessions=len(request.app['sessions'])))
+
+
+@routes.get('/api/ready')
+async def readiness_check(request):
+    """Readiness probe: 200 once the required startup stages are ready, 503 while loading or after a failure"""
+    return web.json_response(startup.snapshot(), status=200 if startup.ready else 503)
+
+
+@routes.get('/api/devices')
+async def list_devices(request):
+    """List camera sessions"""
+    return web.json_response({
+        'devices': [{
+            'device': session.device_id,
+            'connected': session.state.is_connected,
+            'subscribers': session.hub.subscribers
+        } for session in request.app['sessions'].values()]
+    })
+
+
+@routes.post('/api/connect')
+@routes.post('/api/{device_id}/connect')
+async def connect_device(request):
+    """Connect/disconnect a camera session (new devices need stream_url/capture_url)
+
+    Disconnecting removes the session; a device from DEVICES reconnects with its
+    configured URLs.
+    """
+    device_id = request.match_info.get('device_id', DEFAULT_DEVICE_ID)
+    try:
+        data = await request.json() if request.can_read_body else {}
+    except ValueError:
+        data = {}
+    source = data.get('source', 'esp32cam')
+    action = data.get('action', 'connect')
+    sessions = request.app['sessions']
+
+    session = sessions.get(device_id)
+    if action == 'disconnect':
+        if session is None:
+            return device_not_found(device_id)
+        with session.state.lock:
+            session.state.is_connected = False
+            session.state.source = None
+            session.state.detection_active = False
+        sessions.pop(device_id, None)
+        await session.stop()
+        forget_session(device_id)
+        return web.json_response({'success': True, 'action': 'disconnected', 'device': device_id})
+
+    created = session is None
+    if created:
+        urls = DEVICES.get(device_id, {})
+        stream_url = data.get('stream_url', urls.get('stream_url'))
+        capture_url = data.get('capture_url', urls.get('capture_url'))
+        if stream_url is None and capture_url is None:
+            return device_not_found(device_id)
+        try:
+            for url in (stream_url, capture_url):
+                if url is not None:
+                    check_async_camera_url(url)
+        except ValueError as e:
+            return web.json_response({'success': False, 'device': device_id, 'error': str(e)}, status=400)
+        session = sessions[device_id] = AsyncCameraSession(
+            device_id, stream_url, capture_url or stream_url,
+            request.app['http'], request.app['cpu_executor'])
+
+    # Test ESP32-CAM connection
+    if await session.ingest.read_jpeg() is not None:
+        state = session.state
+        with state.lock:
+            state.is_connected = True
+            state.source = source
+            state.detection_active = True
+        session.start()
+        return web.json_response({
+            'success': True,
+            'source': source,
+            'device': device_id,
+            'message': 'ESP32-CAM connected successfully'
+        })
+    if created:
+        # Don't keep a session for a camera that never answered
+        sessions.pop(device_id, None)
+        await session.stop()
+    return web.json_response({
+        'success': False,
+        'source': source,
+        'device': device_id,
+        'error': f'Unable to connect to ESP32-CAM at {session.ingest.capture_url}'
+    }, status=500)
+
+
+@routes.get('/api/feed')
+@routes.get('/api/{device_id}/feed')
+async def video_feed(request):
+    """MJPEG video stream endpoint"""
+    device_id, session = get_session(request)
+    if session is None:
+        return device_not_found(device_id)
+    try:
+        profile = StreamProfile.from_args(request.query, STREAM_PROFILES, JPEG_QUALITY)
+    except ValueError as e:
+        return web.json_response({'success': False, 'error': str(e)}, status=400)
+    response = web.StreamResponse(headers={
+        'Content-Type': 'multipart/x-mixed-replace; boundary=frame',
+        'Cache-Control': 'no-cache'
+    })
+    await response.prepare(request)
+    try:
+        async for part in session.hub.subscribe(profile=profile):
+            # Waits for this client's socket to drain; the hub keeps only the newest frame
+            await response.write(part)
+    except ConnectionResetError:
+        pass
+    return response
+
+
+@routes.get('/api/events')
+@routes.get('/api/{device_id}/events')
+async def event_stream(request):
+    """Server-Sent Events stream: snapshot, then coalesced 'delta' and immediate 'alert' events"""
+    device_id, session = get_session(request)
+    if session is None:
+        return device_not_found(device_id)
+    last_event_id = request.headers.get('Last-Event-ID', request.query.get('last_event_id'))
+    try:
+        cursor = int(last_event_id) if last_event_id is not None else None
+    except ValueError:
+        cursor = None
+
+    response = web.StreamResponse(headers={
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    await response.prepare(request)
+    signal = request.app['event_signal']
+    request.app['event_subscribers'] += 1
+    try:
+        cursor, chunks = events.poll(cursor, device_id)
+        await response.write(b''.join(chunks))
+        while not events.closed:
+            fired = await signal.wait(EVENT_KEEPALIVE)
+            cursor, chunks = events.poll(cursor, device_id)
+            if chunks:
+                await response.write(b''.join(chunks))
+            elif not fired:
+                await response.write(b': keepalive\n\n')
+    except ConnectionResetError:
+        pass
+    finally:
+        request.app['event_subscribers'] -= 1
+    return response
+
+
+@routes.get('/api/history')
+@routes.get('/api/{device_id}/history')
+async def get_history(request):
+    """Downsampled feature aggregates and alert events over ?from=&to= (epoch seconds)"""
+    device_id, session = get_session(request)
+    if session is None and not history.has_device(device_id):
+        return device_not_found(device_id)
+    try:
+        t0, t1, resolution = parse_history_args(request.query)
+    except ValueError as e:
+        return web.json_response({'success': False, 'error': str(e)}, status=400)
+    # memmap reads and aggregation stay off the event loop
+    result = await asyncio.get_running_loop().run_in_executor(
+        request.app['cpu_executor'], history.history, device_id, t0, t1, resolution)
+    return web.json_response(result)
+
+
+@routes.get('/api/status')
+@routes.get('/api/{device_id}/status')
+async def get_status(request):
+    """Get current detection status and statistics"""
+    device_id, session = get_session(request)
+    if session is None:
+        return device_not_found(device_id)
+    status = session.status()
+    status.update(shared_status())
+    status['events'] = dict(status['events'], async_subscribers=request.app['event_subscribers'])
+    return web.json_response(status)
+
+
+@routes.get('/metrics')
+async def metrics(request):
+    """Prometheus scrape endpoint"""
+    return web.Response(body=prometheus_text(request.app['sessions'].values()).encode(),
+                        headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+# ============================================
+# App Setup
+# ============================================
+
+async def cors_preflight(request):
+    response = web.Response()
+    response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
+    response.headers['Access-Control-Allow-Headers'] = request.headers.get(
+        'Access-Control-Request-Headers', 'Content-Type')
+    return response
+
+
+async def add_cors_headers(request, response):
+    """Runs before headers are sent, so it also covers streaming responses"""
+    origin = request.headers.get('Origin')
+    if origin in ALLOWED_ORIGINS:
+        response.headers['Access-Control-Allow-Origin'] = origin
+        response.headers['Vary'] = 'Origin'
+
+
+async def flush_events(app):
+    """Flush coalesced status updates on time even when no new frames arrive"""
+    while True:
+        await asyncio.sleep(EVENT_MIN_INTERVAL)
+        events.flush_due()
+
+
+async def on_startup(app):
+    loop = asyncio.get_running_loop()
+    detection_core.start()
+    app['http'] = aiohttp.ClientSession()
+    app['cpu_executor'] = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix='frame')
+    app['sessions'] = {}
+    for device_id, urls in DEVICES.items():
+        try:
+            app['sessions'][device_id] = AsyncCameraSession(device_id, urls['stream_url'], urls['capture_url'],
+                                                            app['http'], app['cpu_executor'])
+        except ValueError as e:
+            print(f"✗ [{device_id}] not started: {e}")
+    app['event_signal'] = LoopSignal(loop)
+    app['event_subscribers'] = 0
+    events.add_listener(app['event_signal'].fire_threadsafe)
+    app['flush_task'] = asyncio.create_task(flush_events(app))
+
+
+async def on_cleanup(app):
+    events.remove_listener(app['event_signal'].fire_threadsafe)
+    app['flush_task'].cancel()
+    for session in list(app['sessions'].values()):
+        await session.stop()
+    await app['http'].close()
+    app['cpu_executor'].shutdown(wait=False)
+    detection_core.close()
+
+
+def create_app():
+    app = web.Application()
+    app.add_routes(routes)
+    app.router.add_route('OPTIONS', '/api/{tail:.*}', cors_preflight)
+    app.on_response_prepare.append(add_cors_headers)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+# ============================================
+# Main
+# ============================================
+
+if __name__ == '__main__':
+    print("\n" + "=" * 60)
+    print("ESP32-CAM Server Starting (asyncio mode)...")
+    print("=" * 60)
+    print(f"Server will run on: http://localhost:{PORT}")
+    print(f"Video feed: http://localhost:{PORT}/api/feed")
+    print(f"Per-device feed: http://localhost:{PORT}/api/<device>/feed")
+    print(f"Status events (SSE): http://localhost:{PORT}/api/events")
+    print(f"Health check: http://localhost:{PORT}/api/health")
+    print(f"Readiness: http://localhost:{PORT}/api/ready")
+    print(f"Metrics (Prometheus): http://localhost:{PORT}/metrics")
+    print("=" * 60 + "\n")
+
+    web.run_app(create_app(), host=HOST, port=PORT)
@@ -0,0 +1,333 @@
+"""
+ESP32-CAM Frame Ingest
+Reads frames from the camera over one long-lived MJPEG stream connection
+instead of opening a new HTTP request per frame, with automatic reconnects
+and /capture polling as a fallback.
+"""
+
+import time
+import urllib.request
+from urllib.parse import urlsplit
+from threading import Lock, Thread
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+JPEG_SOI = b'\xff\xd8'
+JPEG_EOI = b'\xff\xd9'
+HEADER_END = b'\r\n\r\n'
+
+
+def check_camera_url(url, schemes=('http', 'udp')):
+    """Raise ValueError unless url is an http://host/... camera URL or a udp://[host]:port receiver"""
+    if not isinstance(url, str):
+        raise ValueError(f"Camera URL must be a string, got {type(url).__name__}")
+    parts = urlsplit(url)
+    if parts.scheme not in schemes:
+        raise ValueError(f"Unsupported camera URL '{url}' (expected {' or '.join(s + '://' for s in schemes)})")
+    try:
+        parts.port
+    except ValueError:
+        raise ValueError(f"Invalid port in camera URL '{url}'") from None
+    if parts.scheme == 'udp' and parts.path not in ('', '/'):
+        raise ValueError(f"UDP camera URL '{url}' must be udp://[host]:port")
+    if parts.scheme != 'udp' and not parts.hostname:
+        raise ValueError(f"Camera URL '{url}' has no host")
+    return url
+
+
+def poll_capture_jpeg(capture_url, timeout=3):
+    """Fetch the encoded bytes of a single frame with a one-shot /capture request"""
+    try:
+        req = urllib.request.Request(capture_url, headers={'User-Agent': 'Mozilla/5.0'})
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            return response.read()
+    except Exception as e:
+        print(f"Error fetching ESP32-CAM frame: {e}")
+        return None
+
+
+def poll_capture(capture_url, timeout=3):
+    """Fetch and decode a single frame with a one-shot /capture request"""
+    jpeg = poll_capture_jpeg(capture_url, timeout=timeout)
+    if jpeg is None:
+        return None
+    return cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def find_jpeg_part(buf, max_frame_bytes=2 * 1024 * 1024):
+    """
+    Locate the next complete JPEG in a multipart stream buffer.
+
+    Returns (start, end) offsets into buf, or None if more data is needed.
+    Garbage before the next SOI marker is dropped from buf in place. Shared by
+    the blocking and asyncio stream readers.
+    """
+    start = buf.find(JPEG_SOI)
+    if start >= 0:
+        # Use the part's Content-Length when the camera sends one
+        header_end = buf.rfind(HEADER_END, 0, start + 1)
+        length = None
+        if header_end >= 0 and header_end + len(HEADER_END) == start:
+            headers = bytes(buf[:header_end]).lower()
+            idx = headers.rfind(b'content-length:')
+            if idx >= 0:
+                try:
+                    length = int(headers[idx + 15:].split(b'\r\n', 1)[0])
+                except ValueError:
+                    length = None
+
+        if length is not None:
+            if len(buf) >= start + length:
+                return start, start + length
+        else:
+            end = buf.find(JPEG_EOI, start + 2)
+            if end >= 0:
+                return start, end + 2
+    elif len(buf) > 1:
+        # Keep only a possible partial SOI marker
+        del buf[:-1]
+
+    if len(buf) > max_frame_bytes:
+        raise ValueError("no complete JPEG within max_frame_bytes")
+    return None
+
+
+class MJPEGStreamReader:
+    """
+    Incremental multipart/x-mixed-replace parser over a persistent connection.
+
+    Socket reads go through readinto() on a preallocated chunk buffer and are
+    appended to a reusable bytearray. Each JPEG part is handed to cv2.imdecode
+    as a view into that bytearray, so no per-frame bytes objects are created.
+    """
+
+    def __init__(self, stream_url, timeout=3, chunk_size=16384,
+                 initial_backoff=0.5, max_backoff=8.0, max_frame_bytes=2 * 1024 * 1024):
+        self.stream_url = stream_url
+        self.timeout = timeout
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.max_frame_bytes = max_frame_bytes
+
+        self._response = None
+        self._chunk = bytearray(chunk_size)
+        self._chunk_view = memoryview(self._chunk)
+        self._buf = bytearray()
+        self._backoff = initial_backoff
+        self._next_attempt = 0.0
+
+        self.connects = 0
+        self.disconnects = 0
+        self.frames = 0
+        self.decode_errors = 0
+        self.bytes_read = 0
+
+    @property
+    def connected(self):
+        return self._response is not None
+
+    def available(self):
+        """False while waiting out a reconnect backoff"""
+        return self.connected or time.monotonic() >= self._next_attempt
+
+    def _connect(self):
+        req = urllib.request.Request(self.stream_url, headers={'User-Agent': 'Mozilla/5.0'})
+        self._response = urllib.request.urlopen(req, timeout=self.timeout)
+        self._buf.clear()
+        self.connects += 1
+
+    def close(self):
+        if self._response is not None:
+            try:
+                self._response.close()
+            except Exception:
+                pass
+            self._response = None
+
+    def _fail(self, error):
+        print(f"ESP32-CAM stream error: {error} (retry in {self._backoff:.1f}s)")
+        self.close()
+        self.disconnects += 1
+        self._next_attempt = time.monotonic() + self._backoff
+        self._backoff = min(self._backoff * 2, self.max_backoff)
+
+    def _fill(self):
+        n = self._response.readinto(self._chunk_view)
+        if not n:
+            raise ConnectionError("stream closed by camera")
+        self._buf += self._chunk_view[:n]
+        self.bytes_read += n
+
+    def _next_part(self):
+        """Return (start, end) of the next complete JPEG in the buffer, reading as needed"""
+        while True:
+            part = find_jpeg_part(self._buf, self.max_frame_bytes)
+            if part is not None:
+                return part
+            self._fill()
+
+    def _read_part(self):
+        if not self.available():
+            return None
+        try:
+            if self._response is None:
+                self._connect()
+            return self._next_part()
+        except Exception as e:
+            self._fail(e)
+            return None
+
+    def read_jpeg(self):
+        """Return the next JPEG as bytes (a copy, safe to hand to another thread)"""
+        part = self._read_part()
+        if part is None:
+            return None
+        start, end = part
+        jpeg = bytes(self._buf[start:end])
+        del self._buf[:end]
+        self.frames += 1
+        self._backoff = self.initial_backoff
+        return jpeg
+
+    def read_frame(self):
+        """Return the next decoded frame, or None if the stream is unavailable"""
+        part = self._read_part()
+        if part is None:
+            return None
+        start, end = part
+
+        with memoryview(self._buf) as view:
+            jpeg = np.frombuffer(view[start:end], dtype=np.uint8)
+            frame = cv2.imdecode(jpeg, cv2.IMREAD_COLOR)
+            del jpeg
+        del self._buf[:end]
+
+        if frame is None:
+            self.decode_errors += 1
+            return None
+        self.frames += 1
+        self._backoff = self.initial_backoff
+        return frame
+
+    def stats(self):
+        return {
+            'connected': self.connected,
+            'connects': self.connects,
+            'disconnects': self.disconnects,
+            'frames': self.frames,
+            'decode_errors': self.decode_errors,
+            'bytes_read': self.bytes_read
+        }
+
+
+class CameraIngest:
+    """
+    Frame source for the server: persistent MJPEG stream when available,
+    /capture polling while the stream is down or when mode is 'capture'.
+    """
+
+    def __init__(self, stream_url, capture_url, mode='stream', timeout=3):
+        self.capture_url = capture_url
+        self.mode = mode
+        self.timeout = timeout
+        self.stream = MJPEGStreamReader(stream_url, timeout=timeout) if mode == 'stream' else None
+        self._lock = Lock()
+        self.polled_frames = 0
+
+    def read(self):
+        with self._lock:
+            if self.stream is not None and self.stream.available():
+                frame = self.stream.read_frame()
+                if frame is not None:
+                    return frame
+
+            frame = poll_capture(self.capture_url, timeout=self.timeout)
+            if frame is not None:
+                self.polled_frames += 1
+            return frame
+
+    def read_jpeg(self):
+        """Like read(), but returns undecoded JPEG bytes for a separate decode stage"""
+        with self._lock:
+            if self.stream is not None and self.stream.available():
+                jpeg = self.stream.read_jpeg()
+                if jpeg is not None:
+                    return jpeg
+
+            jpeg = poll_capture_jpeg(self.capture_url, timeout=self.timeout)
+            if jpeg is not None:
+                self.polled_frames += 1
+            return jpeg
+
+    @property
+    def device_host(self):
+        """Camera address, for commands sent back to the device"""
+        return urlsplit(self.capture_url).hostname
+
+    def close(self):
+        with self._lock:
+            if self.stream is not None:
+                self.stream.close()
+
+    def stats(self):
+        stats = {'mode': self.mode, 'polled_frames': self.polled_frames}
+        if self.stream is not None:
+            stats['stream'] = self.stream.stats()
+        return stats
+
+
+# ============================================
+# Local stub camera (for testing without hardware)
+# ============================================
+
+def serve_stub_camera(jpegs, host='127.0.0.1', port=0, fps=30, boundary='123456789000000000000987654321',
+                      max_frames=None):
+    """
+    Start an HTTP server that mimics the ESP32-CAM endpoints with canned JPEGs.
+
+    Serves /stream (multipart MJPEG, like the CameraWebServer firmware) and
+    /capture (single JPEG). With max_frames set, each /stream connection is
+    closed after that many parts, like a camera dropping the client. Returns
+    (server, base_url); call server.shutdown() when done.
+    """
+    frames = [bytes(j) for j in jpegs]
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.startswith('/capture'):
+                body = frames[0]
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/jpeg')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            elif self.path.startswith('/stream'):
+                self.send_response(200)
+                self.send_header('Content-Type', f'multipart/x-mixed-replace;boundary={boundary}')
+                self.end_headers()
+                i = 0
+                try:
+                    while max_frames is None or i < max_frames:
+                        body = frames[i % len(frames)]
+                        self.wfile.write(f'\r\n--{boundary}\r\nContent-Type: image/jpeg\r\n'
+                                         f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+                        self.wfile.flush()
+                        i += 1
+                        time.sleep(1.0 / fps)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                self.close_connection = True
+            else:
+                self.send_error(404)
+
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
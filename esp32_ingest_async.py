@@ -0,0 +1,162 @@
+"""
+ESP32-CAM Frame Ingest (asyncio)
+Non-blocking counterparts of esp32_ingest's stream reader and ingest for the
+asyncio server: one persistent MJPEG connection per camera read with aiohttp,
+reconnects with backoff, and /capture polling as a fallback. Multipart
+parsing is shared with the blocking reader.
+"""
+
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from esp32_ingest import find_jpeg_part
+
+
+async def poll_capture_jpeg_async(http, capture_url, timeout=3):
+    """Fetch the encoded bytes of a single frame with a one-shot /capture request"""
+    try:
+        async with http.get(capture_url, timeout=aiohttp.ClientTimeout(total=timeout),
+                            headers={'User-Agent': 'Mozilla/5.0'}) as response:
+            response.raise_for_status()
+            return await response.read()
+    except Exception as e:
+        print(f"Error fetching ESP32-CAM frame: {e}")
+        return None
+
+
+class AsyncMJPEGStreamReader:
+    """Incremental multipart/x-mixed-replace parser over an aiohttp response"""
+
+    def __init__(self, stream_url, http, timeout=3,
+                 initial_backoff=0.5, max_backoff=8.0, max_frame_bytes=2 * 1024 * 1024):
+        self.stream_url = stream_url
+        self.http = http
+        self.timeout = timeout
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.max_frame_bytes = max_frame_bytes
+
+        self._response = None
+        self._buf = bytearray()
+        self._backoff = initial_backoff
+        self._next_attempt = 0.0
+
+        self.connects = 0
+        self.disconnects = 0
+        self.frames = 0
+        self.bytes_read = 0
+
+    @property
+    def connected(self):
+        return self._response is not None
+
+    def available(self):
+        """False while waiting out a reconnect backoff"""
+        return self.connected or time.monotonic() >= self._next_attempt
+
+    async def _connect(self):
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=self.timeout, sock_read=self.timeout)
+        response = await self.http.get(self.stream_url, timeout=timeout,
+                                       headers={'User-Agent': 'Mozilla/5.0'})
+        if response.status != 200:
+            response.release()
+            raise ConnectionError(f"HTTP {response.status}")
+        self._response = response
+        self._buf.clear()
+        self.connects += 1
+
+    def close(self):
+        if self._response is not None:
+            self._response.close()
+            self._response = None
+
+    def _fail(self, error):
+        print(f"ESP32-CAM stream error: {error!r} (retry in {self._backoff:.1f}s)")
+        self.close()
+        self.disconnects += 1
+        self._next_attempt = time.monotonic() + self._backoff
+        self._backoff = min(self._backoff * 2, self.max_backoff)
+
+    async def read_jpeg(self):
+        """Return the next JPEG as bytes, or None if the stream is unavailable"""
+        if not self.available():
+            return None
+        try:
+            if self._response is None:
+                await self._connect()
+            while True:
+                part = find_jpeg_part(self._buf, self.max_frame_bytes)
+                if part is not None:
+                    break
+                chunk = await self._response.content.readany()
+                if not chunk:
+                    raise ConnectionError("stream closed by camera")
+                self._buf += chunk
+                self.bytes_read += len(chunk)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._fail(e)
+            return None
+
+        start, end = part
+        jpeg = bytes(self._buf[start:end])
+        del self._buf[:end]
+        self.frames += 1
+        self._backoff = self.initial_backoff
+        return jpeg
+
+    def stats(self):
+        return {
+            'connected': self.connected,
+            'connects': self.connects,
+            'disconnects': self.disconnects,
+            'frames': self.frames,
+            'bytes_read': self.bytes_read
+        }
+
+
+class AsyncCameraIngest:
+    """
+    Frame source for the asyncio server: persistent MJPEG stream when
+    available, /capture polling while the stream is down or when mode is 'capture'.
+    """
+
+    def __init__(self, stream_url, capture_url, http, mode='stream', timeout=3):
+        self.capture_url = capture_url
+        self.http = http
+        self.mode = mode
+        self.timeout = timeout
+        self.stream = AsyncMJPEGStreamReader(stream_url, http, timeout=timeout) if mode == 'stream' else None
+        self._lock = asyncio.Lock()
+        self.polled_frames = 0
+
+    async def read_jpeg(self):
+        async with self._lock:
+            if self.stream is not None and self.stream.available():
+                jpeg = await self.stream.read_jpeg()
+                if jpeg is not None:
+                    return jpeg
+
+            jpeg = await poll_capture_jpeg_async(self.http, self.capture_url, timeout=self.timeout)
+            if jpeg is not None:
+                self.polled_frames += 1
+            return jpeg
+
+    @property
+    def device_host(self):
+        """Camera address, for commands sent back to the device"""
+        return urlsplit(self.capture_url).hostname
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+
+    def stats(self):
+        stats = {'mode': self.mode, 'polled_frames': self.polled_frames}
+        if self.stream is not None:
+            stats['stream'] = self.stream.stats()
+        return stats
@@ -2,467 +2,436 @@
 ESP32-CAM Video Streaming Server with Drowsiness Detection
 Flask server that fetches frames from ESP32-CAM, processes them with MediaPipe,
 and streams annotated video with detection overlays to React frontend.
+For many concurrent viewers, esp32_async_server.py serves the same API on asyncio.
+
+Configuration, models and the detection functions live in detection_core.py;
+importing this module starts them (detection_core.start()) and creates the
+camera sessions in DEVICES.
 """
 
 from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 import cv2
 import numpy as np
-import tensorflow as tf
-import pickle
 import time
-import mediapipe as mp
-from mediapipe.tasks import python
-from mediapipe.tasks.python import vision
-import urllib.request
-import os
 from threading import Lock
-from collections import deque
+
+import detection_core
+from detection_core import (
+    CLIP_DIR, CLIP_MAX_BYTES, CLIP_MAX_CLIP_BYTES, CLIP_MAX_SECONDS, CLIP_POST_SECONDS, CLIP_PRE_SECONDS,
+    DEFAULT_DEVICE_ID, DEVICES, INGEST_MODE, JPEG_QUALITY, MAX_DETECT_INTERVAL, STREAM_PROFILES, TARGET_FPS,
+    NO_FACE_OVERLAY, DetectionState, analyze_on_workers, apply_detection, create_buzzer_trigger,
+    create_eye_schedule, create_motion_gate, create_session_tracker, detector_ready, draw_overlays,
+    encode_error_frame, error_frame, events, forget_session, health, history, process_frame, profiler,
+    prometheus_text, reuse_detection, shared_status, startup
+)
+from clip_recorder import ClipRecorder
+from esp32_ingest import CameraIngest, check_camera_url
+from esp32_udp_ingest import UdpFrameReceiver, gray_to_bgr
+from feature_store import parse_history_args
+from frame_buffers import encode_jpeg
+from frame_hub import FrameHub
+from frame_pipeline import FramePipeline, PipelineStage
+from frame_scheduler import FrameScheduler
+from stream_profiles import StreamProfile
 
 # ============================================
 # Configuration
 # ============================================
 
-ESP32_CAM_URL = "http://192.168.4.1/capture"
-MODEL_PATH = 'face_landmarker.task'
-TFLITE_MODEL_PATH = 'drowsiness_model.tflite'
-SCALER_PATH = 'scaler.pkl'
+PROCESSING_MODE = 'pipeline'  # 'pipeline' (staged worker threads) or 'serial' (one loop)
+PIPELINE_WORKERS = {'decode': 1, 'detect': 2, 'encode': 2}  # detect = frames in flight per session
+PIPELINE_QUEUE_SIZE = 2
+UDP_FRAME_SCALE = 8  # upscale for the 80x60 raw UDP frames before detection
 
 # Flask app setup
 app = Flask(__name__)
 CORS(app, origins=["http://localhost:3000"])
 
 # ============================================
-# Global State
+# Camera Sessions
 # ============================================
 
-class DetectionState:
-    def __init__(self):
-        self.is_connected = False
-        self.source = None
-        self.detector_ready = False
-        self.detection_active = False
-        self.lock = Lock()
-        
-        # Detection statistics
-        self.stats = {
-            'total_frames': 0,
-            'drowsy_frames': 0,
-            'alert_frames': 0,
-            'blinks_30s': 0,
-            'yawns_60s': 0,
-            'consecutive_drowsy': 0
-        }
-        
-        # Latest detection data
-        self.latest = {
-            'ear': 0.0,
-            'mar': 0.0,
-            'left_ear': 0.0,
-            'right_ear': 0.0,
-            'prediction': 0.0,
-            'status': 'No face detected',
-            'alert_type': None,
-            'timestamp': None
-        }
-        
-        # Time-windowed counters
-        self.blink_times = deque(maxlen=100)
-        self.yawn_times = deque(maxlen=100)
+class CameraSession:
+    """One camera / vehicle: detection state, ingest, feed hub and pipeline
+    
+    Sessions only own their I/O and per-frame bookkeeping; landmark
+    detection runs on the shared detection_workers.
+    """
+    
+    def __init__(self, device_id, stream_url, capture_url, ingest_mode=INGEST_MODE):
+        self.device_id = device_id
+        self.state = DetectionState(device_id)
+        self.state.tracker = create_session_tracker()
+        self.state.gate = create_motion_gate()
+        self.state.eye_schedule = create_eye_schedule()
+        self.recorder = ClipRecorder(device_id, CLIP_DIR, pre_seconds=CLIP_PRE_SECONDS,
+                                     post_seconds=CLIP_POST_SECONDS, max_bytes=CLIP_MAX_BYTES,
+                                     max_clip_seconds=CLIP_MAX_SECONDS, max_clip_bytes=CLIP_MAX_CLIP_BYTES)
+        self.state.recorder = self.recorder
+        if stream_url is not None and stream_url.startswith('udp://'):
+            self.ingest = UdpFrameReceiver.from_url(stream_url, read_timeout=3, scale=UDP_FRAME_SCALE)
+            self.raw_frames = True
+        else:
+            self.ingest = CameraIngest(stream_url, capture_url, mode=ingest_mode, timeout=3)
+            self.raw_frames = False
+        self.state.actuate = create_buzzer_trigger(self.ingest)
+        self.scheduler = FrameScheduler(target_fps=TARGET_FPS, max_detect_interval=MAX_DETECT_INTERVAL)
         
-        # Previous states for event detection
-        self.prev_ear = 0.3
-        self.eyes_closed = False
-
-state = DetectionState()
-
-# ============================================
-# Load Models
-# ============================================
-
-print("=" * 60)
-print("ESP32-CAM DROWSINESS DETECTION SERVER")
-print("=" * 60)
-
-# Load TFLite model
-try:
-    interpreter = tf.lite.Interpreter(model_path=TFLITE_MODEL_PATH)
-    interpreter.allocate_tensors()
-    input_details = interpreter.get_input_details()
-    output_details = interpreter.get_output_details()
-    print("✓ TFLite model loaded")
-except Exception as e:
-    print(f"✗ Error loading TFLite model: {e}")
-    interpreter = None
-
-# Load scaler
-try:
-    with open(SCALER_PATH, 'rb') as f:
-        scaler = pickle.load(f)
-    print("✓ Scaler loaded")
-except Exception as e:
-    print(f"✗ Error loading scaler: {e}")
-    scaler = None
-
-# Download MediaPipe model if needed
-if not os.path.exists(MODEL_PATH):
-    print(f"\nDownloading MediaPipe Face Landmarker model...")
-    model_url = 'https://storage.googleapis.com/mediapipe-models/face_landmarker/face_landmarker/float16/1/face_landmarker.task'
-    try:
-        urllib.request.urlretrieve(model_url, MODEL_PATH)
-        print(f"✓ Model downloaded: {MODEL_PATH}")
-    except Exception as e:
-        print(f"✗ Download failed: {e}")
-
-# Initialize MediaPipe Face Landmarker
-BaseOptions = python.BaseOptions
-FaceLandmarker = vision.FaceLandmarker
-FaceLandmarkerOptions = vision.FaceLandmarkerOptions
-VisionRunningMode = vision.RunningMode
-
-options_image = FaceLandmarkerOptions(
-    base_options=BaseOptions(model_asset_path=MODEL_PATH),
-    running_mode=VisionRunningMode.IMAGE,
-    num_faces=1,
-    min_face_detection_confidence=0.5,
-    min_face_presence_confidence=0.5,
-    min_tracking_confidence=0.5
-)
-
-print("✓ MediaPipe Face Landmarker initialized")
-
-# MediaPipe landmark indices
-LEFT_EYE = [33, 160, 158, 133, 153, 144]
-RIGHT_EYE = [362, 385, 387, 263, 373, 380]
-MOUTH = [61, 291, 0, 17, 84, 314, 405, 321, 375, 291]
-
-# ============================================
-# Detection Functions
-# ============================================
-
-def calculate_ear(eye_landmarks):
-    """Calculate Eye Aspect Ratio"""
-    A = np.linalg.norm(eye_landmarks[1] - eye_landmarks[5])
-    B = np.linalg.norm(eye_landmarks[2] - eye_landmarks[4])
-    C = np.linalg.norm(eye_landmarks[0] - eye_landmarks[3])
-    ear = (A + B) / (2.0 * C + 1e-6)
-    return ear
-
-def calculate_mar(mouth_landmarks):
-    """Calculate Mouth Aspect Ratio"""
-    A = np.linalg.norm(mouth_landmarks[1] - mouth_landmarks[7])
-    B = np.linalg.norm(mouth_landmarks[2] - mouth_landmarks[6])
-    C = np.linalg.norm(mouth_landmarks[3] - mouth_landmarks[5])
-    D = np.linalg.norm(mouth_landmarks[0] - mouth_landmarks[4])
-    mar = (A + B + C) / (3.0 * D + 1e-6)
-    return mar
-
-def update_time_windows():
-    """Update time-windowed counters (blinks in 30s, yawns in 60s)"""
-    current_time = time.time()
+        # One capture+detect loop per camera, shared by every feed client
+        if PROCESSING_MODE == 'pipeline':
+            self.hub = FrameHub(name=device_id, tap=self.recorder.add, quality=JPEG_QUALITY, profiler=profiler)
+            self.pipeline = FramePipeline(
+                fetch=self.fetch_frame,
+                stages=[
+                    PipelineStage('decode', self.decode_stage, workers=PIPELINE_WORKERS['decode']),
+                    PipelineStage('detect', self.detect_stage, workers=PIPELINE_WORKERS['detect'],
+                                  when=lambda job: job.run_detection and not job.reuse and job.frame is not None),
+                    PipelineStage('annotate', self.annotate_stage, ordered=True),
+                    PipelineStage('encode', self.encode_stage, workers=PIPELINE_WORKERS['encode'])
+                ],
+                sink=lambda job: self.hub.publish(job.output, job.frame),
+                scheduler=self.scheduler,
+                queue_size=PIPELINE_QUEUE_SIZE,
+                name=device_id
+            )
+        else:
+            self.hub = FrameHub(self.render_next_frame, name=device_id, scheduler=self.scheduler,
+                                tap=self.recorder.add, quality=JPEG_QUALITY, profiler=profiler)
+            self.pipeline = None
     
-    # Remove old blinks (older than 30 seconds)
-    while state.blink_times and current_time - state.blink_times[0] > 30:
-        state.blink_times.popleft()
+    def start(self):
+        self.recorder.start()
+        self.hub.start()
+        if self.pipeline is not None:
+            self.pipeline.start()
     
-    # Remove old yawns (older than 60 seconds)
-    while state.yawn_times and current_time - state.yawn_times[0] > 60:
-        state.yawn_times.popleft()
+    def stop(self):
+        if self.pipeline is not None:
+            self.pipeline.stop()
+        self.hub.stop()
+        self.ingest.close()
+        self.recorder.close()
+        if self.state.tracker is not None:
+            self.state.tracker.close()
     
-    state.stats['blinks_30s'] = len(state.blink_times)
-    state.stats['yawns_60s'] = len(state.yawn_times)
-
-# ============================================
-# ESP32-CAM Frame Fetching
-# ============================================
-
-def get_esp32_frame():
-    """Fetch a single frame from ESP32-CAM"""
-    try:
-        # Set timeout to 3 seconds
-        req = urllib.request.Request(ESP32_CAM_URL, headers={'User-Agent': 'Mozilla/5.0'})
-        with urllib.request.urlopen(req, timeout=3) as response:
-            img_array = np.asarray(bytearray(response.read()), dtype=np.uint8)
-            frame = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-            return frame
-    except Exception as e:
-        print(f"Error fetching ESP32-CAM frame: {e}")
-        return None
-
-# ============================================
-# Frame Processing with Detection
-# ============================================
-
-def process_frame(frame):
-    """Process frame with drowsiness detection and add overlays"""
-    if frame is None:
+    def render_next_frame(self, run_detection=True):
+        """Fetch, detect and encode one frame for the feed hub (serial mode)
+
+        Returns (jpeg, annotated frame) so profile viewers can re-encode it.
+        """
+        data = self.fetch_frame()
+        captured_at = time.time()
+        frame = self.decode_frame(data) if data is not None else None
+        
+        if frame is not None:
+            # Process frame with detection
+            processed_frame = process_frame(self.state, frame, run_detection, captured_at)
+            
+            if processed_frame is not None:
+                # Encode frame as JPEG (memoryview over the encoder buffer)
+                with profiler.time('encode'):
+                    encoded = encode_jpeg(processed_frame, JPEG_QUALITY)
+                if encoded is not None:
+                    return encoded, processed_frame
+        else:
+            # ESP32-CAM not responding, send error frame
+            return encode_error_frame(), error_frame()
         return None
     
-    h, w = frame.shape[:2]
+    def fetch_frame(self):
+        """Next JPEG from the camera, or a raw grayscale frame from UDP ingest"""
+        with profiler.time('fetch'):
+            return self.ingest.read_gray() if self.raw_frames else self.ingest.read_jpeg()
     
-    # Convert to RGB for MediaPipe
-    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_frame)
+    def decode_frame(self, data):
+        with profiler.time('decode'):
+            if self.raw_frames:
+                return gray_to_bgr(data, UDP_FRAME_SCALE)
+            return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
     
-    # Default status
-    status_text = "👤 No face detected"
-    status_color = (0, 0, 255)
-    bg_color = (50, 50, 50)
+    # Pipeline stages (pipeline mode)
     
-    with state.lock:
-        state.stats['total_frames'] += 1
-        update_time_windows()
+    def decode_stage(self, job):
+        if job.data is not None:
+            job.frame = self.decode_frame(job.data)
+            # Frames unchanged since the last detected one skip the detect stage
+            if job.run_detection and job.frame is not None and self.state.gate is not None:
+                job.reuse = not self.state.gate.check(job.frame)
+        return job
     
-    try:
-        # Detect face landmarks
-        with FaceLandmarker.create_from_options(options_image) as landmarker:
-            detection_result = landmarker.detect(mp_image)
-        
-        if detection_result.face_landmarks and interpreter and scaler:
-            face_landmarks = detection_result.face_landmarks[0]
-            
-            # Extract eye coordinates
-            left_eye_coords = [[face_landmarks[idx].x * w, face_landmarks[idx].y * h] for idx in LEFT_EYE]
-            right_eye_coords = [[face_landmarks[idx].x * w, face_landmarks[idx].y * h] for idx in RIGHT_EYE]
-            mouth_coords = [[face_landmarks[idx].x * w, face_landmarks[idx].y * h] for idx in MOUTH]
-            
-            left_eye = np.array(left_eye_coords)
-            right_eye = np.array(right_eye_coords)
-            mouth = np.array(mouth_coords)
-            
-            # Calculate features
-            left_ear = calculate_ear(left_eye)
-            right_ear = calculate_ear(right_eye)
-            avg_ear = (left_ear + right_ear) / 2.0
-            mar = calculate_mar(mouth)
-            ear_diff = abs(left_ear - right_ear)
-            
-            # Detect blinks (EAR drops below threshold then rises)
-            if avg_ear < 0.22 and not state.eyes_closed:
-                state.eyes_closed = True
-            elif avg_ear >= 0.22 and state.eyes_closed:
-                state.eyes_closed = False
-                state.blink_times.append(time.time())
-            
-            # Detect yawns (MAR above threshold)
-            if mar > 0.6:
-                if not state.yawn_times or time.time() - state.yawn_times[-1] > 2:
-                    state.yawn_times.append(time.time())
-            
-            # Prepare features for model
-            features = np.array([[avg_ear, left_ear, right_ear, ear_diff, mar]], dtype=np.float32)
-            features_scaled = scaler.transform(features).astype(np.float32)
-            
-            # Run inference
-            interpreter.set_tensor(input_details[0]['index'], features_scaled)
-            interpreter.invoke()
-            prediction = interpreter.get_tensor(output_details[0]['index'])[0][0]
-            
-            is_drowsy = prediction > 0.65
-            
-            # Update statistics
-            with state.lock:
-                if is_drowsy:
-                    state.stats['drowsy_frames'] += 1
-                    state.stats['consecutive_drowsy'] += 1
-                else:
-                    state.stats['alert_frames'] += 1
-                    state.stats['consecutive_drowsy'] = 0
-                
-                # Determine alert type
-                alert_type = None
-                if state.stats['consecutive_drowsy'] >= 15:
-                    status_text = "⚠️ DROWSINESS ALERT!"
-                    status_color = (0, 0, 255)
-                    bg_color = (0, 0, 150)
-                    alert_type = "CRITICAL"
-                elif avg_ear <= 0.25:
-                    status_text = "🚨 ALERT: EAR"
-                    status_color = (0, 165, 255)
-                    bg_color = (0, 50, 100)
-                    alert_type = "EAR"
-                elif mar > 0.6:
-                    status_text = "🚨 ALERT: YAWN"
-                    status_color = (0, 165, 255)
-                    bg_color = (0, 50, 100)
-                    alert_type = "YAWN"
-                elif state.stats['blinks_30s'] > 20:
-                    status_text = "🚨 ALERT: BLINK"
-                    status_color = (0, 165, 255)
-                    bg_color = (0, 50, 100)
-                    alert_type = "BLINK"
-                elif is_drowsy:
-                    status_text = "😴 Drowsy Detected"
-                    status_color = (0, 165, 255)
-                    bg_color = (0, 50, 100)
-                    alert_type = "DROWSY"
+    def detect_stage(self, job):
+        job.result = analyze_on_workers(self.state, job.frame, job.captured_at)
+        return job
+    
+    def annotate_stage(self, job):
+        if job.frame is not None:
+            if job.run_detection:
+                if job.reuse:
+                    overlay = reuse_detection(self.state, job.captured_at)
                 else:
-                    status_text = "✓ ACTIVE"
-                    status_color = (0, 255, 0)
-                    bg_color = (0, 80, 0)
-                
-                # Update latest detection data
-                state.latest = {
-                    'ear': float(avg_ear),
-                    'mar': float(mar),
-                    'left_ear': float(left_ear),
-                    'right_ear': float(right_ear),
-                    'prediction': float(prediction),
-                    'status': status_text,
-                    'alert_type': alert_type,
-                    'timestamp': time.time()
-                }
-            
-            # Draw landmarks - EYES (green)
-            for point in left_eye:
-                cv2.circle(frame, (int(point[0]), int(point[1])), 2, (0, 255, 0), -1)
-            cv2.polylines(frame, [left_eye.astype(int)], True, (0, 255, 0), 1)
-            
-            for point in right_eye:
-                cv2.circle(frame, (int(point[0]), int(point[1])), 2, (0, 255, 0), -1)
-            cv2.polylines(frame, [right_eye.astype(int)], True, (0, 255, 0), 1)
-            
-            # Draw landmarks - MOUTH (blue)
-            for point in mouth[::2]:
-                cv2.circle(frame, (int(point[0]), int(point[1])), 2, (255, 0, 0), -1)
-            cv2.polylines(frame, [mouth.astype(int)], True, (255, 0, 0), 1)
-            
-            # Draw metrics overlay (semi-transparent)
-            overlay = frame.copy()
-            cv2.rectangle(overlay, (10, h - 120), (300, h - 10), (0, 0, 0), -1)
-            cv2.addWeighted(overlay, 0.7, frame, 0.3, 0, frame)
-            
-            y_offset = h - 100
-            ear_color = (0, 255, 0) if avg_ear > 0.25 else (0, 0, 255)
-            cv2.putText(frame, f"EAR: {avg_ear:.3f}", (20, y_offset), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, ear_color, 1)
-            
-            y_offset += 25
-            mar_color = (0, 255, 0) if mar < 0.6 else (0, 0, 255)
-            cv2.putText(frame, f"MAR: {mar:.3f}", (20, y_offset), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, mar_color, 1)
-            
-            y_offset += 25
-            cv2.putText(frame, f"Blinks: {state.stats['blinks_30s']} | Yawns: {state.stats['yawns_60s']}", 
-                       (20, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+                    overlay = apply_detection(self.state, job.result, job.captured_at)
+            else:
+                overlay = self.state.last_overlay or NO_FACE_OVERLAY
+            with profiler.time('overlay'):
+                draw_overlays(job.frame, overlay, self.device_id)
+        return job
+    
+    def encode_stage(self, job):
+        if job.frame is None:
+            job.frame = error_frame()
+            job.output = encode_error_frame()
+        else:
+            with profiler.time('encode'):
+                job.output = encode_jpeg(job.frame, JPEG_QUALITY)
+        return job if job.output is not None else None
+    
+    def generate_frames(self, profile=None):
+        """Generate MJPEG stream from the session's feed hub, shaped by the viewer's profile"""
+        return self.hub.subscribe(profile=profile, source_fps=TARGET_FPS)
+    
+    def status(self):
+        state = self.state
+        with state.lock:
+            return {
+                'device': self.device_id,
+                'source': state.source,
+                'connected': state.is_connected,
+                'detection_active': state.detection_active,
+                'detector_ready': state.is_connected and detector_ready(),
+                'stats': state.stats.copy(),
+                'windows': state.windows.windows(),
+                'latest': state.latest.copy(),
+                'feed': self.hub.stats(),
+                'pipeline': self.pipeline.stats() if self.pipeline is not None else None,
+                'ingest': self.ingest.stats(),
+                'tracker': state.tracker.stats() if state.tracker is not None else None,
+                'gate': state.gate.stats() if state.gate is not None else None,
+                'eye_schedule': state.eye_schedule.stats() if state.eye_schedule is not None else None,
+                'recorder': self.recorder.stats()
+            }
+
+class SessionRegistry:
+    """Camera sessions keyed by device ID"""
     
-    except Exception as e:
-        print(f"Detection error: {e}")
+    def __init__(self):
+        self._sessions = {}
+        self._lock = Lock()
     
-    # Draw status bar at top
-    cv2.rectangle(frame, (0, 0), (w, 60), bg_color, -1)
-    cv2.putText(frame, status_text, (20, 40), 
-               cv2.FONT_HERSHEY_SIMPLEX, 0.8, status_color, 2)
+    def get(self, device_id):
+        with self._lock:
+            return self._sessions.get(device_id)
     
-    # Draw source label (bottom left)
-    cv2.putText(frame, "ESP32-CAM", (10, h - 10), 
-               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1)
+    def get_or_create(self, device_id, stream_url=None, capture_url=None):
+        with self._lock:
+            session = self._sessions.get(device_id)
+            if session is None:
+                if stream_url is None and capture_url is None:
+                    return None
+                session = CameraSession(device_id, stream_url, capture_url or stream_url)
+                self._sessions[device_id] = session
+            return session
     
-    # Draw XIAO status (bottom right) - placeholder for now
-    cv2.putText(frame, "XIAO: OFF", (w - 100, h - 10), 
-               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1)
+    def remove(self, device_id):
+        with self._lock:
+            session = self._sessions.pop(device_id, None)
+        if session is not None:
+            session.stop()
+            forget_session(device_id)
+        return session
     
-    return frame
+    def all(self):
+        with self._lock:
+            return list(self._sessions.values())
 
-# ============================================
-# Video Streaming Generator
-# ============================================
+detection_core.start()
 
-def generate_frames():
-    """Generate MJPEG stream from ESP32-CAM"""
-    while state.is_connected:
-        frame = get_esp32_frame()
-        
-        if frame is not None:
-            # Process frame with detection
-            processed_frame = process_frame(frame)
-            
-            if processed_frame is not None:
-                # Encode frame as JPEG
-                ret, buffer = cv2.imencode('.jpg', processed_frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-                if ret:
-                    frame_bytes = buffer.tobytes()
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-        else:
-            # ESP32-CAM not responding, send error frame
-            error_frame = np.zeros((480, 640, 3), dtype=np.uint8)
-            cv2.putText(error_frame, "ESP32-CAM Not Responding", (100, 240),
-                       cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-            ret, buffer = cv2.imencode('.jpg', error_frame)
-            if ret:
-                frame_bytes = buffer.tobytes()
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-        
-        time.sleep(0.033)  # ~30 FPS
+sessions = SessionRegistry()
+for _device_id, _urls in DEVICES.items():
+    sessions.get_or_create(_device_id, _urls['stream_url'], _urls['capture_url'])
 
 # ============================================
 # API Endpoints
 # ============================================
 
+def device_not_found(device_id):
+    return jsonify({'success': False, 'error': f"Unknown device '{device_id}'"}), 404
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
+    default = sessions.get(DEFAULT_DEVICE_ID)
+    return jsonify(dict(health(), esp32_connected=default is not None and default.state.is_connected,
+                        sessions=len(sessions.all())))
+
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: 200 once the required startup stages are ready, 503 while loading or after a failure"""
+    return jsonify(startup.snapshot()), 200 if startup.ready else 503
+
+@app.route('/api/devices', methods=['GET'])
+def list_devices():
+    """List camera sessions"""
     return jsonify({
-        'status': 'ok',
-        'esp32_connected': state.is_connected,
-        'detector_ready': interpreter is not None and scaler is not None,
-        'timestamp': time.time()
+        'devices': [{
+            'device': session.device_id,
+            'connected': session.state.is_connected,
+            'subscribers': session.hub.subscribers
+        } for session in sessions.all()]
     })
 
 @app.route('/api/connect', methods=['POST'])
-def connect_device():
-    """Connect/disconnect ESP32-CAM"""
+def connect_default_device():
+    """Connect/disconnect the default ESP32-CAM"""
+    return connect_device(DEFAULT_DEVICE_ID)
+
+@app.route('/api/<device_id>/connect', methods=['POST'])
+def connect_device(device_id):
+    """Connect/disconnect a camera session (new devices need stream_url/capture_url)
+    
+    Disconnecting removes the session; a device from DEVICES reconnects with its
+    configured URLs.
+    """
     data = request.get_json() or {}
     source = data.get('source', 'esp32cam')
     action = data.get('action', 'connect')
     
     if action == 'disconnect':
+        session = sessions.get(device_id)
+        if session is None:
+            return device_not_found(device_id)
+        state = session.state
         with state.lock:
             state.is_connected = False
             state.source = None
             state.detection_active = False
-        return jsonify({'success': True, 'action': 'disconnected'})
+        sessions.remove(device_id)
+        return jsonify({'success': True, 'action': 'disconnected', 'device': device_id})
+    
+    session = sessions.get(device_id)
+    created = session is None
+    if created:
+        urls = DEVICES.get(device_id, {})
+        stream_url = data.get('stream_url', urls.get('stream_url'))
+        capture_url = data.get('capture_url', urls.get('capture_url'))
+        try:
+            for url in (stream_url, capture_url):
+                if url is not None:
+                    check_camera_url(url)
+        except ValueError as e:
+            return jsonify({'success': False, 'device': device_id, 'error': str(e)}), 400
+        session = sessions.get_or_create(device_id, stream_url, capture_url)
+    if session is None:
+        return device_not_found(device_id)
+    state = session.state
     
     # Test ESP32-CAM connection
-    test_frame = get_esp32_frame()
+    test_frame = session.ingest.read()
     
     if test_frame is not None:
         with state.lock:
             state.is_connected = True
             state.source = source
             state.detection_active = True
-            state.detector_ready = interpreter is not None and scaler is not None
+        session.start()
         return jsonify({
             'success': True,
             'source': source,
+            'device': device_id,
             'message': 'ESP32-CAM connected successfully'
         })
     else:
+        if created:
+            # Don't keep a session for a camera that never answered
+            sessions.remove(device_id)
         return jsonify({
             'success': False,
             'source': source,
-            'error': 'Unable to connect to ESP32-CAM at 192.168.4.1'
+            'device': device_id,
+            'error': f'Unable to connect to ESP32-CAM at {session.ingest.capture_url}'
         }), 500
 
 @app.route('/api/feed', methods=['GET'])
-def video_feed():
-    """MJPEG video stream endpoint"""
-    return Response(generate_frames(),
+def video_feed_default():
+    """MJPEG video stream endpoint for the default camera"""
+    return video_feed(DEFAULT_DEVICE_ID)
+
+@app.route('/api/<device_id>/feed', methods=['GET'])
+def video_feed(device_id):
+    """MJPEG video stream endpoint
+    
+    Query parameters pick a stream profile: profile (a STREAM_PROFILES name),
+    width, quality, fps, kbps and adaptive=0 to pin the quality.
+    """
+    session = sessions.get(device_id)
+    if session is None:
+        return device_not_found(device_id)
+    try:
+        profile = StreamProfile.from_args(request.args, STREAM_PROFILES, JPEG_QUALITY)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return Response(session.generate_frames(profile),
                    mimetype='multipart/x-mixed-replace; boundary=frame')
 
+@app.route('/api/events', methods=['GET'])
+def events_default():
+    """Server-Sent Events stream of status deltas and alerts for the default camera"""
+    return event_stream(DEFAULT_DEVICE_ID)
+
+@app.route('/api/<device_id>/events', methods=['GET'])
+def event_stream(device_id):
+    """Server-Sent Events stream: snapshot, then coalesced 'delta' and immediate 'alert' events"""
+    if sessions.get(device_id) is None:
+        return device_not_found(device_id)
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+    try:
+        last_event_id = int(last_event_id) if last_event_id is not None else None
+    except ValueError:
+        last_event_id = None
+    return Response(events.subscribe(device_id, last_event_id),
+                   mimetype='text/event-stream',
+                   headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/history', methods=['GET'])
+def history_default():
+    """Feature/alert history for the default camera"""
+    return get_history(DEFAULT_DEVICE_ID)
+
+@app.route('/api/<device_id>/history', methods=['GET'])
+def get_history(device_id):
+    """Downsampled feature aggregates and alert events over ?from=&to= (epoch seconds)
+    
+    resolution is the bucket size in seconds; it is coarsened if the range
+    would need more than history.max_points buckets. Devices stay queryable
+    after their session is gone.
+    """
+    if sessions.get(device_id) is None and not history.has_device(device_id):
+        return device_not_found(device_id)
+    try:
+        t0, t1, resolution = parse_history_args(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify(history.history(device_id, t0, t1, resolution))
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(prometheus_text(sessions.all()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/api/status', methods=['GET'])
-def get_status():
+def get_status_default():
+    """Get current detection status and statistics for the default camera"""
+    return get_status(DEFAULT_DEVICE_ID)
+
+@app.route('/api/<device_id>/status', methods=['GET'])
+def get_status(device_id):
     """Get current detection status and statistics"""
-    with state.lock:
-        return jsonify({
-            'source': state.source,
-            'detection_active': state.detection_active,
-            'detector_ready': state.detector_ready,
-            'stats': state.stats.copy(),
-            'latest': state.latest.copy()
-        })
+    session = sessions.get(device_id)
+    if session is None:
+        return device_not_found(device_id)
+    status = session.status()
+    status.update(shared_status())
+    return jsonify(status)
 
 # ============================================
 # Main
@@ -472,9 +441,17 @@ if __name__ == '__main__':
     print("\n" + "=" * 60)
     print("ESP32-CAM Server Starting...")
     print("=" * 60)
-    print(f"Server will run on: http://localhost:5001")
-    print(f"Video feed: http://localhost:5001/api/feed")
-    print(f"Health check: http://localhost:5001/api/health")
+    print("Server will run on: http://localhost:5001")
+    print("Video feed: http://localhost:5001/api/feed")
+    print("Per-device feed: http://localhost:5001/api/<device>/feed")
+    print("Status events (SSE): http://localhost:5001/api/events")
+    print("History: http://localhost:5001/api/history?from=&to=&resolution=")
+    print("Health check: http://localhost:5001/api/health")
+    print("Readiness: http://localhost:5001/api/ready")
+    print("Metrics (Prometheus): http://localhost:5001/metrics")
     print("=" * 60 + "\n")
     
-    app.run(host='0.0.0.0', port=5001, debug=False, threaded=True)
+    try:
+        app.run(host='0.0.0.0', port=5001, debug=False, threaded=True)
+    finally:
+        detection_core.close()
@@ -0,0 +1,437 @@
+"""
+ESP32 UDP Frame Ingest
+Receives the raw grayscale frames that hardware/ESP32_I2S_Camera.ino
+broadcasts over UDP: each 80x60 frame is split into 800-byte chunks, every
+chunk prefixed with a packed little-endian PacketHeader (magic 0xCAFE,
+frameId, chunkId, chunksTotal, payloadLen, flags). There is no JPEG
+anywhere on this path; chunks are copied straight into preallocated
+per-frame reassembly buffers.
+
+Run `python esp32_udp_ingest.py --emulate` to broadcast synthetic frames
+the way the firmware does, and `python esp32_udp_ingest.py` to receive and
+print reassembly stats.
+"""
+
+import argparse
+import math
+import random
+import select
+import socket
+import struct
+import time
+from threading import Condition, Event, Thread
+from urllib.parse import urlsplit
+
+import cv2
+import numpy as np
+
+from perf_stats import LatencyHistogram
+
+PACKET_HEADER = struct.Struct('<6H')  # magic, frameId, chunkId, chunksTotal, payloadLen, flags
+MAGIC = 0xCAFE
+UDP_PORT = 5000
+FRAME_WIDTH = 80
+FRAME_HEIGHT = 60
+CHUNK_SIZE = 800
+
+
+def frame_id_newer(a, b):
+    """True if 16-bit frame ID a comes after b, allowing for wraparound"""
+    return a != b and ((a - b) & 0xFFFF) < 0x8000
+
+
+def gray_to_bgr(gray, scale=1):
+    """Upscale a small grayscale frame and expand it to 3-channel BGR for detection and overlays"""
+    if scale != 1:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_LINEAR)
+    return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+
+class _Slot:
+    """Preallocated reassembly buffer for one in-flight frame"""
+
+    __slots__ = ('frame_id', 'buffer', 'view', 'received', 'count', 'first_seen')
+
+    def __init__(self, frame_bytes, chunks):
+        self.frame_id = None
+        self.buffer = np.zeros(frame_bytes, dtype=np.uint8)
+        self.view = memoryview(self.buffer)
+        self.received = bytearray(chunks)
+        self.count = 0
+        self.first_seen = 0.0
+
+    def reset(self, frame_id, now):
+        self.frame_id = frame_id
+        self.received[:] = bytes(len(self.received))
+        self.count = 0
+        self.first_seen = now
+
+
+class ChunkReassembler:
+    """
+    Reassembles chunked frames from individual datagrams (no socket I/O).
+
+    feed() takes one datagram and returns the completed slot when it was
+    the frame's last missing chunk. At most max_in_flight frames are
+    assembled at once; the oldest is given up when another one starts, and
+    any frame still incomplete after `timeout` seconds is dropped. Once a
+    frame completes, older frames in flight are dropped too, and chunks for
+    frames at or before the newest completed one are counted as late.
+    """
+
+    def __init__(self, width=FRAME_WIDTH, height=FRAME_HEIGHT, chunk_size=CHUNK_SIZE,
+                 max_in_flight=4, timeout=0.5, resync_seconds=2.0):
+        self.width = width
+        self.height = height
+        self.chunk_size = chunk_size
+        self.frame_bytes = width * height
+        self.chunks = math.ceil(self.frame_bytes / chunk_size)
+        self.timeout = timeout
+        self.resync_seconds = resync_seconds
+
+        self._free = [_Slot(self.frame_bytes, self.chunks) for _ in range(max_in_flight)]
+        self._in_flight = {}
+        self._newest_started = None
+        self._last_completed = None
+        self._last_completed_at = 0.0
+
+        self.packets = 0
+        self.bad_packets = 0
+        self.duplicate_chunks = 0
+        self.late_chunks = 0
+        self.frames_completed = 0
+        self.frames_dropped = 0  # started but never completed (timeout, eviction, superseded)
+        self.frames_missing = 0  # frame IDs skipped entirely
+        self.chunks_lost = 0
+        self.resyncs = 0
+        self.assembly = LatencyHistogram()
+
+    def _drop(self, slot):
+        del self._in_flight[slot.frame_id]
+        self.frames_dropped += 1
+        self.chunks_lost += self.chunks - slot.count
+        self._free.append(slot)
+
+    def release(self, slot):
+        """Return a completed slot's buffer for reuse"""
+        self._free.append(slot)
+
+    def _start(self, frame_id, now):
+        if self._newest_started is not None and frame_id_newer(frame_id, self._newest_started):
+            self.frames_missing += ((frame_id - self._newest_started) & 0xFFFF) - 1
+        if self._newest_started is None or frame_id_newer(frame_id, self._newest_started):
+            self._newest_started = frame_id
+        if not self._free:
+            def age(fid):
+                return (self._newest_started - fid) & 0xFFFF
+            oldest = max(self._in_flight.values(), key=lambda s: age(s.frame_id))
+            if age(frame_id) > age(oldest.frame_id):
+                return None  # older than every frame being assembled
+            self._drop(oldest)
+        slot = self._free.pop()
+        slot.reset(frame_id, now)
+        self._in_flight[frame_id] = slot
+        return slot
+
+    def feed(self, packet, now):
+        """Take one datagram (bytes-like); returns the completed slot or None"""
+        self.packets += 1
+        if len(packet) < PACKET_HEADER.size:
+            self.bad_packets += 1
+            return None
+        magic, frame_id, chunk_id, chunks_total, payload_len, _ = PACKET_HEADER.unpack_from(packet)
+        offset = chunk_id * self.chunk_size
+        if (magic != MAGIC or chunks_total != self.chunks or chunk_id >= chunks_total
+                or payload_len != min(self.chunk_size, self.frame_bytes - offset)
+                or len(packet) < PACKET_HEADER.size + payload_len):
+            self.bad_packets += 1
+            return None
+
+        if self._last_completed is not None and not frame_id_newer(frame_id, self._last_completed):
+            self.late_chunks += 1
+            # A sender restart makes every ID look old; start over if nothing completes for a while
+            if now - self._last_completed_at > self.resync_seconds:
+                self.resync()
+            else:
+                return None
+
+        slot = self._in_flight.get(frame_id)
+        if slot is None:
+            slot = self._start(frame_id, now)
+            if slot is None:
+                self.late_chunks += 1
+                return None
+        if slot.received[chunk_id]:
+            self.duplicate_chunks += 1
+            return None
+        slot.received[chunk_id] = 1
+        slot.count += 1
+        slot.view[offset:offset + payload_len] = packet[PACKET_HEADER.size:PACKET_HEADER.size + payload_len]
+        if slot.count < self.chunks:
+            return None
+
+        # Complete: older frames still in flight can only be shown late now
+        del self._in_flight[frame_id]
+        for other in [s for s in self._in_flight.values() if not frame_id_newer(s.frame_id, frame_id)]:
+            self._drop(other)
+        self._last_completed = frame_id
+        self._last_completed_at = now
+        self.frames_completed += 1
+        self.assembly.record(now - slot.first_seen)
+        return slot
+
+    def expire(self, now):
+        """Drop frames that have waited longer than the reassembly timeout"""
+        for slot in [s for s in self._in_flight.values() if now - s.first_seen > self.timeout]:
+            self._drop(slot)
+
+    def resync(self):
+        for slot in list(self._in_flight.values()):
+            self._drop(slot)
+        self._newest_started = None
+        self._last_completed = None
+        self.resyncs += 1
+
+    def stats(self):
+        started = self.frames_completed + self.frames_dropped
+        expected = started + self.frames_missing
+        return {
+            'packets': self.packets,
+            'bad_packets': self.bad_packets,
+            'duplicate_chunks': self.duplicate_chunks,
+            'late_chunks': self.late_chunks,
+            'in_flight': len(self._in_flight),
+            'frames_completed': self.frames_completed,
+            'frames_dropped': self.frames_dropped,
+            'frames_missing': self.frames_missing,
+            'chunks_lost': self.chunks_lost,
+            'frame_loss': round(1.0 - self.frames_completed / expected, 4) if expected else 0.0,
+            'resyncs': self.resyncs,
+            'assembly': self.assembly.snapshot()
+        }
+
+
+class UdpFrameReceiver:
+    """
+    Frame source for the server fed by the firmware's UDP broadcast.
+
+    A background thread drains a non-blocking socket into one preallocated
+    datagram buffer and feeds a ChunkReassembler; each completed frame is
+    copied into the 'latest' buffer, replacing any frame the consumer has
+    not picked up yet. read_gray() returns the newest unseen frame. The
+    socket is bound on first read and released by close().
+    """
+
+    def __init__(self, host='', port=UDP_PORT, width=FRAME_WIDTH, height=FRAME_HEIGHT, chunk_size=CHUNK_SIZE,
+                 max_in_flight=4, reassembly_timeout=0.5, read_timeout=1.0, scale=1):
+        self.host = host
+        self.port = port
+        self.read_timeout = read_timeout
+        self.scale = scale
+        self.reassembler = ChunkReassembler(width, height, chunk_size, max_in_flight, reassembly_timeout)
+        self._packet = bytearray(PACKET_HEADER.size + chunk_size + 64)
+        self._packet_view = memoryview(self._packet)
+
+        self._cond = Condition()
+        self._latest = np.zeros((height, width), dtype=np.uint8)
+        self._latest_id = None
+        self._latest_at = 0.0
+        self._fresh = False
+        self.device_host = None  # sender of the newest complete frame, for commands back to the device
+        self._sock = None
+        self._stop = Event()
+        self._thread = None
+
+        self.frames_read = 0
+        self.frames_overwritten = 0  # completed but replaced before anyone read them
+        self.delivery = LatencyHistogram()
+
+    @classmethod
+    def from_url(cls, url, **kw):
+        """udp://[host]:port, e.g. udp://0.0.0.0:5000 for the firmware broadcast"""
+        parts = urlsplit(url)
+        return cls(host=parts.hostname or '', port=parts.port or UDP_PORT, **kw)
+
+    @property
+    def capture_url(self):
+        return f"udp://{self.host or '0.0.0.0'}:{self.port}"
+
+    def start(self):
+        if self._thread is not None:
+            return
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        sock.bind((self.host, self.port))
+        sock.setblocking(False)
+        self._sock = sock
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name=f"udp-ingest-{self.port}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        sock, reassembler = self._sock, self.reassembler
+        while not self._stop.is_set():
+            ready, _, _ = select.select([sock], [], [], 0.05)
+            now = time.monotonic()
+            if ready:
+                while True:
+                    try:
+                        n, addr = sock.recvfrom_into(self._packet_view)
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    except OSError as e:
+                        print(f"UDP ingest error: {e}")
+                        break
+                    slot = reassembler.feed(self._packet_view[:n], now)
+                    if slot is not None:
+                        self._publish(slot, now, addr[0])
+                        reassembler.release(slot)
+            reassembler.expire(now)
+
+    def _publish(self, slot, now, host):
+        self.device_host = host
+        with self._cond:
+            if self._fresh:
+                self.frames_overwritten += 1
+            self._latest.reshape(-1)[:] = slot.buffer
+            self._latest_id = slot.frame_id
+            self._latest_at = now
+            self._fresh = True
+            self._cond.notify_all()
+
+    def read_gray(self, timeout=None):
+        """Newest complete frame not returned before (a (height, width) uint8 copy), or None on timeout"""
+        self.start()
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._fresh, self.read_timeout if timeout is None else timeout):
+                return None
+            self._fresh = False
+            self.frames_read += 1
+            self.delivery.record(time.monotonic() - self._latest_at)
+            return self._latest.copy()
+
+    def read(self, timeout=None):
+        """Like read_gray(), as a BGR frame upscaled by `scale`"""
+        gray = self.read_gray(timeout)
+        return None if gray is None else gray_to_bgr(gray, self.scale)
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def stats(self):
+        return dict(self.reassembler.stats(), mode='udp', port=self.port, listening=self._thread is not None,
+                    latest_frame_id=self._latest_id, frames_read=self.frames_read,
+                    frames_overwritten=self.frames_overwritten, delivery=self.delivery.snapshot())
+
+# ============================================
+# Firmware emulator (for testing without hardware)
+# ============================================
+
+def chunk_frame(gray, frame_id, chunk_size=CHUNK_SIZE, flags=0):
+    """Datagrams for one frame exactly as sendFrameUDP() builds them"""
+    data = np.ascontiguousarray(gray, dtype=np.uint8).tobytes()
+    total = math.ceil(len(data) / chunk_size)
+    packets = []
+    for chunk_id in range(total):
+        payload = data[chunk_id * chunk_size:(chunk_id + 1) * chunk_size]
+        packets.append(PACKET_HEADER.pack(MAGIC, frame_id & 0xFFFF, chunk_id, total, len(payload), flags) + payload)
+    return packets
+
+
+def synthetic_frame(index, width=FRAME_WIDTH, height=FRAME_HEIGHT):
+    """Moving gradient with a bright bar, so consecutive frames differ"""
+    x = np.arange(width, dtype=np.uint16)
+    frame = np.tile(((x * 3 + index * 4) % 256).astype(np.uint8), (height, 1))
+    frame[:, (index * 2) % width] = 255
+    return frame
+
+
+def emulate_camera(host='255.255.255.255', port=UDP_PORT, fps=10, frames=0, start_id=0, chunk_gap=0.0002,
+                   loss=0.0, reorder=0.0, duplicate=0.0, stop=None, seed=None):
+    """
+    Send synthetic frames the way ESP32_I2S_Camera.ino does (broadcast by default).
+
+    loss / reorder / duplicate are per-chunk probabilities for dropping a
+    chunk, swapping it with the next one, or sending it twice. Runs until
+    `frames` frames were sent (0 = forever) or `stop` (an Event) is set.
+    Returns the number of frames sent.
+    """
+    rng = random.Random(seed)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    sent = 0
+    next_frame = time.monotonic()
+    try:
+        while (not frames or sent < frames) and not (stop is not None and stop.is_set()):
+            packets = chunk_frame(synthetic_frame(sent), start_id + sent)
+            for i in range(len(packets) - 1):
+                if rng.random() < reorder:
+                    packets[i], packets[i + 1] = packets[i + 1], packets[i]
+            for packet in packets:
+                if rng.random() < loss:
+                    continue
+                sock.sendto(packet, (host, port))
+                if rng.random() < duplicate:
+                    sock.sendto(packet, (host, port))
+                if chunk_gap:
+                    time.sleep(chunk_gap)
+            sent += 1
+            next_frame += 1.0 / fps
+            time.sleep(max(0.0, next_frame - time.monotonic()))
+    finally:
+        sock.close()
+    return sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Receive (default) or emulate the ESP32 UDP frame broadcast")
+    parser.add_argument('--emulate', action='store_true', help='send synthetic frames instead of receiving')
+    parser.add_argument('--host', default=None, help='send to / bind on (default: broadcast / all interfaces)')
+    parser.add_argument('--port', type=int, default=UDP_PORT)
+    parser.add_argument('--fps', type=float, default=10)
+    parser.add_argument('--frames', type=int, default=0, help='frames to send (0 = until Ctrl+C)')
+    parser.add_argument('--start-id', type=int, default=0, help='first frame ID (e.g. 65530 to test wraparound)')
+    parser.add_argument('--loss', type=float, default=0.0, help='per-chunk drop probability')
+    parser.add_argument('--reorder', type=float, default=0.0, help='per-chunk swap probability')
+    parser.add_argument('--duplicate', type=float, default=0.0, help='per-chunk duplicate probability')
+    args = parser.parse_args()
+
+    if args.emulate:
+        host = args.host or '255.255.255.255'
+        print(f"Sending {FRAME_WIDTH}x{FRAME_HEIGHT} frames to {host}:{args.port} at {args.fps} FPS (Ctrl+C to stop)")
+        try:
+            sent = emulate_camera(host, args.port, args.fps, args.frames, args.start_id,
+                                  loss=args.loss, reorder=args.reorder, duplicate=args.duplicate)
+            print(f"✓ Sent {sent} frames")
+        except KeyboardInterrupt:
+            pass
+        return
+
+    receiver = UdpFrameReceiver(host=args.host or '', port=args.port)
+    print(f"Listening on {receiver.capture_url} (Ctrl+C to stop)")
+    last_report = time.monotonic()
+    try:
+        while True:
+            receiver.read_gray()
+            if time.monotonic() - last_report >= 3.0:
+                last_report = time.monotonic()
+                s = receiver.stats()
+                print(f"frames {s['frames_completed']} | loss {s['frame_loss'] * 100:.1f}% "
+                      f"(dropped {s['frames_dropped']}, missing {s['frames_missing']}) | "
+                      f"late {s['late_chunks']} dup {s['duplicate_chunks']} bad {s['bad_packets']} | "
+                      f"assembly p95 {s['assembly']['p95_ms']:.1f} ms | delivery p95 {s['delivery']['p95_ms']:.1f} ms")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        receiver.close()
+
+
+if __name__ == '__main__':
+    main()
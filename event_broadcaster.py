@@ -0,0 +1,227 @@
+"""
+Detection Event Broadcaster
+Pushes detection status to dashboard clients as Server-Sent Events instead of
+having every client poll /api/status. Updates from the detection path are
+merged per device and sent as deltas of the values that actually changed, at
+most once per min_interval; alert transitions are sent immediately.
+
+Each event is serialized once into a shared log and every subscriber just
+reads new entries from it, so the per-client cost is a wait on a condition
+variable and a slice of already-encoded bytes. There is no broadcaster thread:
+trailing coalesced updates are flushed by the next update or by whichever
+subscriber wakes up first (or by the asyncio server's flush task).
+"""
+
+import json
+import time
+from collections import deque
+from itertools import islice
+from threading import Condition
+
+SECTIONS = ('latest', 'stats')
+KEEPALIVE = b': keepalive\n\n'
+_MISSING = object()
+
+
+def _normalize(value, digits):
+    """Round floats so sensor jitter below display precision is not re-sent"""
+    if isinstance(value, float):
+        return round(value, digits)
+    if hasattr(value, 'item'):  # numpy scalar
+        return _normalize(value.item(), digits)
+    return value
+
+
+class EventBroadcaster:
+    """Coalescing delta publisher with a bounded, pre-serialized replay log"""
+
+    def __init__(self, min_interval=0.1, history=512, keepalive=15.0, float_digits=3):
+        self.min_interval = min_interval
+        self.keepalive = keepalive
+        self.float_digits = float_digits
+
+        self._cond = Condition()
+        self._log = deque(maxlen=history)  # (seq, device, encoded event)
+        self._seq = 0
+        self._closed = False
+
+        self._sent = {}        # device -> {section: {key: value}} as last sent
+        self._pending = {}     # device -> {section: {key: value}} not yet sent
+        self._alerts = {}      # device -> current alert_type
+        self._last_flush = {}  # device -> monotonic time of last delta
+        self._listeners = []   # callbacks fired on every new event (asyncio bridges)
+
+        self.subscribers = 0
+        self.updates = 0
+        self.events = 0
+        self.deltas = 0
+        self.alerts = 0
+
+    # ------------------------------------------------------------------
+    # Publishing
+    # ------------------------------------------------------------------
+
+    def update(self, device, latest=None, stats=None):
+        """Merge new values for a device; sends a delta when due"""
+        now = time.monotonic()
+        with self._cond:
+            self.updates += 1
+            pending = self._pending.setdefault(device, {})
+            for section, values in zip(SECTIONS, (latest, stats)):
+                if values:
+                    merged = pending.setdefault(section, {})
+                    for key, value in values.items():
+                        merged[key] = _normalize(value, self.float_digits)
+
+            alert_type = latest.get('alert_type') if latest else None
+            if latest and 'alert_type' in latest and alert_type != self._alerts.get(device):
+                previous = self._alerts.get(device)
+                self._alerts[device] = alert_type
+                # Values first, so clients see the reading that caused the alert
+                self._flush(device, now)
+                self.alerts += 1
+                self._append(device, 'alert', {
+                    'device': device,
+                    'from': previous,
+                    'to': alert_type,
+                    'timestamp': latest.get('timestamp', time.time())
+                })
+            elif now - self._last_flush.get(device, 0.0) >= self.min_interval:
+                self._flush(device, now)
+
+    def _flush(self, device, now):
+        pending = self._pending.pop(device, None)
+        if not pending:
+            return
+        sent = self._sent.setdefault(device, {section: {} for section in SECTIONS})
+        delta = {}
+        for section, values in pending.items():
+            changed = {k: v for k, v in values.items() if sent[section].get(k, _MISSING) != v}
+            if changed:
+                sent[section].update(changed)
+                delta[section] = changed
+        self._last_flush[device] = now
+        if delta:
+            delta['device'] = device
+            self.deltas += 1
+            self._append(device, 'delta', delta)
+
+    def flush_due(self):
+        """Send coalesced updates whose interval has passed"""
+        with self._cond:
+            self._flush_due()
+
+    def _flush_due(self):
+        now = time.monotonic()
+        for device in list(self._pending):
+            if now - self._last_flush.get(device, 0.0) >= self.min_interval:
+                self._flush(device, now)
+
+    def _encode(self, seq, event, data):
+        return f"id: {seq}\nevent: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+    def _append(self, device, event, data):
+        self._seq += 1
+        self.events += 1
+        self._log.append((self._seq, device, self._encode(self._seq, event, data)))
+        self._cond.notify_all()
+        for callback in self._listeners:
+            callback()
+
+    def _snapshot(self, device):
+        """Full current state as one event (for new or too-far-behind clients)"""
+        if device is None:
+            data = {'devices': {d: dict(sections, alert_type=self._alerts.get(d))
+                                for d, sections in self._sent.items()}}
+        else:
+            sections = self._sent.get(device, {section: {} for section in SECTIONS})
+            data = dict(sections, device=device, alert_type=self._alerts.get(device))
+        return self._encode(self._seq, 'snapshot', data)
+
+    # ------------------------------------------------------------------
+    # Subscribing
+    # ------------------------------------------------------------------
+
+    def read(self, cursor, device=None):
+        """Return (new_cursor, encoded chunks) for events after cursor
+
+        A cursor of None, or one that has fallen out of the replay log, gets a
+        snapshot instead. Must be called with the condition held.
+        """
+        if cursor is not None and cursor > self._seq:
+            cursor = None  # stale id from a previous server run
+        oldest = self._log[0][0] if self._log else self._seq + 1
+        if cursor is None or cursor < oldest - 1:
+            return self._seq, [self._snapshot(device)]
+        start = len(self._log) - (self._seq - cursor)
+        chunks = [chunk for _, d, chunk in islice(self._log, start, None)
+                  if device is None or d == device]
+        return self._seq, chunks
+
+    def poll(self, cursor, device=None):
+        """Non-blocking read() for event-loop subscribers"""
+        with self._cond:
+            return self.read(cursor, device)
+
+    def add_listener(self, callback):
+        """Call callback() (from the publishing thread) after every event and on close"""
+        with self._cond:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._cond:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def subscribe(self, device=None, last_event_id=None):
+        """Yield SSE-encoded bytes for one client until the broadcaster closes"""
+        with self._cond:
+            self.subscribers += 1
+        try:
+            with self._cond:
+                self._flush_due()
+                cursor, chunks = self.read(last_event_id, device)
+            if chunks:
+                yield b''.join(chunks)
+            while True:
+                with self._cond:
+                    deadline = time.monotonic() + self.keepalive
+                    chunks = []
+                    while not chunks:
+                        if self._closed:
+                            return
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        if self._seq == cursor:
+                            # Wake early while updates are waiting to be coalesced
+                            self._cond.wait(min(remaining, self.min_interval) if self._pending else remaining)
+                            self._flush_due()
+                        cursor, chunks = self.read(cursor, device)
+                yield b''.join(chunks) if chunks else KEEPALIVE
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            for callback in self._listeners:
+                callback()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'subscribers': self.subscribers,
+                'updates': self.updates,
+                'events': self.events,
+                'alerts': self.alerts,
+                'deltas': self.deltas,
+                'coalesced': self.updates - self.deltas,
+                'last_event_id': self._seq
+            }
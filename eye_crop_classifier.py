@@ -0,0 +1,208 @@
+"""
+Eye-Crop Classifier
+Second-stage eye state check with the small CNN the ESP32 firmware ships
+(hardware/drowsiness_model.h: 48x48 grayscale eye crop -> [closed, droopy,
+open]). The model bytes are read straight out of the C header, both eyes
+are cut from the landmark points already found for the frame, and the two
+crops run through one batched invoke. The EAR features stay the primary
+signal; EyeCheckSchedule decides which frames are worth the extra invoke.
+"""
+
+import math
+import re
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from model_loader import interpreter_runtime
+from perf_stats import LatencyCounter
+
+EYE_CLASSES = ('closed', 'droopy', 'open')
+HEADER_MODEL_PATH = 'hardware/drowsiness_model.h'
+
+
+def load_header_model(path=HEADER_MODEL_PATH, array='model_data'):
+    """TFLite flatbuffer bytes from a C header's `unsigned char <array>[] = {0x.., ...}`"""
+    with open(path) as f:
+        source = f.read()
+    match = re.search(r'\b' + array + r'\s*\[\s*\]\s*[^=]*=\s*\{([^}]*)\}', source)
+    if match is None:
+        raise ValueError(f"{path} has no '{array}[]' byte array")
+    data = bytes(int(value, 16) for value in re.findall(r'0x([0-9a-fA-F]{1,2})', match.group(1)))
+    length = re.search(r'\b' + array + r'_len\s*=\s*(\d+)', source)
+    if length is not None and int(length.group(1)) != len(data):
+        raise ValueError(f"{path}: {array}[] has {len(data)} bytes, {array}_len says {length.group(1)}")
+    if data[4:8] != b'TFL3':
+        raise ValueError(f"{path}: {array}[] is not a TFLite model")
+    return data
+
+
+def eye_transform(points, size, scale):
+    """2x3 affine map from frame pixels to a size x size crop of one eye
+
+    The crop is centered between the eye corners (points 0 and 3 of the
+    6-point EAR contour), levelled along them, and `scale` times the corner
+    distance wide.
+    """
+    (x0, y0), (x1, y1) = points[0], points[3]
+    dx, dy = x1 - x0, y1 - y0
+    if dx < 0:
+        dx, dy = -dx, -dy
+    width = max(math.hypot(dx, dy), 1.0)
+    s = size / (width * scale)
+    cos, sin = s * dx / width, s * dy / width
+    cx, cy = (x0 + x1) / 2.0, (y0 + y1) / 2.0
+    return np.array([[cos, sin, size / 2.0 - (cos * cx + sin * cy)],
+                     [-sin, cos, size / 2.0 - (-sin * cx + cos * cy)]])
+
+
+class EyeCropClassifier:
+    """
+    Batched eye-state CNN over both eyes of a frame.
+
+    classify(frame, left_eye, right_eye) takes a BGR (or grayscale) frame
+    and each eye's 6 landmark points in pixels, and returns a (2, 3) array
+    of [closed, droopy, open] probabilities (left, right). Every calling
+    thread gets its own interpreter, resized to a batch of 2, and its own
+    crop buffers, reused across frames. With a profiler the crops and the
+    invoke are recorded as 'eye_crop' and 'eye_cnn'.
+    """
+
+    def __init__(self, model_content, scale=1.6, profiler=None):
+        self.model_content = model_content
+        self.scale = scale
+        self.profiler = profiler
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        self.frames = 0
+        self.latency = LatencyCounter()
+
+        # Fail fast if the model cannot be loaded
+        self.size = self._interpreter()[4].shape[1]
+
+    def _interpreter(self):
+        """Thread-local (interpreter, input index, output details, BGR scratch, crop batch)"""
+        entry = getattr(self._local, 'entry', None)
+        if entry is None:
+            _, interpreter_class = interpreter_runtime()
+            interpreter = interpreter_class(model_content=self.model_content)
+            input_details = interpreter.get_input_details()[0]
+            shape = list(input_details['shape'])
+            if len(shape) != 4 or shape[3] != 1:
+                raise ValueError(f"Eye model input {shape} is not a grayscale image batch")
+            shape[0] = 2
+            interpreter.resize_tensor_input(input_details['index'], shape)
+            interpreter.allocate_tensors()
+            size = shape[1]
+            crops = np.zeros(shape, dtype=input_details['dtype'])
+            scratch = np.zeros((size, size, 3), dtype=np.uint8)
+            entry = self._local.entry = (interpreter, input_details['index'],
+                                         interpreter.get_output_details()[0], scratch, crops)
+        return entry
+
+    def crop(self, frame, left_eye, right_eye):
+        """Both eye crops in this thread's (2, size, size, 1) input buffer"""
+        _, _, _, scratch, crops = self._interpreter()
+        for i, points in enumerate((left_eye, right_eye)):
+            transform = eye_transform(points, self.size, self.scale)
+            crop = crops[i, :, :, 0]
+            if frame.ndim == 2:
+                cv2.warpAffine(frame, transform, (self.size, self.size), dst=crop,
+                               flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+            else:
+                # Warp the few BGR pixels needed, then convert only the crop
+                cv2.warpAffine(frame, transform, (self.size, self.size), dst=scratch,
+                               flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+                cv2.cvtColor(scratch, cv2.COLOR_BGR2GRAY, dst=crop)
+        return crops
+
+    def invoke(self, crops):
+        """(2, 3) probabilities for a crop batch from crop()"""
+        interpreter, input_index, output_details, _, _ = self._interpreter()
+        interpreter.set_tensor(input_index, crops)
+        interpreter.invoke()
+        output = interpreter.get_tensor(output_details['index'])
+        scale, zero_point = output_details['quantization']
+        return (output.astype(np.float32) - zero_point) * scale if scale else output.astype(np.float32)
+
+    def classify(self, frame, left_eye, right_eye):
+        start = time.perf_counter()
+        crops = self.crop(frame, left_eye, right_eye)
+        cropped = time.perf_counter()
+        probs = self.invoke(crops)
+        end = time.perf_counter()
+        if self.profiler is not None:
+            self.profiler.record('eye_crop', cropped - start)
+            self.profiler.record('eye_cnn', end - cropped)
+        self.latency.record(end - start)
+        with self._lock:
+            self.frames += 1
+        return probs
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'crop_size': int(self.size),
+            'latency': self.latency.snapshot()
+        }
+
+
+def eye_summary(probs):
+    """(label, closed probability) for both eyes together"""
+    mean = probs.mean(axis=0)
+    return EYE_CLASSES[int(mean.argmax())], float(mean[0])
+
+
+class EyeCheckSchedule:
+    """
+    Per-camera choice of which detections also get the eye-crop CNN.
+
+    'always' checks every detection. 'ambiguous' checks detections whose
+    average EAR falls inside ear_band, where the EAR threshold alone is
+    least reliable, plus every `interval`-th detection otherwise (0 =
+    never) so the CNN's view of clearly open or closed eyes stays current.
+    """
+
+    def __init__(self, mode='ambiguous', ear_band=(0.20, 0.30), interval=15):
+        if mode not in ('always', 'ambiguous'):
+            raise ValueError(f"Unknown eye check mode '{mode}'")
+        self.mode = mode
+        self.ear_band = ear_band
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._since = 0
+
+        self.detections = 0
+        self.ambiguous = 0
+        self.periodic = 0
+
+    def ambiguous_ear(self, avg_ear):
+        return self.ear_band[0] <= avg_ear <= self.ear_band[1]
+
+    def due(self, avg_ear):
+        """True if this detection should run the CNN"""
+        with self._lock:
+            self.detections += 1
+            self._since += 1
+            if self.mode == 'always' or self.ambiguous_ear(avg_ear):
+                self.ambiguous += self.mode != 'always'
+                self._since = 0
+                return True
+            if self.interval and self._since >= self.interval:
+                self.periodic += 1
+                self._since = 0
+                return True
+            return False
+
+    def stats(self):
+        checked = self.ambiguous + self.periodic if self.mode == 'ambiguous' else self.detections
+        return {
+            'mode': self.mode,
+            'detections': self.detections,
+            'ambiguous': self.ambiguous,
+            'periodic': self.periodic,
+            'check_rate': round(checked / self.detections, 3) if self.detections else 0.0
+        }
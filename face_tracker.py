@@ -0,0 +1,157 @@
+"""
+Face Landmark Tracking
+Per-camera FaceLandmarker in MediaPipe's VIDEO running mode. In VIDEO mode the
+graph reuses the previous frame's face ROI and only runs the face detector
+again when tracking is lost (landmark confidence below
+min_tracking_confidence), so steady frames skip full detection. A tracker
+is stateful and needs increasing timestamps, so there is one per camera
+stream; callers fall back to IMAGE-mode detection whenever detect() returns None,
+including for frames that reach the tracker after a newer one.
+"""
+
+import time
+from threading import Lock
+
+from perf_stats import LatencyCounter
+
+
+def video_options(model_path, min_detection_confidence=0.5, min_presence_confidence=0.5,
+                  min_tracking_confidence=0.5):
+    """FaceLandmarkerOptions for VIDEO mode, matching the IMAGE-mode settings"""
+    from mediapipe.tasks import python
+    from mediapipe.tasks.python import vision
+    return vision.FaceLandmarkerOptions(
+        base_options=python.BaseOptions(model_asset_path=model_path),
+        running_mode=vision.RunningMode.VIDEO,
+        num_faces=1,
+        min_face_detection_confidence=min_detection_confidence,
+        min_face_presence_confidence=min_presence_confidence,
+        min_tracking_confidence=min_tracking_confidence
+    )
+
+
+class FaceTracker:
+    """
+    VIDEO-mode FaceLandmarker for one camera stream.
+
+    detect() is serialized. Given each frame's capture time, it tracks
+    frames in capture order: a frame captured before the last tracked one
+    (several worker threads finishing out of order) is not tracked and
+    detect() returns None for it. Without capture times frames are tracked
+    in arrival order. After max_failures consecutive errors the tracker
+    disables itself and detect() returns None, leaving callers on IMAGE
+    mode.
+    """
+
+    def __init__(self, options, max_failures=3):
+        self.options = options
+        self.max_failures = max_failures
+        self._landmarker = None
+        self._lock = Lock()
+        self._last_ts = -1
+        self._last_captured = None
+        self._failures = 0
+        self.disabled = False
+        self.latency = LatencyCounter()
+        self.tracked_frames = 0
+        self.lost_frames = 0
+        self.restarts = 0
+        self.errors = 0
+        self.out_of_order = 0
+        self._had_face = False
+
+    @property
+    def available(self):
+        return not self.disabled
+
+    def _timestamp(self, timestamp_ms):
+        if timestamp_ms is None:
+            timestamp_ms = time.monotonic() * 1000.0
+        ts = max(int(timestamp_ms), self._last_ts + 1)
+        self._last_ts = ts
+        return ts
+
+    def _open(self):
+        from mediapipe.tasks.python import vision
+        self._landmarker = vision.FaceLandmarker.create_from_options(self.options)
+        self._last_ts = -1
+        self._had_face = False
+
+    def _close(self):
+        if self._landmarker is not None:
+            try:
+                self._landmarker.close()
+            except Exception:
+                pass
+            self._landmarker = None
+
+    def detect(self, mp_image, timestamp_ms=None):
+        """Track landmarks on the frame captured at timestamp_ms
+
+        None if the tracker is unavailable or the frame is older than the
+        last tracked one.
+        """
+        with self._lock:
+            if self.disabled:
+                return None
+            if timestamp_ms is not None:
+                if self._last_captured is not None and timestamp_ms < self._last_captured:
+                    self.out_of_order += 1
+                    return None
+                self._last_captured = timestamp_ms
+            start = time.perf_counter()
+            try:
+                if self._landmarker is None:
+                    self._open()
+                result = self._landmarker.detect_for_video(mp_image, self._timestamp(timestamp_ms))
+            except Exception as e:
+                self.errors += 1
+                self._failures += 1
+                self._close()
+                if self._failures >= self.max_failures:
+                    self.disabled = True
+                    print(f"✗ Face tracking disabled after {self._failures} errors ({e}); using IMAGE mode")
+                else:
+                    self.restarts += 1
+                return None
+            self.latency.record(time.perf_counter() - start)
+            self._failures = 0
+
+            # A frame without a face after a tracked one means the next frame runs full detection
+            has_face = bool(result.face_landmarks)
+            if has_face:
+                self.tracked_frames += 1
+            elif self._had_face:
+                self.lost_frames += 1
+            self._had_face = has_face
+            return result
+
+    def reset(self):
+        """Drop tracking state (e.g. after the camera reconnects) and re-enable the tracker"""
+        with self._lock:
+            self._close()
+            self._last_captured = None
+            self._failures = 0
+            self.disabled = False
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def stats(self):
+        stats = self.latency.snapshot()
+        stats.update({
+            'mode': 'video',
+            'available': self.available,
+            'tracked_frames': self.tracked_frames,
+            'lost_frames': self.lost_frames,
+            'restarts': self.restarts,
+            'errors': self.errors,
+            'out_of_order': self.out_of_order
+        })
+        return stats
+
+
+def create_tracker(model_path, **kwargs):
+    """FaceTracker for model_path; creation of the graph is deferred to the first frame"""
+    return FaceTracker(video_options(model_path, **kwargs))
@@ -0,0 +1,111 @@
+"""
+Fair Shared Executor
+A fixed set of worker threads shared by many camera sessions. Work is queued
+per session key and served round-robin, so one busy camera cannot starve the
+others of detection time.
+"""
+
+import time
+from collections import deque
+from concurrent.futures import Future
+from threading import Condition, Thread
+
+from perf_stats import LatencyCounter
+
+
+class FairExecutor:
+    """Round-robin executor keyed by session id"""
+
+    def __init__(self, workers=2, name='detect'):
+        self.workers = workers
+        self.name = name
+        self._cond = Condition()
+        self._queues = {}
+        self._ready = deque()
+        self._threads = []
+        self._closed = False
+        self.queue_wait = LatencyCounter()
+        self.run_time = LatencyCounter()
+        self.completed = {}
+
+        for i in range(workers):
+            thread = Thread(target=self._worker, name=f"{name}-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, key, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) under a session key; returns a Future"""
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("executor is shut down")
+            pending = self._queues.get(key)
+            if pending is None:
+                pending = self._queues[key] = deque()
+            if not pending:
+                self._ready.append(key)
+            pending.append((future, fn, args, kwargs, time.perf_counter()))
+            self._cond.notify()
+        return future
+
+    def run(self, key, fn, *args, **kwargs):
+        """Submit and wait for the result"""
+        return self.submit(key, fn, *args, **kwargs).result()
+
+    def _next_job(self):
+        with self._cond:
+            while not self._ready and not self._closed:
+                self._cond.wait()
+            if self._closed and not self._ready:
+                return None, None
+            key = self._ready.popleft()
+            pending = self._queues[key]
+            job = pending.popleft()
+            if pending:
+                # Still has work: go to the back of the line
+                self._ready.append(key)
+            return key, job
+
+    def _worker(self):
+        while True:
+            key, job = self._next_job()
+            if job is None:
+                return
+            future, fn, args, kwargs, queued_at = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            start = time.perf_counter()
+            self.queue_wait.record(start - queued_at)
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+            self.run_time.record(time.perf_counter() - start)
+            with self._cond:
+                self.completed[key] = self.completed.get(key, 0) + 1
+
+    def forget(self, key):
+        """Drop bookkeeping for a session that has been removed"""
+        with self._cond:
+            if not self._queues.get(key):
+                self._queues.pop(key, None)
+                self.completed.pop(key, None)
+
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+    def stats(self):
+        with self._cond:
+            pending = {key: len(q) for key, q in self._queues.items() if q}
+            completed = dict(self.completed)
+        return {
+            'workers': self.workers,
+            'pending': pending,
+            'completed': completed,
+            'queue_wait': self.queue_wait.snapshot(),
+            'run_time': self.run_time.snapshot()
+        }
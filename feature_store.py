@@ -0,0 +1,473 @@
+"""
+Feature History Store
+Append-only on-disk time series of per-frame features and alert events, one
+directory per device. Frames are fixed-size binary records in hourly chunk
+files read back through np.memmap; rollups at a few fixed resolutions are
+maintained as frames are flushed, so a chart over a whole shift reads a few
+hundred rollup rows instead of every frame.
+
+Layout of <root>/<device>/:
+    frames-<hour start>.bin   FRAME_DTYPE records
+    rollup-<seconds>.bin      ROLLUP_DTYPE rows per completed bucket (repeats merge on read)
+    events.bin                EVENT_DTYPE alert changes
+    layout.json               record layouts, checked on open
+"""
+
+import glob
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from perf_stats import LatencyCounter
+
+FRAME_DTYPE = np.dtype([
+    ('t', '<f8'),
+    ('ear', '<f4'),
+    ('left_ear', '<f4'),
+    ('right_ear', '<f4'),
+    ('mar', '<f4'),
+    ('prediction', '<f4'),
+    ('flags', 'u1'),
+    ('alert', 'i1')
+])
+
+FLAG_FACE = 1
+FLAG_DROWSY = 2
+FLAG_BLINK = 4
+FLAG_YAWN = 8
+FLAG_ALERT = 16  # an alert started on this frame
+
+ALERT_TYPES = (None, 'CRITICAL', 'EAR', 'YAWN', 'BLINK', 'DROWSY')
+ALERT_CODES = {name: code for code, name in enumerate(ALERT_TYPES)}
+
+EVENT_DTYPE = np.dtype([('t', '<f8'), ('from', 'i1'), ('to', 'i1')])
+
+ROLLUP_DTYPE = np.dtype([
+    ('t', '<f8'),
+    ('frames', '<u4'),
+    ('faces', '<u4'),
+    ('drowsy', '<u4'),
+    ('blinks', '<u4'),
+    ('yawns', '<u4'),
+    ('alerts', '<u4'),
+    ('ear_sum', '<f8'),
+    ('ear_min', '<f4'),
+    ('mar_sum', '<f8'),
+    ('mar_max', '<f4'),
+    ('prediction_sum', '<f8'),
+    ('prediction_max', '<f4')
+])
+
+# How each rollup field combines when buckets are merged
+_COUNT_FIELDS = ('frames', 'faces', 'drowsy', 'blinks', 'yawns', 'alerts',
+                 'ear_sum', 'mar_sum', 'prediction_sum')
+_MIN_FIELDS = ('ear_min',)
+_MAX_FIELDS = ('mar_max', 'prediction_max')
+
+ROLLUP_RESOLUTIONS = (10, 60, 600)  # seconds
+ROLLUP_LATENESS = 2.0  # seconds past a bucket's end before it is written without a newer frame
+CHUNK_SECONDS = 3600
+LAYOUT_VERSION = 1
+
+
+def _layout():
+    return {
+        'version': LAYOUT_VERSION,
+        'frame': FRAME_DTYPE.descr,
+        'event': EVENT_DTYPE.descr,
+        'rollup': ROLLUP_DTYPE.descr,
+        'rollup_resolutions': list(ROLLUP_RESOLUTIONS),
+        'chunk_seconds': CHUNK_SECONDS
+    }
+
+
+def read_records(path, dtype):
+    """Memory-map whole records of an append-only file (empty array if missing)"""
+    try:
+        count = os.path.getsize(path) // dtype.itemsize
+    except OSError:
+        count = 0
+    if count == 0:
+        return np.empty(0, dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+
+
+def time_slice(records, t0, t1):
+    """Records with t0 <= t < t1 (records are sorted by t)"""
+    t = records['t']
+    return records[np.searchsorted(t, t0, 'left'):np.searchsorted(t, t1, 'left')]
+
+
+def frame_rollups(frames):
+    """One single-frame ROLLUP_DTYPE row per FRAME_DTYPE record"""
+    rows = np.zeros(len(frames), ROLLUP_DTYPE)
+    flags = frames['flags']
+    face = (flags & FLAG_FACE) != 0
+    rows['t'] = frames['t']
+    rows['frames'] = 1
+    rows['faces'] = face
+    rows['drowsy'] = (flags & FLAG_DROWSY) != 0
+    rows['blinks'] = (flags & FLAG_BLINK) != 0
+    rows['yawns'] = (flags & FLAG_YAWN) != 0
+    rows['alerts'] = (flags & FLAG_ALERT) != 0
+    rows['ear_sum'] = np.where(face, frames['ear'], 0.0)
+    rows['ear_min'] = np.where(face, frames['ear'], np.inf)
+    rows['mar_sum'] = np.where(face, frames['mar'], 0.0)
+    rows['mar_max'] = np.where(face, frames['mar'], -np.inf)
+    # Frames without a classifier score (NaN) count as no prediction
+    scored = face & np.isfinite(frames['prediction'])
+    rows['prediction_sum'] = np.where(scored, frames['prediction'], 0.0)
+    rows['prediction_max'] = np.where(scored, frames['prediction'], -np.inf)
+    return rows
+
+
+def merge_rollups(rows, resolution):
+    """Combine rollup rows into buckets of `resolution` seconds (sorted by t)"""
+    if not len(rows):
+        return np.empty(0, ROLLUP_DTYPE)
+    buckets, index = np.unique(np.floor(rows['t'] / resolution) * resolution, return_inverse=True)
+    out = np.zeros(len(buckets), ROLLUP_DTYPE)
+    out['t'] = buckets
+    for field in _COUNT_FIELDS:
+        out[field] = np.bincount(index, weights=rows[field], minlength=len(buckets))
+    for field in _MIN_FIELDS:
+        out[field] = np.inf
+        np.minimum.at(out[field], index, rows[field])
+    for field in _MAX_FIELDS:
+        out[field] = -np.inf
+        np.maximum.at(out[field], index, rows[field])
+    return out
+
+
+def rollups_to_json(rows, resolution):
+    """Columnar, chart-friendly view of rollup rows (None where no face was seen)"""
+    faces = rows['faces'].astype(np.float64)
+    seen = faces > 0
+
+    def mean(field, seen=seen):
+        return [round(float(v), 4) if ok else None
+                for v, ok in zip(rows[field] / np.maximum(faces, 1), seen)]
+
+    def extreme(field):
+        return [round(float(v), 4) if math.isfinite(v) else None for v in rows[field]]
+
+    return {
+        't': rows['t'].tolist(),
+        'resolution': resolution,
+        'frames': rows['frames'].tolist(),
+        'faces': rows['faces'].tolist(),
+        'drowsy': rows['drowsy'].tolist(),
+        'blinks': rows['blinks'].tolist(),
+        'yawns': rows['yawns'].tolist(),
+        'alerts': rows['alerts'].tolist(),
+        'ear_mean': mean('ear_sum'),
+        'ear_min': extreme('ear_min'),
+        'mar_mean': mean('mar_sum'),
+        'mar_max': extreme('mar_max'),
+        'prediction_mean': mean('prediction_sum', seen & np.isfinite(rows['prediction_max'])),
+        'prediction_max': extreme('prediction_max')
+    }
+
+
+def parse_history_args(args, now=None, default_span=3600.0):
+    """(from, to, resolution) from ?from=&to=&resolution= (epoch seconds); ValueError if invalid"""
+    now = time.time() if now is None else now
+    t1 = float(args.get('to') or now)
+    t0 = float(args.get('from') or t1 - default_span)
+    resolution = args.get('resolution')
+    resolution = float(resolution) if resolution else None
+    if not (math.isfinite(t0) and math.isfinite(t1)) or t0 >= t1:
+        raise ValueError("'from' must be before 'to'")
+    if resolution is not None and not resolution > 0:
+        raise ValueError("'resolution' must be a positive number of seconds")
+    return t0, t1, resolution
+
+
+class SeriesWriter:
+    """
+    Buffered appender for one device's series.
+
+    append() only copies one record into a preallocated buffer; flush()
+    swaps buffers and does the file I/O, so it can run on a background
+    thread without stalling the detection path.
+    """
+
+    def __init__(self, directory, buffer_records=2048):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._check_layout()
+        self._lock = threading.Lock()      # guards the record buffer
+        self._io_lock = threading.Lock()   # serializes flushes
+        self._buf = np.zeros(buffer_records, FRAME_DTYPE)
+        self._spare = np.zeros(buffer_records, FRAME_DTYPE)
+        self._n = 0
+        self._events = []
+        self._last_alert = 0
+        self._open = {}  # resolution -> in-progress rollup bucket (1-row array)
+        self.records = 0
+        self.flushes = 0
+        self.flush_latency = LatencyCounter()
+
+    def _check_layout(self):
+        path = os.path.join(self.directory, 'layout.json')
+        layout = json.loads(json.dumps(_layout()))
+        if os.path.exists(path):
+            with open(path) as f:
+                if json.load(f) != layout:
+                    raise ValueError(f"{self.directory} was written with a different record layout")
+        else:
+            with open(path, 'w') as f:
+                json.dump(layout, f, indent=2)
+
+    def append(self, t, ear=np.nan, left_ear=np.nan, right_ear=np.nan, mar=np.nan, prediction=np.nan,
+               face=False, drowsy=False, blink=False, yawn=False, alert_type=None):
+        """Record one analyzed frame"""
+        alert = ALERT_CODES.get(alert_type, 0)
+        flags = (FLAG_FACE * bool(face) | FLAG_DROWSY * bool(drowsy) |
+                 FLAG_BLINK * bool(blink) | FLAG_YAWN * bool(yawn))
+        with self._lock:
+            if alert != self._last_alert:
+                self._events.append((t, self._last_alert, alert))
+                if alert:
+                    flags |= FLAG_ALERT
+                self._last_alert = alert
+            full = self._n == len(self._buf)
+        if full:
+            self.flush()
+        with self._lock:
+            self._buf[self._n] = (t, ear, left_ear, right_ear, mar, prediction, flags, alert)
+            self._n += 1
+
+    def flush(self, now=None):
+        """Write buffered frames, completed rollup buckets and events to disk
+
+        An open rollup bucket is also written once its span is over by `now`
+        (default: the wall clock), even if no newer frame has closed it yet,
+        so a crash after the camera goes quiet does not lose it.
+        """
+        now = time.time() if now is None else now
+        with self._io_lock:
+            with self._lock:
+                if not self._n and not self._events and not self._rolled_over(now):
+                    return
+                frames = self._buf[:self._n]
+                self._buf, self._spare = self._spare, self._buf
+                self._n = 0
+                events, self._events = self._events, []
+
+            start = time.perf_counter()
+            if len(frames):
+                self._write_frames(frames)
+                self._write_rollups(frames)
+            if events:
+                with open(os.path.join(self.directory, 'events.bin'), 'ab') as f:
+                    f.write(np.array(events, EVENT_DTYPE).tobytes())
+            for resolution in self._rolled_over(now):
+                self._append_rollups(resolution, self._open.pop(resolution))
+            self.records += len(frames)
+            self.flushes += 1
+            self.flush_latency.record(time.perf_counter() - start)
+
+    def _write_frames(self, frames):
+        chunks = (frames['t'] // CHUNK_SECONDS).astype(np.int64)
+        bounds = np.flatnonzero(np.diff(chunks)) + 1
+        for part in np.split(frames, bounds):
+            name = f"frames-{int(part['t'][0] // CHUNK_SECONDS) * CHUNK_SECONDS}.bin"
+            with open(os.path.join(self.directory, name), 'ab') as f:
+                f.write(part.tobytes())
+
+    def _write_rollups(self, frames):
+        single = frame_rollups(frames)
+        for resolution in ROLLUP_RESOLUTIONS:
+            open_bucket = self._open.get(resolution)
+            rows = single if open_bucket is None else np.concatenate((open_bucket, single))
+            rows = merge_rollups(rows, resolution)
+            # Every bucket but the last is complete; the last stays open in memory
+            if len(rows) > 1:
+                self._append_rollups(resolution, rows[:-1])
+            self._open[resolution] = rows[-1:].copy()
+
+    def _rolled_over(self, now):
+        """Resolutions whose open bucket ended at least ROLLUP_LATENESS before now"""
+        return [resolution for resolution, bucket in self._open.items()
+                if bucket['t'][0] + resolution + ROLLUP_LATENESS <= now]
+
+    def _append_rollups(self, resolution, rows):
+        with open(os.path.join(self.directory, f'rollup-{resolution}.bin'), 'ab') as f:
+            f.write(rows.tobytes())
+
+    def close(self):
+        """Flush, then persist the open rollup buckets (duplicates merge on read)"""
+        self.flush()
+        with self._io_lock:
+            for resolution, bucket in self._open.items():
+                self._append_rollups(resolution, bucket)
+            self._open = {}
+
+    def open_rollup(self, resolution):
+        with self._io_lock:
+            bucket = self._open.get(resolution)
+            return bucket.copy() if bucket is not None else np.empty(0, ROLLUP_DTYPE)
+
+    def stats(self):
+        with self._lock:
+            buffered = self._n
+        return {
+            'records': self.records,
+            'buffered': buffered,
+            'flushes': self.flushes,
+            'flush': self.flush_latency.snapshot()
+        }
+
+
+class FeatureStore:
+    """Per-device SeriesWriters under one root directory, plus range queries"""
+
+    def __init__(self, root, flush_interval=1.0, max_points=1000):
+        self.root = root
+        self.flush_interval = flush_interval
+        self.max_points = max_points
+        self._writers = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.query_latency = LatencyCounter()
+
+    @staticmethod
+    def _dirname(device):
+        """Directory name for a device id; ids that need escaping get a hash suffix so they stay distinct"""
+        name = re.sub(r'[^A-Za-z0-9_.-]', '_', device).lstrip('.') or '_'
+        if name != device:
+            name += '-' + hashlib.sha1(device.encode('utf-8', 'surrogatepass')).hexdigest()[:8]
+        return name
+
+    def _path(self, device):
+        return os.path.join(self.root, self._dirname(device))
+
+    def writer(self, device):
+        with self._lock:
+            writer = self._writers.get(device)
+            if writer is None:
+                writer = self._writers[device] = SeriesWriter(self._path(device))
+            return writer
+
+    def append(self, device, t, **values):
+        self.writer(device).append(t, **values)
+
+    def start(self):
+        """Flush every writer in the background every flush_interval seconds"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='feature-store', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            writers = list(self._writers.values())
+        for writer in writers:
+            try:
+                writer.flush()
+            except Exception as e:
+                print(f"✗ Feature store flush failed for {writer.directory}: {e}")
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        with self._lock:
+            writers = list(self._writers.values())
+            self._writers = {}
+        for writer in writers:
+            writer.close()
+
+    def has_device(self, device):
+        return os.path.isdir(self._path(device))
+
+    def pick_resolution(self, t0, t1, resolution=None):
+        """Requested resolution, coarsened to stay within max_points buckets"""
+        span = max(t1 - t0, 1e-9)
+        if not resolution:
+            resolution = ROLLUP_RESOLUTIONS[0]
+        floor = span / self.max_points
+        if resolution < floor:
+            steps = [r for r in ROLLUP_RESOLUTIONS if r >= floor]
+            resolution = steps[0] if steps else math.ceil(floor / ROLLUP_RESOLUTIONS[-1]) * ROLLUP_RESOLUTIONS[-1]
+        return resolution
+
+    def frames(self, device, t0, t1):
+        """Raw frame records in [t0, t1), concatenated across chunk files"""
+        directory = self._path(device)
+        first = int(t0 // CHUNK_SECONDS) * CHUNK_SECONDS
+        parts = []
+        for path in sorted(glob.glob(os.path.join(directory, 'frames-*.bin'))):
+            chunk_start = int(os.path.basename(path)[7:-4])
+            if chunk_start < first or chunk_start >= t1:
+                continue
+            part = time_slice(read_records(path, FRAME_DTYPE), t0, t1)
+            if len(part):
+                parts.append(part)
+        return np.concatenate(parts) if parts else np.empty(0, FRAME_DTYPE)
+
+    def rollups(self, device, t0, t1, resolution):
+        """(rows, source) aggregated to `resolution` seconds over [t0, t1)
+
+        Served from the coarsest stored rollup that divides the resolution,
+        else from the coarsest one finer than it (each stored bucket then
+        lands whole in the bucket it starts in), or from raw frames when the
+        resolution is finer than every rollup.
+        """
+        writer = self._writers.get(device)
+        if writer is not None:
+            writer.flush()
+        finer = [r for r in ROLLUP_RESOLUTIONS if r <= resolution]
+        if not finer:
+            return merge_rollups(frame_rollups(self.frames(device, t0, t1)), resolution), 'frames'
+
+        dividing = [r for r in finer if resolution % r == 0]
+        base = dividing[-1] if dividing else finer[-1]
+        path = os.path.join(self._path(device), f'rollup-{base}.bin')
+        rows = time_slice(read_records(path, ROLLUP_DTYPE), math.floor(t0 / base) * base, t1)
+        if writer is not None:
+            open_bucket = writer.open_rollup(base)
+            rows = np.concatenate((rows, open_bucket[(open_bucket['t'] < t1)]))
+        return merge_rollups(rows, resolution), f'rollup-{base}'
+
+    def events(self, device, t0, t1):
+        records = time_slice(read_records(os.path.join(self._path(device), 'events.bin'), EVENT_DTYPE), t0, t1)
+        return [{'t': float(r['t']), 'from': ALERT_TYPES[r['from']], 'to': ALERT_TYPES[r['to']]}
+                for r in records]
+
+    def history(self, device, t0, t1, resolution=None):
+        """JSON-ready aggregates and alert events for the /api/history endpoint"""
+        start = time.perf_counter()
+        resolution = self.pick_resolution(t0, t1, resolution)
+        rows, source = self.rollups(device, t0, t1, resolution)
+        result = {
+            'device': device,
+            'from': t0,
+            'to': t1,
+            'source': source,
+            'buckets': rollups_to_json(rows, resolution),
+            'events': self.events(device, t0, t1)
+        }
+        self.query_latency.record(time.perf_counter() - start)
+        return result
+
+    def stats(self):
+        with self._lock:
+            writers = dict(self._writers)
+        return {
+            'root': self.root,
+            'devices': {device: w.stats() for device, w in writers.items()},
+            'query': self.query_latency.snapshot()
+        }
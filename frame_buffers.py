@@ -0,0 +1,123 @@
+"""
+Preallocated Frame Buffers
+Helpers that keep the per-frame capture / convert / overlay / encode path
+from allocating whole-frame arrays: OpenCV calls write into pooled buffers
+through dst=, the metrics panel is blended only inside its ROI, and encoded
+JPEGs are passed around as memoryviews instead of bytes copies.
+"""
+
+from collections import defaultdict
+from contextlib import contextmanager
+from threading import Lock
+
+import cv2
+import numpy as np
+
+MJPEG_PART_HEADER = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+MJPEG_PART_FOOTER = b'\r\n'
+
+
+class FrameBufferPool:
+    """
+    Thread-safe free lists of arrays keyed by (shape, dtype).
+
+    Buffers are created on first use and then recycled, so a steady stream of
+    same-sized frames allocates nothing after warm-up.
+    """
+
+    def __init__(self, max_free_per_shape=4):
+        self.max_free_per_shape = max_free_per_shape
+        self._free = defaultdict(list)
+        self._lock = Lock()
+        self.allocated = 0
+        self.reused = 0
+
+    def acquire(self, shape, dtype=np.uint8):
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self._lock:
+            free = self._free[key]
+            if free:
+                self.reused += 1
+                return free.pop()
+            self.allocated += 1
+        return np.empty(shape, dtype=dtype)
+
+    def release(self, array):
+        key = (array.shape, array.dtype.str)
+        with self._lock:
+            free = self._free[key]
+            if len(free) < self.max_free_per_shape:
+                free.append(array)
+
+    @contextmanager
+    def borrow(self, shape, dtype=np.uint8):
+        array = self.acquire(shape, dtype)
+        try:
+            yield array
+        finally:
+            self.release(array)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'allocated': self.allocated,
+                'reused': self.reused,
+                'free': sum(len(v) for v in self._free.values())
+            }
+
+
+def flip_into(frame, dst, flip_code=1):
+    """Mirror a frame into a preallocated buffer"""
+    return cv2.flip(frame, flip_code, dst=dst)
+
+
+def bgr_to_rgb(frame, dst):
+    """BGR -> RGB into a preallocated buffer (for MediaPipe)"""
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=dst)
+
+
+_solid_cache = {}
+_solid_lock = Lock()
+
+
+def _solid(shape, color):
+    key = (shape, tuple(color))
+    with _solid_lock:
+        solid = _solid_cache.get(key)
+        if solid is None:
+            if len(_solid_cache) > 32:
+                _solid_cache.clear()
+            solid = np.empty(shape, dtype=np.uint8)
+            solid[:] = color
+            _solid_cache[key] = solid
+    return solid
+
+
+def blend_panel(frame, top_left, bottom_right, color=(0, 0, 0), alpha=0.7):
+    """
+    Semi-transparent filled rectangle, blended in place inside its ROI only.
+
+    Same result as drawing on frame.copy() and addWeighted over the whole
+    frame, without copying or blending the pixels outside the panel.
+    """
+    h, w = frame.shape[:2]
+    x0, y0 = max(0, top_left[0]), max(0, top_left[1])
+    x1, y1 = min(w, bottom_right[0] + 1), min(h, bottom_right[1] + 1)
+    if x1 <= x0 or y1 <= y0:
+        return frame
+    roi = frame[y0:y1, x0:x1]
+    cv2.addWeighted(_solid(roi.shape, color), alpha, roi, 1.0 - alpha, 0, dst=roi)
+    return frame
+
+
+def encode_jpeg(frame, quality=85):
+    """Encode to JPEG and return a memoryview of the encoder's buffer (no bytes copy)"""
+    ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ret:
+        return None
+    return memoryview(buffer).cast('B')
+
+
+def mjpeg_part(jpeg):
+    """Frame one JPEG as a multipart/x-mixed-replace part with a single copy"""
+    return b''.join((MJPEG_PART_HEADER, jpeg, MJPEG_PART_FOOTER))
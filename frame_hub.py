@@ -0,0 +1,191 @@
+"""
+Frame Hub
+One background capture+detect thread per camera source that publishes the
+latest annotated JPEG into a small ring buffer. Every /api/feed client streams
+from that buffer, so detection cost does not grow with the number of viewers.
+"""
+
+import time
+from threading import Condition, Event, Thread
+
+from frame_buffers import mjpeg_part
+from frame_scheduler import FrameScheduler
+from stream_profiles import AdaptiveQuality, ProfileEncoder, select_part
+
+
+class FrameHub:
+    """
+    Single-producer / multi-subscriber fan-out of encoded frames.
+
+    The producer never waits on subscribers: each subscriber tracks the last
+    sequence number it sent and always jumps to the newest frame, so a slow
+    client drops frames instead of holding back the camera loop.
+
+    produce_frame(run_detection) returns (frame_bytes, frame) or None; the
+    scheduler decides pacing and which frames get full detection. With
+    produce_frame=None the hub has no thread of its own and frames are
+    pushed in with publish() (e.g. by a FramePipeline). tap(frame_bytes, ts),
+    if given, also receives every published frame (e.g. a clip recorder).
+
+    Published frames are encoded at `quality`; subscribers with a
+    StreamProfile asking for something else get a shared re-encode of the
+    raw frame from self.encoder. With a profiler (perf_stats.StageProfiler),
+    the time subscribers take to send each part is recorded as 'send'.
+    """
+
+    def __init__(self, produce_frame=None, name='camera', ring_size=4, scheduler=None, tap=None, quality=85,
+                 profiler=None):
+        self.produce_frame = produce_frame
+        self.profiler = profiler
+        self.tap = tap
+        self.name = name
+        self.ring_size = ring_size
+        self.quality = quality
+        self.encoder = ProfileEncoder()
+        if scheduler is None and produce_frame is not None:
+            scheduler = FrameScheduler()
+        self.scheduler = scheduler
+
+        self._cond = Condition()
+        self._ring = [None] * ring_size
+        self._seq = 0
+        self._stop = Event()
+        self._stop.set()
+        self._thread = None
+
+        self.subscribers = 0
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.producer_errors = 0
+        self.quality_changes = 0
+
+    @property
+    def running(self):
+        return not self._stop.is_set()
+
+    def start(self):
+        """Start the producer thread (no-op if already running)"""
+        if self.running:
+            return
+        self._stop.clear()
+        if self.produce_frame is not None:
+            self.scheduler.reset()
+            self._thread = Thread(target=self._run, name=f"frame-hub-{self.name}", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the producer and release all waiting subscribers"""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            run_detection = self.scheduler.begin_frame()
+            try:
+                result = self.produce_frame(run_detection)
+            except Exception as e:
+                self.producer_errors += 1
+                print(f"Frame hub '{self.name}' producer error: {e}")
+                result = None
+
+            if result is not None:
+                self.publish(*result)
+
+            self._stop.wait(self.scheduler.end_frame())
+
+    def publish(self, frame_bytes, frame=None):
+        """Store a frame in the ring buffer and wake subscribers
+
+        The multipart part is built here once and shared by every subscriber.
+        `frame` is the annotated image it was encoded from, kept for profile
+        re-encodes (without it, every subscriber gets the default part).
+        """
+        part = mjpeg_part(frame_bytes)
+        ts = time.time()
+        with self._cond:
+            self._seq += 1
+            self._ring[self._seq % self.ring_size] = (self._seq, frame_bytes, part, ts, frame)
+            self.published += 1
+            self._cond.notify_all()
+        if self.tap is not None:
+            self.tap(frame_bytes, ts)
+
+    def latest(self):
+        """Return (seq, frame_bytes, mjpeg_part, timestamp, frame) of the newest frame, or None"""
+        with self._cond:
+            if self._seq == 0:
+                return None
+            return self._ring[self._seq % self.ring_size]
+
+    def subscribe(self, timeout=1.0, profile=None, source_fps=30):
+        """Yield ready-to-send MJPEG parts as frames are published, until the hub stops
+
+        With a StreamProfile, frames are paced to its max_fps and re-encoded
+        to its width/quality, and the time the caller takes to send each part
+        (the gap until it asks for the next one) drives adaptive quality.
+        """
+        adapter = None
+        min_interval = 0.0
+        if profile is not None:
+            interval = profile.frame_interval(source_fps)
+            adapter = AdaptiveQuality(profile, interval)
+            if profile.max_fps:
+                min_interval = interval
+
+        last_seq = 0
+        last_sent = 0.0
+        with self._cond:
+            self.subscribers += 1
+        try:
+            while self.running:
+                if min_interval:
+                    wait = last_sent + min_interval - time.monotonic()
+                    if wait > 0 and self._stop.wait(wait):
+                        break
+                with self._cond:
+                    self._cond.wait_for(lambda: self._seq > last_seq or self._stop.is_set(), timeout)
+                    if self._stop.is_set() or self._seq == last_seq:
+                        continue
+                    seq, _, part, _, frame = self._ring[self._seq % self.ring_size]
+                    if last_seq and seq - last_seq > 1:
+                        self.dropped += seq - last_seq - 1
+                    self.delivered += 1
+                last_seq = seq
+                if profile is None:
+                    yield part
+                    continue
+
+                quality = adapter.quality
+                part = select_part(self.encoder, profile, adapter, seq, frame, part, self.quality)
+                last_sent = time.monotonic()
+                yield part
+                sent = time.monotonic() - last_sent
+                adapter.observe(sent, len(part))
+                if self.profiler is not None:
+                    self.profiler.record('send', sent)
+                if adapter.quality != quality:
+                    self.quality_changes += 1
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+
+    def stats(self):
+        with self._cond:
+            stats = {
+                'running': self.running,
+                'subscribers': self.subscribers,
+                'published': self.published,
+                'delivered': self.delivered,
+                'dropped': self.dropped,
+                'producer_errors': self.producer_errors,
+                'quality_changes': self.quality_changes
+            }
+        stats['encodings'] = self.encoder.stats()
+        if self.scheduler is not None:
+            stats['scheduler'] = self.scheduler.stats()
+        return stats
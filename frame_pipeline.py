@@ -0,0 +1,303 @@
+"""
+Staged Frame Pipeline
+Runs fetch, decode, detect, annotate and encode on separate worker threads
+with small bounded queues in between, so network I/O for frame N+1 overlaps
+with detection of frame N and encoding of frame N-1.
+"""
+
+import heapq
+import queue
+import time
+from threading import Event, Lock, Thread
+
+from frame_scheduler import FrameScheduler
+from perf_stats import LatencyCounter
+
+
+class FrameJob:
+    """One frame travelling through the pipeline"""
+
+    __slots__ = ('seq', 'captured_at', 'run_detection', 'reuse', 'data', 'frame', 'result', 'output')
+
+    def __init__(self, seq, run_detection, data):
+        self.seq = seq
+        self.captured_at = time.time()
+        self.run_detection = run_detection
+        self.reuse = False  # detection due, but the previous result still applies
+        self.data = data
+        self.frame = None
+        self.result = None
+        self.output = None
+
+
+class PipelineStage:
+    """
+    A pipeline step: fn(job) -> job (or None to drop the frame).
+
+    when(job) can skip the stage for a job (it passes through untouched).
+    ordered stages run on a single worker and restore frame order with a small
+    reorder buffer, for steps that update per-session state in frame order.
+    Frames the pipeline drops upstream (evicted from a queue, or failed or
+    dropped by a stage) are reported through discard() and skipped over at
+    once; a frame still missing after reorder_wait seconds is skipped too,
+    and dropped if it arrives after that.
+    """
+
+    def __init__(self, name, fn, workers=1, when=None, ordered=False, reorder_wait=0.1):
+        self.name = name
+        self.fn = fn
+        self.workers = 1 if ordered else max(1, workers)
+        self.when = when
+        self.ordered = ordered
+        self.reorder_wait = reorder_wait
+        self.queue = None
+
+        self.latency = LatencyCounter()
+        self.cost_ema = None
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.skipped = 0  # sequence gaps passed over by an ordered stage
+        self.last_seq = 0
+        self._lock = Lock()
+        self._discarded = set()  # seqs dropped before reaching this (ordered) stage
+
+    def record(self, seconds):
+        self.latency.record(seconds)
+        with self._lock:
+            self.processed += 1
+            self.cost_ema = seconds if self.cost_ema is None else 0.8 * self.cost_ema + 0.2 * seconds
+
+    def discard(self, seq):
+        """Note that frame seq will never arrive, so the reorder buffer need not wait for it"""
+        with self._lock:
+            if seq > self.last_seq:
+                self._discarded.add(seq)
+
+    def skip_discarded(self):
+        """Advance last_seq over frames known to be dropped upstream"""
+        with self._lock:
+            while self.last_seq + 1 in self._discarded:
+                self.last_seq += 1
+                self._discarded.discard(self.last_seq)
+                self.skipped += 1
+            if len(self._discarded) > 256:
+                self._discarded = {seq for seq in self._discarded if seq > self.last_seq}
+
+    def reset(self):
+        with self._lock:
+            self.last_seq = 0
+            self._discarded = set()
+
+    def throughput_cost(self):
+        """Average seconds of stage time per frame, given its worker count"""
+        return (self.cost_ema or 0.0) / self.workers
+
+    def stats(self):
+        stats = self.latency.snapshot()
+        stats.update({
+            'workers': self.workers,
+            'queue_depth': self.queue.qsize() if self.queue is not None else 0,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'skipped': self.skipped
+        })
+        return stats
+
+
+class FramePipeline:
+    """
+    fetch() -> stage 1 -> ... -> stage N -> sink(job)
+
+    The fetch loop is paced by a FrameScheduler. Every inter-stage queue is
+    bounded; when a queue is full the oldest frame is dropped so latency does
+    not build up behind a slow stage. The sink only ever sees frames in
+    increasing sequence order.
+    """
+
+    def __init__(self, fetch, stages, sink, scheduler=None, queue_size=2, name='camera'):
+        self.fetch = fetch
+        self.stages = stages
+        self.sink = sink
+        self.scheduler = scheduler or FrameScheduler()
+        self.queue_size = queue_size
+        self.name = name
+
+        self._stop = Event()
+        self._stop.set()
+        self._threads = []
+        self._seq = 0
+        self._sink_lock = Lock()
+        self._last_output_seq = 0
+
+        self.fetch_latency = LatencyCounter()
+        self.fetch_errors = 0
+        self.stale_outputs = 0
+        self.outputs = 0
+
+    @property
+    def running(self):
+        return not self._stop.is_set()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self.scheduler.reset()
+        self._last_output_seq = 0
+        for stage in self.stages:
+            stage.queue = queue.Queue(maxsize=self.queue_size)
+            stage.reset()
+
+        self._threads = [Thread(target=self._fetch_loop, name=f"{self.name}-fetch", daemon=True)]
+        for index, stage in enumerate(self.stages):
+            for worker in range(stage.workers):
+                self._threads.append(Thread(target=self._stage_loop, args=(index,),
+                                            name=f"{self.name}-{stage.name}-{worker}", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def _offer(self, index, job):
+        """Put on stage index's queue without blocking; evict the oldest queued frame when full"""
+        stage = self.stages[index]
+        while True:
+            try:
+                stage.queue.put_nowait(job)
+                return
+            except queue.Full:
+                try:
+                    evicted = stage.queue.get_nowait()
+                    stage.dropped += 1
+                    self._discard(index, evicted.seq)
+                except queue.Empty:
+                    pass
+
+    def _discard(self, index, seq):
+        """Tell the ordered stages from stage index on that frame seq is gone"""
+        for stage in self.stages[index:]:
+            if stage.ordered:
+                stage.discard(seq)
+
+    def _frame_cost(self, run_detection):
+        """Per-frame cost of the slowest stage, used to drive decimation
+
+        Fetch is left out: it mostly waits on the camera's own frame rate.
+        """
+        costs = [0.0]
+        for stage in self.stages:
+            if stage.when is None or run_detection:
+                costs.append(stage.throughput_cost())
+        return max(costs)
+
+    def _fetch_loop(self):
+        while not self._stop.is_set():
+            run_detection = self.scheduler.begin_frame()
+            start = time.perf_counter()
+            try:
+                data = self.fetch()
+            except Exception as e:
+                self.fetch_errors += 1
+                print(f"Pipeline '{self.name}' fetch error: {e}")
+                data = None
+            self.fetch_latency.record(time.perf_counter() - start)
+
+            self._seq += 1
+            job = FrameJob(self._seq, run_detection, data)
+            if self.stages:
+                self._offer(0, job)
+            else:
+                self._emit(job)
+
+            self._stop.wait(self.scheduler.end_frame(cost=self._frame_cost(run_detection)))
+
+    def _run_job(self, stage, job):
+        if stage.when is None or stage.when(job):
+            start = time.perf_counter()
+            try:
+                job = stage.fn(job)
+            except Exception as e:
+                stage.errors += 1
+                print(f"Pipeline '{self.name}' stage '{stage.name}' error: {e}")
+                job = None
+            stage.record(time.perf_counter() - start)
+        return job
+
+    def _forward(self, index, seq, job):
+        """Pass stage index's output on; None (dropped or failed) is reported downstream"""
+        if job is None:
+            self._discard(index + 1, seq)
+            return
+        if index + 1 < len(self.stages):
+            self._offer(index + 1, job)
+        else:
+            self._emit(job)
+
+    def _stage_loop(self, index):
+        stage = self.stages[index]
+        if stage.ordered:
+            self._ordered_loop(index)
+            return
+
+        while not self._stop.is_set():
+            try:
+                job = stage.queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            self._forward(index, job.seq, self._run_job(stage, job))
+
+    def _ordered_loop(self, index):
+        stage = self.stages[index]
+        pending = []  # heap of (seq, arrival time, job)
+
+        while not self._stop.is_set():
+            try:
+                job = stage.queue.get(timeout=stage.reorder_wait / 4 if pending else 0.1)
+                if job.seq <= stage.last_seq:
+                    stage.dropped += 1
+                    self._discard(index + 1, job.seq)
+                else:
+                    heapq.heappush(pending, (job.seq, time.perf_counter(), job))
+            except queue.Empty:
+                pass
+
+            now = time.perf_counter()
+            while pending:
+                stage.skip_discarded()
+                seq, arrived, job = pending[0]
+                if seq != stage.last_seq + 1 and now - arrived < stage.reorder_wait:
+                    break
+                heapq.heappop(pending)
+                if seq <= stage.last_seq:
+                    stage.dropped += 1  # arrived after being reported dropped
+                    continue
+                # Gaps given up on here are given up on by later ordered stages too
+                for missing in range(stage.last_seq + 1, seq):
+                    self._discard(index + 1, missing)
+                stage.last_seq = seq
+                self._forward(index, seq, self._run_job(stage, job))
+
+    def _emit(self, job):
+        with self._sink_lock:
+            if job.seq < self._last_output_seq:
+                self.stale_outputs += 1
+                return
+            self._last_output_seq = job.seq
+            self.outputs += 1
+            self.sink(job)
+
+    def stats(self):
+        return {
+            'running': self.running,
+            'outputs': self.outputs,
+            'stale_outputs': self.stale_outputs,
+            'fetch': dict(self.fetch_latency.snapshot(), errors=self.fetch_errors),
+            'stages': {stage.name: stage.stats() for stage in self.stages},
+            'scheduler': self.scheduler.stats()
+        }
@@ -0,0 +1,121 @@
+"""
+Adaptive Frame Scheduler
+Deadline-based pacing for the capture loop. Frames are scheduled on a fixed
+period (so processing time is absorbed instead of added), and detection is
+decimated to every Nth frame while the pipeline cannot keep up.
+"""
+
+import time
+
+
+class FrameScheduler:
+    """
+    Paces a producer loop at target_fps and decides which frames get detection.
+
+    Usage per frame:
+        run_detection = scheduler.begin_frame()
+        ... fetch / detect / encode ...
+        delay = scheduler.end_frame()   # seconds to wait until the next deadline
+
+    Detection and non-detection frame costs are tracked separately, and the
+    detection interval is the smallest N for which the average frame cost fits
+    in the frame period (with some headroom).
+    """
+
+    def __init__(self, target_fps=30, max_detect_interval=6, headroom=0.9):
+        self.target_fps = target_fps
+        self.period = 1.0 / target_fps
+        self.max_detect_interval = max_detect_interval
+        self.headroom = headroom
+
+        self.detect_interval = 1
+        self._deadline = None
+        self._frame_start = None
+        self._last_start = None
+        self._frame_index = 0
+        self._run_detection = True
+        self._interval_ema = None
+        self._detect_ema = None
+        self._plain_ema = None
+
+        self.frames = 0
+        self.detected_frames = 0
+        self.late_frames = 0
+        self.dropped_frames = 0
+
+    def begin_frame(self):
+        """Mark the start of a frame; returns True if detection should run on it"""
+        now = time.perf_counter()
+        if self._deadline is None:
+            self._deadline = now
+        if self._last_start is not None:
+            interval = now - self._last_start
+            self._interval_ema = interval if self._interval_ema is None else \
+                0.9 * self._interval_ema + 0.1 * interval
+        self._last_start = now
+        self._frame_start = now
+
+        self._run_detection = self._frame_index % self.detect_interval == 0
+        self._frame_index += 1
+        self.frames += 1
+        if self._run_detection:
+            self.detected_frames += 1
+        return self._run_detection
+
+    def _update_interval(self):
+        if self._detect_ema is None:
+            return
+        plain = self._plain_ema if self._plain_ema is not None else 0.0
+        budget = self.period * self.headroom
+        for n in range(1, self.max_detect_interval + 1):
+            if (self._detect_ema + (n - 1) * plain) / n <= budget:
+                break
+        if n != self.detect_interval:
+            self.detect_interval = n
+            self._frame_index = 1  # next decimated cycle starts after this frame
+
+    def end_frame(self, cost=None):
+        """Mark the end of a frame; returns how long to wait before the next one
+
+        cost overrides the measured frame time, for pipelined producers where
+        the expensive stages run on other threads.
+        """
+        now = time.perf_counter()
+        busy = cost if cost is not None else now - self._frame_start
+        if self._run_detection:
+            self._detect_ema = busy if self._detect_ema is None else 0.8 * self._detect_ema + 0.2 * busy
+        else:
+            self._plain_ema = busy if self._plain_ema is None else 0.8 * self._plain_ema + 0.2 * busy
+        self._update_interval()
+
+        self._deadline += self.period
+        lag = now - self._deadline
+        if lag > 0:
+            self.late_frames += 1
+            if lag > self.period:
+                # More than a whole frame behind: give up those slots instead of bursting
+                missed = int(lag / self.period)
+                self.dropped_frames += missed
+                self._deadline += missed * self.period
+
+        return max(0.0, self._deadline - now)
+
+    def reset(self):
+        self._deadline = None
+        self._last_start = None
+        self._frame_index = 0
+        self.detect_interval = 1
+
+    def stats(self):
+        achieved = 1.0 / self._interval_ema if self._interval_ema else 0.0
+        return {
+            'target_fps': self.target_fps,
+            'achieved_fps': round(achieved, 2),
+            'frames': self.frames,
+            'detected_frames': self.detected_frames,
+            'late_frames': self.late_frames,
+            'dropped_frames': self.dropped_frames,
+            'detect_every': self.detect_interval,
+            'detect_ms': round((self._detect_ema or 0.0) * 1000.0, 3),
+            'frame_ms': round((self._plain_ema or 0.0) * 1000.0, 3)
+        }
@@ -0,0 +1,194 @@
+"""
+Batched Drowsiness Inference
+Collects feature vectors from concurrent frames/sessions into micro-batches
+and runs one TFLite invoke per batch. Every worker thread owns its own
+interpreters, so nothing is shared between threads.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from perf_stats import LatencyCounter
+
+
+def _bucket(n):
+    """Round a batch size up to a power of two so interpreters can be reused"""
+    size = 1
+    while size < n:
+        size *= 2
+    return size
+
+
+def check_feature_model(interpreter, n_features=None):
+    """Raise ValueError unless the model maps flat [batch, n_features] rows to [batch, k] scores"""
+    shape = tuple(map(int, interpreter.get_input_details()[0]['shape']))
+    if len(shape) != 2 or (n_features is not None and shape[1] != n_features):
+        expected = f"[batch, {n_features}]" if n_features is not None else "[batch, features]"
+        kind = " (an image model)" if len(shape) == 4 else ""
+        raise ValueError(f"Classifier input {list(shape)}{kind} is not {expected} feature rows")
+    output = tuple(map(int, interpreter.get_output_details()[0]['shape']))
+    if len(output) != 2:
+        raise ValueError(f"Classifier output {list(output)} is not [batch, scores]")
+
+
+class InferenceService:
+    """
+    Micro-batching front end for the drowsiness classifier.
+
+    predict(row) blocks until the row's batch has run. A batch closes when it
+    reaches max_batch rows or when its first row has waited max_wait_ms.
+    predict_now(rows) runs directly on the calling thread (single-stream use
+    such as dashcam.py) with a thread-local interpreter. With a profiler
+    (perf_stats.StageProfiler), preprocessing and each invoke are recorded as
+    the 'scaler' and 'tflite_invoke' stages. The model must take flat
+    feature rows (n_features of them, when given); anything else raises
+    ValueError at construction.
+    """
+
+    def __init__(self, interpreter_factory, preprocess=None, workers=1, max_batch=16, max_wait_ms=2.0,
+                 profiler=None, n_features=None):
+        self.interpreter_factory = interpreter_factory
+        self.preprocess = preprocess
+        self.profiler = profiler
+        self.n_features = n_features
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue = queue.Queue()
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._threads = []
+
+        self.batches = 0
+        self.rows = 0
+        self.batch_latency = LatencyCounter()
+        self.request_latency = LatencyCounter()
+
+        # Fail fast if the model cannot be loaded or does not take feature rows
+        self._interpreter(1)
+
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker, name=f"inference-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _interpreter(self, batch_size):
+        """Thread-local interpreter allocated for a given batch size"""
+        cache = getattr(self._local, 'interpreters', None)
+        if cache is None:
+            cache = self._local.interpreters = {}
+        entry = cache.get(batch_size)
+        if entry is None:
+            interpreter = self.interpreter_factory()
+            check_feature_model(interpreter, self.n_features)
+            input_details = interpreter.get_input_details()[0]
+            output_index = interpreter.get_output_details()[0]['index']
+            shape = list(input_details['shape'])
+            if shape[0] != batch_size:
+                shape[0] = batch_size
+                interpreter.resize_tensor_input(input_details['index'], shape)
+            interpreter.allocate_tensors()
+            batch = np.zeros(shape, dtype=input_details['dtype'])
+            entry = cache[batch_size] = (interpreter, input_details['index'], output_index, batch)
+        return entry
+
+    def _run_batch(self, rows):
+        """Run a stacked [n, features] batch and return predictions for those n rows"""
+        n = rows.shape[0]
+        start = time.perf_counter()
+        if self.preprocess is not None:
+            rows = self.preprocess(rows)
+        scaled = time.perf_counter()
+        size = _bucket(n)
+        interpreter, input_index, output_index, batch = self._interpreter(size)
+
+        # The input buffer is reused per batch size; stale padding rows are ignored
+        batch[:n] = rows.reshape((n,) + batch.shape[1:])
+        interpreter.set_tensor(input_index, batch)
+        invoked = time.perf_counter()
+        interpreter.invoke()
+        if self.profiler is not None:
+            self.profiler.record('scaler', scaled - start)
+            self.profiler.record('tflite_invoke', time.perf_counter() - invoked)
+        return interpreter.get_tensor(output_index)[:n, 0].copy()
+
+    def predict_now(self, rows):
+        """Run rows ([features] or [n, features]) on the calling thread"""
+        rows = np.asarray(rows, dtype=np.float32)
+        single = rows.ndim == 1
+        result = self._run_batch(rows.reshape(1, -1) if single else rows)
+        return float(result[0]) if single else result
+
+    def submit(self, row):
+        """Queue one feature row; returns a Future with its prediction"""
+        future = Future()
+        self._queue.put((np.asarray(row, dtype=np.float32).reshape(-1), future, time.perf_counter()))
+        return future
+
+    def predict(self, row):
+        start = time.perf_counter()
+        prediction = self.submit(row).result()
+        self.request_latency.record(time.perf_counter() - start)
+        return prediction
+
+    def _collect(self):
+        """Block for the first request, then gather more until full or the wait bound"""
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get_nowait() if remaining <= 0 else self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+        return batch
+
+    def _worker(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+            live = [(row, future) for row, future, _ in batch if future.set_running_or_notify_cancel()]
+            if not live:
+                continue
+            rows = np.stack([row for row, _ in live])
+            futures = [future for _, future in live]
+
+            start = time.perf_counter()
+            try:
+                predictions = self._run_batch(rows)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            self.batch_latency.record(time.perf_counter() - start)
+            self.batches += 1
+            self.rows += len(futures)
+
+            for future, prediction in zip(futures, predictions):
+                future.set_result(float(prediction))
+
+    def close(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'rows': self.rows,
+            'mean_batch': round(self.rows / self.batches, 2) if self.batches else 0.0,
+            'max_batch': self.max_batch,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'batch_latency': self.batch_latency.snapshot(),
+            'request_latency': self.request_latency.snapshot()
+        }
@@ -0,0 +1,128 @@
+"""
+Vectorized Landmark Features
+Turns MediaPipe face landmarks into the classifier's feature vector
+[avg_ear, left_ear, right_ear, ear_diff, mar] with one gather and one
+vectorized distance computation, instead of per-landmark Python loops and
+separate np.linalg.norm calls. Works on a single face (K, 2|3) or on stacked
+arrays (frames, K, 2|3) for offline batch use.
+"""
+
+from operator import itemgetter
+
+import numpy as np
+
+# MediaPipe landmark indices
+LEFT_EYE = [33, 160, 158, 133, 153, 144]
+RIGHT_EYE = [362, 385, 387, 263, 373, 380]
+MOUTH = [61, 291, 0, 17, 84, 314, 405, 321, 375, 291]
+
+# All points used for features/overlays, in region order:
+# [0:6] left eye, [6:12] right eye, [12:22] mouth
+FEATURE_INDICES = np.array(LEFT_EYE + RIGHT_EYE + MOUTH, dtype=np.intp)
+LEFT_EYE_SLICE = slice(0, 6)
+RIGHT_EYE_SLICE = slice(6, 12)
+MOUTH_SLICE = slice(12, 22)
+
+# Point pairs whose distances make up EAR and MAR (positions in FEATURE_INDICES order)
+#   left EAR:  |p1-p5|, |p2-p4|, |p0-p3|
+#   right EAR: same, offset by 6
+#   MAR:       |p1-p7|, |p2-p6|, |p3-p5|, |p0-p4| of the mouth, offset by 12
+_PAIR_A = np.array([1, 2, 0, 7, 8, 6, 13, 14, 15, 12], dtype=np.intp)
+_PAIR_B = np.array([5, 4, 3, 11, 10, 9, 19, 18, 17, 16], dtype=np.intp)
+
+# One C-level gather of the FEATURE_INDICES landmark objects from a MediaPipe list
+_take_feature_landmarks = itemgetter(*FEATURE_INDICES.tolist())
+
+EPS = 1e-6
+N_FEATURES = 5  # compute_features() columns, the classifier's input width
+
+
+def landmarks_to_array(face_landmarks, indices=None):
+    """
+    Convert a MediaPipe landmark list to an (N, 3) float array of normalized x, y, z.
+
+    With indices, only those landmarks are read (in that order), which is much
+    cheaper per frame than converting all 478 points.
+    """
+    if indices is None:
+        return np.array([(lm.x, lm.y, lm.z) for lm in face_landmarks], dtype=np.float64)
+    return np.array([(face_landmarks[i].x, face_landmarks[i].y, face_landmarks[i].z)
+                     for i in indices], dtype=np.float64)
+
+
+def feature_points(face_landmarks, width, height):
+    """
+    Pixel (K, 2) coordinates of the FEATURE_INDICES points for one face.
+
+    face_landmarks is a MediaPipe landmark list, whose K points are gathered
+    in one itemgetter call and converted to a single array, or an (N, 2|3)
+    array of all normalized landmarks, which is fancy-indexed directly.
+    """
+    if isinstance(face_landmarks, np.ndarray):
+        return gather_feature_points(face_landmarks, width, height)
+    points = np.array([(lm.x, lm.y) for lm in _take_feature_landmarks(face_landmarks)], dtype=np.float64)
+    points *= (width, height)
+    return points
+
+
+def gather_feature_points(points, width=1.0, height=1.0):
+    """
+    Select FEATURE_INDICES from full landmark arrays with one fancy-index.
+
+    points is (N, 2|3) or (frames, N, 2|3) in normalized coordinates; returns
+    (..., K, 2) in pixels.
+    """
+    gathered = np.asarray(points)[..., FEATURE_INDICES, :2]
+    return gathered * (width, height)
+
+
+def compute_features(points):
+    """
+    Features from (..., K, 2) pixel points in FEATURE_INDICES order.
+
+    Returns (..., 5) float64: [avg_ear, left_ear, right_ear, ear_diff, mar].
+    """
+    points = np.asarray(points, dtype=np.float64)
+    diffs = points[..., _PAIR_A, :] - points[..., _PAIR_B, :]
+    d = np.sqrt(np.einsum('...ij,...ij->...i', diffs, diffs))
+
+    left_ear = (d[..., 0] + d[..., 1]) / (2.0 * d[..., 2] + EPS)
+    right_ear = (d[..., 3] + d[..., 4]) / (2.0 * d[..., 5] + EPS)
+    mar = (d[..., 6] + d[..., 7] + d[..., 8]) / (3.0 * d[..., 9] + EPS)
+
+    features = np.empty(d.shape[:-1] + (5,), dtype=np.float64)
+    features[..., 0] = (left_ear + right_ear) / 2.0
+    features[..., 1] = left_ear
+    features[..., 2] = right_ear
+    features[..., 3] = np.abs(left_ear - right_ear)
+    features[..., 4] = mar
+    return features
+
+
+def split_regions(points):
+    """(left_eye, right_eye, mouth) views of (K, 2) feature points, for overlays"""
+    return points[LEFT_EYE_SLICE], points[RIGHT_EYE_SLICE], points[MOUTH_SLICE]
+
+
+class AffineScaler:
+    """
+    StandardScaler.transform as a precomputed x * inv_scale + offset.
+
+    Avoids scikit-learn's per-call validation overhead on single rows.
+    """
+
+    def __init__(self, mean, scale):
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = scale = np.asarray(scale, dtype=np.float64)
+        self.inv_scale = (1.0 / scale).astype(np.float32)
+        self.offset = (-self.mean / scale).astype(np.float32)
+
+    @classmethod
+    def from_sklearn(cls, scaler):
+        mean = scaler.mean_ if getattr(scaler, 'with_mean', True) else np.zeros_like(scaler.scale_)
+        scale = scaler.scale_ if getattr(scaler, 'with_std', True) else np.ones_like(scaler.mean_)
+        return cls(mean, scale)
+
+    def transform(self, features):
+        features = np.asarray(features, dtype=np.float32)
+        return features * self.inv_scale + self.offset
@@ -0,0 +1,228 @@
+"""
+Face Landmarker Pool
+Keeps a bounded set of warmed MediaPipe FaceLandmarker instances alive for the
+lifetime of the server, so each frame only pays for inference and not for
+reloading the face_landmarker.task graph. MediaPipe itself is only
+imported when the first instance is created.
+"""
+
+import queue
+import time
+from contextlib import contextmanager
+from threading import Lock
+
+import numpy as np
+
+from perf_stats import LatencyCounter
+
+
+def image_options(model_path, min_detection_confidence=0.5, min_presence_confidence=0.5,
+                  min_tracking_confidence=0.5):
+    """FaceLandmarkerOptions for IMAGE mode (imports MediaPipe)"""
+    from mediapipe.tasks import python
+    from mediapipe.tasks.python import vision
+    return vision.FaceLandmarkerOptions(
+        base_options=python.BaseOptions(model_asset_path=model_path),
+        running_mode=vision.RunningMode.IMAGE,
+        num_faces=1,
+        min_face_detection_confidence=min_detection_confidence,
+        min_face_presence_confidence=min_presence_confidence,
+        min_tracking_confidence=min_tracking_confidence
+    )
+
+
+def srgb_image(rgb):
+    """Wrap an RGB uint8 array as a MediaPipe image (no copy)"""
+    import mediapipe as mp
+    return mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb)
+
+
+class PooledLandmarker:
+    """A single FaceLandmarker instance plus its latency counters"""
+
+    def __init__(self, instance_id, options):
+        from mediapipe.tasks.python import vision
+        self.instance_id = instance_id
+        self.options = options
+        self.landmarker = vision.FaceLandmarker.create_from_options(options)
+        self.latency = LatencyCounter()
+        self.errors = 0
+        self.healthy = True
+
+    def detect(self, mp_image):
+        """Run detection and record its latency"""
+        start = time.perf_counter()
+        try:
+            return self.landmarker.detect(mp_image)
+        except Exception:
+            self.errors += 1
+            self.healthy = False
+            raise
+        finally:
+            self.latency.record(time.perf_counter() - start)
+
+    def warmup(self, width=640, height=480):
+        """Run one detection on a blank frame so the first real frame is not slow"""
+        blank = np.zeros((height, width, 3), dtype=np.uint8)
+        self.landmarker.detect(srgb_image(blank))
+
+    def close(self):
+        try:
+            self.landmarker.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        stats = self.latency.snapshot()
+        stats.update({'id': self.instance_id, 'errors': self.errors, 'healthy': self.healthy})
+        return stats
+
+
+class LandmarkerPool:
+    """
+    Bounded pool of long-lived FaceLandmarker instances.
+
+    Instances are created and warmed once in start() and checked out per frame,
+    which makes the pool safe to share between Flask's request threads.
+    `options` may also be a zero-argument callable, called in start(), so
+    building the pool does not import MediaPipe. A failed instance is
+    replaced when it is returned; if that fails too, the pool shrinks and a
+    later checkout retries (at most once per retry_interval seconds).
+    """
+
+    def __init__(self, options, size=2, checkout_timeout=5.0, retry_interval=5.0):
+        self.options = options
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        self.retry_interval = retry_interval
+        self._idle = queue.Queue(maxsize=size)
+        self._instances = []
+        self._lock = Lock()
+        self._next_id = 0
+        self._restoring = False
+        self._retry_at = 0.0
+        self.ready = False
+        self.warmup_ms = 0.0
+        self.replaced = 0
+        self.missing = 0  # instances lost to failed replacements, recreated by later checkouts
+        self.replace_errors = 0
+        self.checkout_wait = LatencyCounter()
+
+    def _create(self):
+        with self._lock:
+            instance_id = self._next_id
+            self._next_id += 1
+        instance = PooledLandmarker(instance_id, self.options)
+        instance.warmup()
+        return instance
+
+    def start(self):
+        """Create and warm all instances"""
+        start = time.perf_counter()
+        if callable(self.options):
+            self.options = self.options()
+        for _ in range(self.size):
+            instance = self._create()
+            self._instances.append(instance)
+            self._idle.put(instance)
+        self.warmup_ms = (time.perf_counter() - start) * 1000.0
+        self.ready = True
+
+    def close(self):
+        self.ready = False
+        for instance in self._instances:
+            instance.close()
+        self._instances = []
+
+    def _replace(self, instance):
+        """Swap a failed instance for a fresh one; None (and the pool shrinks) if that fails"""
+        instance.close()
+        try:
+            fresh = self._create()
+        except Exception as e:
+            print(f"✗ Failed to replace landmarker {instance.instance_id}: {e}")
+            with self._lock:
+                self._instances = [i for i in self._instances if i is not instance]
+                self.missing += 1
+                self.replace_errors += 1
+                self._retry_at = time.monotonic() + self.retry_interval
+            return None
+        with self._lock:
+            self._instances = [fresh if i is instance else i for i in self._instances]
+            self.replaced += 1
+        return fresh
+
+    def _restore(self):
+        """Try to recreate one lost instance, if due; returns whether any instances remain"""
+        with self._lock:
+            due = self.missing and not self._restoring and time.monotonic() >= self._retry_at
+            if due:
+                self._restoring = True
+        if due:
+            try:
+                fresh = self._create()
+            except Exception as e:
+                print(f"✗ Failed to recreate a landmarker: {e}")
+                fresh = None
+            with self._lock:
+                self._restoring = False
+                if fresh is None:
+                    self.replace_errors += 1
+                    self._retry_at = time.monotonic() + self.retry_interval
+                else:
+                    self._instances.append(fresh)
+                    self.missing -= 1
+                    self.replaced += 1
+            if fresh is not None:
+                self._idle.put(fresh)
+        with self._lock:
+            return bool(self._instances)
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        """Borrow an instance for the duration of the with-block"""
+        if not self.ready:
+            raise RuntimeError("Landmarker pool not started")
+        if self.missing and not self._restore():
+            raise RuntimeError("No landmarker instances left (replacements failed)")
+
+        start = time.perf_counter()
+        try:
+            instance = self._idle.get(timeout=timeout or self.checkout_timeout)
+        except queue.Empty:
+            raise TimeoutError("No free landmarker instance available")
+        self.checkout_wait.record(time.perf_counter() - start)
+
+        try:
+            yield instance
+        finally:
+            if not instance.healthy:
+                instance = self._replace(instance)
+            # A failed instance is never put back; without a replacement the pool is one smaller
+            if instance is not None:
+                self._idle.put(instance)
+
+    def health(self):
+        """Summary used by /api/health"""
+        return {
+            'ready': self.ready,
+            'size': self.size,
+            'idle': self._idle.qsize(),
+            'healthy': sum(1 for i in self._instances if i.healthy),
+            'missing': self.missing
+        }
+
+    def stats(self):
+        """Per-instance latency counters used by /api/status"""
+        with self._lock:
+            instances = list(self._instances)
+        return {
+            'size': self.size,
+            'idle': self._idle.qsize(),
+            'warmup_ms': round(self.warmup_ms, 3),
+            'replaced': self.replaced,
+            'missing': self.missing,
+            'replace_errors': self.replace_errors,
+            'checkout_wait': self.checkout_wait.snapshot(),
+            'instances': [i.stats() for i in instances]
+        }
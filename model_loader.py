@@ -0,0 +1,144 @@
+"""
+Model Loading
+Lightweight loaders for the drowsiness classifier and its scaler, so a
+server or dashcam start does not pay for TensorFlow or scikit-learn:
+interpreters come from the smallest TFLite runtime installed (tflite_runtime,
+then ai_edge_litert, then full TensorFlow), and the scaler's parameters are
+cached next to scaler.pkl so only the first start unpickles it. Also tracks
+staged startup readiness for /api/health.
+"""
+
+import importlib
+import os
+import pickle
+import time
+from contextlib import contextmanager
+from threading import Lock
+
+import numpy as np
+
+from landmark_features import AffineScaler
+
+# (runtime name, module) in order of preference; TensorFlow exposes it as tf.lite.Interpreter
+TFLITE_RUNTIMES = (
+    ('tflite_runtime', 'tflite_runtime.interpreter'),
+    ('ai_edge_litert', 'ai_edge_litert.interpreter'),
+    ('tensorflow', 'tensorflow')
+)
+
+_runtime = None
+_runtime_lock = Lock()
+
+
+def interpreter_runtime():
+    """(runtime name, Interpreter class) of the first TFLite runtime that imports"""
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None:
+            for name, module in TFLITE_RUNTIMES:
+                try:
+                    loaded = importlib.import_module(module)
+                except ImportError:
+                    continue
+                _runtime = (name, loaded.lite.Interpreter if name == 'tensorflow' else loaded.Interpreter)
+                break
+            else:
+                raise ImportError("No TFLite runtime found (pip install tflite-runtime, ai-edge-litert or tensorflow)")
+        return _runtime
+
+
+def create_interpreter(model_path):
+    """Picklable TFLite interpreter factory"""
+    _, interpreter_class = interpreter_runtime()
+    return interpreter_class(model_path=model_path)
+
+
+def load_scaler(path):
+    """AffineScaler for a pickled StandardScaler
+
+    Its mean/scale are cached in <path>.npz; while the cache is newer than
+    the pickle, scikit-learn is never imported.
+    """
+    cache = path + '.npz'
+    try:
+        if os.path.getmtime(cache) >= os.path.getmtime(path):
+            with np.load(cache) as params:
+                return AffineScaler(params['mean'], params['scale'])
+    except (OSError, KeyError, ValueError):
+        pass
+
+    with open(path, 'rb') as f:
+        scaler = AffineScaler.from_sklearn(pickle.load(f))
+    try:
+        np.savez(cache, mean=scaler.mean, scale=scaler.scale)
+    except OSError as e:
+        print(f"Scaler cache not written ({e})")
+    return scaler
+
+
+class StartupStages:
+    """
+    Readiness of each startup step: 'pending' -> 'loading' -> 'ready' or 'failed'.
+
+    Run a step inside `with stages.stage(name):`. An exception marks the
+    stage failed (with its message) and is not propagated, so later stages
+    still load and the server can report what is missing. Stages named in
+    `optional` only hold readiness back while they are still loading; once
+    failed they leave the server degraded rather than not ready.
+    """
+
+    def __init__(self, names, optional=()):
+        self.started_at = time.time()
+        self.optional = frozenset(optional)
+        self._lock = Lock()
+        self._stages = {name: {'state': 'pending', 'ms': None, 'error': None} for name in names}
+
+    @contextmanager
+    def stage(self, name):
+        with self._lock:
+            self._stages[name] = {'state': 'loading', 'ms': None, 'error': None}
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            state, error = 'failed', str(e)
+            print(f"✗ Startup stage '{name}' failed: {e}")
+        else:
+            state, error = 'ready', None
+        with self._lock:
+            self._stages[name] = {'state': state, 'ms': round((time.perf_counter() - start) * 1000.0, 1),
+                                  'error': error}
+
+    def state(self, name):
+        with self._lock:
+            return self._stages[name]['state']
+
+    def _ready(self):
+        return all(s['state'] == 'ready' or (name in self.optional and s['state'] == 'failed')
+                   for name, s in self._stages.items())
+
+    @property
+    def ready(self):
+        with self._lock:
+            return self._ready()
+
+    @property
+    def degraded(self):
+        """Optional stages that failed"""
+        with self._lock:
+            return [name for name, s in self._stages.items() if name in self.optional and s['state'] == 'failed']
+
+    @property
+    def failed(self):
+        with self._lock:
+            return [name for name, s in self._stages.items() if s['state'] == 'failed']
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'ready': self._ready(),
+                'degraded': [name for name, s in self._stages.items()
+                             if name in self.optional and s['state'] == 'failed'],
+                'uptime_s': round(time.time() - self.started_at, 1),
+                'stages': {name: dict(s, optional=name in self.optional) for name, s in self._stages.items()}
+            }
@@ -0,0 +1,139 @@
+"""
+Motion Gate
+Cheap change detection in front of landmark detection. Each frame is
+shrunk to a small grayscale thumbnail and compared with the thumbnail of
+the last frame that was actually detected, over the whole image and
+inside the eye and mouth regions of the last face found. When neither has
+changed, the previous detection result can be reused instead of running
+the landmarker again. A hard cap on consecutive skips bounds how stale a
+reused result can get, so an eye closure is always seen within a few
+frames even if the change measure misses it.
+"""
+
+from threading import Lock
+
+import cv2
+import numpy as np
+
+from perf_stats import LatencyCounter
+
+
+class MotionGate:
+    """
+    Per-camera detect-or-reuse decision.
+
+    check(frame) returns True when the frame must go through detection
+    (and makes it the new reference) or False when the last result still
+    describes it. observe(result) takes each applied detection result and
+    keeps its eye/mouth regions as the areas to watch. Thresholds are mean
+    absolute gray-level differences (0-255) on the thumbnail.
+    """
+
+    def __init__(self, width=160, threshold=2.5, roi_threshold=4.0, max_skips=2, roi_margin=0.5):
+        self.width = width
+        self.threshold = threshold
+        self.roi_threshold = roi_threshold
+        self.max_skips = max_skips
+        self.roi_margin = roi_margin
+        self._lock = Lock()
+
+        self._small = None
+        self._gray = None
+        self._reference = None
+        self._diff = None
+        self._scale = 1.0
+        self._regions = None  # (left eye, right eye, mouth) points in frame pixels
+        self._skips = 0
+
+        self.frames = 0
+        self.detected = 0
+        self.skipped = 0
+        self.forced = 0
+        self.last_change = 0.0
+        self.last_roi_change = 0.0
+        self.check_latency = LatencyCounter()
+
+    def _thumbnail(self, frame):
+        h, w = frame.shape[:2]
+        size = (self.width, max(1, round(h * self.width / w)))
+        if self._small is None or self._small.shape[:2] != size[::-1] or self._small.ndim != frame.ndim:
+            # New frame geometry: drop the buffers and the reference
+            self._small = self._gray = self._diff = self._reference = None
+        self._scale = self.width / w
+        self._small = cv2.resize(frame, size, dst=self._small, interpolation=cv2.INTER_AREA)
+        if self._small.ndim == 3:
+            self._gray = cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        else:
+            self._gray = self._small
+        return self._gray
+
+    def _roi_boxes(self, shape):
+        """Eye and mouth boxes in thumbnail pixels, padded by roi_margin of their size"""
+        h, w = shape
+        boxes = []
+        for points in self._regions:
+            x0, y0 = points.min(axis=0) * self._scale
+            x1, y1 = points.max(axis=0) * self._scale
+            pad_x = max(1.0, (x1 - x0) * self.roi_margin)
+            pad_y = max(1.0, (y1 - y0) * self.roi_margin)
+            x0, y0 = max(0, int(x0 - pad_x)), max(0, int(y0 - pad_y))
+            x1, y1 = min(w, int(np.ceil(x1 + pad_x)) + 1), min(h, int(np.ceil(y1 + pad_y)) + 1)
+            if x1 > x0 and y1 > y0:
+                boxes.append((x0, y0, x1, y1))
+        return boxes
+
+    def check(self, frame):
+        """True if `frame` needs detection, False if the previous result can be reused"""
+        with self.check_latency.time(), self._lock:
+            self.frames += 1
+            gray = self._thumbnail(frame)
+            reference = self._reference
+            if reference is not None:
+                self._diff = cv2.absdiff(gray, reference, dst=self._diff)
+                change = cv2.mean(self._diff)[0]
+                roi_change = 0.0
+                if self._regions is not None:
+                    for x0, y0, x1, y1 in self._roi_boxes(gray.shape):
+                        roi_change = max(roi_change, cv2.mean(self._diff[y0:y1, x0:x1])[0])
+                self.last_change, self.last_roi_change = change, roi_change
+
+                if change < self.threshold and roi_change < self.roi_threshold:
+                    if self._skips < self.max_skips:
+                        self._skips += 1
+                        self.skipped += 1
+                        return False
+                    self.forced += 1
+
+            # Detect this frame and compare later frames against it
+            self._skips = 0
+            self.detected += 1
+            if reference is None:
+                self._reference = gray.copy()
+            else:
+                np.copyto(reference, gray)
+            return True
+
+    def observe(self, result):
+        """Watch the eye/mouth regions of a detection result (None = no face: whole frame only)"""
+        with self._lock:
+            self._regions = result['landmarks'] if result is not None else None
+
+    def reset(self):
+        with self._lock:
+            self._reference = None
+            self._regions = None
+            self._skips = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'frames': self.frames,
+                'detected': self.detected,
+                'skipped': self.skipped,
+                'forced': self.forced,
+                'skip_rate': round(self.skipped / self.frames, 3) if self.frames else 0.0,
+                'max_skips': self.max_skips,
+                'last_change': round(self.last_change, 2),
+                'last_roi_change': round(self.last_roi_change, 2),
+                'check': self.check_latency.snapshot()
+            }
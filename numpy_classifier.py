@@ -0,0 +1,376 @@
+"""
+NumPy Drowsiness Classifier
+The 5-feature classifier is a few small dense layers, so evaluating it with
+NumPy matmuls costs less than one TFLite set_tensor/invoke/get_tensor round
+trip. export_dense_model() reads the layers out of a .tflite model once
+(dequantizing int8 weights and folding the feature scaler into the first
+layer) and saves them as a compact .npz; NumpyClassifier evaluates that
+file on single rows or whole batches.
+
+Run `python numpy_classifier.py --tflite drowsiness_model.tflite --scaler
+scaler.pkl --out drowsiness_model.npz` to export and check parity against
+the TFLite interpreter.
+"""
+
+import argparse
+import math
+import os
+import sys
+import threading
+import time
+import warnings
+
+import numpy as np
+
+from model_loader import interpreter_runtime, load_scaler
+from perf_stats import LatencyCounter
+
+# Ops a dense classifier may contain; anything else (CONV_2D, ...) is rejected
+ACTIVATION_OPS = {'LOGISTIC': 'sigmoid', 'TANH': 'tanh', 'RELU': 'relu', 'RELU6': 'relu6', 'SOFTMAX': 'softmax'}
+PASSTHROUGH_OPS = {'QUANTIZE', 'DEQUANTIZE', 'RESHAPE', 'DELEGATE'}
+# Activations TFLite can fuse into FULLY_CONNECTED (the op details do not say which)
+FUSED_ACTIVATIONS = ('linear', 'relu', 'relu6', 'relu_n1_to_1', 'tanh')
+
+
+def _softmax(z):
+    e = np.exp(z - z.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+ACTIVATIONS = {
+    'linear': lambda z: z,
+    'relu': lambda z: np.maximum(z, 0.0),
+    'relu6': lambda z: np.clip(z, 0.0, 6.0),
+    'relu_n1_to_1': lambda z: np.clip(z, -1.0, 1.0),
+    'tanh': np.tanh,
+    'sigmoid': lambda z: 1.0 / (1.0 + np.exp(-z)),
+    'softmax': _softmax
+}
+
+
+def dequantize(values, details):
+    """Float view of a (possibly int8/uint8-quantized, possibly per-channel) tensor"""
+    params = details['quantization_parameters']
+    scales = params['scales']
+    if not len(scales):
+        return values.astype(np.float32)
+    shape = [1] * values.ndim
+    if len(scales) > 1:
+        shape[params['quantized_dimension']] = -1
+    zero_points = params['zero_points'].reshape(shape)
+    return ((values.astype(np.float32) - zero_points) * scales.reshape(shape)).astype(np.float32)
+
+
+def quantize(values, details):
+    params = details['quantization_parameters']
+    if not len(params['scales']):
+        return values.astype(details['dtype'])
+    info = np.iinfo(details['dtype'])
+    q = np.round(values / params['scales'][0]) + params['zero_points'][0]
+    return np.clip(q, info.min, info.max).astype(details['dtype'])
+
+
+def quantized_range(details):
+    """(low, high) float values a quantized tensor can hold, or None for a float tensor"""
+    if not len(details['quantization_parameters']['scales']):
+        return None
+    info = np.iinfo(details['dtype'])
+    return dequantize(np.array([info.min, info.max]), details)
+
+
+def ops_details(interpreter):
+    """The interpreter's op list (name, inputs, outputs per op)
+
+    Reading the layers needs the runtime's private _get_ops_details();
+    raises ValueError if this runtime does not have it.
+    """
+    get_ops = getattr(interpreter, '_get_ops_details', None)
+    if get_ops is None:
+        raise ValueError(f"{type(interpreter).__module__}.{type(interpreter).__name__} cannot list a model's ops "
+                         f"(no _get_ops_details); export with ai_edge_litert or tensorflow installed")
+    return get_ops()
+
+
+def feature_range(interpreter):
+    """Range the first dense layer's input is quantized to, or None
+
+    Quantized models saturate the standardized features at this range, even
+    when the model's own input is float (its first op is a QUANTIZE).
+    """
+    tensors = {d['index']: d for d in interpreter.get_tensor_details()}
+    for op in ops_details(interpreter):
+        if op['op_name'] == 'FULLY_CONNECTED':
+            return quantized_range(tensors[op['inputs'][0]])
+    return None
+
+
+def sample_inputs(n_features, bounds, rows, rng):
+    """Random standardized feature rows, spanning `bounds` when the model saturates them"""
+    if bounds is None:
+        return rng.normal(0.0, 1.5, size=(rows, n_features)).astype(np.float32)
+    return rng.uniform(bounds[0], bounds[1], size=(rows, n_features)).astype(np.float32)
+
+
+def export_dense_model(tflite_path, scaler=None, probes=64, seed=0):
+    """Layers of a dense TFLite classifier as {'steps': [...], 'w0': ..., 'b0': ..., ...}
+
+    Raises ValueError if the model is not a chain of FULLY_CONNECTED layers
+    on a flat feature vector. Fused activations are identified by running
+    `probes` random rows and matching each layer's preserved output (the
+    first of equally good candidates wins). In a quantized model every
+    layer saturates at its calibrated range, so the input and each layer's
+    output also get a 'clip' step that reproduces it. With a scaler
+    (landmark_features.AffineScaler), its transform is folded into the
+    first layer (and the input clip), so the result takes raw features.
+    """
+    _, interpreter_class = interpreter_runtime()
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')  # preserving every tensor is what the probes need
+        interpreter = interpreter_class(model_path=tflite_path, experimental_preserve_all_tensors=True)
+    interpreter.allocate_tensors()
+    tensors = {d['index']: d for d in interpreter.get_tensor_details()}
+    input_details = interpreter.get_input_details()[0]
+    if len(input_details['shape']) != 2:
+        raise ValueError(f"{tflite_path} takes input of shape {tuple(map(int, input_details['shape']))}, not a feature "
+                         f"vector; only dense feature classifiers can be exported")
+
+    ops = [op for op in ops_details(interpreter) if op['op_name'] != 'DELEGATE']
+    for op in ops:
+        name = op['op_name']
+        if name != 'FULLY_CONNECTED' and name not in ACTIVATION_OPS and name not in PASSTHROUGH_OPS:
+            raise ValueError(f"{tflite_path} contains a {name} op; only dense (FULLY_CONNECTED) "
+                             f"classifiers can be exported")
+    dense_ops = [op for op in ops if op['op_name'] == 'FULLY_CONNECTED']
+    if not dense_ops:
+        raise ValueError(f"{tflite_path} has no FULLY_CONNECTED layers")
+
+    # Record every dense layer's actual input and output on random rows
+    rng = np.random.default_rng(seed)
+    seen = {op['index']: ([], []) for op in dense_ops}
+    n_features = int(input_details['shape'][1])
+    input_bounds = feature_range(interpreter)
+    for row in sample_inputs(n_features, input_bounds, probes, rng)[:, None, :]:
+        interpreter.set_tensor(input_details['index'], quantize(row, input_details))
+        interpreter.invoke()
+        for op in dense_ops:
+            x, y = op['inputs'][0], op['outputs'][0]
+            seen[op['index']][0].append(dequantize(interpreter.get_tensor(x), tensors[x]).reshape(1, -1))
+            seen[op['index']][1].append(dequantize(interpreter.get_tensor(y), tensors[y]).reshape(1, -1))
+
+    arrays = {}
+    steps = []
+    if input_bounds is not None:
+        bounds = np.tile(input_bounds.reshape(2, 1), (1, n_features))
+        if scaler is not None:
+            # Standardized bounds back to raw features (inv_scale > 0)
+            bounds = (bounds - scaler.offset) / scaler.inv_scale
+        arrays['clip_in'] = bounds.astype(np.float32)
+        steps.append('clip_in')
+    for layer, op in enumerate(dense_ops):
+        weights_index = op['inputs'][1]
+        bias_index = op['inputs'][2] if len(op['inputs']) > 2 else -1
+        weights = dequantize(interpreter.get_tensor(weights_index), tensors[weights_index])  # [out, in]
+        bias = (dequantize(interpreter.get_tensor(bias_index), tensors[bias_index]) if bias_index >= 0
+                else np.zeros(weights.shape[0], dtype=np.float32))
+        x = np.concatenate(seen[op['index']][0])
+        y = np.concatenate(seen[op['index']][1])
+        z = x @ weights.T + bias
+        bounds = quantized_range(tensors[op['outputs'][0]])
+        clip = (lambda v: v) if bounds is None else (lambda v: np.clip(v, bounds[0], bounds[1]))
+        errors = [float(np.abs(clip(ACTIVATIONS[name](z)) - y).mean()) for name in FUSED_ACTIVATIONS]
+        best = min(errors)
+        fused = next(name for name, error in zip(FUSED_ACTIVATIONS, errors) if error <= best * 1.01 + 1e-6)
+
+        if layer == 0 and scaler is not None:
+            # W(x * inv_scale + offset) + b == (W * inv_scale) x + (W offset + b)
+            bias = bias + weights @ scaler.offset
+            weights = weights * scaler.inv_scale
+        arrays[f"w{layer}"] = np.ascontiguousarray(weights.T, dtype=np.float32)  # [in, out] for rows @ w
+        arrays[f"b{layer}"] = bias.astype(np.float32)
+        steps.append('dense')
+        if fused != 'linear':
+            steps.append(fused)
+        if bounds is not None:
+            arrays[f"c{layer}"] = bounds.astype(np.float32)
+            steps.append('clip')
+        # Standalone activation ops that follow this layer
+        for later in ops[ops.index(op) + 1:]:
+            if later['op_name'] == 'FULLY_CONNECTED':
+                break
+            if later['op_name'] in ACTIVATION_OPS:
+                steps.append(ACTIVATION_OPS[later['op_name']])
+
+    arrays['steps'] = np.array(steps)
+    arrays['scaled'] = np.array(scaler is not None)
+    return arrays
+
+
+class NumpyClassifier:
+    """
+    Drowsiness classifier evaluated with NumPy from an exported .npz.
+
+    Drop-in for InferenceService: predict(row) and predict_now(rows) return
+    the first output column. Rows are raw features when the scaler was
+    folded in at export; otherwise `preprocess` is applied first. There is
+    no batching queue: a row costs a few microseconds, so predict() runs on
+    the calling thread.
+    """
+
+    def __init__(self, layers, preprocess=None, profiler=None):
+        steps = [str(s) for s in layers['steps']]
+        self.layers = []  # (step, a, b): weights and bias, or clip bounds
+        dense = -1
+        for step in steps:
+            if step == 'dense':
+                dense += 1
+                self.layers.append((step, np.asarray(layers[f"w{dense}"], dtype=np.float32),
+                                    np.asarray(layers[f"b{dense}"], dtype=np.float32)))
+            elif step == 'clip_in':
+                low, high = np.asarray(layers['clip_in'], dtype=np.float32)
+                self.layers.append((step, low, high))
+            elif step == 'clip':
+                low, high = (np.float32(v) for v in layers[f"c{dense}"])
+                self.layers.append((step, low, high))
+            elif step in ACTIVATIONS:
+                self.layers.append((step, None, None))
+            else:
+                raise ValueError(f"Unknown layer '{step}' in exported classifier")
+        self.steps = steps
+        # Single rows finish a sigmoid output in Python: one float beats four ufunc calls
+        self._row_layers = self.layers[:-1] if steps[-1] == 'sigmoid' else self.layers
+        self.n_features = int(np.shape(layers['w0'])[0])
+        self.scaled = bool(layers['scaled'])
+        self.preprocess = None if self.scaled else preprocess
+        self.profiler = profiler
+        self._lock = threading.Lock()
+
+        self.batches = 0
+        self.rows = 0
+        self.request_latency = LatencyCounter()
+
+    @classmethod
+    def load(cls, path, preprocess=None, profiler=None):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found; export it with `python numpy_classifier.py --out {path}`")
+        with np.load(path) as layers:
+            return cls(dict(layers), preprocess=preprocess, profiler=profiler)
+
+    def evaluate(self, rows, layers=None):
+        """[features] -> [outputs] or [n, features] -> [n, outputs]
+
+        Every step after the first matmul works in place: at a handful of
+        rows the cost is numpy's per-call overhead, not the arithmetic.
+        """
+        x = rows
+        for step, a, b in self.layers if layers is None else layers:
+            if step == 'dense':
+                x = np.dot(x, a)
+                x += b
+            elif step == 'clip_in':
+                x = np.maximum(x, a)  # copy: rows belong to the caller
+                np.minimum(x, b, out=x)
+            elif step == 'clip':
+                np.maximum(x, a, out=x)
+                np.minimum(x, b, out=x)
+            elif step == 'relu':
+                np.maximum(x, 0.0, out=x)
+            elif step == 'sigmoid':
+                np.negative(x, out=x)
+                np.exp(x, out=x)
+                x += 1.0
+                np.reciprocal(x, out=x)
+            else:
+                x = ACTIVATIONS[step](x)
+        return x
+
+    def predict_now(self, rows):
+        """Run rows ([features] or [n, features]) on the calling thread"""
+        start = time.perf_counter()
+        rows = np.asarray(rows, dtype=np.float32)
+        single = rows.ndim == 1
+        if self.preprocess is not None:
+            rows = self.preprocess(rows)
+        if single:
+            result = float(self.evaluate(rows, self._row_layers)[0])
+            if self._row_layers is not self.layers:
+                result = 1.0 / (1.0 + math.exp(-result)) if result >= 0 else 1.0 - 1.0 / (1.0 + math.exp(result))
+        else:
+            result = self.evaluate(rows)[:, 0]
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.batches += 1
+            self.rows += 1 if single else rows.shape[0]
+        if self.profiler is not None:
+            self.profiler.record('numpy_invoke', elapsed)
+        return result
+
+    def predict(self, row):
+        start = time.perf_counter()
+        prediction = self.predict_now(np.asarray(row, dtype=np.float32).reshape(-1))
+        self.request_latency.record(time.perf_counter() - start)
+        return prediction
+
+    def close(self):
+        pass
+
+    def stats(self):
+        return {
+            'backend': 'numpy',
+            'layers': self.steps,
+            'batches': self.batches,
+            'rows': self.rows,
+            'request_latency': self.request_latency.snapshot()
+        }
+
+
+def parity(tflite_path, classifier, scaler=None, rows=1000, seed=1):
+    """Max |numpy - TFLite| over random feature rows, evaluated one row at a time"""
+    _, interpreter_class = interpreter_runtime()
+    interpreter = interpreter_class(model_path=tflite_path)
+    interpreter.allocate_tensors()
+    input_details = interpreter.get_input_details()[0]
+    output_details = interpreter.get_output_details()[0]
+    inputs = sample_inputs(classifier.n_features, feature_range(interpreter), rows, np.random.default_rng(seed))
+    # Raw features mapping to those standardized rows
+    features = inputs if scaler is None else ((inputs - scaler.offset) / scaler.inv_scale).astype(np.float32)
+    reference = np.empty(rows, dtype=np.float32)
+    for i in range(rows):
+        interpreter.set_tensor(input_details['index'], quantize(inputs[i:i + 1], input_details))
+        interpreter.invoke()
+        reference[i] = dequantize(interpreter.get_tensor(output_details['index']), output_details)[0, 0]
+    return float(np.abs(classifier.predict_now(features) - reference).max())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a dense TFLite classifier to .npz for NumpyClassifier")
+    parser.add_argument('--tflite', default='drowsiness_model.tflite')
+    parser.add_argument('--scaler', default='scaler.pkl', help="fold this scaler into the first layer ('' = none)")
+    parser.add_argument('--out', default='drowsiness_model.npz')
+    parser.add_argument('--tolerance', type=float, default=None,
+                        help='max allowed |numpy - TFLite| (default 1e-4 float, 5e-2 quantized models)')
+    args = parser.parse_args()
+
+    scaler = load_scaler(args.scaler) if args.scaler else None
+    try:
+        layers = export_dense_model(args.tflite, scaler)
+    except ValueError as e:
+        print(f"✗ {e}")
+        sys.exit(1)
+    np.savez(args.out, **layers)
+    classifier = NumpyClassifier.load(args.out, preprocess=scaler.transform if scaler else None)
+    print(f"✓ Exported {args.tflite} -> {args.out}: {' -> '.join(classifier.steps)}"
+          f"{' (scaler folded in)' if classifier.scaled else ''}")
+
+    _, interpreter_class = interpreter_runtime()
+    tensors = interpreter_class(model_path=args.tflite).get_tensor_details()
+    quantized = any(len(d['quantization_parameters']['scales']) for d in tensors)
+    tolerance = args.tolerance if args.tolerance is not None else (5e-2 if quantized else 1e-4)
+    error = parity(args.tflite, classifier, scaler)
+    if error > tolerance:
+        print(f"✗ Parity check failed: max |numpy - TFLite| = {error:.2e} > {tolerance:.0e}")
+        sys.exit(1)
+    print(f"✓ Parity with TFLite: max |numpy - TFLite| = {error:.2e} (tolerance {tolerance:.0e})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""
+Lightweight performance counters shared by the streaming server components.
+All timings are reported in milliseconds, except in the Prometheus text
+exposition, which uses seconds as that format expects.
+"""
+
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from itertools import accumulate
+from threading import Lock
+
+
+class LatencyCounter:
+    """Thread-safe running latency summary (count / mean / last / max)"""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.count = 0
+        self.total_ms = 0.0
+        self.last_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, seconds):
+        """Record one observation given in seconds"""
+        ms = seconds * 1000.0
+        with self._lock:
+            self.count += 1
+            self.total_ms += ms
+            self.last_ms = ms
+            if ms > self.max_ms:
+                self.max_ms = ms
+
+    @contextmanager
+    def time(self):
+        """Context manager that records the wall time of its body"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(time.perf_counter() - start)
+
+    def snapshot(self):
+        """Return a JSON-serialisable copy of the counters"""
+        with self._lock:
+            mean = self.total_ms / self.count if self.count else 0.0
+            return {
+                'count': self.count,
+                'mean_ms': round(mean, 3),
+                'last_ms': round(self.last_ms, 3),
+                'max_ms': round(self.max_ms, 3)
+            }
+
+
+class LatencyHistogram:
+    """
+    Thread-safe latency histogram with log-spaced buckets.
+
+    Bucket bounds grow by 2**(1/8) (about 9%) from 10 us to about 3 minutes,
+    so percentiles read back to within one bucket. Recording is a bisect
+    and a few adds under a lock.
+    """
+
+    BOUNDS_MS = tuple(0.01 * 2 ** (i / 8) for i in range(8 * 24))
+
+    def __init__(self):
+        self._lock = Lock()
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, seconds):
+        """Record one observation given in seconds"""
+        ms = seconds * 1000.0
+        i = bisect_left(self.BOUNDS_MS, ms)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.total_ms += ms
+            if ms > self.max_ms:
+                self.max_ms = ms
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(time.perf_counter() - start)
+
+    def quantiles(self, qs=(0.5, 0.95, 0.99)):
+        """Upper bucket bound (ms, capped at the max seen) for each quantile"""
+        with self._lock:
+            counts = list(self.counts)
+            count, max_ms = self.count, self.max_ms
+        values = []
+        for q in qs:
+            if not count:
+                values.append(0.0)
+                continue
+            rank = q * count
+            seen = 0
+            for i, n in enumerate(counts):
+                seen += n
+                if seen >= rank and n:
+                    break
+            bound = self.BOUNDS_MS[i] if i < len(self.BOUNDS_MS) else max_ms
+            values.append(min(bound, max_ms))
+        return values
+
+    def cumulative(self, step=1):
+        """([(upper bound ms, observations <= bound)] at every `step`-th bound, count, total ms), read atomically"""
+        with self._lock:
+            counts, count, total = list(self.counts), self.count, self.total_ms
+        running = list(accumulate(counts[:-1]))
+        return list(zip(self.BOUNDS_MS[::step], running[::step])), count, total
+
+    def snapshot(self):
+        p50, p95, p99 = self.quantiles()
+        with self._lock:
+            count, total, max_ms = self.count, self.total_ms, self.max_ms
+        return {
+            'count': count,
+            'mean_ms': round(total / count, 3) if count else 0.0,
+            'p50_ms': round(p50, 3),
+            'p95_ms': round(p95, 3),
+            'p99_ms': round(p99, 3),
+            'max_ms': round(max_ms, 3)
+        }
+
+
+class StageProfiler:
+    """
+    One LatencyHistogram per named stage (fetch, decode, detect, ...),
+    created on first use, with JSON, console and Prometheus views.
+    """
+
+    QUANTILES = (0.5, 0.95, 0.99)
+    BUCKET_STEP = 8  # Prometheus buckets at every 8th bound: powers of two from 10 us
+
+    def __init__(self):
+        self._lock = Lock()
+        self._stages = {}
+
+    def histogram(self, stage):
+        histogram = self._stages.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._stages.setdefault(stage, LatencyHistogram())
+        return histogram
+
+    def record(self, stage, seconds):
+        self.histogram(stage).record(seconds)
+
+    def time(self, stage):
+        """Context manager that records the wall time of its body under `stage`"""
+        return self.histogram(stage).time()
+
+    def snapshot(self):
+        with self._lock:
+            stages = list(self._stages.items())
+        return {stage: histogram.snapshot() for stage, histogram in stages}
+
+    def report(self):
+        """Console table of per-stage latency"""
+        lines = [f"{'stage':<16}{'count':>9}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)"]
+        for stage, s in self.snapshot().items():
+            lines.append(f"{stage:<16}{s['count']:>9}{s['mean_ms']:>9.2f}{s['p50_ms']:>9.2f}"
+                         f"{s['p95_ms']:>9.2f}{s['p99_ms']:>9.2f}{s['max_ms']:>9.2f}")
+        return '\n'.join(lines)
+
+    def prometheus(self, name='stage_latency_seconds', help_text='Per-stage processing latency'):
+        """Prometheus histogram (cumulative buckets, sum, count) plus a `<name>_quantile` gauge
+        with p50/p95/p99, one `stage` label per stage"""
+        with self._lock:
+            stages = list(self._stages.items())
+        samples = []
+        quantiles = []
+        for stage, histogram in stages:
+            buckets, count, total_ms = histogram.cumulative(self.BUCKET_STEP)
+            for bound_ms, n in buckets:
+                samples.append(('_bucket', {'stage': stage, 'le': f'{bound_ms / 1000.0:.6g}'}, n))
+            samples.append(('_bucket', {'stage': stage, 'le': '+Inf'}, count))
+            samples.append(('_sum', {'stage': stage}, total_ms / 1000.0))
+            samples.append(('_count', {'stage': stage}, count))
+            for q, ms in zip(self.QUANTILES, histogram.quantiles(self.QUANTILES)):
+                quantiles.append(({'stage': stage, 'quantile': q}, ms / 1000.0))
+        return (prometheus_metric(name, 'histogram', help_text, samples) +
+                prometheus_metric(f'{name}_quantile', 'gauge', f'{help_text} (p50/p95/p99)', quantiles))
+
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_metric(name, kind, help_text, samples):
+    """Text exposition (format 0.0.4) of one metric family
+
+    samples: iterable of (name suffix, labels dict, value); a plain
+    (labels, value) pair is taken as having no suffix.
+    """
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for sample in samples:
+        suffix, labels, value = sample if len(sample) == 3 else ('',) + tuple(sample)
+        label_text = ','.join(f'{key}="{_label_value(val)}"' for key, val in labels.items())
+        if isinstance(value, bool):
+            value = int(value)
+        value = str(value) if isinstance(value, int) else repr(float(value))
+        lines.append(f"{name}{suffix}{{{label_text}}} {value}" if label_text else f"{name}{suffix} {value}")
+    return '\n'.join(lines) + '\n'
@@ -2,7 +2,8 @@ import { useState, useEffect, useCallback, useRef } from 'react';
 
 /**
  * Custom hook for managing ESP32-CAM connection and detection status
- * Handles connection state, retry logic, and status polling
+ * Handles connection state, retry logic, and status updates
+ * (pushed over Server-Sent Events, with status polling as a fallback)
  */
 const useESP32Connection = () => {
     const [isConnected, setIsConnected] = useState(false);
@@ -24,6 +25,7 @@ const useESP32Connection = () => {
     });
 
     const statusPollInterval = useRef(null);
+    const eventSource = useRef(null);
     const retryCount = useRef(0);
     const maxRetries = 3;
 
@@ -72,6 +74,71 @@ const useESP32Connection = () => {
         }
     }, []);
 
+    /**
+     * Merge a pushed snapshot/delta into the current stats and detection state
+     */
+    const applyStatusEvent = useCallback((event) => {
+        const data = JSON.parse(event.data);
+        if (data.stats) {
+            setDetectionStats(prev => ({ ...prev, ...data.stats }));
+        }
+        if (data.latest) {
+            setLatestDetection(prev => ({ ...prev, ...data.latest }));
+        }
+    }, []);
+
+    /**
+     * Stop pushed status updates (and any polling fallback)
+     */
+    const stopStatusUpdates = useCallback(() => {
+        if (eventSource.current) {
+            eventSource.current.close();
+            eventSource.current = null;
+        }
+        stopStatusPolling();
+    }, [stopStatusPolling]);
+
+    /**
+     * Subscribe to pushed status updates; falls back to polling when
+     * EventSource is unavailable or the events endpoint cannot be reached
+     */
+    const startStatusUpdates = useCallback(() => {
+        stopStatusUpdates();
+
+        if (typeof EventSource === 'undefined') {
+            startStatusPolling();
+            return;
+        }
+
+        const source = new EventSource(`${ESP32_API_BASE}/events`);
+        let opened = false;
+        eventSource.current = source;
+
+        source.onopen = () => {
+            opened = true;
+            // Push is live again: no need to poll
+            stopStatusPolling();
+        };
+        source.addEventListener('snapshot', applyStatusEvent);
+        source.addEventListener('delta', applyStatusEvent);
+        source.addEventListener('alert', (event) => {
+            const data = JSON.parse(event.data);
+            setLatestDetection(prev => ({ ...prev, alert_type: data.to }));
+        });
+        source.onerror = () => {
+            if (!opened) {
+                // Endpoint not available on this server: poll instead
+                source.close();
+                eventSource.current = null;
+            }
+            // Otherwise the browser reconnects (resuming from Last-Event-ID);
+            // poll in the meantime so the UI does not go stale
+            if (!statusPollInterval.current) {
+                startStatusPolling();
+            }
+        };
+    }, [applyStatusEvent, startStatusPolling, stopStatusPolling, stopStatusUpdates]);
+
     /**
      * Connect to ESP32-CAM device
      */
@@ -97,7 +164,7 @@ const useESP32Connection = () => {
                 setIsConnected(true);
                 setError(null);
                 retryCount.current = 0;
-                startStatusPolling();
+                startStatusUpdates();
                 return { success: true };
             } else {
                 throw new Error(data.error || 'Failed to connect to ESP32-CAM');
@@ -123,7 +190,7 @@ const useESP32Connection = () => {
         } finally {
             setIsConnecting(false);
         }
-    }, [isConnected, startStatusPolling]);
+    }, [isConnected, startStatusUpdates]);
 
     /**
      * Disconnect from ESP32-CAM device
@@ -144,7 +211,7 @@ const useESP32Connection = () => {
             setIsConnected(false);
             setError(null);
             retryCount.current = 0;
-            stopStatusPolling();
+            stopStatusUpdates();
 
             // Reset stats
             setDetectionStats({
@@ -167,7 +234,7 @@ const useESP32Connection = () => {
             console.error('Error disconnecting:', err);
             return { success: false, error: err.message };
         }
-    }, [stopStatusPolling]);
+    }, [stopStatusUpdates]);
 
     /**
      * Toggle connection state
@@ -205,9 +272,9 @@ const useESP32Connection = () => {
      */
     useEffect(() => {
         return () => {
-            stopStatusPolling();
+            stopStatusUpdates();
         };
-    }, [stopStatusPolling]);
+    }, [stopStatusUpdates]);
 
     return {
         // State
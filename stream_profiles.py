@@ -0,0 +1,213 @@
+"""
+Per-Client Stream Profiles
+Viewers of /api/feed pick a resolution, JPEG quality, frame-rate cap and
+bitrate cap with query parameters. Each annotated frame is encoded at most
+once per distinct (width, quality) and shared by every viewer using it, and
+a viewer's quality steps down while its socket backs up and recovers once
+it drains. The full-resolution default shares the feed's own encoding.
+"""
+
+import time
+from threading import Lock
+
+import cv2
+
+from frame_buffers import encode_jpeg, mjpeg_part
+
+MIN_QUALITY = 30
+QUALITY_STEP = 15
+
+
+class StreamProfile:
+    """What one viewer asked for: width (None = source), quality, max fps/kbps"""
+
+    __slots__ = ('width', 'quality', 'max_fps', 'max_kbps', 'adaptive')
+
+    def __init__(self, width=None, quality=85, max_fps=None, max_kbps=None, adaptive=True):
+        self.width = width
+        self.quality = quality
+        self.max_fps = max_fps
+        self.max_kbps = max_kbps
+        self.adaptive = adaptive
+
+    @classmethod
+    def from_args(cls, args, presets, default_quality):
+        """Parse ?profile=&width=&quality=&fps=&kbps=&adaptive= ; ValueError if invalid
+
+        A named preset supplies defaults that the other parameters override.
+        """
+        base = {'quality': default_quality}
+        name = args.get('profile')
+        if name:
+            if name not in presets:
+                raise ValueError(f"unknown profile '{name}' (choose from {', '.join(presets)})")
+            base.update(presets[name])
+
+        def number(key, cast, low, high, default):
+            value = args.get(key)
+            if value in (None, ''):
+                return default
+            try:
+                value = cast(value)
+            except ValueError:
+                raise ValueError(f"'{key}' must be a number") from None
+            if not low <= value <= high:
+                raise ValueError(f"'{key}' must be between {low} and {high}")
+            return value
+
+        return cls(
+            width=number('width', int, 16, 4096, base.get('width')),
+            quality=number('quality', int, MIN_QUALITY, 100, base['quality']),
+            max_fps=number('fps', float, 0.1, 120, base.get('max_fps')),
+            max_kbps=number('kbps', float, 16, 1e6, base.get('max_kbps')),
+            adaptive=args.get('adaptive', '1') not in ('0', 'false', 'no')
+        )
+
+    def frame_interval(self, source_fps):
+        fps = min(self.max_fps, source_fps) if self.max_fps else source_fps
+        return 1.0 / fps
+
+    def __repr__(self):
+        return (f"StreamProfile(width={self.width}, quality={self.quality}, "
+                f"max_fps={self.max_fps}, max_kbps={self.max_kbps}, adaptive={self.adaptive})")
+
+
+class AdaptiveQuality:
+    """
+    Quality ladder for one viewer, driven by how long its socket takes to
+    accept each part.
+
+    A send that eats most of the frame interval (or a bitrate above the
+    profile's cap) steps quality down one rung; sustained fast sends step it
+    back up. Rungs are fixed multiples of QUALITY_STEP below the requested
+    quality so viewers on the same rung share encodes.
+    """
+
+    def __init__(self, profile, frame_interval, hold=2.0):
+        self.profile = profile
+        self.frame_interval = frame_interval
+        self.hold = hold
+        self.levels = list(range(profile.quality, MIN_QUALITY - 1, -QUALITY_STEP)) or [profile.quality]
+        self.level = 0
+        self._send_ema = 0.0
+        self._changed_at = time.monotonic()
+        self._window_start = self._changed_at
+        self._window_bytes = 0
+        self._kbps = 0.0
+        self.steps_down = 0
+        self.steps_up = 0
+
+    @property
+    def quality(self):
+        return self.levels[self.level]
+
+    def observe(self, send_seconds, nbytes):
+        """Feed one part's socket write time and size"""
+        now = time.monotonic()
+        self._send_ema = 0.7 * self._send_ema + 0.3 * send_seconds
+        self._window_bytes += nbytes
+        if now - self._window_start >= 1.0:
+            self._kbps = self._window_bytes * 8 / 1000.0 / (now - self._window_start)
+            self._window_start = now
+            self._window_bytes = 0
+
+        if not self.profile.adaptive or now - self._changed_at < self.hold:
+            return
+        over_budget = self.profile.max_kbps is not None and self._kbps > self.profile.max_kbps
+        if (over_budget or self._send_ema > 0.5 * self.frame_interval) and self.level < len(self.levels) - 1:
+            self.level += 1
+            self.steps_down += 1
+            self._changed_at = now
+        elif (not over_budget and self._send_ema < 0.2 * self.frame_interval and self.level > 0
+              and now - self._changed_at >= 3 * self.hold):
+            self.level -= 1
+            self.steps_up += 1
+            self._changed_at = now
+
+
+class _Encoding:
+    __slots__ = ('lock', 'seq', 'frame', 'part', 'resized', 'encodes', 'hits', 'last_used')
+
+    def __init__(self):
+        self.lock = Lock()
+        self.seq = -1
+        self.frame = None
+        self.part = None
+        self.resized = None
+        self.encodes = 0
+        self.hits = 0
+        self.last_used = time.monotonic()
+
+
+class ProfileEncoder:
+    """
+    Per-hub cache of the newest frame encoded at each (width, quality).
+
+    The first viewer to need a frame at a given key encodes it (into a
+    reused resize buffer); everyone else on that key gets the same part.
+    Keys unused for `idle_seconds` are dropped.
+    """
+
+    def __init__(self, idle_seconds=30.0):
+        self.idle_seconds = idle_seconds
+        self._lock = Lock()
+        self._encodings = {}
+
+    def _entry(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._encodings.get(key)
+            if entry is None:
+                for stale in [k for k, e in self._encodings.items() if now - e.last_used > self.idle_seconds]:
+                    del self._encodings[stale]
+                entry = self._encodings[key] = _Encoding()
+            entry.last_used = now
+            return entry
+
+    def part(self, seq, frame, width, quality):
+        """MJPEG part of frame `seq` at (width, quality), encoding it only once"""
+        entry = self._entry((width, quality))
+        with entry.lock:
+            # Same frame, a newer one, or the same static placeholder object
+            if entry.part is not None and (entry.seq >= seq or entry.frame is frame):
+                entry.hits += 1
+                return entry.part
+            image = frame
+            if width is not None:
+                h, w = frame.shape[:2]
+                size = (width, max(1, round(h * width / w)))
+                entry.resized = cv2.resize(frame, size, dst=entry.resized, interpolation=cv2.INTER_AREA)
+                image = entry.resized
+            encoded = encode_jpeg(image, quality)
+            if encoded is None:
+                return None
+            entry.seq, entry.frame, entry.part = seq, frame, mjpeg_part(encoded)
+            entry.encodes += 1
+            return entry.part
+
+    def stats(self):
+        with self._lock:
+            items = list(self._encodings.items())
+        return {
+            f"{width or 'source'}@q{quality}": {'encodes': e.encodes, 'shared': e.hits}
+            for (width, quality), e in items
+        }
+
+
+def encoding_key(profile, adapter, frame, default_quality):
+    """(width, quality) a viewer needs for this frame, or None if the feed's own part will do"""
+    if frame is None:
+        return None
+    quality = adapter.quality if adapter is not None else profile.quality
+    width = profile.width if profile.width is not None and profile.width < frame.shape[1] else None
+    if width is None and quality == default_quality:
+        return None
+    return width, quality
+
+
+def select_part(encoder, profile, adapter, seq, frame, part, default_quality):
+    """The part to send one viewer: the feed's own encoding when it matches, else a profile encoding"""
+    key = encoding_key(profile, adapter, frame, default_quality)
+    if key is None:
+        return part
+    return encoder.part(seq, frame, *key) or part
@@ -0,0 +1,46 @@
+"""
+Regenerates the tiny dense classifiers used by test_numpy_classifier.py:
+a 5 -> 16 (relu) -> 8 (relu) -> 1 (sigmoid) Keras model trained for a few
+epochs on random rows, converted to float and dynamic-range int8 TFLite.
+Needs TensorFlow; the tests themselves only need a TFLite runtime.
+
+Usage: python tests/data/make_dense_models.py
+"""
+
+import os
+
+import numpy as np
+import tensorflow as tf
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(512, 5)).astype(np.float32)
+    y = (x[:, 0] + 0.5 * x[:, 4] < 0).astype(np.float32)
+    model = tf.keras.Sequential([
+        tf.keras.Input((5,)),
+        tf.keras.layers.Dense(16, activation='relu'),
+        tf.keras.layers.Dense(8, activation='relu'),
+        tf.keras.layers.Dense(1, activation='sigmoid')
+    ])
+    model.compile('adam', 'binary_crossentropy')
+    model.fit(x, y, epochs=30, verbose=0)
+
+    def representative():
+        for i in range(100):
+            yield [x[i:i + 1]]
+
+    for name, quantized in (('dense_float.tflite', False), ('dense_int8.tflite', True)):
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+        if quantized:
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.representative_dataset = representative
+        with open(os.path.join(HERE, name), 'wb') as f:
+            f.write(converter.convert())
+        print(f"✓ Wrote {name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+import socket
+import time
+
+import pytest
+
+from alert_actuator import BuzzerActuator
+
+HOST = '127.0.0.1'
+
+
+@pytest.fixture
+def device():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((HOST, 0))
+    sock.settimeout(2.0)
+    yield sock
+    sock.close()
+
+
+def receive(sock, count):
+    """(monotonic arrival time, payload) of the next `count` datagrams"""
+    out = []
+    for _ in range(count):
+        data, _ = sock.recvfrom(64)
+        out.append((time.monotonic(), data))
+    return out
+
+
+def assert_silent(sock, wait=0.2):
+    sock.settimeout(wait)
+    with pytest.raises(socket.timeout):
+        sock.recvfrom(64)
+
+
+def test_trigger_sends_command_with_latency(device):
+    actuator = BuzzerActuator(port=device.getsockname()[1], retries=0)
+    actuator.start()
+    try:
+        assert actuator.trigger(HOST, frame_ts=time.time())
+        [(_, data)] = receive(device, 1)
+        assert data == b'BUZZER_ON'
+    finally:
+        actuator.close()
+    stats = actuator.stats()
+    assert stats['sent'] == 1 and stats['retries_sent'] == 0
+    assert stats['latency']['count'] == 1
+    assert stats['queue_wait']['count'] == 1
+    assert not stats['running']
+
+
+def test_dedup_window(device):
+    actuator = BuzzerActuator(port=device.getsockname()[1], refresh=0.3, retries=0)
+    actuator.start()
+    try:
+        assert actuator.trigger(HOST)
+        assert not actuator.trigger(HOST)
+        assert not actuator.trigger(HOST)
+        receive(device, 1)
+        assert_silent(device, 0.1)
+        time.sleep(0.3)
+        assert actuator.trigger(HOST)
+        receive(device, 1)
+    finally:
+        actuator.close()
+    stats = actuator.stats()
+    assert stats['triggers'] == 4
+    assert stats['deduplicated'] == 2
+    assert stats['sent'] == 2
+
+
+def test_retry_backoff_schedule(device):
+    interval = 0.05
+    actuator = BuzzerActuator(port=device.getsockname()[1], retries=3, retry_interval=interval)
+    actuator.start()
+    try:
+        assert actuator.trigger(HOST)
+        arrivals = receive(device, 4)
+        assert_silent(device, 0.5)
+    finally:
+        actuator.close()
+
+    times = [t for t, _ in arrivals]
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    # Retry n (1-based) follows the previous send by retry_interval * 2 ** (n - 1)
+    for attempt, gap in enumerate(gaps):
+        expected = interval * 2 ** attempt
+        assert expected * 0.8 <= gap < expected + 0.1, gaps
+    assert actuator.stats()['sent'] == 1
+    assert actuator.stats()['retries_sent'] == 3
+
+
+def test_queue_full_drops_and_rolls_back_dedup():
+    # Not started: nothing drains the queue
+    actuator = BuzzerActuator(port=9, queue_size=1, refresh=60.0)
+    assert actuator.trigger('10.0.0.1')
+    assert not actuator.trigger('10.0.0.2')
+    stats = actuator.stats()
+    assert stats['dropped'] == 1
+    assert stats['queued'] == 1
+    # The dropped host was not marked as sent, so it is not deduplicated later
+    assert stats['targets'] == ['10.0.0.1']
+
+    actuator._queue.get_nowait()
+    assert actuator.trigger('10.0.0.2')
+    assert actuator.stats()['deduplicated'] == 0
+
+
+def test_stale_hosts_are_pruned():
+    actuator = BuzzerActuator(port=9, queue_size=64, refresh=0.05)
+    for i in range(10):
+        assert actuator.trigger(f'10.0.0.{i}')
+    assert len(actuator.stats()['targets']) == 10
+    time.sleep(0.06)
+    assert actuator.trigger('10.0.1.1')
+    assert actuator._last_sent.keys() == {'10.0.1.1'}
+    time.sleep(0.06)
+    assert actuator.stats()['targets'] == []
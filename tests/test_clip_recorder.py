@@ -0,0 +1,87 @@
+import glob
+import json
+import os
+
+from clip_recorder import ClipRecorder, JpegRing
+
+JPEG = b'\xff\xd8' + b'\x00' * 996 + b'\xff\xd9'  # 1000 bytes
+
+
+def sidecars(directory):
+    return [json.load(open(path)) for path in sorted(glob.glob(os.path.join(directory, '*.json')))]
+
+
+def test_ring_bounded_by_age_and_bytes():
+    ring = JpegRing(max_seconds=2.0, max_bytes=5000)
+    for i in range(30):
+        ring.append(i * 0.1, JPEG)
+    assert len(ring) == 5 and ring.bytes == 5000
+    ring = JpegRing(max_seconds=1.0, max_bytes=10 ** 6)
+    for i in range(30):
+        ring.append(i * 0.1, JPEG)
+    assert ring.span() <= 1.0 + 1e-9
+    assert ring.evicted == 30 - len(ring)
+
+
+def test_clip_has_lead_up_and_post_window(tmp_path):
+    recorder = ClipRecorder('cam/1', str(tmp_path), pre_seconds=1.0, post_seconds=0.5)
+    recorder.start()
+    for i in range(40):
+        ts = 100.0 + i * 0.1
+        if i == 20:
+            recorder.trigger('CRITICAL', ts, ear=0.1)
+        recorder.add(JPEG, ts)
+    recorder.close()
+    [sidecar] = sidecars(tmp_path)
+    assert sidecar['reasons'] == ['CRITICAL'] and sidecar['part'] == 1
+    assert sidecar['pre_seconds'] <= 1.0 + 0.1 + 1e-6  # the ring's span plus one frame interval
+    assert abs(sidecar['post_seconds'] - 0.5) < 1e-6
+    assert sidecar['meta'] == {'ear': 0.1}
+    assert os.path.getsize(glob.glob(os.path.join(tmp_path, 'cam_1-*.mjpeg'))[0]) == sidecar['bytes']
+
+
+def test_sustained_alert_is_split_into_bounded_parts(tmp_path):
+    recorder = ClipRecorder('cam', str(tmp_path), pre_seconds=2.0, post_seconds=1.0, max_pending=100,
+                            max_clip_seconds=20.0, max_clip_bytes=10 ** 6)
+    recorder.start()
+    largest = 0
+    for i in range(2000):  # an alert on every frame for 200 s at 10 fps
+        ts = 1000.0 + i * 0.1
+        recorder.trigger('EAR' if i % 2 else 'CRITICAL', ts)
+        recorder.add(JPEG, ts)
+        largest = max(largest, len(recorder._active.frames))
+    recorder.close()
+
+    assert largest <= 201  # never more than max_clip_seconds of frames held
+    parts = sidecars(tmp_path)
+    assert len(parts) == 10
+    assert recorder.stats()['clips_split'] == 9
+    assert sorted(p['part'] for p in parts) == list(range(1, 11))
+    assert all(p['reasons'] == ['CRITICAL', 'EAR'] for p in parts)
+    assert sum(p['alerts'] for p in parts) == 2000
+    assert all(p['frame_times'][-1] - p['frame_times'][0] <= 20.0 + 1e-6 for p in parts)
+    # Parts follow on from each other without losing or repeating frames
+    assert sum(p['frames'] for p in parts) == 2000
+
+
+def test_clip_split_on_bytes(tmp_path):
+    recorder = ClipRecorder('cam', str(tmp_path), pre_seconds=0.0, post_seconds=1.0, max_pending=100,
+                            max_clip_seconds=1e9, max_clip_bytes=50 * len(JPEG))
+    recorder.start()
+    for i in range(120):
+        ts = i * 0.1
+        recorder.trigger('CRITICAL', ts)
+        recorder.add(JPEG, ts)
+    recorder.close()
+    parts = sidecars(tmp_path)
+    assert [p['frames'] for p in parts] == [50, 50, 20]
+    assert all(p['bytes'] <= 50 * len(JPEG) for p in parts)
+
+
+def test_writer_behind_drops_clips(tmp_path):
+    recorder = ClipRecorder('cam', str(tmp_path), pre_seconds=0.0, post_seconds=0.1, max_pending=1)
+    for i in range(3):  # writer not started: the queue fills
+        recorder.trigger('CRITICAL', i * 10.0)
+        recorder.add(JPEG, i * 10.0)
+        recorder.add(JPEG, i * 10.0 + 1.0)
+    assert recorder.stats()['clips_dropped'] == 2
@@ -0,0 +1,166 @@
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from esp32_ingest import (CameraIngest, MJPEGStreamReader, check_camera_url,
+                          find_jpeg_part, serve_stub_camera)
+
+
+def make_jpeg(value):
+    ok, buf = cv2.imencode('.jpg', np.full((24, 32, 3), value, dtype=np.uint8))
+    assert ok
+    return buf.tobytes()
+
+
+JPEGS = [make_jpeg(40), make_jpeg(120), make_jpeg(200)]
+
+
+def multipart(jpegs, content_length=True, boundary=b'frame'):
+    out = b''
+    for jpeg in jpegs:
+        out += b'\r\n--' + boundary + b'\r\nContent-Type: image/jpeg\r\n'
+        if content_length:
+            out += b'Content-Length: %d\r\n' % len(jpeg)
+        out += b'\r\n' + jpeg
+    return out
+
+
+def parse_in_chunks(data, chunk):
+    buf = bytearray()
+    parts = []
+    for i in range(0, len(data), chunk):
+        buf += data[i:i + chunk]
+        while True:
+            part = find_jpeg_part(buf)
+            if part is None:
+                break
+            start, end = part
+            parts.append(bytes(buf[start:end]))
+            del buf[:end]
+    return parts
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(**kwargs):
+        server, url = serve_stub_camera(JPEGS, fps=200, **kwargs)
+        servers.append(server)
+        return url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.mark.parametrize('content_length', [True, False])
+@pytest.mark.parametrize('chunk', [1, 2, 3, 7, 64, 4096])
+def test_find_jpeg_part_across_split_chunks(content_length, chunk):
+    data = multipart(JPEGS * 2, content_length=content_length)
+    assert parse_in_chunks(data, chunk) == JPEGS * 2
+
+
+def test_find_jpeg_part_drops_garbage_but_keeps_partial_marker():
+    buf = bytearray(b'noise' * 10 + b'\xff')
+    assert find_jpeg_part(buf) is None
+    assert buf == b'\xff'
+    buf += JPEGS[0][1:]
+    assert find_jpeg_part(buf) == (0, len(JPEGS[0]))
+
+
+def test_find_jpeg_part_rejects_oversized_frame():
+    buf = bytearray(b'\xff\xd8' + b'\x00' * 100)
+    with pytest.raises(ValueError):
+        find_jpeg_part(buf, max_frame_bytes=50)
+
+
+def test_reader_reads_stub_stream_in_small_chunks(stub):
+    url = stub()
+    reader = MJPEGStreamReader(url + '/stream', chunk_size=7)
+    try:
+        jpegs = [reader.read_jpeg() for _ in range(6)]
+        frame = reader.read_frame()
+    finally:
+        reader.close()
+
+    assert jpegs == JPEGS * 2
+    assert frame is not None and frame.shape == (24, 32, 3)
+    assert reader.stats()['frames'] == 7
+    assert reader.stats()['connects'] == 1
+    assert reader.stats()['decode_errors'] == 0
+
+
+def test_reader_reconnects_after_stub_drops(stub):
+    url = stub(max_frames=2)
+    reader = MJPEGStreamReader(url + '/stream', initial_backoff=0.05, max_backoff=0.05)
+    jpegs = []
+    saw_backoff = False
+    deadline = time.monotonic() + 5.0
+    try:
+        while len(jpegs) < 6 and time.monotonic() < deadline:
+            if not reader.available():
+                saw_backoff = True
+            jpeg = reader.read_jpeg()
+            if jpeg is not None:
+                jpegs.append(jpeg)
+    finally:
+        reader.close()
+
+    # Each connection restarts the stub's sequence at the first frame
+    assert jpegs == JPEGS[:2] * 3
+    assert saw_backoff
+    stats = reader.stats()
+    assert stats['connects'] == 3
+    assert stats['disconnects'] >= 2
+
+
+def test_reader_backs_off_when_camera_is_down(stub):
+    url = stub()
+    reader = MJPEGStreamReader(url + '/missing', initial_backoff=10.0)
+    assert reader.read_jpeg() is None
+    assert not reader.available()
+    assert reader.read_jpeg() is None
+    assert reader.stats()['disconnects'] == 1
+
+
+def test_camera_ingest_falls_back_to_capture(stub):
+    url = stub()
+    ingest = CameraIngest(url + '/missing', url + '/capture', timeout=2)
+    try:
+        assert ingest.read_jpeg() == JPEGS[0]
+        assert ingest.read_jpeg() == JPEGS[0]
+        assert ingest.stats()['polled_frames'] == 2
+        assert ingest.device_host == '127.0.0.1'
+    finally:
+        ingest.close()
+
+
+@pytest.mark.parametrize('url', [
+    None,
+    'rtsp://192.168.1.10/stream',
+    'http:///capture',
+    'http://192.168.1.10:99999/capture',
+    'udp://0.0.0.0:5000/frames',
+])
+def test_check_camera_url_rejects(url):
+    with pytest.raises(ValueError):
+        check_camera_url(url)
+
+
+@pytest.mark.parametrize('url', [
+    'http://192.168.1.10/capture',
+    'http://cam.local:81/stream',
+    'udp://:5000',
+    'udp://0.0.0.0:5000/',
+])
+def test_check_camera_url_accepts(url):
+    assert check_camera_url(url) == url
+
+
+def test_check_camera_url_limits_schemes():
+    with pytest.raises(ValueError):
+        check_camera_url('udp://:5000', schemes=('http',))
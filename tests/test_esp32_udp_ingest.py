@@ -0,0 +1,119 @@
+import struct
+
+import numpy as np
+
+from esp32_udp_ingest import PACKET_HEADER, ChunkReassembler, chunk_frame, frame_id_newer, synthetic_frame
+
+
+def feed_all(reassembler, packets, now=0.0):
+    """Completed frame IDs (and a copy of each frame) from feeding `packets` in order"""
+    done = []
+    for packet in packets:
+        slot = reassembler.feed(packet, now)
+        if slot is not None:
+            done.append((slot.frame_id, slot.buffer.copy()))
+            reassembler.release(slot)
+    return done
+
+
+def test_frame_id_newer_wraps():
+    assert frame_id_newer(1, 0)
+    assert frame_id_newer(0, 0xFFFF)
+    assert frame_id_newer(2, 0xFFFE)
+    assert not frame_id_newer(0xFFFF, 0)
+    assert not frame_id_newer(5, 5)
+
+
+def test_reassembles_frame():
+    frame = synthetic_frame(3)
+    done = feed_all(ChunkReassembler(), chunk_frame(frame, 7))
+    assert [fid for fid, _ in done] == [7]
+    np.testing.assert_array_equal(done[0][1], frame.reshape(-1))
+
+
+def test_out_of_order_and_duplicate_chunks():
+    reassembler = ChunkReassembler()
+    packets = chunk_frame(synthetic_frame(0), 1)
+    packets = packets[::-1] + packets[:1]
+    done = feed_all(reassembler, packets)
+    assert [fid for fid, _ in done] == [1]
+    # The extra copy of chunk 0 arrives after completion, so it is late rather than a duplicate
+    assert reassembler.late_chunks == 1
+
+    reassembler = ChunkReassembler()
+    packets = chunk_frame(synthetic_frame(0), 1)
+    assert feed_all(reassembler, [packets[0], packets[0]] + packets[1:])
+    assert reassembler.duplicate_chunks == 1
+
+
+def test_wraparound():
+    reassembler = ChunkReassembler()
+    ids = [0xFFFE, 0xFFFF, 0, 1]
+    packets = [p for i, fid in enumerate(ids) for p in chunk_frame(synthetic_frame(i), fid)]
+    assert [fid for fid, _ in feed_all(reassembler, packets)] == ids
+    stats = reassembler.stats()
+    assert stats['frames_completed'] == 4
+    assert stats['frames_missing'] == 0
+    assert stats['late_chunks'] == 0
+
+
+def test_lost_chunk_drops_frame_when_newer_completes():
+    reassembler = ChunkReassembler()
+    first = chunk_frame(synthetic_frame(0), 10)
+    second = chunk_frame(synthetic_frame(1), 11)
+    done = feed_all(reassembler, first[:-1] + second)
+    assert [fid for fid, _ in done] == [11]
+    stats = reassembler.stats()
+    assert stats['frames_dropped'] == 1
+    assert stats['chunks_lost'] == 1
+    assert stats['frame_loss'] == 0.5
+
+    # The lost frame's last chunk now arrives too late to matter
+    assert feed_all(reassembler, first[-1:]) == []
+    assert reassembler.late_chunks == 1
+
+
+def test_skipped_frame_ids_count_as_missing():
+    reassembler = ChunkReassembler()
+    packets = chunk_frame(synthetic_frame(0), 0xFFFD) + chunk_frame(synthetic_frame(1), 1)
+    assert [fid for fid, _ in feed_all(reassembler, packets)] == [0xFFFD, 1]
+    assert reassembler.frames_missing == 3  # 0xFFFE, 0xFFFF, 0
+
+
+def test_timeout_expires_incomplete_frame():
+    reassembler = ChunkReassembler(timeout=0.5)
+    reassembler.feed(chunk_frame(synthetic_frame(0), 1)[0], 0.0)
+    reassembler.expire(0.4)
+    assert reassembler.stats()['in_flight'] == 1
+    reassembler.expire(0.6)
+    assert reassembler.stats()['in_flight'] == 0
+    assert reassembler.frames_dropped == 1
+
+
+def test_eviction_keeps_newest_frames():
+    reassembler = ChunkReassembler(max_in_flight=2)
+    for fid in (1, 2, 3):
+        assert reassembler.feed(chunk_frame(synthetic_frame(fid), fid)[0], 0.0) is None
+    assert reassembler.frames_dropped == 1
+    assert sorted(reassembler._in_flight) == [2, 3]
+
+
+def test_sender_restart_resyncs():
+    reassembler = ChunkReassembler(resync_seconds=2.0)
+    feed_all(reassembler, chunk_frame(synthetic_frame(0), 5000), now=0.0)
+    # A restarted sender's IDs can land in the older half of the 16-bit space
+    restarted = chunk_frame(synthetic_frame(1), 40000)
+    assert feed_all(reassembler, restarted, now=1.0) == []
+    assert [fid for fid, _ in feed_all(reassembler, restarted, now=3.5)] == [40000]
+    assert reassembler.resyncs == 1
+
+
+def test_bad_packets():
+    reassembler = ChunkReassembler()
+    good = chunk_frame(synthetic_frame(0), 1)[0]
+    header = list(PACKET_HEADER.unpack_from(good))
+    bad_magic = PACKET_HEADER.pack(0xBEEF, *header[1:]) + good[PACKET_HEADER.size:]
+    truncated = good[:PACKET_HEADER.size + 10]
+    for packet in (b'\x00' * 4, bad_magic, truncated, struct.pack('<6H', *header[:3], 99, *header[4:])):
+        assert reassembler.feed(packet, 0.0) is None
+    assert reassembler.bad_packets == 4
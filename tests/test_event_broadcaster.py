@@ -0,0 +1,119 @@
+import json
+
+import numpy as np
+
+from event_broadcaster import KEEPALIVE, EventBroadcaster
+
+
+def parse(chunks):
+    """[(id, event, data)] from SSE-encoded chunks"""
+    events = []
+    for block in b''.join(chunks).decode().split('\n\n'):
+        if not block or block.startswith(':'):
+            continue
+        fields = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((int(fields['id']), fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def test_deltas_only_carry_changed_values():
+    broadcaster = EventBroadcaster(min_interval=0.0)
+    broadcaster.update('cam', latest={'ear': 0.30001, 'face_detected': True}, stats={'blinks_30s': 1})
+    broadcaster.update('cam', latest={'ear': 0.30004, 'face_detected': False}, stats={'blinks_30s': 1})
+    broadcaster.update('cam', latest={'ear': 0.3}, stats={'blinks_30s': 1})  # nothing changed: no event
+
+    _, chunks = broadcaster.poll(0)
+    events = parse(chunks)
+    assert [e[:2] for e in events] == [(1, 'delta'), (2, 'delta')]
+    assert events[0][2] == {'device': 'cam', 'latest': {'ear': 0.3, 'face_detected': True},
+                            'stats': {'blinks_30s': 1}}
+    assert events[1][2] == {'device': 'cam', 'latest': {'face_detected': False}}
+    assert broadcaster.stats()['coalesced'] == 1
+
+
+def test_updates_coalesce_within_interval():
+    broadcaster = EventBroadcaster(min_interval=3600.0)
+    broadcaster.update('cam', latest={'ear': 0.3})
+    broadcaster.update('cam', latest={'ear': 0.2})
+    broadcaster.update('cam', latest={'mar': 0.5})
+    broadcaster.flush_due()
+    assert [e[2] for e in parse(broadcaster.poll(0)[1])] == [{'device': 'cam', 'latest': {'ear': 0.3}}]
+
+    broadcaster.min_interval = 0.0
+    broadcaster.flush_due()
+    assert parse(broadcaster.poll(1)[1])[0][2] == {'device': 'cam', 'latest': {'ear': 0.2, 'mar': 0.5}}
+
+
+def test_alerts_send_pending_values_first():
+    broadcaster = EventBroadcaster(min_interval=3600.0)
+    broadcaster.update('cam', latest={'ear': 0.3, 'alert_type': None})
+    broadcaster.update('cam', latest={'ear': 0.1, 'alert_type': 'EAR', 'timestamp': 12.5})
+    broadcaster.update('cam', latest={'ear': 0.1, 'alert_type': 'EAR'})  # same alert: no event
+    events = parse(broadcaster.poll(0)[1])
+    assert [e[1] for e in events] == ['delta', 'delta', 'alert']
+    assert events[1][2]['latest'] == {'ear': 0.1, 'alert_type': 'EAR', 'timestamp': 12.5}
+    assert events[2][2] == {'device': 'cam', 'from': None, 'to': 'EAR', 'timestamp': 12.5}
+
+    broadcaster.update('cam', latest={'ear': 0.3, 'alert_type': None, 'timestamp': 14.0})
+    assert parse(broadcaster.poll(3)[1])[-1][2] == {'device': 'cam', 'from': 'EAR', 'to': None, 'timestamp': 14.0}
+    assert broadcaster.stats()['alerts'] == 2
+
+
+def test_numpy_values_are_encoded():
+    broadcaster = EventBroadcaster(min_interval=0.0, float_digits=2)
+    broadcaster.update('cam', latest={'ear': np.float32(0.2468), 'frames': np.int64(3), 'ok': np.bool_(True)})
+    assert parse(broadcaster.poll(0)[1])[0][2]['latest'] == {'ear': 0.25, 'frames': 3, 'ok': True}
+
+
+def test_new_and_lagging_clients_get_a_snapshot():
+    broadcaster = EventBroadcaster(min_interval=0.0, history=4)
+    for i in range(10):
+        broadcaster.update('cam', latest={'n': i})
+    broadcaster.update('other', latest={'alert_type': 'YAWN'})
+
+    for cursor in (None, 2, 99):  # new, fallen out of the log, stale id from a previous run
+        seq, chunks = broadcaster.poll(cursor, 'cam')
+        assert seq == 12
+        [(event_id, event, data)] = parse(chunks)
+        assert (event_id, event) == (12, 'snapshot')
+        assert data == {'device': 'cam', 'latest': {'n': 9}, 'stats': {}, 'alert_type': None}
+
+    [(_, _, data)] = parse(broadcaster.poll(None)[1])
+    assert data['devices']['other']['alert_type'] == 'YAWN'
+    assert data['devices']['cam']['latest'] == {'n': 9}
+
+
+def test_device_filter():
+    broadcaster = EventBroadcaster(min_interval=0.0)
+    broadcaster.update('a', latest={'n': 1})
+    broadcaster.update('b', latest={'n': 2})
+    broadcaster.update('a', latest={'n': 3})
+    cursor, chunks = broadcaster.poll(0, 'a')
+    assert cursor == 3
+    assert [data['latest']['n'] for _, _, data in parse(chunks)] == [1, 3]
+    assert broadcaster.poll(cursor, 'a')[1] == []
+
+
+def test_subscribe_until_close():
+    broadcaster = EventBroadcaster(min_interval=0.0, keepalive=0.01)
+    broadcaster.update('cam', latest={'n': 1})
+    stream = broadcaster.subscribe('cam', last_event_id=0)
+    assert parse([next(stream)])[0][2]['latest'] == {'n': 1}
+    assert broadcaster.stats()['subscribers'] == 1
+    assert next(stream) == KEEPALIVE
+    broadcaster.update('cam', latest={'n': 2})
+    assert parse([next(stream)])[0][2]['latest'] == {'n': 2}
+    broadcaster.close()
+    assert list(stream) == []
+    assert broadcaster.stats()['subscribers'] == 0
+
+
+def test_listeners():
+    broadcaster = EventBroadcaster(min_interval=0.0)
+    calls = []
+    listener = lambda: calls.append(broadcaster.stats()['last_event_id'])  # noqa: E731
+    broadcaster.add_listener(listener)
+    broadcaster.update('cam', latest={'n': 1})
+    broadcaster.remove_listener(listener)
+    broadcaster.update('cam', latest={'n': 2})
+    assert calls == [1]
@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+import pytest
+
+from eye_crop_classifier import (EYE_CLASSES, EyeCheckSchedule, EyeCropClassifier, eye_summary, eye_transform,
+                                 load_header_model)
+from model_loader import interpreter_runtime
+
+HEADER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'hardware', 'drowsiness_model.h')
+
+
+def test_always_checks_every_detection():
+    schedule = EyeCheckSchedule('always')
+    assert all(schedule.due(ear) for ear in (0.05, 0.25, 0.4))
+    assert schedule.stats() == {'mode': 'always', 'detections': 3, 'ambiguous': 0, 'periodic': 0,
+                                'check_rate': 1.0}
+
+
+def test_ambiguous_band_and_periodic_checks():
+    schedule = EyeCheckSchedule('ambiguous', ear_band=(0.20, 0.30), interval=5)
+    assert schedule.due(0.20) and schedule.due(0.25) and schedule.due(0.30)
+    # Clearly open eyes: only every 5th detection since the last check
+    assert [schedule.due(0.35) for _ in range(10)] == [False] * 4 + [True] + [False] * 4 + [True]
+    # An ambiguous detection restarts the count
+    schedule.due(0.35)
+    schedule.due(0.22)
+    assert [schedule.due(0.10) for _ in range(5)] == [False] * 4 + [True]
+
+    stats = schedule.stats()
+    assert (stats['detections'], stats['ambiguous'], stats['periodic']) == (20, 4, 3)
+    assert stats['check_rate'] == round(7 / 20, 3)
+
+
+def test_periodic_checks_can_be_disabled():
+    schedule = EyeCheckSchedule('ambiguous', interval=0)
+    assert not any(schedule.due(0.4) for _ in range(100))
+    assert schedule.stats()['check_rate'] == 0.0
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        EyeCheckSchedule('sometimes')
+
+
+def test_eye_transform_centers_and_levels_the_eye():
+    # Eye corners 20 px apart on a line tilted by 30 degrees
+    angle = np.radians(30)
+    corners = np.array([[100.0, 100.0], [100 + 20 * np.cos(angle), 100 + 20 * np.sin(angle)]])
+    points = np.array([corners[0], corners[0], corners[1], corners[1], corners[1], corners[0]])
+    transform = eye_transform(points, 48, scale=1.6)
+    mapped = corners @ transform[:, :2].T + transform[:, 2]
+    np.testing.assert_allclose(mapped.mean(axis=0), [24.0, 24.0])
+    np.testing.assert_allclose(mapped[:, 1], [24.0, 24.0])  # levelled
+    assert mapped[1, 0] - mapped[0, 0] == pytest.approx(48 / 1.6)
+
+
+def test_eye_summary():
+    probs = np.array([[0.7, 0.2, 0.1], [0.5, 0.1, 0.4]])
+    assert eye_summary(probs) == ('closed', pytest.approx(0.6))
+    assert eye_summary(np.array([[0.1, 0.1, 0.8]] * 2))[0] == EYE_CLASSES[2]
+
+
+def test_load_header_model_rejects_bad_headers(tmp_path):
+    path = tmp_path / 'model.h'
+    path.write_text('const unsigned char other[] = {0x00};')
+    with pytest.raises(ValueError, match='no'):
+        load_header_model(str(path))
+    path.write_text('unsigned char model_data[] = {0x01, 0x02};\nunsigned int model_data_len = 3;')
+    with pytest.raises(ValueError, match='_len says 3'):
+        load_header_model(str(path))
+    path.write_text('unsigned char model_data[] = {' + ', '.join(['0x00'] * 8) + '};')
+    with pytest.raises(ValueError, match='not a TFLite model'):
+        load_header_model(str(path))
+
+
+def test_classifier_on_shipped_model():
+    try:
+        interpreter_runtime()
+    except ImportError as e:
+        pytest.skip(str(e))
+    classifier = EyeCropClassifier(load_header_model(HEADER))
+    assert classifier.size == 48
+    frame = np.random.default_rng(0).integers(0, 255, size=(240, 320, 3), dtype=np.uint8)
+    left_eye = np.array([[100, 120], [105, 115], [115, 115], [120, 120], [115, 125], [105, 125]], dtype=np.float64)
+    right_eye = left_eye + (80, 0)
+    probs = classifier.classify(frame, left_eye, right_eye)
+    assert probs.shape == (2, 3)
+    np.testing.assert_allclose(probs.sum(axis=1), 1.0, atol=1e-2)
+    # Grayscale frames give the same crops as BGR frames that are already gray
+    gray = frame[:, :, 0]
+    np.testing.assert_array_equal(classifier.crop(np.dstack([gray] * 3), left_eye, right_eye).copy(),
+                                  classifier.crop(gray, left_eye, right_eye))
+    assert classifier.stats()['frames'] == 1
@@ -0,0 +1,77 @@
+import threading
+
+import pytest
+
+from fair_executor import FairExecutor
+
+
+@pytest.fixture
+def executor():
+    executor = FairExecutor(workers=1, name='test')
+    yield executor
+    executor.shutdown()
+
+
+def blocked(executor):
+    """Occupy the single worker until the returned event is set"""
+    release = threading.Event()
+    started = threading.Event()
+
+    def wait():
+        started.set()
+        release.wait(5)
+
+    executor.submit('blocker', wait)
+    assert started.wait(5)
+    return release
+
+
+def test_round_robin_between_sessions(executor):
+    release = blocked(executor)
+    order = []
+    futures = [executor.submit('busy', order.append, f"busy-{i}") for i in range(4)]
+    futures += [executor.submit('quiet', order.append, f"quiet-{i}") for i in range(2)]
+    release.set()
+    for future in futures:
+        future.result(timeout=5)
+    assert order == ['busy-0', 'quiet-0', 'busy-1', 'quiet-1', 'busy-2', 'busy-3']
+
+
+def test_results_and_exceptions(executor):
+    assert executor.run('cam', lambda a, b=0: a + b, 2, b=3) == 5
+    future = executor.submit('cam', lambda: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        future.result(timeout=5)
+    assert executor.run('cam', lambda: 'still running') == 'still running'
+
+
+def test_cancelled_jobs_are_skipped(executor):
+    release = blocked(executor)
+    ran = []
+    future = executor.submit('cam', ran.append, 'cancelled')
+    assert future.cancel()
+    executor.submit('cam', ran.append, 'kept')
+    release.set()
+    executor.run('cam', lambda: None)
+    assert ran == ['kept']
+
+
+def test_stats_and_forget(executor):
+    release = blocked(executor)
+    executor.submit('cam', lambda: None)
+    assert executor.stats()['pending'] == {'cam': 1}
+    executor.forget('cam')  # still has queued work: kept
+    release.set()
+    executor.run('cam', lambda: None)
+    executor.shutdown()  # waits for the workers' bookkeeping
+    assert executor.stats()['completed']['cam'] == 2
+    executor.forget('cam')
+    assert 'cam' not in executor.stats()['completed']
+
+
+def test_shutdown_rejects_new_work():
+    executor = FairExecutor(workers=2)
+    assert executor.run('cam', lambda: 1) == 1
+    executor.shutdown()
+    with pytest.raises(RuntimeError):
+        executor.submit('cam', lambda: 1)
@@ -0,0 +1,190 @@
+import numpy as np
+import pytest
+
+from feature_store import (FRAME_DTYPE, ROLLUP_DTYPE, ROLLUP_LATENESS, FeatureStore, SeriesWriter, frame_rollups,
+                           merge_rollups, parse_history_args, read_records, rollups_to_json)
+
+T0 = 25200.0 * 67000  # a multiple of every resolution below and of the hourly chunk length
+SPAN = 7200.0
+
+
+def fill(store, device='cam', seed=0):
+    """Append two hours of frames at 2 fps: some without a face, some without a classifier score"""
+    rng = np.random.default_rng(seed)
+    for i in range(int(SPAN * 2)):
+        face = rng.random() > 0.1
+        prediction = rng.random() if rng.random() > 0.2 else np.nan
+        store.append(device, T0 + i * 0.5, ear=rng.uniform(0.1, 0.4), mar=rng.uniform(0.2, 0.9),
+                     prediction=prediction, face=face, drowsy=face and prediction > 0.7,
+                     blink=rng.random() < 0.05, yawn=rng.random() < 0.01,
+                     alert_type='EAR' if i % 600 < 20 else None)
+
+
+def assert_rows_equal(a, b):
+    assert len(a) == len(b)
+    for field in ROLLUP_DTYPE.names:
+        np.testing.assert_allclose(a[field], b[field], rtol=1e-5, err_msg=field)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = FeatureStore(str(tmp_path), max_points=1000)
+    fill(store)
+    yield store
+    store.close()
+
+
+def test_frames_span_chunk_files(store):
+    store.flush()
+    frames = store.frames('cam', T0, T0 + SPAN)
+    assert len(frames) == SPAN * 2
+    assert np.all(np.diff(frames['t']) > 0)
+    assert len(store.frames('cam', T0 + 3599, T0 + 3601)) == 4
+
+
+@pytest.mark.parametrize('resolution', [10, 60, 120, 600, 700, 1800])
+def test_rollups_match_raw_frames(store, resolution):
+    rows, source = store.rollups('cam', T0, T0 + SPAN, resolution)
+    expected = merge_rollups(frame_rollups(store.frames('cam', T0, T0 + SPAN)), resolution)
+    assert_rows_equal(rows, expected)
+    assert source.startswith('rollup-')
+
+
+def test_rollup_source_selection(store):
+    assert store.rollups('cam', T0, T0 + SPAN, 5)[1] == 'frames'
+    assert store.rollups('cam', T0, T0 + SPAN, 120)[1] == 'rollup-60'
+    assert store.rollups('cam', T0, T0 + SPAN, 1800)[1] == 'rollup-600'
+    # 700 s: the largest stored rollup that divides it is 10 s
+    assert store.rollups('cam', T0, T0 + SPAN, 700)[1] == 'rollup-10'
+
+
+@pytest.mark.parametrize('resolution', [25, 35])
+def test_non_dividing_resolution_keeps_totals(store, resolution):
+    rows, source = store.rollups('cam', T0, T0 + SPAN, resolution)
+    assert source == 'rollup-10'
+    frames = store.frames('cam', T0, T0 + SPAN)
+    assert rows['frames'].sum() == len(frames)
+    assert np.all(np.diff(rows['t']) == resolution)
+
+
+def test_rollups_survive_close_and_reopen(tmp_path):
+    store = FeatureStore(str(tmp_path))
+    fill(store)
+    live = store.rollups('cam', T0, T0 + SPAN, 60)[0]
+    store.close()
+
+    reopened = FeatureStore(str(tmp_path))
+    assert reopened.has_device('cam')
+    assert_rows_equal(reopened.rollups('cam', T0, T0 + SPAN, 60)[0], live)
+
+
+def test_merge_rollups_combines_fields():
+    frames = np.zeros(4, FRAME_DTYPE)
+    frames['t'] = [0.0, 5.0, 12.0, 13.0]
+    frames['ear'] = [0.3, 0.1, 0.2, 0.9]
+    frames['mar'] = [0.5, 0.7, 0.4, 0.9]
+    frames['prediction'] = [0.2, np.nan, 0.6, 0.9]
+    frames['flags'] = [1, 1, 1, 0]  # the last frame has no face
+    rows = merge_rollups(frame_rollups(frames), 10)
+    assert rows['t'].tolist() == [0.0, 10.0]
+    assert rows['frames'].tolist() == [2, 2]
+    assert rows['faces'].tolist() == [2, 1]
+    assert rows['ear_min'].tolist() == pytest.approx([0.1, 0.2])
+    assert rows['mar_max'].tolist() == pytest.approx([0.7, 0.4])
+    assert rows['prediction_sum'].tolist() == pytest.approx([0.2, 0.6])
+    assert rows['prediction_max'].tolist() == pytest.approx([0.2, 0.6])
+    assert len(merge_rollups(np.empty(0, ROLLUP_DTYPE), 10)) == 0
+
+
+def test_rollups_to_json_marks_missing_values():
+    frames = np.zeros(3, FRAME_DTYPE)
+    frames['t'] = [0.0, 10.0, 20.0]
+    frames['ear'] = 0.25
+    frames['prediction'] = [0.5, np.nan, 0.5]
+    frames['flags'] = [1, 1, 0]
+    buckets = rollups_to_json(merge_rollups(frame_rollups(frames), 10), 10)
+    assert buckets['ear_mean'] == [0.25, 0.25, None]
+    assert buckets['ear_min'] == [0.25, 0.25, None]
+    assert buckets['prediction_mean'] == [0.5, None, None]
+    assert buckets['prediction_max'] == [0.5, None, None]
+
+
+def test_history(store):
+    history = store.history('cam', T0, T0 + SPAN)
+    assert history['source'] == 'rollup-10'
+    assert history['buckets']['resolution'] == 10
+    assert len(history['buckets']['t']) == SPAN / 10
+    assert history['events'][:2] == [{'t': T0, 'from': None, 'to': 'EAR'},
+                                     {'t': T0 + 10.0, 'from': 'EAR', 'to': None}]
+
+
+def test_pick_resolution():
+    store = FeatureStore('unused', max_points=1000)
+    assert store.pick_resolution(0, 3600) == 10
+    assert store.pick_resolution(0, 3600, 5) == 5
+    assert store.pick_resolution(0, 3600, 1) == 10
+    assert store.pick_resolution(0, 86400) == 600
+    assert store.pick_resolution(0, 864000) == 1200
+    assert store.pick_resolution(0, 3600, 700) == 700
+
+
+def test_parse_history_args():
+    assert parse_history_args({}, now=10000.0) == (6400.0, 10000.0, None)
+    assert parse_history_args({'from': '100', 'to': '200', 'resolution': '30'}) == (100.0, 200.0, 30.0)
+    assert parse_history_args({'to': '5000'}, default_span=60.0) == (4940.0, 5000.0, None)
+    for args in ({'from': '200', 'to': '100'}, {'from': 'nan', 'to': '100'}, {'from': '-inf'},
+                 {'resolution': '0'}, {'resolution': '-5'}, {'resolution': 'nan'}, {'from': 'yesterday'}):
+        with pytest.raises(ValueError):
+            parse_history_args(args, now=1000.0)
+
+
+def test_dirname_keeps_escaped_ids_apart(tmp_path):
+    store = FeatureStore(str(tmp_path))
+    assert store._dirname('192.168.1.10') == '192.168.1.10'
+    assert store._dirname('cam_1') == 'cam_1'
+    names = {store._dirname(d) for d in ('cam_1', 'cam/1', 'cam 1', 'cam:1', '.cam_1', '', '.')}
+    assert len(names) == 7
+    assert all('/' not in n and not n.startswith('.') for n in names)
+
+    store.append('cam/1', T0, ear=0.3, mar=0.5, face=True)
+    store.append('cam_1', T0, ear=0.3, mar=0.5, face=True)
+    store.append('cam_1', T0 + 1, ear=0.3, mar=0.5, face=True)
+    store.close()
+    assert len(store.frames('cam/1', T0, T0 + 10)) == 1
+    assert len(store.frames('cam_1', T0, T0 + 10)) == 2
+    assert not store.has_device('cam 1')
+
+
+def test_idle_rollup_bucket_is_written_once_over(tmp_path):
+    writer = SeriesWriter(str(tmp_path / 'cam'))
+    for i in range(6):
+        writer.append(T0 + i, ear=0.3, mar=0.5, face=True)
+    path = str(tmp_path / 'cam' / 'rollup-10.bin')
+
+    writer.flush(now=T0 + 6)
+    assert len(read_records(path, ROLLUP_DTYPE)) == 0
+    writer.flush(now=T0 + 10 + ROLLUP_LATENESS)
+    rows = read_records(path, ROLLUP_DTYPE)
+    assert rows['t'].tolist() == [T0]
+    assert rows['frames'].tolist() == [6]
+    assert len(writer.open_rollup(10)) == 0
+    assert len(writer.open_rollup(60)) == 1
+
+    # Without close(), a new store still sees the bucket that rolled over
+    reopened = FeatureStore(str(tmp_path))
+    rows = reopened.rollups('cam', T0, T0 + 60, 10)[0]
+    assert rows['frames'].tolist() == [6]
+
+
+def test_late_frames_for_a_written_bucket_merge_on_read(tmp_path):
+    writer = SeriesWriter(str(tmp_path / 'cam'))
+    writer.append(T0, ear=0.3, mar=0.5, face=True)
+    writer.flush(now=T0 + 60)
+    writer.append(T0 + 5, ear=0.3, mar=0.5, face=True)
+    writer.append(T0 + 12, ear=0.3, mar=0.5, face=True)
+    writer.close()
+
+    store = FeatureStore(str(tmp_path))
+    rows = store.rollups('cam', T0, T0 + 60, 10)[0]
+    assert rows['t'].tolist() == [T0, T0 + 10]
+    assert rows['frames'].tolist() == [2, 1]
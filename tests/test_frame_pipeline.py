@@ -0,0 +1,148 @@
+import itertools
+import queue
+import random
+import threading
+import time
+
+from frame_pipeline import FrameJob, FramePipeline, PipelineStage
+from frame_scheduler import FrameScheduler
+
+
+def run_pipeline(stages, outputs=60, fps=200, queue_size=4, latencies=None):
+    """Run until `outputs` frames reached the sink; returns (pipeline, sink seqs)"""
+    counter = itertools.count()
+    seen = []
+    done = threading.Event()
+
+    def sink(job):
+        seen.append(job.seq)
+        if latencies is not None:
+            latencies.append(time.time() - job.captured_at)
+        if len(seen) >= outputs:
+            done.set()
+
+    pipeline = FramePipeline(lambda: next(counter), stages, sink, scheduler=FrameScheduler(target_fps=fps),
+                             queue_size=queue_size, name='test')
+    pipeline.start()
+    try:
+        assert done.wait(10), f"only {len(seen)} frames reached the sink"
+    finally:
+        pipeline.stop()
+    return pipeline, seen
+
+
+def test_parallel_stage_output_stays_in_order():
+    rng = random.Random(0)
+
+    def detect(job):
+        time.sleep(rng.uniform(0.0, 0.01))
+        job.result = job.data
+        return job
+
+    _, seen = run_pipeline([PipelineStage('detect', detect, workers=4)])
+    assert seen == sorted(seen)
+    assert len(set(seen)) == len(seen)
+
+
+def test_ordered_stage_sees_frames_in_sequence():
+    rng = random.Random(1)
+    order = []
+
+    def detect(job):
+        time.sleep(rng.uniform(0.0, 0.01))
+        return job
+
+    def track(job):
+        order.append(job.seq)
+        return job
+
+    pipeline, seen = run_pipeline([PipelineStage('detect', detect, workers=4),
+                                   PipelineStage('track', track, ordered=True)])
+    assert order == sorted(order)
+    assert seen == sorted(seen)
+    assert pipeline.stats()['stale_outputs'] == 0
+
+
+def test_ordered_stage_skips_frames_dropped_upstream():
+    order = []
+
+    def detect(job):
+        return None if job.seq % 3 == 0 else job
+
+    def track(job):
+        order.append(job.seq)
+        return job
+
+    _, seen = run_pipeline([PipelineStage('detect', detect, workers=2),
+                            PipelineStage('track', track, ordered=True, reorder_wait=0.02)], outputs=20)
+    assert order == sorted(order)
+    assert not any(seq % 3 == 0 for seq in seen)
+
+
+def test_dropped_frames_do_not_stall_ordered_stage():
+    latencies = []
+
+    def detect(job):
+        return None if job.seq % 3 == 0 else job
+
+    track = PipelineStage('track', lambda job: job, ordered=True, reorder_wait=0.5)
+    _, seen = run_pipeline([PipelineStage('detect', detect, workers=2), track], outputs=40, fps=100,
+                           latencies=latencies)
+    assert seen == sorted(seen)
+    assert max(latencies) < 0.25  # waiting out reorder_wait per dropped frame would take 0.5 s
+    assert track.skipped >= 10
+
+
+def test_evicted_frames_do_not_stall_ordered_stage():
+    latencies = []
+
+    def detect(job):
+        time.sleep(0.02)
+        return job
+
+    detect_stage = PipelineStage('detect', detect)
+    track = PipelineStage('track', lambda job: job, ordered=True, reorder_wait=0.5)
+    _, seen = run_pipeline([detect_stage, track], outputs=20, fps=200, queue_size=1, latencies=latencies)
+    assert detect_stage.dropped > 0
+    assert seen == sorted(seen)
+    assert max(latencies) < 0.25
+
+
+def test_stage_conditions_and_errors():
+    ran = []
+
+    def detect(job):
+        ran.append(job.seq)
+        if job.seq == 4:
+            raise RuntimeError('boom')
+        return job
+
+    stage = PipelineStage('detect', detect, when=lambda job: job.seq % 2 == 0)
+    _, seen = run_pipeline([stage], outputs=20)
+    assert all(seq % 2 == 0 for seq in ran)
+    assert 3 in seen and 5 in seen  # skipped the stage, passed through
+    assert 4 not in seen  # failed: dropped
+    assert stage.errors == 1
+
+
+def test_full_queue_evicts_oldest():
+    stage = PipelineStage('detect', lambda job: job)
+    track = PipelineStage('track', lambda job: job, ordered=True)
+    pipeline = FramePipeline(lambda: None, [stage, track], lambda job: None)
+    stage.queue = queue.Queue(maxsize=2)
+    for seq in (1, 2, 3):
+        pipeline._offer(0, FrameJob(seq, True, None))
+    assert [stage.queue.get_nowait().seq for _ in range(2)] == [2, 3]
+    assert stage.dropped == 1
+    # The ordered stage downstream is told not to wait for the evicted frame
+    track.skip_discarded()
+    assert track.last_seq == 1
+
+
+def test_sink_drops_stale_frames():
+    seen = []
+    pipeline = FramePipeline(lambda: None, [], lambda job: seen.append(job.seq))
+    for seq in (1, 3, 2, 4):
+        pipeline._emit(FrameJob(seq, True, None))
+    assert seen == [1, 3, 4]
+    assert pipeline.stale_outputs == 1
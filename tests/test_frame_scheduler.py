@@ -0,0 +1,96 @@
+import pytest
+
+import frame_scheduler
+from frame_scheduler import FrameScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(frame_scheduler.time, 'perf_counter', clock)
+    return clock
+
+
+def run(scheduler, clock, frames, detect_cost, plain_cost):
+    """Drive the scheduler, sleeping as told; returns the detection decision of each frame"""
+    decisions = []
+    for _ in range(frames):
+        detect = scheduler.begin_frame()
+        decisions.append(detect)
+        clock.now += detect_cost if detect else plain_cost
+        clock.now += scheduler.end_frame()
+    return decisions
+
+
+def test_no_decimation_when_detection_fits(clock):
+    scheduler = FrameScheduler(target_fps=30)
+    assert all(run(scheduler, clock, 60, detect_cost=0.02, plain_cost=0.005))
+    stats = scheduler.stats()
+    assert stats['detect_every'] == 1
+    assert stats['late_frames'] == 0
+    assert stats['achieved_fps'] == pytest.approx(30.0)
+
+
+def test_decimates_slow_detection(clock):
+    scheduler = FrameScheduler(target_fps=30, headroom=0.9)
+    decisions = run(scheduler, clock, 120, detect_cost=0.09, plain_cost=0.005)
+    # Smallest N with (0.09 + (N - 1) * 0.005) / N <= 0.9 / 30
+    assert scheduler.detect_interval == 4
+    detected = [i for i, detect in enumerate(decisions[-40:]) if detect]
+    assert len(detected) == 10
+    assert {b - a for a, b in zip(detected, detected[1:])} == {4}
+    assert scheduler.stats()['detected_frames'] == sum(decisions)
+
+
+def test_recovers_when_detection_gets_cheaper(clock):
+    scheduler = FrameScheduler(target_fps=30)
+    run(scheduler, clock, 60, detect_cost=0.09, plain_cost=0.005)
+    assert scheduler.detect_interval > 1
+    run(scheduler, clock, 60, detect_cost=0.01, plain_cost=0.005)
+    assert scheduler.detect_interval == 1
+
+
+def test_interval_capped(clock):
+    scheduler = FrameScheduler(target_fps=30, max_detect_interval=6)
+    run(scheduler, clock, 60, detect_cost=1.0, plain_cost=0.001)
+    assert scheduler.detect_interval == 6
+
+
+def test_cost_override_for_pipelined_producers(clock):
+    scheduler = FrameScheduler(target_fps=30)
+    for _ in range(60):
+        detect = scheduler.begin_frame()
+        clock.now += 0.001
+        clock.now += scheduler.end_frame(cost=0.09 if detect else 0.005)
+    assert scheduler.detect_interval == 4
+    assert scheduler.stats()['late_frames'] == 0
+
+
+def test_late_frames_give_up_missed_slots(clock):
+    scheduler = FrameScheduler(target_fps=10)
+    scheduler.begin_frame()
+    clock.now += 0.35  # three and a half periods
+    assert scheduler.end_frame() == 0.0
+    stats = scheduler.stats()
+    assert stats['late_frames'] == 1
+    assert stats['dropped_frames'] == 2
+    # The next deadline is the next whole slot, not a burst of catch-up frames
+    scheduler.begin_frame()
+    clock.now += 0.01
+    assert scheduler.end_frame() == pytest.approx(0.04)
+
+
+def test_reset(clock):
+    scheduler = FrameScheduler(target_fps=30)
+    run(scheduler, clock, 30, detect_cost=0.09, plain_cost=0.005)
+    scheduler.reset()
+    assert scheduler.detect_interval == 1
+    assert scheduler.begin_frame()
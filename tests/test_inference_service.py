@@ -0,0 +1,129 @@
+import os
+import threading
+from functools import partial
+
+import numpy as np
+import pytest
+
+import detection_core
+from inference_service import InferenceService, check_feature_model
+from landmark_features import N_FEATURES
+from model_loader import StartupStages, create_interpreter, interpreter_runtime
+from numpy_classifier import export_dense_model
+
+try:
+    interpreter_runtime()
+except ImportError as e:
+    pytest.skip(str(e), allow_module_level=True)
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DENSE = os.path.join(REPO, 'tests', 'data', 'dense_float.tflite')
+SHIPPED = os.path.join(REPO, 'drowsiness_model.tflite')
+
+
+def reference(rows):
+    """Predictions straight from one interpreter, one row at a time"""
+    interpreter = create_interpreter(DENSE)
+    interpreter.allocate_tensors()
+    input_index = interpreter.get_input_details()[0]['index']
+    output_index = interpreter.get_output_details()[0]['index']
+    out = []
+    for row in rows:
+        interpreter.set_tensor(input_index, row.reshape(1, -1))
+        interpreter.invoke()
+        out.append(interpreter.get_tensor(output_index)[0, 0])
+    return np.array(out)
+
+
+def rows(n, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, N_FEATURES)).astype(np.float32)
+
+
+def test_predict_now_matches_interpreter():
+    service = InferenceService(partial(create_interpreter, DENSE), workers=0, n_features=N_FEATURES)
+    features = rows(7)
+    np.testing.assert_allclose(service.predict_now(features), reference(features), atol=1e-6)
+    assert service.predict_now(features[0]) == pytest.approx(float(reference(features[:1])[0]), abs=1e-6)
+
+
+def test_preprocess_is_applied():
+    service = InferenceService(partial(create_interpreter, DENSE), preprocess=lambda x: x * 2.0, workers=0)
+    features = rows(4)
+    np.testing.assert_allclose(service.predict_now(features), reference(features * 2.0), atol=1e-6)
+
+
+def test_concurrent_predictions_are_batched():
+    service = InferenceService(partial(create_interpreter, DENSE), workers=1, max_batch=8, max_wait_ms=20.0,
+                               n_features=N_FEATURES)
+    features = rows(16, seed=1)
+    results = [None] * len(features)
+    barrier = threading.Barrier(len(features))
+
+    def predict(i):
+        barrier.wait()
+        results[i] = service.predict(features[i])
+
+    threads = [threading.Thread(target=predict, args=(i,)) for i in range(len(features))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    service.close()
+    np.testing.assert_allclose(results, reference(features), atol=1e-6)
+    stats = service.stats()
+    assert stats['rows'] == 16
+    assert stats['batches'] < 16
+
+
+def test_rejects_models_that_do_not_take_feature_rows():
+    with pytest.raises(ValueError, match='an image model'):
+        InferenceService(partial(create_interpreter, SHIPPED), workers=0, n_features=N_FEATURES)
+    with pytest.raises(ValueError, match=r'\[batch, 4\]'):
+        check_feature_model(create_interpreter(DENSE), 4)
+    check_feature_model(create_interpreter(DENSE), N_FEATURES)
+
+
+@pytest.fixture
+def core(monkeypatch):
+    """detection_core with its model globals restored after the test, run from the repo root"""
+    monkeypatch.chdir(REPO)
+    for name in ('scaler', 'drowsiness_model', 'eye_classifier'):
+        monkeypatch.setattr(detection_core, name, None)
+    return detection_core
+
+
+def use_backend(monkeypatch, core, backend):
+    monkeypatch.setattr(core, 'CLASSIFIER_BACKEND', backend)
+    monkeypatch.setattr(core, 'startup', StartupStages(('scaler', 'landmarker', 'classifier'),
+                                                       optional=('classifier', 'eye_cnn')))
+
+
+def test_configured_default_loads(core):
+    core.load_classifier_models()
+    assert core.startup.failed == []
+    assert core.startup.state('scaler') == 'ready'
+    if core.CLASSIFIER_BACKEND == 'off':
+        assert core.drowsiness_model is None
+    else:
+        assert core.startup.state('classifier') == 'ready'
+        assert core.drowsiness_model is not None
+
+
+def test_shipped_tflite_degrades_the_classifier_stage(monkeypatch, core):
+    use_backend(monkeypatch, core, 'tflite')
+    core.load_classifier_models()
+    assert core.drowsiness_model is None
+    assert core.startup.degraded == ['classifier']
+    assert 'an image model' in core.startup.snapshot()['stages']['classifier']['error']
+
+
+def test_numpy_backend_loads_exported_feature_model(monkeypatch, tmp_path, core):
+    use_backend(monkeypatch, core, 'numpy')
+    npz = tmp_path / 'model.npz'
+    np.savez(npz, **export_dense_model(DENSE))
+    monkeypatch.setattr(core, 'CLASSIFIER_NPZ_PATH', str(npz))
+    core.load_classifier_models()
+    assert core.startup.state('classifier') == 'ready'
+    features = rows(3, seed=2)
+    expected = reference(core.scaler.transform(features))
+    np.testing.assert_allclose(core.drowsiness_model.predict_now(features), expected, atol=1e-5)
@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from landmark_features import (FEATURE_INDICES, LEFT_EYE, MOUTH, N_FEATURES, RIGHT_EYE, compute_features,
+                               feature_points, gather_feature_points, landmarks_to_array, split_regions)
+
+
+# Per-landmark reference math, as the servers computed it before vectorizing
+def calculate_ear(eye):
+    A = np.linalg.norm(eye[1] - eye[5])
+    B = np.linalg.norm(eye[2] - eye[4])
+    C = np.linalg.norm(eye[0] - eye[3])
+    return (A + B) / (2.0 * C + 1e-6)
+
+
+def calculate_mar(mouth):
+    A = np.linalg.norm(mouth[1] - mouth[7])
+    B = np.linalg.norm(mouth[2] - mouth[6])
+    C = np.linalg.norm(mouth[3] - mouth[5])
+    D = np.linalg.norm(mouth[0] - mouth[4])
+    return (A + B + C) / (3.0 * D + 1e-6)
+
+
+def reference_features(landmarks, width, height):
+    """[avg_ear, left_ear, right_ear, ear_diff, mar] from a (478, 3) normalized landmark array"""
+    pixels = landmarks[:, :2] * (width, height)
+    left_ear = calculate_ear(pixels[LEFT_EYE])
+    right_ear = calculate_ear(pixels[RIGHT_EYE])
+    mar = calculate_mar(pixels[MOUTH])
+    return np.array([(left_ear + right_ear) / 2.0, left_ear, right_ear, abs(left_ear - right_ear), mar])
+
+
+def random_faces(frames, seed=0):
+    return np.random.default_rng(seed).uniform(0.0, 1.0, size=(frames, 478, 3))
+
+
+def test_matches_per_landmark_math():
+    for landmarks in random_faces(20):
+        features = compute_features(gather_feature_points(landmarks, 640, 480))
+        assert features.shape == (N_FEATURES,)
+        np.testing.assert_allclose(features, reference_features(landmarks, 640, 480), rtol=1e-9)
+
+
+def test_batched_matches_single():
+    faces = random_faces(8, seed=1)
+    batched = compute_features(gather_feature_points(faces, 320, 240))
+    assert batched.shape == (8, N_FEATURES)
+    for face, row in zip(faces, batched):
+        np.testing.assert_allclose(row, compute_features(gather_feature_points(face, 320, 240)))
+
+
+def test_feature_points_from_landmark_objects():
+    landmarks = random_faces(1, seed=2)[0]
+    face = [SimpleNamespace(x=x, y=y, z=z) for x, y, z in landmarks]
+    np.testing.assert_array_equal(landmarks_to_array(face), landmarks)
+    np.testing.assert_array_equal(landmarks_to_array(face, FEATURE_INDICES), landmarks[FEATURE_INDICES])
+    points = feature_points(face, 640, 480)
+    np.testing.assert_allclose(points, gather_feature_points(landmarks, 640, 480))
+    assert points.shape == (len(FEATURE_INDICES), 2) and points.dtype == np.float64
+    np.testing.assert_array_equal(feature_points(landmarks, 640, 480), points)
+    np.testing.assert_array_equal(feature_points(landmarks[:, :2], 640, 480), points)
+
+    left_eye, right_eye, mouth = split_regions(points)
+    np.testing.assert_allclose(left_eye, landmarks[LEFT_EYE, :2] * (640, 480))
+    np.testing.assert_allclose(right_eye, landmarks[RIGHT_EYE, :2] * (640, 480))
+    np.testing.assert_allclose(mouth, landmarks[MOUTH, :2] * (640, 480))
+
+
+def test_closed_eye_and_degenerate_points():
+    points = np.zeros((len(FEATURE_INDICES), 2))
+    # Left eye 10 px wide and fully closed, right eye 10 px wide with 5 px lids apart
+    points[0], points[3] = (0, 0), (10, 0)
+    points[6], points[9] = (20, 0), (30, 0)
+    points[7], points[11] = (23, -2.5), (23, 2.5)
+    points[8], points[10] = (27, -2.5), (27, 2.5)
+    avg_ear, left_ear, right_ear, ear_diff, mar = compute_features(points)
+    assert left_ear == 0.0
+    assert right_ear == pytest.approx(0.5)
+    assert avg_ear == pytest.approx(0.25)
+    assert ear_diff == pytest.approx(0.5)
+    assert mar == 0.0  # all mouth points coincide; EPS keeps it finite
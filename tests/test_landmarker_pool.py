@@ -0,0 +1,125 @@
+import pytest
+
+import landmarker_pool
+from landmarker_pool import LandmarkerPool
+
+
+class FakeLandmarker:
+    """Stands in for PooledLandmarker; construction fails while `failing` is set"""
+
+    failing = False
+    created = 0
+
+    def __init__(self, instance_id, options):
+        if FakeLandmarker.failing:
+            raise RuntimeError('graph load failed')
+        FakeLandmarker.created += 1
+        self.instance_id = instance_id
+        self.healthy = True
+        self.closed = False
+
+    def detect(self, mp_image):
+        if mp_image == 'bad':
+            self.healthy = False
+            raise RuntimeError('inference failed')
+        return 'landmarks'
+
+    def warmup(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def stats(self):
+        return {'id': self.instance_id, 'healthy': self.healthy}
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(landmarker_pool, 'PooledLandmarker', FakeLandmarker)
+    monkeypatch.setattr(FakeLandmarker, 'failing', False)
+    pool = LandmarkerPool(lambda: 'options', size=2, checkout_timeout=0.1, retry_interval=0.0)
+    pool.start()
+    yield pool
+    pool.close()
+
+
+def fail_one(pool):
+    """Break one instance during a checkout; returns it"""
+    with pytest.raises(RuntimeError):
+        with pool.checkout() as instance:
+            instance.detect('bad')
+    return instance
+
+
+def test_checkout_and_return(pool):
+    with pool.checkout() as instance:
+        assert instance.detect('frame') == 'landmarks'
+    assert pool.health() == {'ready': True, 'size': 2, 'idle': 2, 'healthy': 2, 'missing': 0}
+
+
+def test_failed_instance_is_replaced(pool):
+    broken = fail_one(pool)
+    assert broken.closed
+    assert pool.replaced == 1
+    ids = set()
+    for _ in range(2):
+        with pool.checkout() as a, pool.checkout() as b:
+            ids |= {a.instance_id, b.instance_id}
+            assert a.healthy and b.healthy
+    assert broken.instance_id not in ids
+
+
+def test_failed_replacement_shrinks_pool(pool, monkeypatch):
+    pool.retry_interval = 60.0
+    monkeypatch.setattr(FakeLandmarker, 'failing', True)
+    broken = fail_one(pool)
+    assert pool.missing == 1
+    assert pool.health()['idle'] == 1
+    # The broken instance is never handed out again
+    for _ in range(3):
+        with pool.checkout() as instance:
+            assert instance is not broken and instance.healthy
+    assert pool.stats()['replace_errors'] == 1
+    assert len(pool.stats()['instances']) == 1
+
+
+def test_later_checkout_restores_lost_instance(pool, monkeypatch):
+    monkeypatch.setattr(FakeLandmarker, 'failing', True)
+    fail_one(pool)
+    fail_one(pool)
+    assert pool.missing == 2
+    # Every instance lost and recreating still fails: a clear error, not a dead landmarker
+    with pytest.raises(RuntimeError, match='No landmarker instances'):
+        with pool.checkout():
+            pass
+
+    monkeypatch.setattr(FakeLandmarker, 'failing', False)
+    with pool.checkout() as instance:
+        assert instance.healthy
+    assert pool.missing == 1
+    with pool.checkout():
+        pass
+    assert pool.missing == 0
+    assert pool.health()['idle'] == 2
+
+
+def test_restore_waits_for_retry_interval(pool, monkeypatch):
+    pool.retry_interval = 60.0
+    monkeypatch.setattr(FakeLandmarker, 'failing', True)
+    fail_one(pool)
+    monkeypatch.setattr(FakeLandmarker, 'failing', False)
+    created = FakeLandmarker.created
+    with pool.checkout():
+        pass
+    assert FakeLandmarker.created == created  # not retried yet
+    pool._retry_at = 0.0
+    with pool.checkout():
+        pass
+    assert pool.missing == 0
+
+
+def test_checkout_before_start():
+    with pytest.raises(RuntimeError, match='not started'):
+        with LandmarkerPool('options').checkout():
+            pass
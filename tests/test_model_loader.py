@@ -0,0 +1,50 @@
+import pytest
+
+from model_loader import StartupStages
+
+
+def fail():
+    raise RuntimeError('missing model')
+
+
+def test_required_stage_failure_blocks_readiness():
+    stages = StartupStages(('scaler', 'landmarker'))
+    with stages.stage('scaler'):
+        pass
+    assert not stages.ready
+    with stages.stage('landmarker'):
+        fail()
+    assert not stages.ready
+    assert stages.failed == ['landmarker']
+    assert stages.snapshot()['stages']['landmarker']['error'] == 'missing model'
+
+
+def test_failed_optional_stage_degrades_but_stays_ready():
+    stages = StartupStages(('scaler', 'landmarker', 'classifier'), optional=('classifier', 'eye_cnn'))
+    with stages.stage('scaler'):
+        pass
+    with stages.stage('landmarker'):
+        pass
+    assert not stages.ready  # optional stages still hold readiness while pending
+    with stages.stage('classifier'):
+        fail()
+    assert stages.ready
+    assert stages.degraded == ['classifier']
+    snapshot = stages.snapshot()
+    assert snapshot['ready'] and snapshot['degraded'] == ['classifier']
+    assert snapshot['stages']['classifier']['optional']
+    assert not snapshot['stages']['scaler']['optional']
+
+
+@pytest.mark.parametrize('state', ['ready', 'failed'])
+def test_optional_stage_loading_holds_readiness(state):
+    stages = StartupStages(('landmarker', 'eye_cnn'), optional=('eye_cnn',))
+    with stages.stage('landmarker'):
+        pass
+    with stages.stage('eye_cnn'):
+        assert stages.state('eye_cnn') == 'loading'
+        assert not stages.ready
+        if state == 'failed':
+            fail()
+    assert stages.ready
+    assert stages.degraded == ([] if state == 'ready' else ['eye_cnn'])
@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+from motion_gate import MotionGate
+
+
+def scene(seed=0, shape=(240, 320, 3)):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, shape, dtype=np.uint8)
+
+
+def face_result(eye_y=100):
+    """Detection result with eye and mouth regions around (x, eye_y) in frame pixels"""
+    left = np.array([[100.0, eye_y], [130.0, eye_y], [115.0, eye_y + 5]])
+    right = np.array([[190.0, eye_y], [220.0, eye_y], [205.0, eye_y + 5]])
+    mouth = np.array([[130.0, 180.0], [190.0, 180.0], [160.0, 200.0]])
+    return {'landmarks': (left, right, mouth)}
+
+
+def test_first_frame_is_detected():
+    gate = MotionGate()
+    assert gate.check(scene())
+    assert gate.stats()['detected'] == 1
+
+
+def test_static_scene_skips_up_to_max_skips():
+    gate = MotionGate(max_skips=3)
+    frame = scene()
+    decisions = [gate.check(frame.copy()) for _ in range(9)]
+    # Detect, skip 3, forced detect, skip 3, forced detect
+    assert decisions == [True, False, False, False, True, False, False, False, True]
+    stats = gate.stats()
+    assert stats['skipped'] == 6
+    assert stats['forced'] == 2
+    assert stats['detected'] == 3
+    assert stats['skip_rate'] == pytest.approx(6 / 9, abs=1e-3)
+    assert stats['last_change'] == 0.0
+
+
+def test_max_skips_zero_never_skips():
+    gate = MotionGate(max_skips=0)
+    frame = scene()
+    assert all(gate.check(frame) for _ in range(5))
+    assert gate.stats()['forced'] == 4
+
+
+def test_sensor_noise_below_threshold_is_skipped():
+    gate = MotionGate()
+    frame = scene()
+    rng = np.random.default_rng(1)
+    assert gate.check(frame)
+    noisy = np.clip(frame.astype(np.int16) + rng.integers(-1, 2, frame.shape), 0, 255).astype(np.uint8)
+    assert not gate.check(noisy)
+
+
+def test_global_motion_triggers_detection():
+    gate = MotionGate(max_skips=10)
+    assert gate.check(scene(0))
+    assert not gate.check(scene(0))
+    assert gate.check(scene(1))
+    assert gate.stats()['last_change'] > gate.threshold
+    # The new frame is the reference from now on
+    assert not gate.check(scene(1))
+
+
+def test_small_change_inside_eye_region_triggers_detection():
+    frame = np.full((240, 320, 3), 128, np.uint8)
+    closed = frame.copy()
+    closed[95:110, 100:131] = 20  # left eye darkens, far too small to move the whole-frame mean
+
+    gate = MotionGate(max_skips=10)
+    assert gate.check(frame)
+    gate.observe(face_result())
+    assert gate.check(closed)
+    stats = gate.stats()
+    assert stats['last_change'] < gate.threshold
+    assert stats['last_roi_change'] > gate.roi_threshold
+
+    # Without a face there are no regions to watch, so the same change is skipped
+    gate = MotionGate(max_skips=10)
+    assert gate.check(frame)
+    gate.observe(None)
+    assert not gate.check(closed)
+
+
+def test_change_outside_watched_regions_is_skipped():
+    frame = np.full((240, 320, 3), 128, np.uint8)
+    corner = frame.copy()
+    corner[0:15, 0:30] = 20
+
+    gate = MotionGate(max_skips=10)
+    assert gate.check(frame)
+    gate.observe(face_result())
+    assert not gate.check(corner)
+
+
+def test_geometry_change_and_reset_force_detection():
+    gate = MotionGate(max_skips=10)
+    assert gate.check(scene())
+    assert not gate.check(scene())
+    assert gate.check(scene(shape=(120, 160, 3)))
+    assert not gate.check(scene(shape=(120, 160, 3)))
+    assert gate.check(scene(shape=(120, 160)))  # grayscale input
+    gate.reset()
+    assert gate.check(scene(shape=(120, 160)))
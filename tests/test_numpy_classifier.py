@@ -0,0 +1,70 @@
+import os
+
+import numpy as np
+import pytest
+
+from landmark_features import AffineScaler
+from model_loader import interpreter_runtime
+from numpy_classifier import NumpyClassifier, export_dense_model, feature_range, ops_details, parity
+
+try:
+    interpreter_runtime()
+except ImportError as e:
+    pytest.skip(str(e), allow_module_level=True)
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+REPO = os.path.join(DATA, '..', '..')
+SCALER = AffineScaler([0.28, 0.30, 0.29, 0.35, 0.4], [0.05, 0.06, 0.05, 0.2, 0.1])
+
+
+def export(tmp_path, name, scaler=None):
+    path = tmp_path / 'model.npz'
+    np.savez(path, **export_dense_model(os.path.join(DATA, name), scaler))
+    return NumpyClassifier.load(str(path), preprocess=scaler.transform if scaler else None)
+
+
+def test_float_model_parity(tmp_path):
+    classifier = export(tmp_path, 'dense_float.tflite')
+    assert classifier.steps == ['dense', 'relu', 'dense', 'relu', 'dense', 'sigmoid']
+    assert not classifier.scaled
+    assert parity(os.path.join(DATA, 'dense_float.tflite'), classifier) < 1e-4
+
+
+def test_scaler_folded_in(tmp_path):
+    classifier = export(tmp_path, 'dense_float.tflite', SCALER)
+    assert classifier.scaled and classifier.preprocess is None
+    assert parity(os.path.join(DATA, 'dense_float.tflite'), classifier, SCALER) < 1e-4
+
+    # Folding the scaler matches scaling first and running the unscaled export
+    plain = export(tmp_path, 'dense_float.tflite')
+    rows = np.random.default_rng(2).normal(SCALER.mean, SCALER.scale, size=(32, 5)).astype(np.float32)
+    np.testing.assert_allclose(classifier.predict_now(rows), plain.predict_now(SCALER.transform(rows)), atol=1e-5)
+
+
+def test_int8_model_parity(tmp_path):
+    classifier = export(tmp_path, 'dense_int8.tflite', SCALER)
+    assert parity(os.path.join(DATA, 'dense_int8.tflite'), classifier, SCALER) < 5e-2
+
+
+def test_single_row_matches_batch(tmp_path):
+    classifier = export(tmp_path, 'dense_float.tflite')
+    rows = np.random.default_rng(3).normal(size=(8, 5)).astype(np.float32)
+    batch = classifier.predict_now(rows)
+    assert [classifier.predict(row) for row in rows] == pytest.approx(batch, abs=1e-6)
+    assert classifier.stats()['rows'] == 16
+
+
+def test_rejects_image_model():
+    with pytest.raises(ValueError, match='not a feature vector'):
+        export_dense_model(os.path.join(REPO, 'drowsiness_model.tflite'))
+
+
+def test_runtime_without_ops_details():
+    class Interpreter:
+        def get_tensor_details(self):
+            return []
+
+    with pytest.raises(ValueError, match='_get_ops_details'):
+        ops_details(Interpreter())
+    with pytest.raises(ValueError, match='_get_ops_details'):
+        feature_range(Interpreter())
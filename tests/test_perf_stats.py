@@ -0,0 +1,142 @@
+import math
+import re
+from collections import defaultdict
+
+import pytest
+
+import detection_core
+from perf_stats import LatencyCounter, LatencyHistogram, StageProfiler, prometheus_metric
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})? (\S+)$')
+LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+STEP = 2 ** (1 / 8)
+
+
+def parse_exposition(text):
+    """{family: {'type', 'help', 'samples': [(name, labels, value)]}} from Prometheus text format 0.0.4"""
+    families = {}
+    family = None
+    assert text.endswith('\n')
+    for line in text.splitlines():
+        if line.startswith('# HELP '):
+            family, help_text = line[7:].split(' ', 1)
+            families[family] = {'help': help_text, 'samples': []}
+        elif line.startswith('# TYPE '):
+            name, kind = line[7:].split(' ')
+            assert name == family and kind in ('counter', 'gauge', 'summary', 'histogram')
+            families[family]['type'] = kind
+        else:
+            match = SAMPLE.match(line)
+            assert match, line
+            name, labels, value = match.groups()
+            assert name.startswith(family), line
+            families[family]['samples'].append((name, dict(LABEL.findall(labels or '')), float(value)))
+    return families
+
+
+def test_latency_counter():
+    counter = LatencyCounter()
+    for ms in (1, 2, 6):
+        counter.record(ms / 1000)
+    assert counter.snapshot() == {'count': 3, 'mean_ms': 3.0, 'last_ms': 6.0, 'max_ms': 6.0}
+
+
+def test_quantiles_of_known_samples():
+    histogram = LatencyHistogram()
+    for ms in range(1, 1001):
+        histogram.record(ms / 1000)
+    # Each quantile is the upper bound of its bucket: at most one bucket step above the true value
+    for q, value in zip((0.5, 0.9, 0.99), histogram.quantiles((0.5, 0.9, 0.99))):
+        exact = q * 1000
+        assert exact <= value <= exact * STEP
+    assert histogram.quantiles((1.0,)) == [pytest.approx(1000.0)]
+    snapshot = histogram.snapshot()
+    assert snapshot['count'] == 1000
+    assert snapshot['mean_ms'] == pytest.approx(500.5)
+    assert snapshot['max_ms'] == pytest.approx(1000.0)
+
+
+def test_quantiles_edge_cases():
+    histogram = LatencyHistogram()
+    assert histogram.quantiles() == [0.0, 0.0, 0.0]
+    histogram.record(0.0)
+    assert histogram.quantiles((0.5,)) == [0.0]
+
+    histogram = LatencyHistogram()
+    histogram.record(1000.0)  # beyond the last bound: reported as the max seen
+    assert histogram.quantiles((0.5,)) == [pytest.approx(1e6)]
+
+    histogram = LatencyHistogram()
+    for _ in range(99):
+        histogram.record(0.001)
+    histogram.record(0.5)
+    p50, p99 = histogram.quantiles((0.5, 0.995))
+    assert 1.0 <= p50 <= STEP
+    assert 500.0 / STEP <= p99 <= 500.0
+
+
+def test_cumulative_buckets():
+    histogram = LatencyHistogram()
+    for ms in (0.005, 0.01, 0.5, 1.0, 40.0, 1e6):
+        histogram.record(ms / 1000)
+    buckets, count, total = histogram.cumulative(step=8)
+    assert count == 6
+    assert total == pytest.approx(1e6 + 41.515)
+    assert len(buckets) == len(LatencyHistogram.BOUNDS_MS) // 8
+    for bound, n in buckets:
+        assert n == sum(1 for ms in (0.005, 0.01, 0.5, 1.0, 40.0) if ms <= bound * (1 + 1e-9))
+
+
+def test_stage_profiler_prometheus_histogram():
+    profiler = StageProfiler()
+    samples = {'fetch': [0.002, 0.004, 0.004, 0.03], 'detect': [0.015] * 10 + [0.2], 'idle': []}
+    for stage, values in samples.items():
+        profiler.histogram(stage)
+        for seconds in values:
+            profiler.record(stage, seconds)
+
+    families = parse_exposition(profiler.prometheus('x_latency_seconds', 'Stage "latency"'))
+    assert set(families) == {'x_latency_seconds', 'x_latency_seconds_quantile'}
+    family = families['x_latency_seconds']
+    assert family['type'] == 'histogram'
+    assert families['x_latency_seconds_quantile']['type'] == 'gauge'
+
+    by_stage = defaultdict(lambda: defaultdict(list))
+    for name, labels, value in family['samples']:
+        by_stage[labels['stage']][name].append((labels, value))
+    assert set(by_stage) == set(samples)
+
+    for stage, values in samples.items():
+        series = by_stage[stage]
+        buckets = series['x_latency_seconds_bucket']
+        bounds = [float(labels['le']) for labels, _ in buckets]
+        counts = [value for _, value in buckets]
+        assert bounds[-1] == math.inf and buckets[-1][0]['le'] == '+Inf'
+        assert bounds == sorted(bounds) and len(set(bounds)) == len(bounds)
+        assert counts == sorted(counts)  # cumulative
+        for bound, n in zip(bounds[:-1], counts):
+            # Bounds are printed to 6 significant digits
+            assert n == sum(1 for s in values if s <= bound * (1 + 1e-5))
+        [(_, total)] = series['x_latency_seconds_sum']
+        [(_, count)] = series['x_latency_seconds_count']
+        assert count == counts[-1] == len(values)
+        assert total == pytest.approx(sum(values))
+
+    quantiles = {(labels['stage'], labels['quantile']): value
+                 for _, labels, value in families['x_latency_seconds_quantile']['samples']}
+    assert quantiles[('detect', '0.5')] == pytest.approx(0.015, rel=STEP - 1)
+    assert quantiles[('detect', '0.99')] == pytest.approx(0.2)
+    assert quantiles[('idle', '0.95')] == 0.0
+
+
+def test_prometheus_metric_formats_values_and_escapes_labels():
+    text = prometheus_metric('m', 'gauge', 'help', [({'a': 'x"y\\z\n'}, True), ({}, 2), ('_total', {}, 0.5)])
+    assert text.splitlines()[2:] == ['m{a="x\\"y\\\\z\\n"} 1', 'm 2', 'm_total 0.5']
+    assert parse_exposition(text)['m']['samples'][0][1] == {'a': 'x\\"y\\\\z\\n'}
+
+
+def test_detection_core_metrics_parse():
+    detection_core.profiler.record('fetch', 0.003)
+    families = parse_exposition(detection_core.prometheus_text([]))
+    assert families['drowsiness_stage_latency_seconds']['type'] == 'histogram'
+    assert families['drowsiness_frames_total']['type'] == 'counter'
@@ -0,0 +1,143 @@
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+import stream_profiles
+from frame_buffers import MJPEG_PART_HEADER
+from stream_profiles import AdaptiveQuality, ProfileEncoder, StreamProfile, encoding_key, select_part
+
+PRESETS = {
+    'high': {},
+    'low': {'width': 320, 'quality': 50, 'max_fps': 10}
+}
+
+
+def frame(value=0, width=640, height=480):
+    image = np.full((height, width, 3), value, dtype=np.uint8)
+    cv2.circle(image, (width // 2, height // 2), height // 4, (255, 255, 255), -1)
+    return image
+
+
+def decode(part):
+    jpeg = np.frombuffer(part[len(MJPEG_PART_HEADER):-2], dtype=np.uint8)
+    return cv2.imdecode(jpeg, cv2.IMREAD_COLOR)
+
+
+def test_same_frame_is_encoded_once_per_key():
+    encoder = ProfileEncoder()
+    image = frame()
+    first = encoder.part(1, image, 320, 50)
+    assert encoder.part(1, image, 320, 50) is first
+    assert encoder.part(1, image, None, 50) is not first
+    assert decode(first).shape == (240, 320, 3)
+    assert encoder.stats() == {'320@q50': {'encodes': 1, 'shared': 1}, 'source@q50': {'encodes': 1, 'shared': 0}}
+
+
+def test_newer_frames_re_encode_and_older_ones_reuse():
+    encoder = ProfileEncoder()
+    newer = encoder.part(2, frame(10), 320, 50)
+    assert encoder.part(1, frame(20), 320, 50) is newer  # a late viewer gets the newest frame
+    assert encoder.part(3, frame(30), 320, 50) is not newer
+    assert encoder.stats()['320@q50']['encodes'] == 2
+
+
+def test_static_placeholder_is_not_re_encoded():
+    encoder = ProfileEncoder()
+    placeholder = frame(50)
+    first = encoder.part(1, placeholder, 320, 50)
+    assert encoder.part(7, placeholder, 320, 50) is first
+
+
+def test_concurrent_viewers_share_one_encode():
+    encoder = ProfileEncoder()
+    image = frame()
+    barrier = threading.Barrier(8)
+    parts = []
+
+    def viewer():
+        barrier.wait()
+        parts.append(encoder.part(1, image, 160, 40))
+
+    threads = [threading.Thread(target=viewer) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(part) for part in parts}) == 1
+    assert encoder.stats()['160@q40'] == {'encodes': 1, 'shared': 7}
+
+
+def test_idle_keys_are_dropped(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(stream_profiles.time, 'monotonic', lambda: now[0])
+    encoder = ProfileEncoder(idle_seconds=30.0)
+    encoder.part(1, frame(), 320, 50)
+    now[0] += 31.0
+    encoder.part(2, frame(), 160, 50)
+    assert list(encoder.stats()) == ['160@q50']
+
+
+def test_feed_part_is_reused_when_profile_matches():
+    encoder = ProfileEncoder()
+    image = frame()
+    feed_part = b'feed'
+    full = StreamProfile(quality=85)
+    assert encoding_key(full, None, image, 85) is None
+    assert select_part(encoder, full, None, 1, image, feed_part, 85) is feed_part
+    # Wider than the source: no resize needed
+    assert encoding_key(StreamProfile(width=1280, quality=85), None, image, 85) is None
+    assert encoding_key(StreamProfile(width=320, quality=85), None, image, 85) == (320, 85)
+    assert encoding_key(full, None, None, 85) is None
+
+    low = StreamProfile(width=320, quality=50)
+    part = select_part(encoder, low, None, 1, image, feed_part, 85)
+    assert part.startswith(MJPEG_PART_HEADER)
+    assert encoder.stats() == {'320@q50': {'encodes': 1, 'shared': 0}}
+
+
+def test_profile_from_args():
+    profile = StreamProfile.from_args({'profile': 'low', 'quality': '60'}, PRESETS, 85)
+    assert (profile.width, profile.quality, profile.max_fps, profile.max_kbps) == (320, 60, 10, None)
+    assert profile.adaptive
+    profile = StreamProfile.from_args({'fps': '5', 'kbps': '500', 'adaptive': 'no'}, PRESETS, 85)
+    assert (profile.width, profile.quality, profile.max_fps, profile.max_kbps) == (None, 85, 5.0, 500.0)
+    assert not profile.adaptive
+    assert profile.frame_interval(30) == pytest.approx(0.2)
+    assert StreamProfile().frame_interval(20) == pytest.approx(0.05)
+
+    for args in ({'profile': 'ultra'}, {'width': 'wide'}, {'width': '8'}, {'quality': '10'}, {'fps': '0'}):
+        with pytest.raises(ValueError):
+            StreamProfile.from_args(args, PRESETS, 85)
+
+
+def test_adaptive_quality_steps_down_and_recovers(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(stream_profiles.time, 'monotonic', lambda: now[0])
+    adapter = AdaptiveQuality(StreamProfile(quality=85), frame_interval=0.1, hold=2.0)
+    assert adapter.levels == [85, 70, 55, 40]
+
+    # Sends eating most of the frame interval: one rung down per hold period
+    for _ in range(50):
+        now[0] += 0.1
+        adapter.observe(0.09, 10000)
+    assert adapter.quality == 55
+    assert adapter.steps_down == 2
+
+    # Fast sends: back up one rung per 3 hold periods
+    for _ in range(80):
+        now[0] += 0.1
+        adapter.observe(0.001, 10000)
+    assert adapter.quality == 70
+    assert adapter.steps_up == 1
+
+
+def test_non_adaptive_quality_is_fixed(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(stream_profiles.time, 'monotonic', lambda: now[0])
+    adapter = AdaptiveQuality(StreamProfile(quality=85, adaptive=False), frame_interval=0.1)
+    for _ in range(100):
+        now[0] += 0.1
+        adapter.observe(0.5, 10000)
+    assert adapter.quality == 85
@@ -0,0 +1,105 @@
+import random
+
+import pytest
+
+from window_metrics import BucketRing, WindowMetrics, window_key
+
+
+def test_window_key():
+    assert window_key('blinks', 30) == 'blinks_30s'
+    assert window_key('blinks', 30.0) == 'blinks_30s'
+    assert window_key('yawns', 7.5) == 'yawns_7.5s'
+
+
+def test_ring_slides_out_old_buckets():
+    ring = BucketRing(10, resolution=1.0)
+    ring.add(0.5, 1.0)
+    ring.add(3.2, 2.0)
+    assert ring.total(9.9) == 3.0
+    assert ring.total(10.0) == 2.0  # bucket 0 left the window
+    assert ring.total(12.9) == 2.0
+    assert ring.total(13.0) == 0.0
+
+
+def test_ring_jump_past_window_clears():
+    ring = BucketRing(5, resolution=1.0, channels=2)
+    ring.add(1.0, 1.0, 4.0)
+    assert ring.total(100.0) == 0.0
+    assert ring.total(100.0, 1) == 0.0
+    ring.add(101.0, 1.0, 2.0)
+    assert ring.total(101.0, 1) == 2.0
+
+
+def test_ring_clock_step_back_adds_to_newest_bucket():
+    ring = BucketRing(5, resolution=1.0)
+    ring.add(4.0, 1.0)
+    ring.add(2.0, 1.0)
+    assert ring.total(4.0) == 2.0
+    assert ring.total(9.0) == 0.0
+
+
+def test_ring_matches_brute_force():
+    rng = random.Random(0)
+    ring = BucketRing(7, resolution=0.5)
+    events = []
+    t = 0.0
+    for _ in range(2000):
+        t += rng.uniform(0.0, 0.8)
+        value = rng.uniform(0.0, 1.0)
+        ring.add(t, value)
+        events.append((t, value))
+        head = int(t // 0.5)
+        expected = sum(v for et, v in events if int(et // 0.5) > head - ring.size)
+        assert ring.total(t) == pytest.approx(expected, abs=1e-9)
+
+
+def test_blinks_and_duration():
+    metrics = WindowMetrics(blink_window=30.0, closed_ear=0.22)
+    assert metrics.update(0.0, 0.30) == (False, False)
+    assert metrics.update(1.0, 0.10) == (False, False)
+    assert metrics.update(1.2, 0.30) == (True, False)
+    metrics.update(5.0, 0.10)
+    assert metrics.update(5.4, 0.30) == (True, False)
+
+    stats = metrics.write({}, 6.0)
+    assert stats['blinks_30s'] == 2
+    assert stats['blink_duration_ms'] == pytest.approx(300.0)
+    assert metrics.write({}, 36.0)['blinks_30s'] == 0
+
+
+def test_yawns_respect_gap():
+    metrics = WindowMetrics(yawn_window=60.0, yawn_mar=0.6, yawn_gap=2.0)
+    assert metrics.update(0.0, 0.3, 0.8) == (False, True)
+    assert metrics.update(1.0, 0.3, 0.8) == (False, False)
+    assert metrics.update(3.0, 0.3, 0.8) == (False, True)
+    assert metrics.write({}, 3.0)['yawns_60s'] == 2
+
+
+def test_perclos_and_ear_stats():
+    metrics = WindowMetrics()
+    ears = [0.30, 0.10, 0.10, 0.30]
+    for i, ear in enumerate(ears):
+        metrics.update(i * 0.1, ear)
+    metrics.update(0.5)  # no face: ignored
+    stats = metrics.write({}, 0.5)
+    assert stats['perclos'] == 0.5
+    assert stats['ear_mean'] == pytest.approx(0.2)
+    assert stats['ear_var'] == pytest.approx(0.01)
+
+
+def test_custom_windows_name_their_keys():
+    metrics = WindowMetrics(blink_window=10.0, yawn_window=45.0)
+    stats = metrics.write({}, 0.0)
+    assert (metrics.blink_key, metrics.yawn_key) == ('blinks_10s', 'yawns_45s')
+    assert stats['blinks_10s'] == 0 and stats['yawns_45s'] == 0
+    assert 'blinks_30s' not in stats
+    assert metrics.windows()['blinks'] == 10.0
+
+
+def test_reset():
+    metrics = WindowMetrics()
+    metrics.update(0.0, 0.1, 0.9)
+    metrics.reset()
+    assert not metrics.eyes_closed
+    stats = metrics.write({}, 0.0)
+    assert stats['yawns_60s'] == 0 and stats['perclos'] == 0.0 and stats['ear_mean'] == 0.0
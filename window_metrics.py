@@ -0,0 +1,172 @@
+"""
+Sliding-Window Drowsiness Metrics
+Blink / yawn counts, PERCLOS, mean blink duration and rolling EAR mean and
+variance over configurable time windows. Each window is a ring of
+fixed-width buckets with running totals, so an update or a read costs O(1)
+amortized regardless of how many events fall inside the window, and
+nothing is allocated per frame.
+"""
+
+import math
+
+
+def window_key(name, seconds):
+    """Stats key of a windowed count, e.g. window_key('blinks', 30) -> 'blinks_30s'"""
+    return f"{name}_{seconds:g}s"
+
+
+class BucketRing:
+    """
+    Running sums of one or more channels over the last `window` seconds.
+
+    Time is split into buckets of `resolution` seconds; a bucket's values
+    leave the totals when the window slides past it, so a window covers
+    between window - resolution and window seconds.
+    """
+
+    def __init__(self, window, resolution=1.0, channels=1):
+        self.window = window
+        self.resolution = resolution
+        self.size = max(1, int(math.ceil(window / resolution)))
+        self._buckets = [[0.0] * self.size for _ in range(channels)]
+        self._totals = [0.0] * channels
+        self._head = None  # absolute number of the newest bucket
+
+    def _advance(self, t):
+        bucket = int(t // self.resolution)
+        if self._head is None:
+            self._head = bucket
+            return
+        steps = bucket - self._head
+        if steps <= 0:
+            return  # same bucket (or a clock step back): add to the newest one
+        if steps >= self.size:
+            for values in self._buckets:
+                values[:] = [0.0] * self.size
+            self._totals[:] = [0.0] * len(self._totals)
+        else:
+            for b in range(self._head + 1, bucket + 1):
+                i = b % self.size
+                for c, values in enumerate(self._buckets):
+                    self._totals[c] -= values[i]
+                    values[i] = 0.0
+            # Re-sum once per lap so floating-point drift cannot build up
+            if bucket // self.size != self._head // self.size:
+                for c, values in enumerate(self._buckets):
+                    self._totals[c] = math.fsum(values)
+        self._head = bucket
+
+    def add(self, t, *values):
+        """Add one value per channel at time t"""
+        self._advance(t)
+        i = self._head % self.size
+        for c, value in enumerate(values):
+            self._buckets[c][i] += value
+            self._totals[c] += value
+
+    def total(self, t, channel=0):
+        """Channel total over the window ending at t"""
+        self._advance(t)
+        return self._totals[channel]
+
+    def clear(self):
+        for values in self._buckets:
+            values[:] = [0.0] * self.size
+        self._totals[:] = [0.0] * len(self._totals)
+        self._head = None
+
+
+class WindowMetrics:
+    """
+    Blink/yawn event detection plus windowed drowsiness metrics for one stream.
+
+    update() takes one frame's EAR/MAR (or None when no face was found) and
+    reports whether a blink ended or a yawn started on it; write() puts the
+    current window values into a stats dict in place, with the blink and
+    yawn counts under blink_key/yawn_key (named after their windows, so
+    'blinks_30s'/'yawns_60s' by default). Not thread-safe: callers
+    serialize access per stream.
+    """
+
+    def __init__(self, blink_window=30.0, yawn_window=60.0, perclos_window=60.0, ear_window=30.0,
+                 resolution=1.0, closed_ear=0.22, yawn_mar=0.6, yawn_gap=2.0):
+        self.blink_window = blink_window
+        self.yawn_window = yawn_window
+        self.perclos_window = perclos_window
+        self.ear_window = ear_window
+        self.closed_ear = closed_ear
+        self.yawn_mar = yawn_mar
+        self.yawn_gap = yawn_gap
+        self.blink_key = window_key('blinks', blink_window)
+        self.yawn_key = window_key('yawns', yawn_window)
+
+        self.blinks = BucketRing(blink_window, resolution, channels=2)  # count, total duration
+        self.yawns = BucketRing(yawn_window, resolution)
+        self.perclos = BucketRing(perclos_window, resolution, channels=2)  # face frames, closed frames
+        self.ear = BucketRing(ear_window, resolution, channels=3)  # count, sum, sum of squares
+
+        self.eyes_closed = False
+        self._closed_since = None
+        self._last_yawn = None
+
+    def update(self, t, ear=None, mar=None):
+        """Feed one frame at time t (seconds); returns (blinked, yawned)"""
+        if ear is None:
+            return False, False
+
+        blinked = yawned = False
+        closed = ear < self.closed_ear
+        if closed and not self.eyes_closed:
+            self.eyes_closed = True
+            self._closed_since = t
+        elif not closed and self.eyes_closed:
+            # Blink = EAR drops below the threshold and rises again
+            self.eyes_closed = False
+            self.blinks.add(t, 1.0, t - self._closed_since)
+            blinked = True
+
+        if mar is not None and mar > self.yawn_mar:
+            if self._last_yawn is None or t - self._last_yawn > self.yawn_gap:
+                self.yawns.add(t, 1.0)
+                self._last_yawn = t
+                yawned = True
+
+        self.perclos.add(t, 1.0, 1.0 if closed else 0.0)
+        self.ear.add(t, 1.0, ear, ear * ear)
+        return blinked, yawned
+
+    def write(self, stats, t):
+        """Store the window values at time t into `stats`"""
+        blinks = self.blinks.total(t)
+        stats[self.blink_key] = int(round(blinks))
+        stats[self.yawn_key] = int(round(self.yawns.total(t)))
+
+        face_frames = self.perclos.total(t)
+        stats['perclos'] = round(self.perclos.total(t, 1) / face_frames, 4) if face_frames else 0.0
+        stats['blink_duration_ms'] = round(self.blinks.total(t, 1) / blinks * 1000.0, 1) if blinks else 0.0
+
+        n = self.ear.total(t)
+        if n:
+            mean = self.ear.total(t, 1) / n
+            stats['ear_mean'] = round(mean, 4)
+            stats['ear_var'] = round(max(self.ear.total(t, 2) / n - mean * mean, 0.0), 6)
+        else:
+            stats['ear_mean'] = 0.0
+            stats['ear_var'] = 0.0
+        return stats
+
+    def windows(self):
+        """Window lengths in seconds, for clients labelling the values"""
+        return {
+            'blinks': self.blink_window,
+            'yawns': self.yawn_window,
+            'perclos': self.perclos_window,
+            'ear': self.ear_window
+        }
+
+    def reset(self):
+        for ring in (self.blinks, self.yawns, self.perclos, self.ear):
+            ring.clear()
+        self.eyes_closed = False
+        self._closed_since = None
+        self._last_yawn = None